@@ -28,7 +28,7 @@ mkdir -p package
 # Copy ONLY lightweight dependencies (exclude image processing libs)
 echo "📚 Copying lightweight Python packages..."
 echo "   Including: boto3, stripe, python-dotenv and their dependencies"
-echo "   Excluding: Pillow, rawpy, pillow-heif, numpy (from Lambda layer)"
+echo "   Excluding: Pillow, rawpy, pillow-heif, numpy, pyarrow (from Lambda layers)"
 
 # Copy all packages, then remove image processing ones
 cp -r venv/lib/python*/site-packages/* package/ 2>/dev/null || true
@@ -36,9 +36,9 @@ cp -r venv/lib/python*/site-packages/* package/ 2>/dev/null || true
 # Remove image processing libraries (they come from Lambda layer)
 echo "   Removing image processing libs (from layer)..."
 # Remove directories
-find package -type d \( -name "PIL" -o -name "Pillow*" -o -name "rawpy*" -o -name "pillow_heif*" -o -name "numpy*" -o -name "imagecodecs*" \) -exec rm -rf {} + 2>/dev/null || true
+find package -type d \( -name "PIL" -o -name "Pillow*" -o -name "rawpy*" -o -name "pillow_heif*" -o -name "numpy*" -o -name "imagecodecs*" -o -name "pyarrow*" \) -exec rm -rf {} + 2>/dev/null || true
 # Remove .dist-info directories
-find package -type d \( -name "Pillow*.dist-info" -o -name "rawpy*.dist-info" -o -name "pillow-heif*.dist-info" -o -name "numpy*.dist-info" -o -name "imagecodecs*.dist-info" \) -exec rm -rf {} + 2>/dev/null || true
+find package -type d \( -name "Pillow*.dist-info" -o -name "rawpy*.dist-info" -o -name "pillow-heif*.dist-info" -o -name "numpy*.dist-info" -o -name "imagecodecs*.dist-info" -o -name "pyarrow*.dist-info" \) -exec rm -rf {} + 2>/dev/null || true
 # Remove .so files (compiled extensions) for image processing libs
 find package -type f \( -name "*pillow*.so" -o -name "*rawpy*.so" -o -name "*numpy*.so" -o -name "*imagecodecs*.so" -o -name "_imaging*.so" -o -name "_pillow_heif*.so" \) -delete 2>/dev/null || true
 # Remove any remaining files with these names
@@ -47,6 +47,8 @@ find package -type f -name "*Pillow*" -delete 2>/dev/null || true
 find package -type f -name "*rawpy*" -delete 2>/dev/null || true
 find package -type f -name "*pillow_heif*" -delete 2>/dev/null || true
 find package -type f -name "*numpy*" -delete 2>/dev/null || true
+# pyarrow (analytics archive) comes from its own optional layer - requirements-archive.txt
+find package -type f -name "*pyarrow*" -delete 2>/dev/null || true
 
 # Copy application code
 echo "📄 Copying application code..."
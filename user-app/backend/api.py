@@ -1,6 +1,11 @@
 """
 Galerly API - Clean Modular Architecture
 Main entry point for AWS Lambda
+
+Requests are dispatched through a compiled route table (utils/router.py).
+Each route names its handler as 'module:function'; handler modules are
+imported the first time one of their routes is hit, so a cold start only
+pays for the modules the invocation actually uses.
 """
 import json
 from datetime import datetime, timezone
@@ -9,314 +14,850 @@ from datetime import datetime, timezone
 from utils.response import create_response
 from utils.auth import get_user_from_token
 from utils.rate_limiter import check_rate_limit
-
-# Import handlers
-from handlers.auth_handler import (
-    handle_register, handle_login, handle_logout, handle_get_me, 
-    handle_request_password_reset, handle_reset_password, 
-    handle_request_verification_code, handle_verify_code, 
-    handle_delete_account, handle_restore_account,
-    handle_generate_api_key, handle_get_api_key
-)
-from utils.key_rotation import handle_rotation_status
-
-from handlers.city_handler import handle_city_search
-from handlers.profile_handler import handle_update_profile
-from handlers.gallery_handler import (
-    handle_list_galleries,
-    handle_create_gallery,
-    handle_get_gallery,
-    handle_update_gallery,
-    handle_delete_gallery,
-    handle_duplicate_gallery,
-    handle_archive_gallery,
-    handle_archive_originals,
-    handle_list_layouts,
-    handle_get_layout
-)
-from handlers.gallery_statistics_handler import handle_get_gallery_statistics
-from handlers.client_selection_handler import (
-    handle_create_selection_session,
-    handle_add_to_selection,
-    handle_remove_from_selection,
-    handle_get_selection_session,
-    handle_submit_selection,
-    handle_list_selection_sessions
-)
-from handlers.photo_handler import (
-    handle_upload_photo,
-    handle_get_photo,
-    handle_check_duplicates,
-    handle_update_photo,
-    handle_add_comment,
-    handle_update_comment,
-    handle_delete_comment,
-    handle_search_photos,
-    handle_delete_photos,
-    handle_send_batch_notification
-)
-from handlers.engagement_analytics_handler import (
-    handle_track_visit,
-    handle_track_event,
-    handle_track_photo_engagement,
-    handle_track_video_engagement,
-    handle_get_gallery_engagement,
-    handle_get_client_preferences,
-    handle_get_overall_engagement,
-    handle_get_gallery_engagement_summary
-)
-from handlers.realtime_viewers_handler import (
-    handle_track_viewer_heartbeat,
-    handle_get_active_viewers,
-    handle_viewer_disconnect
-)
-from handlers.photo_upload_presigned import (
-    handle_get_upload_url,
-    handle_confirm_upload,
-    handle_direct_upload
-)
-from handlers.multipart_upload_handler import (
-    handle_initialize_multipart_upload,
-    handle_complete_multipart_upload,
-    handle_abort_multipart_upload
-)
-from handlers.dashboard_handler import handle_dashboard_stats
-from handlers.client_handler import handle_client_galleries, handle_get_client_gallery, handle_get_client_gallery_by_token
-from handlers.photographer_handler import handle_list_photographers, handle_get_photographer
-from handlers.newsletter_handler import handle_newsletter_subscribe, handle_newsletter_unsubscribe
-from handlers.contact_handler import handle_contact_submit
-from handlers.billing_handler import (
-    handle_create_checkout_session,
-    handle_get_billing_history,
-    handle_get_invoice_pdf,
-    handle_get_subscription,
-    handle_cancel_subscription,
-    handle_stripe_webhook,
-    handle_check_downgrade_limits,
-    handle_downgrade_subscription,
-    handle_change_plan
-)
-from handlers.refund_handler import (
-    handle_check_refund_eligibility,
-    handle_request_refund,
-    handle_get_refund_status
-)
-from handlers.subscription_handler import handle_get_usage
-from handlers.analytics_handler import (
-    handle_get_gallery_analytics,
-    handle_get_overall_analytics,
-    handle_track_gallery_view,
-    handle_track_photo_view,
-    handle_track_photo_download,
-    handle_track_gallery_share,
-    handle_track_photo_share,
-    handle_track_bulk_download,
-    handle_get_bulk_downloads
-)
-from handlers.client_favorites_handler import (
-    handle_add_favorite,
-    handle_remove_favorite,
-    handle_get_favorites,
-    handle_check_favorite,
-    handle_submit_favorites
-)
-from handlers.portfolio_handler import (
-    handle_get_portfolio_settings,
-    handle_update_portfolio_settings,
-    handle_get_public_portfolio,
-    handle_verify_domain,
-    handle_check_domain_status,
-    handle_setup_custom_domain,
-    handle_check_custom_domain_status,
-    handle_refresh_custom_domain_certificate
-)
-from handlers.social_handler import (
-    handle_get_gallery_share_info,
-    handle_get_photo_share_info
-)
-from handlers.client_feedback_handler import (
-    handle_submit_client_feedback,
-    handle_get_gallery_feedback
-)
-from handlers.visitor_tracking_handler import (
-    handle_track_visit as handle_track_visitor_visit,
-    handle_track_event as handle_track_visitor_event,
-    handle_track_session_end,
-    handle_get_visitor_analytics
-)
-from handlers.notification_handler import (
-    handle_get_preferences,
-    handle_update_preferences,
-    handle_send_custom_notification,
-    handle_send_selection_reminder
-)
-from handlers.invoice_handler import (
-    handle_list_invoices,
-    handle_create_invoice,
-    handle_get_invoice,
-    handle_update_invoice,
-    handle_delete_invoice,
-    handle_send_invoice,
-    handle_mark_invoice_paid
-)
-from handlers.appointment_handler import (
-    handle_list_appointments,
-    handle_create_appointment,
-    handle_update_appointment,
-    handle_delete_appointment,
-    handle_create_public_appointment_request
-)
-from handlers.availability_handler import (
-    handle_get_availability_settings,
-    handle_update_availability_settings,
-    handle_get_available_slots,
-    handle_check_slot_availability,
-    handle_get_busy_times,
-    handle_generate_ical_feed
-)
-from handlers.branding_handler import (
-    handle_get_branding_settings,
-    handle_update_branding_settings,
-    handle_upload_branding_logo,
-    handle_get_public_branding
-)
-from handlers.contract_handler import (
-    handle_list_contracts,
-    handle_create_contract,
-    handle_get_contract,
-    handle_update_contract,
-    handle_delete_contract,
-    handle_send_contract,
-    handle_sign_contract
-)
-from handlers.bulk_download_handler import (
-    handle_bulk_download,
-    handle_bulk_download_by_token
-)
-from handlers.email_template_handler import (
-    handle_list_templates,
-    handle_get_template,
-    handle_save_template,
-    handle_delete_template,
-    handle_preview_template
-)
-from handlers.email_automation_handler import (
-    handle_schedule_automated_email,
-    handle_setup_gallery_automation,
-    handle_cancel_scheduled_email,
-    handle_list_scheduled_emails,
-    handle_process_email_queue,
-    handle_create_automation_rule,
-    handle_list_automation_rules,
-    handle_update_automation_rule,
-    handle_delete_automation_rule,
-    handle_get_automation_templates,
-    handle_apply_automation_template
-)
-from handlers.raw_vault_handler import (
-    handle_archive_to_vault,
-    handle_list_vault_files,
-    handle_request_retrieval,
-    handle_check_retrieval_status,
-    handle_download_vault_file,
-    handle_delete_vault_file
-)
-from handlers.seo_handler import (
-    handle_generate_sitemap,
-    handle_generate_schema_markup,
-    handle_validate_og_tags,
-    handle_get_seo_settings,
-    handle_update_seo_settings,
-    handle_get_robots_txt,
-    handle_get_seo_score,
-    handle_get_seo_issues,
-    handle_fix_seo_issue
-)
-from handlers.leads_handler import (
-    handle_capture_lead,
-    handle_list_leads,
-    handle_get_lead,
-    handle_update_lead,
-    handle_cancel_followup_sequence
-)
-from handlers.testimonials_handler import (
-    handle_list_testimonials,
-    handle_create_testimonial,
-    handle_update_testimonial,
-    handle_delete_testimonial,
-    handle_request_testimonial
-)
-from handlers.services_handler import (
-    handle_list_services,
-    handle_create_service,
-    handle_update_service,
-    handle_delete_service,
-    handle_get_service
-)
-from handlers.sales_handler import (
-    handle_list_packages,
-    handle_create_package,
-    handle_create_payment_intent,
-    handle_confirm_sale,
-    handle_get_download,
-    handle_list_sales
-)
-from handlers.payment_reminders_handler import (
-    handle_create_reminder_schedule,
-    handle_cancel_reminder_schedule
-)
-from handlers.onboarding_handler import (
-    handle_create_onboarding_workflow,
-    handle_list_workflows,
-    handle_update_workflow,
-    handle_delete_workflow
-)
-from handlers.analytics_export_handler import (
-    handle_export_analytics_csv,
-    handle_export_analytics_pdf,
-    handle_export_analytics_excel
-)
-from handlers.invoice_pdf_handler import (
-    handle_generate_invoice_pdf,
-    handle_download_invoice_pdf
-)
-from handlers.contract_pdf_handler import (
-    handle_generate_contract_pdf,
-    handle_download_contract_pdf
-)
-from handlers.calendar_ics_handler import (
-    handle_export_appointment_ics,
-    handle_export_calendar_feed,
-    handle_generate_calendar_token
-)
-from handlers.feature_requests_handler import (
-    handle_list_feature_requests,
-    handle_create_feature_request,
-    handle_vote_feature_request,
-    handle_unvote_feature_request,
-    handle_update_feature_request_status
-)
-from handlers.gdpr_handler import (
-    handle_export_user_data,
-    handle_get_data_retention_info
+from utils.request_scope import begin_request_scope, end_request_scope
+from utils.event_buffer import begin_event_buffer, flush_event_buffer
+from utils.router import (
+    Router, Route, RequestContext, load_handler,
+    PUBLIC, OPTIONAL_AUTH, AUTH_REQUIRED, ANY_METHOD
 )
 
+# API Gateway custom domain base path (obfuscated)
+BASE_PATH_PREFIX = '/xb667e3fa92f9776468017a9758f31ba4'
+
+# Methods whose requests get a memoizing request scope (see utils/request_scope.py)
+READ_ONLY_METHODS = ('GET', 'HEAD')
+
+
+# ================================================================
+# CALL ADAPTERS
+# Map the parsed request onto each handler's signature
+# ================================================================
+
+def _no_args(handler, request):
+    return handler()
+
+
+def _with_body(handler, request):
+    return handler(request.body)
+
+
+def _with_event(handler, request):
+    return handler(request.event)
+
+
+def _with_path_event(handler, request):
+    return handler(request.event_with_params())
+
+
+def _with_user(handler, request):
+    return handler(request.user)
+
+
+def _with_user_body(handler, request):
+    return handler(request.user, request.body)
+
+
+def _with_user_query(handler, request):
+    return handler(request.user, request.query)
+
+
+def _with_user_id(handler, request):
+    return handler(request.user['id'])
+
+
+def _with_user_id_body(handler, request):
+    return handler(request.user['id'], request.body)
+
+
+def _with_user_id_query(handler, request):
+    return handler(request.user['id'], request.query)
+
+
+def _param(name, *extra):
+    """Adapter calling handler(path_param, *extra request attributes)"""
+    def adapter(handler, request):
+        return handler(request.params[name], *[getattr(request, attr) for attr in extra])
+    return adapter
+
+
+def _user_param(name, *extra):
+    """Adapter calling handler(user, path_param, *extra request attributes)"""
+    def adapter(handler, request):
+        return handler(request.user, request.params[name], *[getattr(request, attr) for attr in extra])
+    return adapter
+
+
+def _rate_limited(limit_type, error, call=_with_body):
+    """Apply an IP-based rate limit before calling the handler"""
+    def adapter(handler, request):
+        is_allowed, retry_after = check_rate_limit(limit_type, request.client_ip)
+        if not is_allowed:
+            return create_response(429, {
+                'error': error,
+                'retry_after': retry_after
+            }, headers={'Retry-After': str(retry_after)})
+        return call(handler, request)
+    return adapter
+
+
+def _viewer_user_id(request):
+    """Viewer's user_id if authenticated (used to skip tracking for gallery owners)"""
+    return request.user['id'] if request.user else None
+
+
+# ================================================================
+# ROUTES SERVED BY THE ENTRY POINT
+# ================================================================
+
+def _timestamp():
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+
+
+def handle_root():
+    return create_response(200, {
+        'name': 'Galerly API',
+        'version': '3.0.0',
+        'architecture': 'Modular',
+        'storage': 'DynamoDB (isolated per photographer)',
+        'status': 'running',
+        'timestamp': _timestamp(),
+        'documentation': {
+            'swagger_ui': '/v1/docs',
+            'redoc_ui': '/v1/docs/redoc',
+            'openapi_spec': '/v1/docs/openapi.json'
+        }
+    })
+
+
+def handle_health():
+    return create_response(200, {
+        'status': 'healthy',
+        'architecture': 'modular',
+        'storage': 'DynamoDB',
+        'timestamp': _timestamp()
+    })
+
+
+# ================================================================
+# ROUTE-SPECIFIC ADAPTERS
+# ================================================================
+
+def _delete_account(handler, request):
+    # Pass cookie header to delete account handler so it can clear the session
+    cookie_header = request.headers.get('cookie') or request.headers.get('Cookie')
+    return handler(request.user, cookie_header)
+
+
+def _stripe_webhook(handler, request):
+    stripe_signature = request.headers.get('stripe-signature') or request.headers.get('Stripe-Signature') or ''
+    # Use raw body string for signature verification
+    return handler(request.body, stripe_signature, request.raw_body)
+
+
+def _track_gallery_view(handler, request):
+    metadata = request.body.get('metadata', {})
+    return handler(request.params['gallery_id'], _viewer_user_id(request), metadata)
+
+
+def _track_photo(handler, request):
+    # Photo view and photo download tracking share a signature
+    gallery_id = request.body.get('gallery_id')
+    metadata = request.body.get('metadata', {})
+    return handler(request.params['photo_id'], gallery_id, _viewer_user_id(request), metadata)
+
+
+def _track_share(name):
+    def adapter(handler, request):
+        platform = request.body.get('platform', 'unknown')
+        metadata = request.body.get('metadata', {})
+        return handler(request.params[name], platform, request.user, metadata)
+    return adapter
+
+
+def _track_bulk_download(handler, request):
+    metadata = request.body.get('metadata', {})
+    return handler(request.params['gallery_id'], _viewer_user_id(request), metadata, request.client_ip)
+
+
+def _track_batch(handler, request):
+    return handler(request.body, _viewer_user_id(request))
+
+
+def _comment_user(request):
+    """
+    Authenticated user, or a temporary guest user object built from the
+    X-Guest-Name / X-Guest-Email headers sent by the frontend
+    """
+    if request.user:
+        return request.user
+
+    try:
+        guest_name = request.headers.get('x-guest-name') or request.headers.get('X-Guest-Name')
+        guest_email = request.headers.get('x-guest-email') or request.headers.get('X-Guest-Email')
+
+        # Without an email we can't match against stored comments
+        if guest_email:
+            return {
+                'id': f"guest-{guest_email}",
+                'username': guest_name,
+                'email': guest_email,
+                'is_guest': True
+            }
+    except Exception as e:
+        print(f"Error creating guest user object: {str(e)}")
+    return None
+
+
+def _update_comment(handler, request):
+    return handler(request.params['photo_id'], request.params['comment_id'], _comment_user(request), request.body)
+
+
+def _delete_comment(handler, request):
+    return handler(request.params['photo_id'], request.params['comment_id'], _comment_user(request))
+
+
+def _sign_contract(handler, request):
+    return handler(request.params['contract_id'], request.body, request.client_ip)
+
+
+def _public_photographer_query(handler, request):
+    return handler(request.params['photographer_id'], request.query)
+
+
+def _public_list(handler, request):
+    return handler(request.params['photographer_id'], is_public=True)
+
+
+def _overall_analytics(handler, request):
+    query_params = request.query
+    print(f"[API] Analytics request - path: {request.path}, query_params: {query_params}")
+    # Use engagement analytics for more accurate data
+    use_engagement = query_params.get('use_engagement', 'true').lower() == 'true'
+    print(f"[API] Using engagement analytics: {use_engagement}")
+    if use_engagement:
+        return handler(request.user)
+    return load_handler('handlers.analytics_handler:handle_get_overall_analytics')(request.user, query_params)
+
+
+def _gallery_analytics(handler, request):
+    gallery_id = request.params['gallery_id']
+    query_params = request.query
+    use_engagement = query_params.get('use_engagement', 'true').lower() == 'true'
+    if use_engagement:
+        return handler(request.user, gallery_id)
+    return load_handler('handlers.analytics_handler:handle_get_gallery_analytics')(request.user, gallery_id, query_params)
+
+
+def _crm_testimonials(handler, request):
+    # Photographer view - includes unapproved
+    query_params = request.query
+    query_params['show_all'] = 'true'
+    return handler(request.user['id'], query_params)
+
+
+def _admin_user_body(handler, request):
+    body = request.body
+    body['user_id'] = request.params['user_id']
+    return handler(request.user, body)
+
+
+# ================================================================
+# ROUTE TABLE
+# (method, path template, handler, call adapter, access)
+# ================================================================
+
+ROUTES = [
+    # ------------------------------------------------------------
+    # PUBLIC ENDPOINTS (No authentication required)
+    # ------------------------------------------------------------
+    Route(ANY_METHOD, '/', handle_root, _no_args, PUBLIC),
+    Route(ANY_METHOD, '/v1', handle_root, _no_args, PUBLIC),
+    Route(ANY_METHOD, '/health', handle_health, _no_args, PUBLIC),
+    Route(ANY_METHOD, '/v1/health', handle_health, _no_args, PUBLIC),
+
+    # API Documentation
+    Route('GET', '/v1/docs', 'handlers.docs_handler:handle_get_swagger_ui', _no_args, PUBLIC),
+    Route('GET', '/v1/docs/openapi.json', 'handlers.docs_handler:handle_get_openapi_spec', _no_args, PUBLIC),
+    Route('GET', '/v1/docs/redoc', 'handlers.docs_handler:handle_get_redoc_ui', _no_args, PUBLIC),
+
+    # Authentication (with rate limiting)
+    Route('POST', '/v1/auth/request-verification', 'handlers.auth_handler:handle_request_verification_code',
+          _rate_limited('auth_verification', 'Too many verification requests'), PUBLIC),
+    Route('POST', '/v1/auth/verify-email', 'handlers.auth_handler:handle_verify_code', _with_body, PUBLIC),
+    Route('POST', '/v1/auth/register', 'handlers.auth_handler:handle_register',
+          _rate_limited('auth_register', 'Too many registration attempts'), PUBLIC),
+    Route('POST', '/v1/auth/login', 'handlers.auth_handler:handle_login',
+          _rate_limited('auth_login', 'Too many login attempts'), PUBLIC),
+    Route('POST', '/v1/auth/logout', 'handlers.auth_handler:handle_logout', _with_event, PUBLIC),
+    Route('DELETE', '/v1/auth/delete-account', 'handlers.auth_handler:handle_delete_account', _delete_account),
+    # Restore account (within 30-day grace period)
+    Route('POST', '/v1/auth/restore-account', 'handlers.auth_handler:handle_restore_account', _with_body, PUBLIC),
+    Route('POST', '/v1/auth/api-key', 'handlers.auth_handler:handle_generate_api_key', _with_user),
+    Route('GET', '/v1/auth/api-key', 'handlers.auth_handler:handle_get_api_key', _with_user),
+    Route('POST', '/v1/auth/forgot-password', 'handlers.auth_handler:handle_request_password_reset',
+          _rate_limited('auth_password_reset', 'Too many password reset requests'), PUBLIC),
+    Route('POST', '/v1/auth/reset-password', 'handlers.auth_handler:handle_reset_password', _with_body, PUBLIC),
+
+    # Security
+    Route('GET', '/v1/security/rotation-status', 'utils.key_rotation:handle_rotation_status', _with_user),
+
+    # City search
+    Route('GET', '/v1/cities/search', 'handlers.city_handler:handle_city_search',
+          lambda h, r: h(r.query.get('q', '')), PUBLIC),
+
+    # Photographer directory
+    Route('GET', '/v1/photographers', 'handlers.photographer_handler:handle_list_photographers',
+          lambda h, r: h(r.query), PUBLIC),
+    Route('GET', '/v1/photographers/{photographer_id}', 'handlers.photographer_handler:handle_get_photographer',
+          _param('photographer_id'), PUBLIC),
+    Route('GET', '/v1/photographers/{photographer_id}/availability',
+          'handlers.availability_handler:handle_get_availability_settings',
+          lambda h, r: h({'id': r.params['photographer_id']}), PUBLIC),
+    Route('GET', '/v1/photographers/{photographer_id}/slots', 'handlers.availability_handler:handle_get_available_slots',
+          _public_photographer_query, PUBLIC),
+    Route('GET', '/v1/photographers/{photographer_id}/busy-times', 'handlers.availability_handler:handle_get_busy_times',
+          _public_photographer_query, PUBLIC),
+    Route('GET', '/v1/photographers/{photographer_id}/calendar.ics',
+          'handlers.availability_handler:handle_generate_ical_feed', _param('photographer_id'), PUBLIC),
+    Route('GET', '/v1/photographers/{photographer_id}/services', 'handlers.services_handler:handle_list_services',
+          _public_list, PUBLIC),
+    # Lead capture from public portfolio
+    Route('POST', '/v1/photographers/{photographer_id}/lead', 'handlers.leads_handler:handle_capture_lead',
+          _param('photographer_id', 'body'), PUBLIC),
+
+    # Public portfolio (with customization)
+    Route('GET', '/v1/portfolio/{photographer_id}', 'handlers.portfolio_handler:handle_get_public_portfolio',
+          _param('photographer_id'), PUBLIC),
+
+    # Social sharing (public galleries/photos)
+    Route('GET', '/v1/share/gallery/{gallery_id}', 'handlers.social_handler:handle_get_gallery_share_info',
+          lambda h, r: h(r.params['gallery_id'], user=None), PUBLIC),
+    Route('GET', '/v1/share/photo/{photo_id}', 'handlers.social_handler:handle_get_photo_share_info',
+          lambda h, r: h(r.params['photo_id'], user=None), PUBLIC),
+
+    # Newsletter
+    Route('POST', '/v1/newsletter/subscribe', 'handlers.newsletter_handler:handle_newsletter_subscribe', _with_body, PUBLIC),
+    Route('POST', '/v1/newsletter/unsubscribe', 'handlers.newsletter_handler:handle_newsletter_unsubscribe', _with_body, PUBLIC),
+
+    # Gallery layouts
+    Route('GET', '/v1/gallery-layouts', 'handlers.gallery_handler:handle_list_layouts', lambda h, r: h(r.query), PUBLIC),
+    Route('GET', '/v1/gallery-layouts/{layout_id}', 'handlers.gallery_handler:handle_get_layout', _param('layout_id'), PUBLIC),
+
+    # Contact/Support
+    Route('POST', '/v1/contact/submit', 'handlers.contact_handler:handle_contact_submit', _with_body, PUBLIC),
+
+    # Client feedback (clients submit, photographers view)
+    Route('POST', '/v1/client/feedback/{gallery_id}', 'handlers.client_feedback_handler:handle_submit_client_feedback',
+          _param('gallery_id', 'body'), PUBLIC),
+    Route('GET', '/v1/client/feedback/{gallery_id}', 'handlers.client_feedback_handler:handle_get_gallery_feedback',
+          _param('gallery_id', 'user')),
+
+    # Client favorites (guest access via email in body/query, user may be None)
+    Route('GET', '/v1/client/favorites', 'handlers.client_favorites_handler:handle_get_favorites',
+          _with_user_query, OPTIONAL_AUTH),
+    Route('POST', '/v1/client/favorites', 'handlers.client_favorites_handler:handle_add_favorite',
+          _with_user_body, OPTIONAL_AUTH),
+    Route('POST', '/v1/client/favorites/submit', 'handlers.client_favorites_handler:handle_submit_favorites',
+          _with_user_body, OPTIONAL_AUTH),
+    Route('DELETE', '/v1/client/favorites', 'handlers.client_favorites_handler:handle_remove_favorite',
+          _with_user_body, OPTIONAL_AUTH),
+    Route('GET', '/v1/client/favorites/{photo_id}', 'handlers.client_favorites_handler:handle_check_favorite',
+          lambda h, r: h(r.user, r.params['photo_id'], r.query), OPTIONAL_AUTH),
+
+    # Client gallery by share token
+    Route('GET', '/v1/client/galleries/by-token/{share_token}',
+          'handlers.client_handler:handle_get_client_gallery_by_token', _param('share_token'), PUBLIC),
+    Route('POST', '/v1/downloads/bulk/by-token', 'handlers.bulk_download_handler:handle_bulk_download_by_token',
+          _with_event, PUBLIC),
+    # ZIP of client favorites / a submitted selection (guests pass client_email and the share token)
+    Route('POST', '/v1/downloads/selection', 'handlers.bulk_download_handler:handle_selection_download',
+          _with_user_body, OPTIONAL_AUTH),
+
+    # Stripe webhook (verified by signature)
+    Route('POST', '/v1/billing/webhook', 'handlers.billing_handler:handle_stripe_webhook', _stripe_webhook, PUBLIC),
+
+    # Analytics tracking (gets owner from gallery; viewer token only used to skip owner views)
+    Route('POST', '/v1/analytics/track/gallery/{gallery_id}', 'handlers.analytics_handler:handle_track_gallery_view',
+          _track_gallery_view, OPTIONAL_AUTH),
+    Route('POST', '/v1/analytics/track/photo/{photo_id}', 'handlers.analytics_handler:handle_track_photo_view',
+          _track_photo, OPTIONAL_AUTH),
+    Route('POST', '/v1/analytics/track/download/{photo_id}', 'handlers.analytics_handler:handle_track_photo_download',
+          _track_photo, OPTIONAL_AUTH),
+    Route('POST', '/v1/analytics/track/share/gallery/{gallery_id}',
+          'handlers.analytics_handler:handle_track_gallery_share', _track_share('gallery_id'), OPTIONAL_AUTH),
+    Route('POST', '/v1/analytics/track/share/photo/{photo_id}',
+          'handlers.analytics_handler:handle_track_photo_share', _track_share('photo_id'), OPTIONAL_AUTH),
+    Route('POST', '/v1/analytics/track/bulk-download/{gallery_id}',
+          'handlers.analytics_handler:handle_track_bulk_download', _track_bulk_download, OPTIONAL_AUTH),
+    # Many tracking events in one request (written with batch writes at the end of the invocation)
+    Route('POST', '/v1/analytics/batch', 'handlers.analytics_batch_handler:handle_track_batch',
+          _track_batch, OPTIONAL_AUTH),
+
+    # Engagement analytics tracking (guest tracking)
+    Route('POST', '/v1/analytics/visit', 'handlers.engagement_analytics_handler:handle_track_visit', _with_body, PUBLIC),
+    Route('POST', '/v1/analytics/event', 'handlers.engagement_analytics_handler:handle_track_event', _with_body, PUBLIC),
+    Route('POST', '/v1/analytics/photo-engagement', 'handlers.engagement_analytics_handler:handle_track_photo_engagement',
+          _with_body, PUBLIC),
+    Route('POST', '/v1/analytics/video-engagement', 'handlers.engagement_analytics_handler:handle_track_video_engagement',
+          _with_body, PUBLIC),
+
+    # Real-time viewer tracking (live globe)
+    Route('POST', '/v1/viewers/heartbeat', 'handlers.realtime_viewers_handler:handle_track_viewer_heartbeat',
+          _with_event, PUBLIC),
+    Route('POST', '/v1/viewers/disconnect', 'handlers.realtime_viewers_handler:handle_viewer_disconnect',
+          _with_event, PUBLIC),
+
+    # Photo comments (guests can comment; handler checks gallery settings)
+    Route('POST', '/v1/photos/{photo_id}/comments', 'handlers.photo_handler:handle_add_comment',
+          lambda h, r: h(r.params['photo_id'], r.user, r.body), OPTIONAL_AUTH),
+    Route('PUT', '/v1/photos/{photo_id}/comments/{comment_id}', 'handlers.photo_handler:handle_update_comment',
+          _update_comment, OPTIONAL_AUTH),
+    Route('DELETE', '/v1/photos/{photo_id}/comments/{comment_id}', 'handlers.photo_handler:handle_delete_comment',
+          _delete_comment, OPTIONAL_AUTH),
+
+    # Photo details (for polling comments etc)
+    Route('GET', '/v1/photos/{photo_id}', 'handlers.photo_handler:handle_get_photo', _param('photo_id'), PUBLIC),
+
+    # Visitor tracking (tracks ALL visitors for UX improvement)
+    Route('POST', '/v1/visitor/track/visit', 'handlers.engagement_analytics_handler:handle_track_visit', _with_body, PUBLIC),
+    Route('POST', '/v1/visitor/track/event', 'handlers.engagement_analytics_handler:handle_track_event', _with_body, PUBLIC),
+    Route('POST', '/v1/visitor/track/session-end', 'handlers.visitor_tracking_handler:handle_track_session_end',
+          _with_body, PUBLIC),
+
+    # Public contract signing
+    Route('GET', '/v1/public/contracts/{contract_id}', 'handlers.contract_handler:handle_get_contract',
+          lambda h, r: h(r.params['contract_id'], user=None), PUBLIC),
+    Route('POST', '/v1/public/contracts/{contract_id}/sign', 'handlers.contract_handler:handle_sign_contract',
+          _sign_contract, PUBLIC),
+
+    # Public photographer pages (booking, branding, leads, testimonials, pricing, availability)
+    Route('POST', '/v1/public/photographers/{photographer_id}/appointments',
+          'handlers.appointment_handler:handle_create_public_appointment_request', _param('photographer_id', 'body'), PUBLIC),
+    Route('GET', '/v1/public/photographers/{photographer_id}/branding',
+          'handlers.branding_handler:handle_get_public_branding', _param('photographer_id'), PUBLIC),
+    Route('POST', '/v1/public/photographers/{photographer_id}/lead', 'handlers.leads_handler:handle_capture_lead',
+          _param('photographer_id', 'body'), PUBLIC),
+    Route('GET', '/v1/public/photographers/{photographer_id}/testimonials',
+          'handlers.testimonials_handler:handle_list_testimonials', _public_photographer_query, PUBLIC),
+    Route('POST', '/v1/public/photographers/{photographer_id}/testimonials',
+          'handlers.testimonials_handler:handle_create_testimonial', _param('photographer_id', 'body'), PUBLIC),
+    Route('GET', '/v1/public/photographers/{photographer_id}/services', 'handlers.services_handler:handle_list_services',
+          _public_list, PUBLIC),
+    Route('GET', '/v1/public/photographers/{photographer_id}/packages', 'handlers.sales_handler:handle_list_packages',
+          _public_list, PUBLIC),
+    Route('GET', '/v1/public/photographers/{photographer_id}/availability/available-slots',
+          'handlers.availability_handler:handle_get_available_slots', _public_photographer_query, PUBLIC),
+    Route('GET', '/v1/public/photographers/{photographer_id}/availability/busy-times',
+          'handlers.availability_handler:handle_get_busy_times', _public_photographer_query, PUBLIC),
+    Route('GET', '/v1/public/photographers/{photographer_id}/calendar.ics',
+          'handlers.availability_handler:handle_generate_ical_feed', _param('photographer_id'), PUBLIC),
+
+    # ------------------------------------------------------------
+    # AUTHENTICATED ENDPOINTS (Require valid token)
+    # ------------------------------------------------------------
+    Route('GET', '/v1/auth/me', 'handlers.auth_handler:handle_get_me', _with_user),
+
+    # Profile, watermark and branding
+    Route('PUT', '/v1/profile', 'handlers.profile_handler:handle_update_profile', _with_user_body),
+    Route('POST', '/v1/profile/watermark-logo', 'handlers.watermark_handler:handle_upload_watermark_logo', _with_user_body),
+    Route('GET', '/v1/profile/watermark-settings', 'handlers.watermark_handler:handle_get_watermark_settings', _with_user),
+    Route('PUT', '/v1/profile/watermark-settings', 'handlers.watermark_handler:handle_update_watermark_settings',
+          _with_user_body),
+    Route('POST', '/v1/profile/watermark-batch-apply', 'handlers.watermark_handler:handle_batch_apply_watermark',
+          _with_user_body),
+    Route('GET', '/v1/profile/branding-settings', 'handlers.branding_handler:handle_get_branding_settings', _with_user),
+    Route('PUT', '/v1/profile/branding-settings', 'handlers.branding_handler:handle_update_branding_settings',
+          _with_user_body),
+    Route('POST', '/v1/profile/branding-logo', 'handlers.branding_handler:handle_upload_branding_logo', _with_user_body),
+
+    # Background jobs
+    Route('GET', '/v1/jobs/{job_id}', 'handlers.background_jobs_handler:handle_get_job_status', _user_param('job_id')),
+    Route('POST', '/v1/jobs/{job_id}/process', 'handlers.background_jobs_handler:handle_process_background_job',
+          _param('job_id')),
+
+    # Portfolio settings and custom domains
+    Route('GET', '/v1/portfolio/settings', 'handlers.portfolio_handler:handle_get_portfolio_settings', _with_user),
+    Route('PUT', '/v1/portfolio/settings', 'handlers.portfolio_handler:handle_update_portfolio_settings', _with_user_body),
+    Route('GET', '/v1/portfolio/domain-status', 'handlers.portfolio_handler:handle_check_domain_status',
+          lambda h, r: h(r.user, r.query.get('domain', ''))),
+    Route('POST', '/v1/portfolio/verify-domain', 'handlers.portfolio_handler:handle_verify_domain', _with_user_body),
+    Route('POST', '/v1/portfolio/custom-domain/setup', 'handlers.portfolio_handler:handle_setup_custom_domain',
+          _with_user_body),
+    Route('GET', '/v1/portfolio/custom-domain/status', 'handlers.portfolio_handler:handle_check_custom_domain_status',
+          lambda h, r: h(r.user, r.query.get('domain', ''))),
+    Route('POST', '/v1/portfolio/custom-domain/refresh',
+          'handlers.portfolio_handler:handle_refresh_custom_domain_certificate',
+          lambda h, r: h(r.user, r.body.get('domain', ''))),
+
+    # Dashboard
+    Route('GET', '/v1/dashboard', 'handlers.dashboard_handler:handle_dashboard_stats', _with_user),
+    Route('GET', '/v1/dashboard/stats', 'handlers.dashboard_handler:handle_dashboard_stats', _with_user),
+
+    # Client galleries
+    Route('GET', '/v1/client/galleries', 'handlers.client_handler:handle_client_galleries', _with_user),
+    Route('GET', '/v1/client/galleries/{gallery_id}', 'handlers.client_handler:handle_get_client_gallery',
+          _param('gallery_id', 'user')),
+
+    # Photo uploads (presigned, direct and multipart)
+    Route('POST', '/v1/galleries/{gallery_id}/photos', 'handlers.photo_handler:handle_upload_photo',
+          _param('gallery_id', 'user', 'event')),
+    Route('POST', '/v1/galleries/{gallery_id}/photos/upload-url', 'handlers.photo_upload_presigned:handle_get_upload_url',
+          _param('gallery_id', 'user', 'event')),
+    Route('POST', '/v1/galleries/{gallery_id}/photos/direct-upload', 'handlers.photo_upload_presigned:handle_direct_upload',
+          _param('gallery_id', 'user', 'event')),
+    Route('POST', '/v1/galleries/{gallery_id}/photos/confirm-upload',
+          'handlers.photo_upload_presigned:handle_confirm_upload', _param('gallery_id', 'user', 'event')),
+    Route('POST', '/v1/galleries/{gallery_id}/photos/multipart-upload/init',
+          'handlers.multipart_upload_handler:handle_initialize_multipart_upload', _param('gallery_id', 'user', 'event')),
+    Route('POST', '/v1/galleries/{gallery_id}/photos/multipart-upload/complete',
+          'handlers.multipart_upload_handler:handle_complete_multipart_upload', _param('gallery_id', 'user', 'event')),
+    Route('POST', '/v1/galleries/{gallery_id}/photos/multipart-upload/abort',
+          'handlers.multipart_upload_handler:handle_abort_multipart_upload', _param('gallery_id', 'user', 'event')),
+    Route('POST', '/v1/galleries/{gallery_id}/photos/check-duplicates', 'handlers.photo_handler:handle_check_duplicates',
+          _param('gallery_id', 'user', 'event')),
+    Route('DELETE', '/v1/galleries/{gallery_id}/photos/delete', 'handlers.photo_handler:handle_delete_photos',
+          _param('gallery_id', 'user', 'event')),
+
+    # Gallery bulk download and client notifications
+    Route('POST', '/v1/galleries/{gallery_id}/download-bulk', 'handlers.bulk_download_handler:handle_bulk_download',
+          _param('gallery_id', 'user', 'event')),
+    Route('POST', '/v1/galleries/{gallery_id}/notify-clients', 'handlers.photo_handler:handle_send_batch_notification',
+          _param('gallery_id', 'user')),
+
+    # Galleries
+    Route('GET', '/v1/galleries', 'handlers.gallery_handler:handle_list_galleries', _with_user_query),
+    Route('POST', '/v1/galleries', 'handlers.gallery_handler:handle_create_gallery', _with_user_body),
+    Route('GET', '/v1/galleries/{gallery_id}', 'handlers.gallery_handler:handle_get_gallery', _param('gallery_id', 'user')),
+    Route('PUT', '/v1/galleries/{gallery_id}', 'handlers.gallery_handler:handle_update_gallery',
+          _param('gallery_id', 'user', 'body')),
+    Route('DELETE', '/v1/galleries/{gallery_id}', 'handlers.gallery_handler:handle_delete_gallery',
+          _param('gallery_id', 'user')),
+    Route('POST', '/v1/galleries/{gallery_id}/duplicate', 'handlers.gallery_handler:handle_duplicate_gallery',
+          _param('gallery_id', 'user', 'body')),
+    Route('POST', '/v1/galleries/{gallery_id}/archive', 'handlers.gallery_handler:handle_archive_gallery',
+          lambda h, r: h(r.params['gallery_id'], r.user, archive=True)),
+    Route('POST', '/v1/galleries/{gallery_id}/unarchive', 'handlers.gallery_handler:handle_archive_gallery',
+          lambda h, r: h(r.params['gallery_id'], r.user, archive=False)),
+    Route('POST', '/v1/galleries/{gallery_id}/archive-originals', 'handlers.gallery_handler:handle_archive_originals',
+          _param('gallery_id', 'user')),
+    Route('GET', '/v1/galleries/{gallery_id}/statistics',
+          'handlers.gallery_statistics_handler:handle_get_gallery_statistics', _user_param('gallery_id')),
+
+    # Client selection workflow
+    Route('POST', '/v1/selections/sessions', 'handlers.client_selection_handler:handle_create_selection_session',
+          _with_user_body),
+    Route('GET', '/v1/selections/sessions', 'handlers.client_selection_handler:handle_list_selection_sessions',
+          _with_user_query),
+    Route('GET', '/v1/selections/sessions/{session_id}', 'handlers.client_selection_handler:handle_get_selection_session',
+          _user_param('session_id')),
+    Route('POST', '/v1/selections/add', 'handlers.client_selection_handler:handle_add_to_selection', _with_user_body),
+    Route('POST', '/v1/selections/remove', 'handlers.client_selection_handler:handle_remove_from_selection',
+          _with_user_body),
+    Route('POST', '/v1/selections/submit', 'handlers.client_selection_handler:handle_submit_selection', _with_user_body),
+
+    # Photo search and update
+    Route('GET', '/v1/photos/search', 'handlers.photo_handler:handle_search_photos', _with_user_query),
+    Route('GET', '/v1/photos/near-duplicates', 'handlers.photo_handler:handle_find_near_duplicates',
+          _with_user_query),
+    Route('PUT', '/v1/photos/{photo_id}', 'handlers.photo_handler:handle_update_photo', _param('photo_id', 'body', 'user')),
+
+    # Billing
+    Route('POST', '/v1/billing/checkout', 'handlers.billing_handler:handle_create_checkout_session', _with_user_body),
+    Route('GET', '/v1/billing/history', 'handlers.billing_handler:handle_get_billing_history', _with_user),
+    Route('GET', '/v1/billing/invoice/{invoice_id}/pdf', 'handlers.billing_handler:handle_get_invoice_pdf',
+          _user_param('invoice_id')),
+    Route('GET', '/v1/billing/subscription', 'handlers.billing_handler:handle_get_subscription', _with_user),
+    Route('POST', '/v1/billing/subscription/cancel', 'handlers.billing_handler:handle_cancel_subscription', _with_user),
+    Route('POST', '/v1/billing/customer-portal', 'handlers.billing_handler:handle_create_customer_portal_session',
+          _with_user_body),
+    Route('GET', '/v1/billing/subscription/check-downgrade', 'handlers.billing_handler:handle_check_downgrade_limits',
+          lambda h, r: h(r.user, r.query.get('target_plan', 'free'))),
+    Route('POST', '/v1/billing/subscription/downgrade', 'handlers.billing_handler:handle_downgrade_subscription',
+          _with_user_body),
+    Route('POST', '/v1/billing/subscription/change-plan', 'handlers.billing_handler:handle_change_plan', _with_user_body),
+
+    # Refunds
+    Route('GET', '/v1/billing/refund/check', 'handlers.refund_handler:handle_check_refund_eligibility', _with_user),
+    Route('POST', '/v1/billing/refund/request', 'handlers.refund_handler:handle_request_refund', _with_user_body),
+    Route('GET', '/v1/billing/refund/status', 'handlers.refund_handler:handle_get_refund_status', _with_user),
+
+    # Leads & CRM (Pro/Ultimate Feature)
+    Route('GET', '/v1/leads', 'handlers.leads_handler:handle_list_leads', _with_user_query),
+    Route('GET', '/v1/leads/{lead_id}', 'handlers.leads_handler:handle_get_lead', _user_param('lead_id')),
+    Route('PUT', '/v1/leads/{lead_id}', 'handlers.leads_handler:handle_update_lead', _user_param('lead_id', 'body')),
+    Route('DELETE', '/v1/leads/{lead_id}/followup', 'handlers.leads_handler:handle_cancel_followup_sequence',
+          _user_param('lead_id')),
+    Route('GET', '/v1/crm/leads', 'handlers.leads_handler:handle_list_leads', _with_user_query),
+    Route('GET', '/v1/crm/leads/{lead_id}', 'handlers.leads_handler:handle_get_lead', _user_param('lead_id')),
+    Route('PUT', '/v1/crm/leads/{lead_id}', 'handlers.leads_handler:handle_update_lead', _user_param('lead_id', 'body')),
+    Route('POST', '/v1/crm/leads/{lead_id}/cancel-followup', 'handlers.leads_handler:handle_cancel_followup_sequence',
+          _user_param('lead_id')),
+    Route('GET', '/v1/crm/testimonials', 'handlers.testimonials_handler:handle_list_testimonials', _crm_testimonials),
+    Route('PUT', '/v1/crm/testimonials/{testimonial_id}', 'handlers.testimonials_handler:handle_update_testimonial',
+          _user_param('testimonial_id', 'body')),
+    Route('DELETE', '/v1/crm/testimonials/{testimonial_id}', 'handlers.testimonials_handler:handle_delete_testimonial',
+          _user_param('testimonial_id')),
+    Route('POST', '/v1/crm/testimonials/request', 'handlers.testimonials_handler:handle_request_testimonial',
+          _with_user_body),
+
+    # Invoices, invoice PDFs and payment reminders
+    Route('GET', '/v1/invoices', 'handlers.invoice_handler:handle_list_invoices', _with_user_query),
+    Route('POST', '/v1/invoices', 'handlers.invoice_handler:handle_create_invoice', _with_user_body),
+    Route('GET', '/v1/invoices/{invoice_id}', 'handlers.invoice_handler:handle_get_invoice', _param('invoice_id', 'user')),
+    Route('PUT', '/v1/invoices/{invoice_id}', 'handlers.invoice_handler:handle_update_invoice',
+          _param('invoice_id', 'user', 'body')),
+    Route('DELETE', '/v1/invoices/{invoice_id}', 'handlers.invoice_handler:handle_delete_invoice',
+          _param('invoice_id', 'user')),
+    Route('POST', '/v1/invoices/{invoice_id}/send', 'handlers.invoice_handler:handle_send_invoice',
+          _param('invoice_id', 'user')),
+    Route('PUT', '/v1/invoices/{invoice_id}/mark-paid', 'handlers.invoice_handler:handle_mark_invoice_paid',
+          _param('invoice_id', 'user', 'body')),
+    Route('POST', '/v1/invoices/{invoice_id}/pdf', 'handlers.invoice_pdf_handler:handle_generate_invoice_pdf',
+          _with_path_event),
+    Route('GET', '/v1/invoices/{invoice_id}/pdf/download', 'handlers.invoice_pdf_handler:handle_download_invoice_pdf',
+          _with_path_event),
+    Route('POST', '/v1/invoices/{invoice_id}/reminders',
+          'handlers.payment_reminders_handler:handle_create_reminder_schedule', _user_param('invoice_id', 'body')),
+    Route('DELETE', '/v1/invoices/{invoice_id}/reminders',
+          'handlers.payment_reminders_handler:handle_cancel_reminder_schedule', _user_param('invoice_id')),
+
+    # Appointment scheduler
+    Route('GET', '/v1/appointments', 'handlers.appointment_handler:handle_list_appointments', _with_user_query),
+    Route('POST', '/v1/appointments', 'handlers.appointment_handler:handle_create_appointment', _with_user_body),
+    Route('PUT', '/v1/appointments/{appointment_id}', 'handlers.appointment_handler:handle_update_appointment',
+          _param('appointment_id', 'user', 'body')),
+    Route('DELETE', '/v1/appointments/{appointment_id}', 'handlers.appointment_handler:handle_delete_appointment',
+          _param('appointment_id', 'user')),
+    Route('GET', '/v1/appointments/{appointment_id}/ics', 'handlers.calendar_ics_handler:handle_export_appointment_ics',
+          _with_path_event),
+
+    # Services management
+    Route('GET', '/v1/services', 'handlers.services_handler:handle_list_services',
+          lambda h, r: h(r.user['id'], is_public=False)),
+    Route('POST', '/v1/services', 'handlers.services_handler:handle_create_service', _with_user_body),
+    Route('GET', '/v1/services/{service_id}', 'handlers.services_handler:handle_get_service',
+          lambda h, r: h(r.params['service_id'], r.user['id'])),
+    Route('PUT', '/v1/services/{service_id}', 'handlers.services_handler:handle_update_service',
+          _user_param('service_id', 'body')),
+    Route('DELETE', '/v1/services/{service_id}', 'handlers.services_handler:handle_delete_service',
+          _user_param('service_id')),
+
+    # Calendar feeds
+    Route('GET', '/v1/calendar/feed.ics', 'handlers.calendar_ics_handler:handle_export_calendar_feed', _with_event),
+    Route('POST', '/v1/calendar/token', 'handlers.calendar_ics_handler:handle_generate_calendar_token', _with_event),
+
+    # Availability
+    Route('GET', '/v1/availability/settings', 'handlers.availability_handler:handle_get_availability_settings', _with_user),
+    Route('PUT', '/v1/availability/settings', 'handlers.availability_handler:handle_update_availability_settings',
+          _with_user_body),
+    Route('POST', '/v1/availability/check-slot', 'handlers.availability_handler:handle_check_slot_availability',
+          _with_user_id_body),
+    Route('GET', '/v1/availability/busy-times', 'handlers.availability_handler:handle_get_busy_times',
+          _with_user_id_query),
+
+    # Contracts and contract PDFs
+    Route('GET', '/v1/contracts', 'handlers.contract_handler:handle_list_contracts', _with_user_query),
+    Route('POST', '/v1/contracts', 'handlers.contract_handler:handle_create_contract', _with_user_body),
+    Route('GET', '/v1/contracts/{contract_id}', 'handlers.contract_handler:handle_get_contract',
+          _param('contract_id', 'user')),
+    Route('PUT', '/v1/contracts/{contract_id}', 'handlers.contract_handler:handle_update_contract',
+          _param('contract_id', 'user', 'body')),
+    Route('DELETE', '/v1/contracts/{contract_id}', 'handlers.contract_handler:handle_delete_contract',
+          _param('contract_id', 'user')),
+    Route('POST', '/v1/contracts/{contract_id}/send', 'handlers.contract_handler:handle_send_contract',
+          _param('contract_id', 'user')),
+    Route('POST', '/v1/contracts/{contract_id}/pdf', 'handlers.contract_pdf_handler:handle_generate_contract_pdf',
+          _with_path_event),
+    Route('GET', '/v1/contracts/{contract_id}/pdf/download', 'handlers.contract_pdf_handler:handle_download_contract_pdf',
+          _with_path_event),
+
+    # RAW Vault (Ultimate plan feature)
+    Route('GET', '/v1/raw-vault', 'handlers.raw_vault_handler:handle_list_vault_files', _with_user_query),
+    Route('POST', '/v1/raw-vault', 'handlers.raw_vault_handler:handle_archive_to_vault', _with_user_body),
+    Route('POST', '/v1/raw-vault/{vault_id}/retrieve', 'handlers.raw_vault_handler:handle_request_retrieval',
+          _param('vault_id', 'user', 'body')),
+    Route('GET', '/v1/raw-vault/{vault_id}/status', 'handlers.raw_vault_handler:handle_check_retrieval_status',
+          _param('vault_id', 'user')),
+    Route('GET', '/v1/raw-vault/{vault_id}/download', 'handlers.raw_vault_handler:handle_download_vault_file',
+          _param('vault_id', 'user')),
+    Route('DELETE', '/v1/raw-vault/{vault_id}', 'handlers.raw_vault_handler:handle_delete_vault_file',
+          _param('vault_id', 'user')),
+
+    # Subscription usage
+    Route('GET', '/v1/subscription/usage', 'handlers.subscription_handler:handle_get_usage', _with_user),
+
+    # Analytics dashboards and exports
+    Route('GET', '/v1/analytics', 'handlers.engagement_analytics_handler:handle_get_overall_engagement',
+          _overall_analytics),
+    Route('GET', '/v1/analytics/overall', 'handlers.engagement_analytics_handler:handle_get_overall_engagement',
+          _overall_analytics),
+    Route('GET', '/v1/analytics/export/csv', 'handlers.analytics_export_handler:handle_export_analytics_csv',
+          _with_user_query),
+    Route('POST', '/v1/analytics/export/pdf', 'handlers.analytics_export_handler:handle_export_analytics_pdf',
+          _with_user_body),
+    Route('GET', '/v1/analytics/export/excel', 'handlers.analytics_export_handler:handle_export_analytics_excel',
+          _with_user_query),
+    Route('GET', '/v1/analytics/bulk-downloads', 'handlers.analytics_handler:handle_get_bulk_downloads', _with_user),
+    Route('GET', '/v1/analytics/visitors', 'handlers.visitor_tracking_handler:handle_get_visitor_analytics',
+          _with_user_query),
+    Route('GET', '/v1/visitor/analytics', 'handlers.visitor_tracking_handler:handle_get_visitor_analytics',
+          _with_user_query),
+    Route('GET', '/v1/analytics/galleries/{gallery_id}',
+          'handlers.engagement_analytics_handler:handle_get_gallery_engagement_summary', _gallery_analytics),
+    Route('GET', '/v1/analytics/galleries/{gallery_id}/engagement',
+          'handlers.engagement_analytics_handler:handle_get_gallery_engagement', _user_param('gallery_id')),
+    Route('GET', '/v1/analytics/galleries/{gallery_id}/client-preferences',
+          'handlers.engagement_analytics_handler:handle_get_client_preferences', _user_param('gallery_id')),
+
+    # Video analytics
+    Route('POST', '/v1/videos/track-view', 'handlers.video_analytics_handler:handle_track_video_view', _with_body),
+    Route('GET', '/v1/videos/{photo_id}/analytics', 'handlers.video_analytics_handler:handle_get_video_analytics',
+          _user_param('photo_id')),
+
+    # Real-time viewers (photographers view their active viewers)
+    Route('GET', '/v1/viewers/active', 'handlers.realtime_viewers_handler:handle_get_active_viewers', _with_user),
+
+    # Notification preferences
+    Route('GET', '/v1/notifications/preferences', 'handlers.notification_handler:handle_get_preferences', _with_user),
+    Route('PUT', '/v1/notifications/preferences', 'handlers.notification_handler:handle_update_preferences',
+          _with_user_body),
+    Route('POST', '/v1/notifications/send-custom', 'handlers.notification_handler:handle_send_custom_notification',
+          _with_user_body),
+    Route('POST', '/v1/notifications/send-selection-reminder',
+          'handlers.notification_handler:handle_send_selection_reminder', _with_user_body),
+
+    # Email templates (Pro Feature Only)
+    Route('GET', '/v1/email-templates', 'handlers.email_template_handler:handle_list_templates', _with_user),
+    Route('GET', '/v1/email-templates/{template_type}', 'handlers.email_template_handler:handle_get_template',
+          _user_param('template_type')),
+    Route('PUT', '/v1/email-templates/{template_type}', 'handlers.email_template_handler:handle_save_template',
+          _user_param('template_type', 'body')),
+    Route('DELETE', '/v1/email-templates/{template_type}', 'handlers.email_template_handler:handle_delete_template',
+          _user_param('template_type')),
+    Route('POST', '/v1/email-templates/{template_type}/preview', 'handlers.email_template_handler:handle_preview_template',
+          _user_param('template_type', 'body')),
+
+    # Email automation (Pro/Ultimate Feature)
+    Route('POST', '/v1/email-automation/schedule', 'handlers.email_automation_handler:handle_schedule_automated_email',
+          _with_user_body),
+    Route('POST', '/v1/email-automation/setup-gallery',
+          'handlers.email_automation_handler:handle_setup_gallery_automation', _with_user_body),
+    Route('GET', '/v1/email-automation/scheduled', 'handlers.email_automation_handler:handle_list_scheduled_emails',
+          lambda h, r: h(r.user, r.query.get('gallery_id'))),
+    Route('DELETE', '/v1/email-automation/scheduled/{email_id}',
+          'handlers.email_automation_handler:handle_cancel_scheduled_email', _user_param('email_id')),
+    Route('POST', '/v1/email-automation/create-rule', 'handlers.email_automation_handler:handle_create_automation_rule',
+          _with_user_body),
+    Route('GET', '/v1/email-automation/rules', 'handlers.email_automation_handler:handle_list_automation_rules',
+          _with_user),
+    Route('PUT', '/v1/email-automation/rule/{rule_id}', 'handlers.email_automation_handler:handle_update_automation_rule',
+          _user_param('rule_id', 'body')),
+    Route('DELETE', '/v1/email-automation/rule/{rule_id}',
+          'handlers.email_automation_handler:handle_delete_automation_rule', _user_param('rule_id')),
+    Route('GET', '/v1/email-automation/templates', 'handlers.email_automation_handler:handle_get_automation_templates',
+          _with_user),
+    Route('POST', '/v1/email-automation/templates/apply',
+          'handlers.email_automation_handler:handle_apply_automation_template', _with_user_body),
+
+    # Photo sales & packages
+    Route('GET', '/v1/sales', 'handlers.sales_handler:handle_list_sales', _with_user_query),
+    Route('POST', '/v1/sales/create-payment-intent', 'handlers.sales_handler:handle_create_payment_intent', _with_body),
+    Route('POST', '/v1/sales/{sale_id}/confirm', 'handlers.sales_handler:handle_confirm_sale',
+          lambda h, r: h(r.params['sale_id'], r.body.get('payment_intent_id'))),
+    Route('GET', '/v1/packages', 'handlers.sales_handler:handle_list_packages',
+          lambda h, r: h(r.user['id'], is_public=False)),
+    Route('POST', '/v1/packages', 'handlers.sales_handler:handle_create_package', _with_user_body),
+    Route('PUT', '/v1/packages/{package_id}', 'handlers.sales_handler:handle_update_package',
+          _user_param('package_id', 'body')),
+    Route('DELETE', '/v1/packages/{package_id}', 'handlers.sales_handler:handle_delete_package',
+          _user_param('package_id')),
+    # Download link (requires customer email verification)
+    Route('GET', '/v1/downloads/{download_id}', 'handlers.sales_handler:handle_get_download',
+          lambda h, r: h(r.params['download_id'], r.query.get('email', ''))),
+
+    # Client onboarding workflows
+    Route('GET', '/v1/onboarding/workflows', 'handlers.onboarding_handler:handle_list_workflows', _with_user),
+    Route('POST', '/v1/onboarding/workflows', 'handlers.onboarding_handler:handle_create_onboarding_workflow',
+          _with_user_body),
+    Route('PUT', '/v1/onboarding/workflows/{workflow_id}', 'handlers.onboarding_handler:handle_update_workflow',
+          _user_param('workflow_id', 'body')),
+    Route('DELETE', '/v1/onboarding/workflows/{workflow_id}', 'handlers.onboarding_handler:handle_delete_workflow',
+          _user_param('workflow_id')),
+
+    # SEO tools (Pro/Ultimate Feature)
+    Route('GET', '/v1/seo/sitemap', 'handlers.seo_handler:handle_generate_sitemap', _with_user),
+    Route('GET', '/v1/seo/schema', 'handlers.seo_handler:handle_generate_schema_markup', _with_user),
+    Route('GET', '/v1/seo/schema-markup', 'handlers.seo_handler:handle_generate_schema_markup', _with_user),
+    Route('POST', '/v1/seo/validate-og', 'handlers.seo_handler:handle_validate_og_tags', _with_user_body),
+    Route('POST', '/v1/seo/validate-og-tags', 'handlers.seo_handler:handle_validate_og_tags', _with_user_body),
+    Route('GET', '/v1/seo/settings', 'handlers.seo_handler:handle_get_seo_settings', _with_user),
+    Route('PUT', '/v1/seo/settings', 'handlers.seo_handler:handle_update_seo_settings', _with_user_body),
+    Route('GET', '/v1/seo/robots.txt', 'handlers.seo_handler:handle_get_robots_txt', _with_user),
+    Route('GET', '/v1/seo/score', 'handlers.seo_handler:handle_get_seo_score', _with_user),
+    Route('GET', '/v1/seo/issues', 'handlers.seo_handler:handle_get_seo_issues', _with_user),
+    Route('GET', '/v1/seo/recommendations', 'handlers.seo_handler:handle_get_seo_recommendations', _with_user),
+    Route('POST', '/v1/seo/fix-issue', 'handlers.seo_handler:handle_fix_seo_issue', _with_user_body),
+    Route('POST', '/v1/seo/optimize', 'handlers.seo_handler:handle_one_click_optimize', _with_user),
+    Route('POST', '/v1/seo/optimize-all', 'handlers.seo_handler:handle_one_click_optimize', _with_user),
+
+    # GDPR compliance
+    Route('POST', '/v1/gdpr/export-data', 'handlers.gdpr_handler:handle_export_user_data', _with_user),
+    Route('GET', '/v1/gdpr/data-retention', 'handlers.gdpr_handler:handle_get_data_retention_info', _with_user),
+
+    # Feature requests & feedback
+    Route('GET', '/v1/feature-requests', 'handlers.feature_requests_handler:handle_list_feature_requests', _with_event),
+    Route('POST', '/v1/feature-requests', 'handlers.feature_requests_handler:handle_create_feature_request', _with_event),
+    Route('POST', '/v1/feature-requests/{request_id}/vote',
+          'handlers.feature_requests_handler:handle_vote_feature_request', _with_path_event),
+    Route('DELETE', '/v1/feature-requests/{request_id}/vote',
+          'handlers.feature_requests_handler:handle_unvote_feature_request', _with_path_event),
+    Route('PUT', '/v1/feature-requests/{request_id}/status',
+          'handlers.feature_requests_handler:handle_update_feature_request_status', _with_path_event),
+
+    # Admin - plan management & monitoring
+    Route('POST', '/v1/admin/users/{user_id}/features', 'handlers.admin_plan_handler:handle_grant_feature',
+          _admin_user_body),
+    Route('GET', '/v1/admin/users/{user_id}/features', 'handlers.admin_plan_handler:handle_list_user_overrides',
+          _user_param('user_id')),
+    Route('DELETE', '/v1/admin/users/{user_id}/features/{feature_id}', 'handlers.admin_plan_handler:handle_revoke_feature',
+          lambda h, r: h(r.user, r.params['user_id'], r.params['feature_id'])),
+    Route('POST', '/v1/admin/users/{user_id}/plan', 'handlers.admin_plan_handler:handle_upgrade_user_plan',
+          _admin_user_body),
+    Route('GET', '/v1/admin/violations', 'handlers.admin_plan_handler:handle_get_plan_violations', _with_user_query),
+    Route('GET', '/v1/admin/users/{user_id}/violations', 'handlers.admin_plan_handler:handle_get_user_violations',
+          _user_param('user_id', 'query')),
+]
+
+router = Router(ROUTES)
+
+
+def normalize_path(raw_path):
+    """Strip the stage and obfuscated base path (API Gateway custom domain mapping)"""
+    path = raw_path.replace('/prod', '')
+    if path.startswith(BASE_PATH_PREFIX):
+        path = path.replace(BASE_PATH_PREFIX, '', 1)
+    return path
+
+
 def handler(event, context):
-    """Main Lambda handler with clean routing"""
+    """Main Lambda handler with table-driven routing"""
+    path = None
+    method = None
     try:
         # Handle CORS preflight
         if event.get('httpMethod') == 'OPTIONS':
             return create_response(200, {'message': 'OK'})
-        
+
         # Get path and method
-        raw_path = event.get('path', '/')
+        path = normalize_path(event.get('path', '/'))
         method = event.get('httpMethod', 'GET')
-        
-        # Strip the obfuscated base path if present (from API Gateway custom domain mapping)
-        path = raw_path.replace('/prod', '')
-        if path.startswith('/xb667e3fa92f9776468017a9758f31ba4'):
-            path = path.replace('/xb667e3fa92f9776468017a9758f31ba4', '', 1)
-        
+
+        # Item reads are memoized per request; only for reads, so a handler
+        # that writes and then re-reads sees its own write
+        begin_request_scope(memoize=method in READ_ONLY_METHODS)
+        # Tracking writes are buffered and batch-written in the finally below
+        begin_event_buffer()
+
         # Log request (without sensitive data)
         print(f"Request: {method} {path}")
         # Parse body (keep raw body for webhook signature verification)
@@ -327,1462 +868,31 @@ def handler(event, context):
                 body = json.loads(raw_body_str)
             except:
                 body = {}
-        
-        # ================================================================
-        # PUBLIC ENDPOINTS (No authentication required)
-        # ================================================================
-        
-        # Root endpoint
-        if path in ['/', '', '/v1', '/v1/']:
-            return create_response(200, {
-                'name': 'Galerly API',
-                'version': '3.0.0',
-                'architecture': 'Modular',
-                'storage': 'DynamoDB (isolated per photographer)',
-                'status': 'running',
-                'timestamp': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z',
-                'documentation': {
-                    'swagger_ui': '/v1/docs',
-                    'redoc_ui': '/v1/docs/redoc',
-                    'openapi_spec': '/v1/docs/openapi.json'
-                }
-            })
-        
-        # Health check
-        if path in ['/health', '/v1/health']:
-            return create_response(200, {
-                'status': 'healthy',
-                'architecture': 'modular',
-                'storage': 'DynamoDB',
-                'timestamp': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
-            })
-        
-        # API Documentation endpoints (PUBLIC - no authentication)
-        if path == '/v1/docs' and method == 'GET':
-            from handlers.docs_handler import handle_get_swagger_ui
-            return handle_get_swagger_ui()
-        
-        if path == '/v1/docs/openapi.json' and method == 'GET':
-            from handlers.docs_handler import handle_get_openapi_spec
-            return handle_get_openapi_spec()
-        
-        if path == '/v1/docs/redoc' and method == 'GET':
-            from handlers.docs_handler import handle_get_redoc_ui
-            return handle_get_redoc_ui()
-        
-        # Authentication endpoints (with rate limiting)
-        if path == '/v1/auth/request-verification' and method == 'POST':
-            # Extract IP from event for rate limiting
-            client_ip = event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'unknown')
-            is_allowed, retry_after = check_rate_limit('auth_verification', client_ip)
-            if not is_allowed:
-                return create_response(429, {
-                    'error': 'Too many verification requests',
-                    'retry_after': retry_after
-                }, headers={'Retry-After': str(retry_after)})
-            return handle_request_verification_code(body)
-        
-        if path == '/v1/auth/verify-email' and method == 'POST':
-            return handle_verify_code(body)
-        
-        if path == '/v1/auth/register' and method == 'POST':
-            # Extract IP from event for rate limiting
-            client_ip = event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'unknown')
-            is_allowed, retry_after = check_rate_limit('auth_register', client_ip)
-            if not is_allowed:
-                return create_response(429, {
-                    'error': 'Too many registration attempts',
-                    'retry_after': retry_after
-                }, headers={'Retry-After': str(retry_after)})
-            return handle_register(body)
-        
-        if path == '/v1/auth/login' and method == 'POST':
-            # Extract IP from event for rate limiting
-            client_ip = event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'unknown')
-            is_allowed, retry_after = check_rate_limit('auth_login', client_ip)
-            if not is_allowed:
-                return create_response(429, {
-                    'error': 'Too many login attempts',
-                    'retry_after': retry_after
-                }, headers={'Retry-After': str(retry_after)})
-            return handle_login(body)
-        
-        if path == '/v1/auth/logout' and method == 'POST':
-            return handle_logout(event)
-        
-        if path == '/v1/auth/delete-account' and method == 'DELETE':
-            # Requires authentication
-            user = get_user_from_token(event)
-            if not user:
-                return create_response(401, {'error': 'Authentication required'})
-            
-            # Pass cookie header to delete account handler so it can clear the session
-            cookie_header = event.get('headers', {}).get('cookie') or event.get('headers', {}).get('Cookie')
-            return handle_delete_account(user, cookie_header)
-        
-        # Restore account (within 30-day grace period)
-        if path == '/v1/auth/restore-account' and method == 'POST':
-            return handle_restore_account(body)
-        
-        # API Keys (Protected)
-        if path == '/v1/auth/api-key' and method == 'POST':
-            user = get_user_from_token(event)
-            if not user: return create_response(401, {'error': 'Authentication required'})
-            return handle_generate_api_key(user)
-            
-        if path == '/v1/auth/api-key' and method == 'GET':
-            user = get_user_from_token(event)
-            if not user: return create_response(401, {'error': 'Authentication required'})
-            return handle_get_api_key(user)
-        
-        if path == '/v1/auth/forgot-password' and method == 'POST':
-            # Extract IP from event for rate limiting
-            client_ip = event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'unknown')
-            is_allowed, retry_after = check_rate_limit('auth_password_reset', client_ip)
-            if not is_allowed:
-                return create_response(429, {
-                    'error': 'Too many password reset requests',
-                    'retry_after': retry_after
-                }, headers={'Retry-After': str(retry_after)})
-            return handle_request_password_reset(body)
-        
-        if path == '/v1/auth/reset-password' and method == 'POST':
-            return handle_reset_password(body)
-        
-        # Security endpoints
-        if path == '/v1/security/rotation-status' and method == 'GET':
-            user = get_user_from_token(event)
-            if not user: return create_response(401, {'error': 'Authentication required'})
-            return handle_rotation_status(user)
-        
-        # City search endpoint (PUBLIC)
-        if path == '/v1/cities/search' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            query = query_params.get('q', '')
-            return handle_city_search(query)
-        
-        # Photographer directory endpoints (PUBLIC - no auth required)
-        if path == '/v1/photographers' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_list_photographers(query_params)
-        
-        if path.startswith('/v1/photographers/') and method == 'GET':
-            parts = path.split('/')
-            photographer_id = parts[3]
-            
-            # Check if it's a sub-resource (availability, services, etc)
-            if len(parts) > 4:
-                resource = parts[4]
-                
-                # Public availability endpoints
-                if resource == 'availability':
-                    return handle_get_availability_settings({'id': photographer_id})
-                
-                # Public slots endpoint
-                if resource == 'slots':
-                    query_params = event.get('queryStringParameters') or {}
-                    return handle_get_available_slots(photographer_id, query_params)
-                
-                # Public busy times endpoint
-                if resource == 'busy-times':
-                    query_params = event.get('queryStringParameters') or {}
-                    return handle_get_busy_times(photographer_id, query_params)
-                
-                # Public iCal feed
-                if resource == 'calendar.ics':
-                    return handle_generate_ical_feed(photographer_id)
-                
-                # Public services listing
-                if resource == 'services':
-                    return handle_list_services(photographer_id, is_public=True)
-            else:
-                # Get photographer profile
-                return handle_get_photographer(photographer_id)
-        
-        # Public portfolio endpoint (with customization)
-        if path.startswith('/v1/portfolio/') and method == 'GET':
-            photographer_id = path.split('/')[-1]
-            if photographer_id != 'settings':  # Avoid conflict with settings endpoint
-                return handle_get_public_portfolio(photographer_id)
-        
-        # Lead capture from public portfolio (PUBLIC)
-        if path.startswith('/v1/photographers/') and path.endswith('/lead') and method == 'POST':
-            photographer_id = path.split('/')[3]
-            return handle_capture_lead(photographer_id, body)
-        
-        # Social sharing endpoints (PUBLIC - for public galleries/photos)
-        if path.startswith('/v1/share/gallery/') and method == 'GET':
-            gallery_id = path.split('/')[-1]
-            return handle_get_gallery_share_info(gallery_id, user=None)
-        
-        if path.startswith('/v1/share/photo/') and method == 'GET':
-            photo_id = path.split('/')[-1]
-            return handle_get_photo_share_info(photo_id, user=None)
-        
-        # Newsletter endpoints (PUBLIC)
-        if path == '/v1/newsletter/subscribe' and method == 'POST':
-            return handle_newsletter_subscribe(body)
-        
-        if path == '/v1/newsletter/unsubscribe' and method == 'POST':
-            return handle_newsletter_unsubscribe(body)
-        
-        # Gallery layouts (PUBLIC - no auth required)
-        if path == '/v1/gallery-layouts' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_list_layouts(query_params)
-        
-        if path.startswith('/v1/gallery-layouts/') and method == 'GET':
-            layout_id = path.split('/')[-1]
-            return handle_get_layout(layout_id)
-        
-        # Contact/Support endpoint (PUBLIC)
-        if path == '/v1/contact/submit' and method == 'POST':
-            return handle_contact_submit(body)
-        
-        # Client feedback endpoint (PUBLIC - clients can submit feedback)
-        if path.startswith('/v1/client/feedback/') and method == 'POST':
-            gallery_id = path.split('/')[-1]
-            return handle_submit_client_feedback(gallery_id, body)
-        
-        # Client favorites endpoints (PUBLIC - allows guest access via email in body/query)
-        if path == '/v1/client/favorites' and method == 'GET':
-            # user might be None
-            user = get_user_from_token(event)
-            query_params = event.get('queryStringParameters') or {}
-            return handle_get_favorites(user, query_params)
-        
-        if path == '/v1/client/favorites' and method == 'POST':
-            user = get_user_from_token(event)
-            return handle_add_favorite(user, body)
-
-        if path == '/v1/client/favorites/submit' and method == 'POST':
-            user = get_user_from_token(event)
-            return handle_submit_favorites(user, body)
-        
-        if path == '/v1/client/favorites' and method == 'DELETE':
-            user = get_user_from_token(event)
-            return handle_remove_favorite(user, body)
-        
-        if path.startswith('/v1/client/favorites/') and method == 'GET':
-            photo_id = path.split('/')[-1]
-            user = get_user_from_token(event)
-            query_params = event.get('queryStringParameters') or {}
-            return handle_check_favorite(user, photo_id, query_params)
-
-        # Client gallery by token endpoint (PUBLIC - anyone with token can view)
-        if path.startswith('/v1/client/galleries/by-token/') and method == 'GET':
-            share_token = path.split('/')[-1]
-            return handle_get_client_gallery_by_token(share_token)
-        
-        # Bulk download by token endpoint (PUBLIC - for clients with share token)
-        if path == '/v1/downloads/bulk/by-token' and method == 'POST':
-            return handle_bulk_download_by_token(event)
-        
-        # Stripe webhook endpoint (PUBLIC - verified by signature)
-        if path == '/v1/billing/webhook' and method == 'POST':
-            # Get Stripe signature from headers
-            headers = event.get('headers', {}) or {}
-            stripe_signature = headers.get('stripe-signature') or headers.get('Stripe-Signature') or ''
-            # Use raw body string for signature verification
-            return handle_stripe_webhook(body, stripe_signature, raw_body_str)
-        
-        # Analytics tracking endpoints (PUBLIC - no auth required, gets user_id from gallery)
-        # viewer_user_id is the user viewing (if authenticated), used to skip tracking if they're the owner
-        if path.startswith('/v1/analytics/track/gallery/') and method == 'POST':
-            gallery_id = path.split('/')[-1]
-            metadata = body.get('metadata', {})
-            # Get viewer's user_id from token if available (to check if they're the owner)
-            user = get_user_from_token(event)
-            viewer_user_id = user['id'] if user else None
-            return handle_track_gallery_view(gallery_id, viewer_user_id, metadata)
-        
-        if path.startswith('/v1/analytics/track/photo/') and method == 'POST':
-            photo_id = path.split('/')[-1]
-            gallery_id = body.get('gallery_id')
-            metadata = body.get('metadata', {})
-            # Get viewer's user_id from token if available (to check if they're the owner)
-            user = get_user_from_token(event)
-            viewer_user_id = user['id'] if user else None
-            return handle_track_photo_view(photo_id, gallery_id, viewer_user_id, metadata)
-        
-        if path.startswith('/v1/analytics/track/download/') and method == 'POST':
-            photo_id = path.split('/')[-1]
-            gallery_id = body.get('gallery_id')
-            metadata = body.get('metadata', {})
-            # Get viewer's user_id from token if available (to check if they're the owner)
-            user = get_user_from_token(event)
-            viewer_user_id = user['id'] if user else None
-            return handle_track_photo_download(photo_id, gallery_id, viewer_user_id, metadata)
-        
-        # Share tracking endpoints (PUBLIC - can track shares from anyone)
-        if path.startswith('/v1/analytics/track/share/gallery/') and method == 'POST':
-            gallery_id = path.split('/')[-1]
-            platform = body.get('platform', 'unknown')
-            metadata = body.get('metadata', {})
-            # Get user from token if available (for analytics)
-            user = get_user_from_token(event)
-            return handle_track_gallery_share(gallery_id, platform, user, metadata)
-        
-        if path.startswith('/v1/analytics/track/share/photo/') and method == 'POST':
-            photo_id = path.split('/')[-1]
-            platform = body.get('platform', 'unknown')
-            metadata = body.get('metadata', {})
-            # Get user from token if available (for analytics)
-            user = get_user_from_token(event)
-            return handle_track_photo_share(photo_id, platform, user, metadata)
-        
-        # New engagement analytics tracking endpoints (PUBLIC - for guest tracking)
-        if path == '/v1/analytics/visit' and method == 'POST':
-            return handle_track_visit(body)
 
-        if path == '/v1/analytics/event' and method == 'POST':
-            return handle_track_event(body)
+        route, params = router.match(method, path)
 
-        if path == '/v1/analytics/photo-engagement' and method == 'POST':
-            return handle_track_photo_engagement(body)
+        if route is None:
+            # Unknown endpoints are only revealed to authenticated callers
+            if not get_user_from_token(event):
+                return create_response(401, {'error': 'Authentication required'})
+            return create_response(404, {
+                'error': 'Endpoint not found',
+                'path': path,
+                'method': method
+            })
 
-        if path == '/v1/analytics/video-engagement' and method == 'POST':
-            return handle_track_video_engagement(body)
-        
-        # Real-time viewer tracking endpoints (PUBLIC - for live globe)
-        if path == '/v1/viewers/heartbeat' and method == 'POST':
-            return handle_track_viewer_heartbeat(event)
-        
-        if path == '/v1/viewers/disconnect' and method == 'POST':
-            return handle_viewer_disconnect(event)
-        
-        # Bulk download tracking endpoint (PUBLIC - tracks downloads from all users)
-        if path.startswith('/v1/analytics/track/bulk-download/') and method == 'POST':
-            gallery_id = path.split('/')[-1]
-            metadata = body.get('metadata', {})
-            # Get user from token if available (for analytics)
+        user = None
+        if route.access != PUBLIC:
             user = get_user_from_token(event)
-            viewer_user_id = user.get('id') if user else None
-            # Extract IP address from request
-            request_context = event.get('requestContext', {})
-            identity = request_context.get('identity', {})
-            client_ip = identity.get('sourceIp', 'unknown')
-            return handle_track_bulk_download(gallery_id, viewer_user_id, metadata, client_ip)
-        
-        # Photo comments (PUBLIC - Allows guests to comment)
-        if path.startswith('/v1/photos/') and '/comments' in path:
-            parts = path.split('/')
-            photo_id = parts[parts.index('photos') + 1]
-            
-            # Check if it's a specific comment (update/delete)
-            if len(parts) > parts.index('comments') + 1:
-                comment_id = parts[parts.index('comments') + 1]
-                
-                # Update/Delete - allow for authenticated users AND guests who own the comment
-                user = get_user_from_token(event)  # Get user if authenticated, otherwise None
-                
-                # For guest users, create a temporary user object from localStorage info sent in headers
+            if route.access == AUTH_REQUIRED:
                 if not user:
-                    # Check if guest user info is in request body or headers
-                    try:
-                        # Try to get guest info from headers (sent by frontend)
-                        headers = event.get('headers', {}) or {}
-                        guest_name = headers.get('x-guest-name') or headers.get('X-Guest-Name')
-                        guest_email = headers.get('x-guest-email') or headers.get('X-Guest-Email')
-                        
-                        if guest_name or guest_email:
-                            # Create temporary guest user object for permission check
-                            if guest_email:
-                                guest_user_id = f"guest-{guest_email}"
-                            else:
-                                # If no email, we can't match against stored comments
-                                guest_user_id = None
-                            
-                            if guest_user_id:
-                                user = {
-                                    'id': guest_user_id,
-                                    'username': guest_name,
-                                    'email': guest_email,
-                                    'is_guest': True
-                                }
-                    except Exception as e:
-                        print(f"Error creating guest user object: {str(e)}")
-                
-                if method == 'PUT':
-                    return handle_update_comment(photo_id, comment_id, user, body)
-                
-                if method == 'DELETE':
-                    return handle_delete_comment(photo_id, comment_id, user)
-                    
-            elif method == 'POST':
-                # Add new comment - Publicly accessible (handler checks gallery settings)
-                user = get_user_from_token(event) # Optional user
-                return handle_add_comment(photo_id, user, body)
-
-        # Photo details (PUBLIC - for polling comments etc)
-        # Exclude /photos/search which is handled in authenticated section
-        if path.startswith('/v1/photos/') and '/comments' not in path and path != '/v1/photos/search' and method == 'GET':
-             photo_id = path.split('/')[-1]
-             return handle_get_photo(photo_id)
-
-        # Visitor tracking endpoints (PUBLIC - tracks ALL visitors for UX improvement)
-        # These are mandatory for understanding user behavior and improving UX
-        if path == '/v1/visitor/track/visit' and method == 'POST':
-            return handle_track_visit(body)
-        
-        if path == '/v1/visitor/track/event' and method == 'POST':
-            return handle_track_event(body)
-        
-        if path == '/v1/visitor/track/session-end' and method == 'POST':
-            return handle_track_session_end(body)
-        
-        # Public contract signing
-        if path.startswith('/v1/public/contracts/') and method == 'GET':
-            contract_id = path.split('/')[-1]
-            return handle_get_contract(contract_id, user=None)
-            
-        if path.startswith('/v1/public/contracts/') and path.endswith('/sign') and method == 'POST':
-             parts = path.split('/')
-             contract_id = parts[-2]
-             request_context = event.get('requestContext', {})
-             identity = request_context.get('identity', {})
-             ip_address = identity.get('sourceIp', 'unknown')
-             return handle_sign_contract(contract_id, body, ip_address)
-
-        # Public Booking Request
-        if path.startswith('/v1/public/photographers/') and path.endswith('/appointments') and method == 'POST':
-            parts = path.split('/')
-            photographer_id = parts[-2]
-            return handle_create_public_appointment_request(photographer_id, body)
-        
-        # Public availability endpoints
-        if path.startswith('/v1/public/photographers/'):
-            parts = path.split('/')
-            if len(parts) >= 5:
-                photographer_id = parts[4]
-                query_params = event.get('queryStringParameters') or {}
-                
-                # Branding settings
-                if '/branding' in path and method == 'GET':
-                    return handle_get_public_branding(photographer_id)
-                
-                # Lead capture (contact/inquiry)
-                if '/lead' in path and method == 'POST':
-                    return handle_capture_lead(photographer_id, body)
-                
-                # Testimonials (public)
-                if '/testimonials' in path:
-                    if method == 'GET':
-                        return handle_list_testimonials(photographer_id, query_params)
-                    elif method == 'POST':
-                        return handle_create_testimonial(photographer_id, body)
-                
-                # Services pricing (public)
-                if '/services' in path:
-                    if method == 'GET':
-                        return handle_list_services(photographer_id, is_public=True)
-                
-                # Packages (public)
-                if '/packages' in path and method == 'GET':
-                    return handle_list_packages(photographer_id, is_public=True)
-                
-                if '/availability/available-slots' in path and method == 'GET':
-                    return handle_get_available_slots(photographer_id, query_params)
-                
-                if '/availability/busy-times' in path and method == 'GET':
-                    return handle_get_busy_times(photographer_id, query_params)
-                
-                if path.endswith('/calendar.ics') and method == 'GET':
-                    return handle_generate_ical_feed(photographer_id)
-        
-        # ================================================================
-        # AUTHENTICATED ENDPOINTS (Require valid token)
-        # ================================================================
-        
-        user = get_user_from_token(event)
-        if not user:
-            return create_response(401, {'error': 'Authentication required'})
-        
-        # Log authenticated request (without email for security)
-        print(f"Authenticated request from user: {user.get('id')}")
-        
-        # Get current user info
-        if path == '/v1/auth/me' and method == 'GET':
-            return handle_get_me(user)
-        
-        # Profile update endpoint
-        if path == '/v1/profile' and method == 'PUT':
-            return handle_update_profile(user, body)
-        
-        # Watermark logo upload endpoint
-        if path == '/v1/profile/watermark-logo' and method == 'POST':
-            from handlers.watermark_handler import handle_upload_watermark_logo
-            return handle_upload_watermark_logo(user, body)
-        
-        # Get watermark settings
-        if path == '/v1/profile/watermark-settings' and method == 'GET':
-            from handlers.watermark_handler import handle_get_watermark_settings
-            return handle_get_watermark_settings(user)
-        
-        # Update watermark settings
-        if path == '/v1/profile/watermark-settings' and method == 'PUT':
-            from handlers.watermark_handler import handle_update_watermark_settings
-            return handle_update_watermark_settings(user, body)
-        
-        # Batch apply watermark to existing photos
-        if path == '/v1/profile/watermark-batch-apply' and method == 'POST':
-            from handlers.watermark_handler import handle_batch_apply_watermark
-            return handle_batch_apply_watermark(user, body)
-        
-        # Branding settings
-        if path == '/v1/profile/branding-settings' and method == 'GET':
-            return handle_get_branding_settings(user)
-        
-        if path == '/v1/profile/branding-settings' and method == 'PUT':
-            return handle_update_branding_settings(user, body)
-        
-        if path == '/v1/profile/branding-logo' and method == 'POST':
-            return handle_upload_branding_logo(user, body)
-        
-        # Background jobs endpoints
-        if path.startswith('/v1/jobs/'):
-            from handlers.background_jobs_handler import handle_get_job_status, handle_process_background_job
-            
-            # Get job status
-            if method == 'GET':
-                job_id = path.split('/')[-1]
-                return handle_get_job_status(user, job_id)
-            
-            # Process job (internal use / worker)
-            if path.endswith('/process') and method == 'POST':
-                job_id = path.split('/')[-2]
-                return handle_process_background_job(job_id)
-        
-        # Portfolio settings endpoints
-        if path == '/v1/portfolio/settings' and method == 'GET':
-            return handle_get_portfolio_settings(user)
-        
-        if path == '/v1/portfolio/settings' and method == 'PUT':
-            return handle_update_portfolio_settings(user, body)
-        
-        if path == '/v1/portfolio/domain-status' and method == 'GET':
-            domain = event.get('queryStringParameters', {}).get('domain', '')
-            return handle_check_domain_status(user, domain)
-            
-        if path == '/v1/portfolio/verify-domain' and method == 'POST':
-            return handle_verify_domain(user, body)
-        
-        # Custom domain setup (NEW - Full CloudFront/ACM integration)
-        if path == '/v1/portfolio/custom-domain/setup' and method == 'POST':
-            return handle_setup_custom_domain(user, body)
-        
-        if path == '/v1/portfolio/custom-domain/status' and method == 'GET':
-            domain = event.get('queryStringParameters', {}).get('domain', '')
-            return handle_check_custom_domain_status(user, domain)
-        
-        if path == '/v1/portfolio/custom-domain/refresh' and method == 'POST':
-            domain = body.get('domain', '')
-            return handle_refresh_custom_domain_certificate(user, domain)
-        
-        # Dashboard
-        if path == '/v1/dashboard' and method == 'GET':
-            return handle_dashboard_stats(user)
-        
-        # Dashboard stats (explicit endpoint for clarity)
-        if path == '/v1/dashboard/stats' and method == 'GET':
-            return handle_dashboard_stats(user)
-        
-        # Client galleries endpoint
-        if path == '/v1/client/galleries' and method == 'GET':
-            return handle_client_galleries(user)
-        
-        # Client single gallery endpoint
-        if path.startswith('/v1/client/galleries/') and method == 'GET':
-            gallery_id = path.split('/')[-1]
-            return handle_get_client_gallery(gallery_id, user)
-        
-        
-        # Photos endpoints (MUST come BEFORE gallery endpoints to avoid path collision)
-        if path.startswith('/v1/galleries/') and '/photos' in path:
-            parts = path.split('/')
-            gallery_id = parts[parts.index('galleries') + 1]
-            
-            # Presigned URL endpoints (NEW - for large file uploads)
-            if '/upload-url' in path and method == 'POST':
-                return handle_get_upload_url(gallery_id, user, event)
-            
-            if '/direct-upload' in path and method == 'POST':
-                return handle_direct_upload(gallery_id, user, event)
-            
-            if '/confirm-upload' in path and method == 'POST':
-                return handle_confirm_upload(gallery_id, user, event)
-            
-            # Multipart upload endpoints (for files > 10MB)
-            if '/multipart-upload/init' in path and method == 'POST':
-                return handle_initialize_multipart_upload(gallery_id, user, event)
-            
-            if '/multipart-upload/complete' in path and method == 'POST':
-                return handle_complete_multipart_upload(gallery_id, user, event)
-            
-            if '/multipart-upload/abort' in path and method == 'POST':
-                return handle_abort_multipart_upload(gallery_id, user, event)
-            
-            # Check for duplicate detection endpoint
-            if '/check-duplicates' in path and method == 'POST':
-                return handle_check_duplicates(gallery_id, user, event)
-            
-            # Check for delete photos endpoint (batch delete)
-            if '/delete' in path and method == 'DELETE':
-                return handle_delete_photos(gallery_id, user, event)
-            
-            if method == 'POST':
-                return handle_upload_photo(gallery_id, user, event)
-        
-        # Bulk download endpoint (authenticated photographers/clients) - OUTSIDE photos section
-        if path.startswith('/v1/galleries/') and '/download-bulk' in path and method == 'POST':
-            parts = path.split('/')
-            gallery_id = parts[parts.index('galleries') + 1]
-            return handle_bulk_download(gallery_id, user, event)
-        
-        # Batch email notification endpoint
-        if path.startswith('/v1/galleries/') and '/notify-clients' in path and method == 'POST':
-            parts = path.split('/')
-            gallery_id = parts[parts.index('galleries') + 1]
-            return handle_send_batch_notification(gallery_id, user)
-        
-        # Galleries
-        if path == '/v1/galleries' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_list_galleries(user, query_params)
-        
-        if path == '/v1/galleries' and method == 'POST':
-            return handle_create_gallery(user, body)
-        
-        if path.startswith('/v1/galleries/'):
-            parts = path.split('/')
-            gallery_index = parts.index('galleries')
-            
-            # Check if it's a special action endpoint
-            if len(parts) > gallery_index + 2:
-                action = parts[gallery_index + 2]
-                gallery_id = parts[gallery_index + 1]
-                
-                if action == 'duplicate' and method == 'POST':
-                    return handle_duplicate_gallery(gallery_id, user, body)
-                
-                if action == 'archive' and method == 'POST':
-                    return handle_archive_gallery(gallery_id, user, archive=True)
-                
-                if action == 'unarchive' and method == 'POST':
-                    return handle_archive_gallery(gallery_id, user, archive=False)
-                
-                if action == 'archive-originals' and method == 'POST':
-                    return handle_archive_originals(gallery_id, user)
-            
-            # Regular gallery operations
-            gallery_id = parts[-1]
-            
-            if method == 'GET':
-                return handle_get_gallery(gallery_id, user)
-            
-            if method == 'PUT':
-                return handle_update_gallery(gallery_id, user, body)
-            
-            if method == 'DELETE':
-                return handle_delete_gallery(gallery_id, user)
-        
-        # Gallery statistics (new endpoint)
-        if path.startswith('/v1/galleries/') and path.endswith('/statistics') and method == 'GET':
-            gallery_id = path.split('/')[-2]
-            return handle_get_gallery_statistics(user, gallery_id)
-        
-        # Client selection workflow
-        if path == '/v1/selections/sessions' and method == 'POST':
-            return handle_create_selection_session(user, body)
-        
-        if path == '/v1/selections/sessions' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_list_selection_sessions(user, query_params)
-        
-        if path.startswith('/v1/selections/sessions/') and method == 'GET':
-            session_id = path.split('/')[-1]
-            return handle_get_selection_session(user, session_id)
-        
-        if path == '/v1/selections/add' and method == 'POST':
-            return handle_add_to_selection(user, body)
-        
-        if path == '/v1/selections/remove' and method == 'POST':
-            return handle_remove_from_selection(user, body)
-        
-        if path == '/v1/selections/submit' and method == 'POST':
-            return handle_submit_selection(user, body)
-        
-        # Photo comments - already handled in PUBLIC section above
-        # Kept here for backward compatibility if needed
-        # if path.startswith('/v1/photos/') and '/comments' in path:
-        #     ...
-        
-        # Photo search endpoint
-        if path == '/v1/photos/search' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_search_photos(user, query_params)
-        
-        # Social sharing endpoints (AUTHENTICATED - for user's own galleries/photos)
-        if path.startswith('/v1/share/gallery/') and method == 'GET':
-            gallery_id = path.split('/')[-1]
-            return handle_get_gallery_share_info(gallery_id, user)
-        
-        if path.startswith('/v1/share/photo/') and method == 'GET':
-            photo_id = path.split('/')[-1]
-            return handle_get_photo_share_info(photo_id, user)
-        
-        # Photo update (status, etc.)
-        if path.startswith('/v1/photos/') and '/comments' not in path:
-            photo_id = path.split('/')[-1]
-            
-            if method == 'PUT':
-                return handle_update_photo(photo_id, body, user)
-        
-        # Billing endpoints
-        if path == '/v1/billing/checkout' and method == 'POST':
-            return handle_create_checkout_session(user, body)
-        
-        if path == '/v1/billing/history' and method == 'GET':
-            return handle_get_billing_history(user)
-        
-        if path.startswith('/v1/billing/invoice/') and path.endswith('/pdf') and method == 'GET':
-            # Extract invoice_id from path: /v1/billing/invoice/{invoice_id}/pdf
-            invoice_id = path.split('/')[-2]
-            return handle_get_invoice_pdf(user, invoice_id)
-        
-        if path == '/v1/billing/subscription' and method == 'GET':
-            return handle_get_subscription(user)
-        
-        if path == '/v1/billing/subscription/cancel' and method == 'POST':
-            return handle_cancel_subscription(user)
-        
-        if path == '/v1/billing/customer-portal' and method == 'POST':
-            from handlers.billing_handler import handle_create_customer_portal_session
-            return handle_create_customer_portal_session(user, body)
-        
-        if path == '/v1/billing/subscription/check-downgrade' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            target_plan = query_params.get('target_plan', 'free')
-            return handle_check_downgrade_limits(user, target_plan)
-        
-        if path == '/v1/billing/subscription/downgrade' and method == 'POST':
-            return handle_downgrade_subscription(user, body)
-        
-        if path == '/v1/billing/subscription/change-plan' and method == 'POST':
-            return handle_change_plan(user, body)
-        
-        # Refund endpoints
-        if path == '/v1/billing/refund/check' and method == 'GET':
-            return handle_check_refund_eligibility(user)
-        
-        if path == '/v1/billing/refund/request' and method == 'POST':
-            return handle_request_refund(user, body)
-        
-        if path == '/v1/billing/refund/status' and method == 'GET':
-            return handle_get_refund_status(user)
-        
-        # ================================================================
-        # LEADS & CRM (Pro/Ultimate Feature)
-        # ================================================================
-        
-        # List all leads for photographer
-        if path == '/v1/leads' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_list_leads(user, query_params)
-        
-        # Get single lead details
-        if path.startswith('/v1/leads/') and method == 'GET' and '/followup' not in path:
-            lead_id = path.split('/')[-1]
-            return handle_get_lead(user, lead_id)
-        
-        # Update lead information
-        if path.startswith('/v1/leads/') and method == 'PUT':
-            lead_id = path.split('/')[-1]
-            return handle_update_lead(user, lead_id, body)
-        
-        # Cancel follow-up sequence for a lead
-        if path.startswith('/v1/leads/') and path.endswith('/followup') and method == 'DELETE':
-            lead_id = path.split('/')[3]
-            return handle_cancel_followup_sequence(user, lead_id)
-        
-        # Invoice management
-        if path == '/v1/invoices' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_list_invoices(user, query_params)
-        
-        if path == '/v1/invoices' and method == 'POST':
-            return handle_create_invoice(user, body)
-        
-        if path.startswith('/v1/invoices/'):
-            parts = path.split('/')
-            invoice_id = parts[3] if len(parts) > 3 else None
-            
-            # PDF generation routes
-            if 'pdf' in parts and method == 'POST':
-                event['pathParameters'] = {'invoice_id': invoice_id}
-                return handle_generate_invoice_pdf(event)
-            
-            if 'pdf' in parts and 'download' in parts and method == 'GET':
-                event['pathParameters'] = {'invoice_id': invoice_id}
-                return handle_download_invoice_pdf(event)
-            
-            # Check for specific actions like /v1/invoices/{id}/send
-            if parts[-1] == 'send' and method == 'POST':
-                invoice_id = parts[-2]
-                return handle_send_invoice(invoice_id, user)
-            
-            invoice_id = parts[-1]
-            
-            if method == 'GET':
-                return handle_get_invoice(invoice_id, user)
-                
-            if method == 'PUT':
-                # Check if marking as paid
-                if 'mark-paid' in path:
-                    return handle_mark_invoice_paid(invoice_id, user, body)
-                return handle_update_invoice(invoice_id, user, body)
-                
-            if method == 'DELETE':
-                return handle_delete_invoice(invoice_id, user)
-
-        # Appointment scheduler
-        if path == '/v1/appointments' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_list_appointments(user, query_params)
-        
-        if path == '/v1/appointments' and method == 'POST':
-            return handle_create_appointment(user, body)
-            
-        if path.startswith('/v1/appointments/'):
-            parts = path.split('/')
-            appt_id = parts[3] if len(parts) > 3 else None
-            
-            # ICS export route
-            if 'ics' in parts and method == 'GET':
-                event['pathParameters'] = {'appointment_id': appt_id}
-                return handle_export_appointment_ics(event)
-            
-            appt_id = path.split('/')[-1]
-            if method == 'PUT':
-                return handle_update_appointment(appt_id, user, body)
-            if method == 'DELETE':
-                return handle_delete_appointment(appt_id, user)
-        
-        # ================================================================
-        # SERVICES MANAGEMENT (For all photographers)
-        # ================================================================
-        
-        # List photographer's services
-        if path == '/v1/services' and method == 'GET':
-            return handle_list_services(user['id'], is_public=False)
-        
-        # Create new service
-        if path == '/v1/services' and method == 'POST':
-            return handle_create_service(user, body)
-        
-        # Get service details
-        if path.startswith('/v1/services/') and method == 'GET':
-            service_id = path.split('/')[-1]
-            return handle_get_service(service_id, user['id'])
-        
-        # Update service
-        if path.startswith('/v1/services/') and method == 'PUT':
-            service_id = path.split('/')[-1]
-            return handle_update_service(user, service_id, body)
-        
-        # Delete service
-        if path.startswith('/v1/services/') and method == 'DELETE':
-            service_id = path.split('/')[-1]
-            return handle_delete_service(user, service_id)
-        
-        # Calendar feed routes
-        if path == '/v1/calendar/feed.ics' and method == 'GET':
-            return handle_export_calendar_feed(event)
-        
-        if path == '/v1/calendar/token' and method == 'POST':
-            return handle_generate_calendar_token(event)
-        
-        # Availability settings
-        if path == '/v1/availability/settings' and method == 'GET':
-            return handle_get_availability_settings(user)
-        
-        if path == '/v1/availability/settings' and method == 'PUT':
-            return handle_update_availability_settings(user, body)
-        
-        # Check slot availability
-        if path == '/v1/availability/check-slot' and method == 'POST':
-            return handle_check_slot_availability(user['id'], body)
-        
-        # Get busy times for calendar
-        if path == '/v1/availability/busy-times' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_get_busy_times(user['id'], query_params)
-
-        # Contract management
-        if path == '/v1/contracts' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_list_contracts(user, query_params)
-        
-        if path == '/v1/contracts' and method == 'POST':
-            return handle_create_contract(user, body)
-            
-        if path.startswith('/v1/contracts/'):
-            parts = path.split('/')
-            contract_id = parts[3] if len(parts) > 3 else None
-            
-            # PDF generation routes
-            if 'pdf' in parts and method == 'POST':
-                event['pathParameters'] = {'contract_id': contract_id}
-                return handle_generate_contract_pdf(event)
-            
-            if 'pdf' in parts and 'download' in parts and method == 'GET':
-                event['pathParameters'] = {'contract_id': contract_id}
-                return handle_download_contract_pdf(event)
-            
-            # Check for specific actions
-            if parts[-1] == 'send' and method == 'POST':
-                contract_id = parts[-2]
-                return handle_send_contract(contract_id, user)
-            
-            contract_id = parts[-1]
-            if method == 'GET':
-                return handle_get_contract(contract_id, user)
-            if method == 'PUT':
-                return handle_update_contract(contract_id, user, body)
-            if method == 'DELETE':
-                return handle_delete_contract(contract_id, user)
-        
-        # RAW Vault management (Ultimate plan feature)
-        if path == '/v1/raw-vault' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_list_vault_files(user, query_params)
-        
-        if path == '/v1/raw-vault' and method == 'POST':
-            return handle_archive_to_vault(user, body)
-        
-        if path.startswith('/v1/raw-vault/'):
-            parts = path.split('/')
-            vault_id = parts[3] if len(parts) > 3 else None
-            
-            # Handle sub-actions: /raw-vault/{id}/retrieve, /raw-vault/{id}/download, etc.
-            if len(parts) > 4:
-                action = parts[4]
-                if action == 'retrieve' and method == 'POST':
-                    return handle_request_retrieval(vault_id, user, body)
-                elif action == 'status' and method == 'GET':
-                    return handle_check_retrieval_status(vault_id, user)
-                elif action == 'download' and method == 'GET':
-                    return handle_download_vault_file(vault_id, user)
-            
-            # Direct vault file operations
-            if vault_id and method == 'DELETE':
-                return handle_delete_vault_file(vault_id, user)
-        
-        # Subscription/Usage endpoints
-        if path == '/v1/subscription/usage' and method == 'GET':
-            return handle_get_usage(user)
-        
-        # Analytics endpoints
-        # Support both /v1/analytics and /v1/analytics/overall
-        if (path == '/v1/analytics' or path == '/v1/analytics/overall') and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            print(f"[API] Analytics request - path: {path}, query_params: {query_params}")
-            # Use engagement analytics for more accurate data
-            use_engagement = query_params.get('use_engagement', 'true').lower() == 'true'
-            print(f"[API] Using engagement analytics: {use_engagement}")
-            if use_engagement:
-                return handle_get_overall_engagement(user)
-            else:
-                return handle_get_overall_analytics(user, query_params)
-        
-        # Analytics export routes
-        if path == '/v1/analytics/export/csv' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_export_analytics_csv(user, query_params)
-        
-        if path == '/v1/analytics/export/pdf' and method == 'POST':
-            return handle_export_analytics_pdf(user, body)
-        
-        if path == '/v1/analytics/export/excel' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_export_analytics_excel(user, query_params)
-        
-        if path == '/v1/analytics/bulk-downloads' and method == 'GET':
-            return handle_get_bulk_downloads(user)
-        
-        # Visitor analytics endpoint (support both paths for compatibility)
-        if (path == '/v1/analytics/visitors' or path == '/v1/visitor/analytics') and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_get_visitor_analytics(user, query_params)
-        
-        if path.startswith('/v1/analytics/galleries/') and method == 'GET':
-            # Handle multiple analytics endpoints for galleries
-            if '/engagement' in path:
-                # GET /v1/analytics/galleries/{gallery_id}/engagement
-                gallery_id = path.split('/')[4]
-                return handle_get_gallery_engagement(user, gallery_id)
-            elif '/client-preferences' in path:
-                # GET /v1/analytics/galleries/{gallery_id}/client-preferences
-                gallery_id = path.split('/')[4]
-                return handle_get_client_preferences(user, gallery_id)
-            else:
-                # GET /v1/analytics/galleries/{gallery_id} - Use engagement analytics summary
-                gallery_id = path.split('/')[-1]
-                query_params = event.get('queryStringParameters') or {}
-                use_engagement = query_params.get('use_engagement', 'true').lower() == 'true'
-                if use_engagement:
-                    return handle_get_gallery_engagement_summary(user, gallery_id)
-                else:
-                    return handle_get_gallery_analytics(user, gallery_id, query_params)
-        
-        # Video analytics endpoints
-        if path == '/v1/videos/track-view' and method == 'POST':
-            from handlers.video_analytics_handler import handle_track_video_view
-            return handle_track_video_view(body)
-        
-        if path.startswith('/v1/videos/') and path.endswith('/analytics') and method == 'GET':
-            from handlers.video_analytics_handler import handle_get_video_analytics
-            photo_id = path.split('/')[-2]
-            return handle_get_video_analytics(user, photo_id)
-        
-        # Client feedback endpoint (AUTHENTICATED - photographers can view feedback)
-        if path.startswith('/v1/client/feedback/') and method == 'GET':
-            gallery_id = path.split('/')[-1]
-            return handle_get_gallery_feedback(gallery_id, user)
-        
-        # Real-time viewers endpoint (AUTHENTICATED - photographers view their active viewers)
-        if path == '/v1/viewers/active' and method == 'GET':
-            return handle_get_active_viewers(user)
-        
-        # ================================================================
-        # NOTIFICATION PREFERENCES ENDPOINTS
-        # ================================================================
-        
-        # Get notification preferences
-        if path == '/v1/notifications/preferences' and method == 'GET':
-            return handle_get_preferences(user)
-        
-        # Update notification preferences
-        if path == '/v1/notifications/preferences' and method == 'PUT':
-            return handle_update_preferences(user, body)
-        
-        # Send custom notification to client
-        if path == '/v1/notifications/send-custom' and method == 'POST':
-            return handle_send_custom_notification(user, body)
-        
-        # Send selection reminder to client (matches frontend call)
-        if path == '/v1/notifications/send-selection-reminder' and method == 'POST':
-            return handle_send_selection_reminder(user, body)
-        
-        # ================================================================
-        # EMAIL TEMPLATES (Pro Feature Only)
-        # ================================================================
-        
-        # List all email templates
-        if path == '/v1/email-templates' and method == 'GET':
-            return handle_list_templates(user)
-        
-        # Get specific template
-        if path.startswith('/v1/email-templates/') and method == 'GET' and '/preview' not in path:
-            parts = path.split('/')
-            template_type = parts[-1]
-            return handle_get_template(user, template_type)
-        
-        # Save/update template
-        if path.startswith('/v1/email-templates/') and method == 'PUT' and '/preview' not in path:
-            parts = path.split('/')
-            template_type = parts[-1]
-            return handle_save_template(user, template_type, body)
-        
-        # Delete custom template (revert to default)
-        if path.startswith('/v1/email-templates/') and method == 'DELETE' and '/preview' not in path:
-            parts = path.split('/')
-            template_type = parts[-1]
-            return handle_delete_template(user, template_type)
-        
-        # Preview template with sample data
-        if path.startswith('/v1/email-templates/') and '/preview' in path and method == 'POST':
-            parts = path.split('/')
-            # Path should be: /v1/email-templates/{template_type}/preview
-            # Extract template_type safely (it's before 'preview')
-            try:
-                preview_index = parts.index('preview')
-                if preview_index > 0:
-                    template_type = parts[preview_index - 1]
-                    return handle_preview_template(user, template_type, body)
-            except (ValueError, IndexError):
-                return create_response(400, {'error': 'Invalid template preview path'})
-        
-        # ================================================================
-        # EMAIL AUTOMATION (Pro/Ultimate Feature)
-        # ================================================================
-        
-        # Schedule automated email
-        if path == '/v1/email-automation/schedule' and method == 'POST':
-            return handle_schedule_automated_email(user, body)
-        
-        # Setup gallery automation (auto-schedule reminders)
-        if path == '/v1/email-automation/setup-gallery' and method == 'POST':
-            return handle_setup_gallery_automation(user, body)
-        
-        # List scheduled emails
-        if path == '/v1/email-automation/scheduled' and method == 'GET':
-            gallery_id = event.get('queryStringParameters', {}).get('gallery_id')
-            return handle_list_scheduled_emails(user, gallery_id)
-        
-        # Cancel scheduled email
-        if path.startswith('/v1/email-automation/scheduled/') and method == 'DELETE':
-            email_id = path.split('/')[-1]
-            return handle_cancel_scheduled_email(user, email_id)
-        
-        # Create automation rule
-        if path == '/v1/email-automation/create-rule' and method == 'POST':
-            return handle_create_automation_rule(user, body)
-        
-        # List automation rules
-        if path == '/v1/email-automation/rules' and method == 'GET':
-            return handle_list_automation_rules(user)
-        
-        # Update automation rule
-        if path.startswith('/v1/email-automation/rule/') and method == 'PUT':
-            rule_id = path.split('/')[-1]
-            return handle_update_automation_rule(user, rule_id, body)
-        
-        # Delete automation rule
-        if path.startswith('/v1/email-automation/rule/') and method == 'DELETE':
-            rule_id = path.split('/')[-1]
-            return handle_delete_automation_rule(user, rule_id)
-        
-        # Get automation templates
-        if path == '/v1/email-automation/templates' and method == 'GET':
-            return handle_get_automation_templates(user)
-        
-        # Apply automation template
-        if path == '/v1/email-automation/templates/apply' and method == 'POST':
-            return handle_apply_automation_template(user, body)
-        
-        # Manual expiry check (photographer can test expiry notifications)
-        if path == '/v1/galleries/check-expiring' and method == 'POST':
-            return handle_manual_expiry_check(user)
-        
-        # ================================================================
-        # CRM & LEADS (Pro/Ultimate Feature)
-        # ================================================================
-        
-        # List leads
-        if path == '/v1/crm/leads' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_list_leads(user, query_params)
-        
-        # Get single lead
-        if path.startswith('/v1/crm/leads/') and method == 'GET':
-            lead_id = path.split('/')[-1]
-            return handle_get_lead(user, lead_id)
-        
-        # Update lead
-        if path.startswith('/v1/crm/leads/') and method == 'PUT':
-            lead_id = path.split('/')[-1]
-            return handle_update_lead(user, lead_id, body)
-        
-        # Cancel follow-up sequence for lead
-        if path.startswith('/v1/crm/leads/') and path.endswith('/cancel-followup') and method == 'POST':
-            lead_id = path.split('/')[-2]
-            return handle_cancel_followup_sequence(user, lead_id)
-        
-        # List testimonials (photographer view - includes unapproved)
-        if path == '/v1/crm/testimonials' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            query_params['show_all'] = 'true'
-            return handle_list_testimonials(user['id'], query_params)
-        
-        # Update testimonial (approve/feature)
-        if path.startswith('/v1/crm/testimonials/') and method == 'PUT':
-            testimonial_id = path.split('/')[-1]
-            return handle_update_testimonial(user, testimonial_id, body)
-        
-        # Delete testimonial
-        if path.startswith('/v1/crm/testimonials/') and method == 'DELETE':
-            testimonial_id = path.split('/')[-1]
-            return handle_delete_testimonial(user, testimonial_id)
-        
-        # Request testimonial from client
-        if path == '/v1/crm/testimonials/request' and method == 'POST':
-            return handle_request_testimonial(user, body)
-        
-        # ================================================================
-        # SERVICES MANAGEMENT
-        # ================================================================
-        
-        # List photographer's services
-        if path == '/v1/services' and method == 'GET':
-            return handle_list_services(user['id'], is_public=False)
-        
-        # Create service
-        if path == '/v1/services' and method == 'POST':
-            return handle_create_service(user, body)
-        
-        # Get single service
-        if path.startswith('/v1/services/') and method == 'GET':
-            service_id = path.split('/')[-1]
-            return handle_get_service(service_id, user['id'])
-        
-        # Update service
-        if path.startswith('/v1/services/') and method == 'PUT':
-            service_id = path.split('/')[-1]
-            return handle_update_service(user, service_id, body)
-        
-        # Delete service
-        if path.startswith('/v1/services/') and method == 'DELETE':
-            service_id = path.split('/')[-1]
-            return handle_delete_service(user, service_id)
-        
-        # ================================================================
-        # PHOTO SALES & PACKAGES
-        # ================================================================
-        
-        # List sales with revenue stats
-        if path == '/v1/sales' and method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            return handle_list_sales(user, query_params)
-        
-        # Create payment intent
-        if path == '/v1/sales/create-payment-intent' and method == 'POST':
-            return handle_create_payment_intent(body)
-        
-        # Confirm sale after payment
-        if path.startswith('/v1/sales/') and path.endswith('/confirm') and method == 'POST':
-            sale_id = path.split('/')[-2]
-            payment_intent_id = body.get('payment_intent_id')
-            return handle_confirm_sale(sale_id, payment_intent_id)
-        
-        # List packages
-        if path == '/v1/packages' and method == 'GET':
-            return handle_list_packages(user['id'], is_public=False)
-        
-        # Create package
-        if path == '/v1/packages' and method == 'POST':
-            return handle_create_package(user, body)
-        
-        # Update package
-        if path.startswith('/v1/packages/') and method == 'PUT':
-            package_id = path.split('/')[-1]
-            from handlers.sales_handler import handle_update_package
-            return handle_update_package(user, package_id, body)
-        
-        # Delete package
-        if path.startswith('/v1/packages/') and method == 'DELETE':
-            package_id = path.split('/')[-1]
-            from handlers.sales_handler import handle_delete_package
-            return handle_delete_package(user, package_id)
-        
-        # Get download link (requires customer email verification)
-        if path.startswith('/v1/downloads/') and method == 'GET':
-            download_id = path.split('/')[-1]
-            query_params = event.get('queryStringParameters') or {}
-            customer_email = query_params.get('email', '')
-            return handle_get_download(download_id, customer_email)
-        
-        # ================================================================
-        # PAYMENT REMINDERS
-        # ================================================================
-        
-        # Create reminder schedule for invoice
-        if path.startswith('/v1/invoices/') and path.endswith('/reminders') and method == 'POST':
-            invoice_id = path.split('/')[-2]
-            return handle_create_reminder_schedule(user, invoice_id, body)
-        
-        # Cancel reminder schedule
-        if path.startswith('/v1/invoices/') and path.endswith('/reminders') and method == 'DELETE':
-            invoice_id = path.split('/')[-2]
-            return handle_cancel_reminder_schedule(user, invoice_id)
-        
-        # ================================================================
-        # CLIENT ONBOARDING WORKFLOWS
-        # ================================================================
-        
-        # List onboarding workflows
-        if path == '/v1/onboarding/workflows' and method == 'GET':
-            return handle_list_workflows(user)
-        
-        # Create onboarding workflow
-        if path == '/v1/onboarding/workflows' and method == 'POST':
-            return handle_create_onboarding_workflow(user, body)
-        
-        # Update onboarding workflow
-        if path.startswith('/v1/onboarding/workflows/') and method == 'PUT':
-            workflow_id = path.split('/')[-1]
-            return handle_update_workflow(user, workflow_id, body)
-        
-        # Delete onboarding workflow
-        if path.startswith('/v1/onboarding/workflows/') and method == 'DELETE':
-            workflow_id = path.split('/')[-1]
-            return handle_delete_workflow(user, workflow_id)
-        
-        # ================================================================
-        # SEO TOOLS (Pro/Ultimate Feature)
-        # ================================================================
+                    return create_response(401, {'error': 'Authentication required'})
+                # Log authenticated request (without email for security)
+                print(f"Authenticated request from user: {user.get('id')}")
 
-        # Generate sitemap.xml
-        if path == '/v1/seo/sitemap' and method == 'GET':
-            return handle_generate_sitemap(user)
+        request = RequestContext(event, path, method, body, raw_body_str, params, user)
+        return route.call(route.handler, request)
 
-        # Generate Schema.org markup
-        if path == '/v1/seo/schema' and method == 'GET':
-            return handle_generate_schema_markup(user)
-        
-        # Schema markup endpoint (alternative path)
-        if path == '/v1/seo/schema-markup' and method == 'GET':
-            return handle_generate_schema_markup(user)
-
-        # Validate OG tags
-        if path == '/v1/seo/validate-og' and method == 'POST':
-            return handle_validate_og_tags(user, body)
-        
-        # Validate OG tags (alternative path)
-        if path == '/v1/seo/validate-og-tags' and method == 'POST':
-            return handle_validate_og_tags(user, body)
-
-        # Get SEO settings
-        if path == '/v1/seo/settings' and method == 'GET':
-            return handle_get_seo_settings(user)
-
-        # Update SEO settings
-        if path == '/v1/seo/settings' and method == 'PUT':
-            return handle_update_seo_settings(user, body)
-
-        # Get robots.txt
-        if path == '/v1/seo/robots.txt' and method == 'GET':
-            return handle_get_robots_txt(user)
-        
-        # SEO Score
-        if path == '/v1/seo/score' and method == 'GET':
-            return handle_get_seo_score(user)
-        
-        # SEO Issues
-        if path == '/v1/seo/issues' and method == 'GET':
-            return handle_get_seo_issues(user)
-        
-        # SEO Recommendations (NEW - Enhanced)
-        if path == '/v1/seo/recommendations' and method == 'GET':
-            from handlers.seo_handler import handle_get_seo_recommendations
-            return handle_get_seo_recommendations(user)
-        
-        # Fix SEO Issue
-        if path == '/v1/seo/fix-issue' and method == 'POST':
-            return handle_fix_seo_issue(user, body)
-        
-        # One-click SEO optimization
-        if path == '/v1/seo/optimize' and method == 'POST':
-            from handlers.seo_handler import handle_one_click_optimize
-            return handle_one_click_optimize(user)
-        
-        # Optimize All (alias for /seo/optimize)
-        if path == '/v1/seo/optimize-all' and method == 'POST':
-            from handlers.seo_handler import handle_one_click_optimize
-            return handle_one_click_optimize(user)
-        
-        # ================================================================
-        # ADMIN/SYSTEM ENDPOINTS
-        # ================================================================
-        
-        # Gallery cleanup endpoint removed - galleries never expire
-        
-        # ================================================================
-        # GDPR COMPLIANCE
-        # ================================================================
-        
-        # Export user data (GDPR Article 20 - Right to Data Portability)
-        if path == '/v1/gdpr/export-data' and method == 'POST':
-            return handle_export_user_data(user)
-        
-        # Get data retention information (GDPR Article 13)
-        if path == '/v1/gdpr/data-retention' and method == 'GET':
-            return handle_get_data_retention_info(user)
-        
-        # ================================================================
-        # FEATURE REQUESTS & FEEDBACK
-        # ================================================================
-        
-        # List feature requests
-        if path == '/v1/feature-requests' and method == 'GET':
-            return handle_list_feature_requests(event)
-        
-        # Submit feature request
-        if path == '/v1/feature-requests' and method == 'POST':
-            return handle_create_feature_request(event)
-        
-        # Vote/unvote on feature request
-        if path.startswith('/v1/feature-requests/') and '/vote' in path:
-            request_id = path.split('/')[3]
-            event['pathParameters'] = {'request_id': request_id}
-            
-            if method == 'POST':
-                return handle_vote_feature_request(event)
-            elif method == 'DELETE':
-                return handle_unvote_feature_request(event)
-        
-        # Update feature request status (admin only)
-        if path.startswith('/v1/feature-requests/') and '/status' in path:
-            request_id = path.split('/')[3]
-            event['pathParameters'] = {'request_id': request_id}
-            
-            if method == 'PUT':
-                return handle_update_feature_request_status(event)
-        
-        # ================================================================
-        # ADMIN ENDPOINTS - Plan Management & Monitoring
-        # ================================================================
-        
-        # Grant feature to user
-        if path.startswith('/v1/admin/users/') and path.endswith('/features') and method == 'POST':
-            from handlers.admin_plan_handler import handle_grant_feature
-            user_id = path.split('/')[3]
-            body['user_id'] = user_id
-            return handle_grant_feature(user, body)
-        
-        # Revoke feature from user
-        if path.startswith('/v1/admin/users/') and '/features/' in path and method == 'DELETE':
-            from handlers.admin_plan_handler import handle_revoke_feature
-            parts = path.split('/')
-            user_id = parts[3]
-            feature_id = parts[5]
-            return handle_revoke_feature(user, user_id, feature_id)
-        
-        # List user feature overrides
-        if path.startswith('/v1/admin/users/') and path.endswith('/features') and method == 'GET':
-            from handlers.admin_plan_handler import handle_list_user_overrides
-            user_id = path.split('/')[3]
-            return handle_list_user_overrides(user, user_id)
-        
-        # Change user plan
-        if path.startswith('/v1/admin/users/') and path.endswith('/plan') and method == 'POST':
-            from handlers.admin_plan_handler import handle_upgrade_user_plan
-            user_id = path.split('/')[3]
-            body['user_id'] = user_id
-            return handle_upgrade_user_plan(user, body)
-        
-        # Get platform violations summary
-        if path == '/v1/admin/violations' and method == 'GET':
-            from handlers.admin_plan_handler import handle_get_plan_violations
-            query_params = event.get('queryStringParameters', {})
-            return handle_get_plan_violations(user, query_params)
-        
-        # Get user-specific violations
-        if path.startswith('/v1/admin/users/') and path.endswith('/violations') and method == 'GET':
-            from handlers.admin_plan_handler import handle_get_user_violations
-            user_id = path.split('/')[3]
-            query_params = event.get('queryStringParameters', {})
-            return handle_get_user_violations(user, user_id, query_params)
-        
-        # ================================================================
-        # 404 - Endpoint not found
-        # ================================================================
-        return create_response(404, {
-            'error': 'Endpoint not found',
-            'path': path,
-            'method': method
-        })
-    
     except Exception as e:
         error_msg = str(e) if e else 'Unknown error'
         error_type = type(e).__name__
@@ -1796,6 +906,9 @@ def handler(event, context):
             'path': path,
             'method': method
         })
+    finally:
+        flush_event_buffer(f"{method} {path}")
+        end_request_scope(f"{method} {path}")
 
 # For local development - run Flask directly
 if __name__ == '__main__':
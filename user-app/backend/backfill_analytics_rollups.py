@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Galerly - Analytics Rollup Backfill
+Rebuilds galerly-analytics-rollups rows (per gallery-day and per
+gallery-photo-day counters, per gallery-day visitor sketches) from the raw
+events in galerly-analytics.
+New events maintain the rollups themselves (analytics_handler.track_event ->
+utils/analytics_rollups.py).
+
+Order: create the table with setup_dynamodb.py, deploy the ingest change,
+then run this on a later day. Only days before --until (default: today,
+UTC) are rebuilt, and their rows are overwritten with counts computed from
+the raw events - which are still written for every event - so days the
+ingest path already touched are not counted twice.
+
+Safe to re-run: rows are rebuilt from scratch every time.
+
+Usage:
+    python backfill_analytics_rollups.py                       # rebuild days before today
+    python backfill_analytics_rollups.py --until 2026-10-01    # rebuild days before a date
+    python backfill_analytics_rollups.py --dry-run             # count only
+"""
+import argparse
+import sys
+from datetime import datetime, timezone
+
+from utils.config import analytics_table, analytics_rollups_table
+from utils.analytics_rollups import build_rollups
+
+
+def iter_events(until_day):
+    """Scan raw events page by page (rollup fields only), before until_day"""
+    scan_kwargs = {
+        'ProjectionExpression': 'gallery_id, user_id, event_type, #ts, metadata',
+        'ExpressionAttributeNames': {'#ts': 'timestamp'}
+    }
+    while True:
+        response = analytics_table.scan(**scan_kwargs)
+        for event in response.get('Items', []):
+            if (event.get('timestamp') or '')[:10] < until_day:
+                yield event
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def counted(events, progress_every=10000):
+    """Pass events through, printing progress"""
+    for count, event in enumerate(events, 1):
+        if count % progress_every == 0:
+            print(f"   ... {count} events scanned")
+        yield event
+
+
+def backfill(until_day, dry_run=False):
+    """Rebuild rollup rows for days before until_day; returns (rows, errors)"""
+    rows = build_rollups(counted(iter_events(until_day)))
+    if dry_run:
+        return len(rows), 0
+
+    errors = 0
+    with analytics_rollups_table.batch_writer() as batch:
+        for (gallery_id, rollup_key), row in rows.items():
+            try:
+                batch.put_item(Item=row)
+            except Exception as e:
+                errors += 1
+                print(f"❌ Rollup {gallery_id}/{rollup_key}: {str(e)}")
+    return len(rows), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild analytics rollups from raw events')
+    parser.add_argument('--until', help='First day NOT rebuilt, YYYY-MM-DD (default: today, UTC)')
+    parser.add_argument('--dry-run', action='store_true', help='Count rows without writing')
+    args = parser.parse_args()
+
+    until_day = args.until or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    try:
+        datetime.strptime(until_day, '%Y-%m-%d')
+    except ValueError:
+        parser.error('--until must be YYYY-MM-DD')
+
+    print("=" * 60)
+    print("ANALYTICS ROLLUP BACKFILL" + (" (DRY RUN)" if args.dry_run else ""))
+    print("=" * 60)
+    print(f"Rebuilding days before {until_day}")
+
+    rows, errors = backfill(until_day, dry_run=args.dry_run)
+
+    print(f"\nRollup rows {'to write' if args.dry_run else 'written'}: {rows}")
+    if errors:
+        print(f"❌ Errors: {errors}")
+        return 1
+    print("✅ Done")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
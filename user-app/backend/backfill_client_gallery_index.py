@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Galerly - Client Gallery Index Backfill
+Builds galerly-client-galleries (client_email -> gallery) rows for every
+existing gallery. New and updated galleries maintain the index themselves
+(see utils/client_gallery_index.py); run this once after creating the table
+with setup_dynamodb.py, before deploying the client dashboard change.
+
+Safe to re-run: rows are keyed by (client_email, gallery_id) so existing
+rows are simply overwritten.
+
+Usage:
+    python backfill_client_gallery_index.py            # write rows
+    python backfill_client_gallery_index.py --dry-run  # count only
+"""
+import argparse
+import sys
+
+from utils.config import galleries_table
+from utils.client_gallery_index import sync_client_gallery_index, get_gallery_client_emails
+
+
+def iter_galleries():
+    """Scan the galleries table page by page (keys + client fields only)"""
+    scan_kwargs = {
+        'ProjectionExpression': 'user_id, id, client_emails, client_email, created_at'
+    }
+    while True:
+        response = galleries_table.scan(**scan_kwargs)
+        for gallery in response.get('Items', []):
+            yield gallery
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def backfill(dry_run=False):
+    """Write index rows for all galleries; returns (galleries_scanned, rows_written, errors)"""
+    scanned = 0
+    rows = 0
+    errors = 0
+
+    for gallery in iter_galleries():
+        scanned += 1
+        emails = get_gallery_client_emails(gallery)
+        if not emails:
+            continue
+
+        if not dry_run:
+            try:
+                sync_client_gallery_index(gallery)
+            except Exception as e:
+                errors += 1
+                print(f"❌ Gallery {gallery.get('id')}: {str(e)}")
+                continue
+        rows += len(emails)
+
+        if scanned % 500 == 0:
+            print(f"   ... {scanned} galleries scanned, {rows} index rows")
+
+    return scanned, rows, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill the client_email -> gallery reverse index')
+    parser.add_argument('--dry-run', action='store_true', help='Count rows without writing')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("CLIENT GALLERY INDEX BACKFILL" + (" (DRY RUN)" if args.dry_run else ""))
+    print("=" * 60)
+
+    scanned, rows, errors = backfill(dry_run=args.dry_run)
+
+    print(f"\nGalleries scanned: {scanned}")
+    print(f"Index rows {'to write' if args.dry_run else 'written'}: {rows}")
+    if errors:
+        print(f"❌ Errors: {errors}")
+        return 1
+    print("✅ Done")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
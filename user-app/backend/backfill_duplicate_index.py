@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Galerly - Duplicate Index Backfill
+Sets the duplicate-detection index attributes on every existing photo:
+name_size (GalleryNameSizeIndex) and file_hash (UserFileHashIndex). New
+uploads set them themselves (see utils/duplicate_detector.py
+duplicate_index_fields).
+
+Order matters: run this BEFORE creating the two indexes with
+manage_indexes.py. Older records may hold file_hash = '' and DynamoDB
+refuses to index an empty string key, so those values are removed here.
+
+Safe to re-run: records that already have the right values are skipped.
+
+Usage:
+    python backfill_duplicate_index.py            # update records
+    python backfill_duplicate_index.py --dry-run  # count only
+"""
+import argparse
+import sys
+
+from utils.config import photos_table
+from utils.duplicate_detector import name_size_key
+
+
+def iter_photos():
+    """Scan the photos table page by page (key + duplicate fields only)"""
+    scan_kwargs = {
+        'ProjectionExpression': 'id, filename, file_size, file_hash, name_size'
+    }
+    while True:
+        response = photos_table.scan(**scan_kwargs)
+        for photo in response.get('Items', []):
+            yield photo
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def photo_update(photo):
+    """update_item kwargs bringing the record in line, or None when it already is"""
+    sets = {}
+    removes = []
+    key = name_size_key(photo.get('filename'), photo.get('file_size'))
+    if key and photo.get('name_size') != key:
+        sets['name_size'] = key
+    elif not key and 'name_size' in photo:
+        removes.append('name_size')
+    if 'file_hash' in photo and not photo['file_hash']:
+        removes.append('file_hash')
+    if not sets and not removes:
+        return None
+
+    clauses = []
+    if sets:
+        clauses.append('SET ' + ', '.join(f'{name} = :{name}' for name in sets))
+    if removes:
+        clauses.append('REMOVE ' + ', '.join(removes))
+    update = {
+        'Key': {'id': photo['id']},
+        'UpdateExpression': ' '.join(clauses)
+    }
+    if sets:
+        update['ExpressionAttributeValues'] = {f':{name}': value for name, value in sets.items()}
+    return update
+
+
+def backfill(dry_run=False):
+    """Update all photos; returns (photos_scanned, photos_updated, errors)"""
+    scanned = 0
+    updated = 0
+    errors = 0
+
+    for photo in iter_photos():
+        scanned += 1
+        update = photo_update(photo)
+        if update is None:
+            continue
+
+        if not dry_run:
+            try:
+                photos_table.update_item(**update)
+            except Exception as e:
+                errors += 1
+                print(f"❌ Photo {photo.get('id')}: {str(e)}")
+                continue
+        updated += 1
+
+        if scanned % 1000 == 0:
+            print(f"   ... {scanned} photos scanned, {updated} updated")
+
+    return scanned, updated, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill the duplicate-detection index attributes on photos')
+    parser.add_argument('--dry-run', action='store_true', help='Count updates without writing')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("DUPLICATE INDEX BACKFILL" + (" (DRY RUN)" if args.dry_run else ""))
+    print("=" * 60)
+
+    scanned, updated, errors = backfill(dry_run=args.dry_run)
+
+    print(f"\nPhotos scanned: {scanned}")
+    print(f"Photos {'to update' if args.dry_run else 'updated'}: {updated}")
+    if errors:
+        print(f"❌ Errors: {errors}")
+        return 1
+    print("✅ Done")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
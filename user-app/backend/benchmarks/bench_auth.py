@@ -0,0 +1,105 @@
+"""
+Auth overhead benchmark for utils.auth session validation
+Measures per-request cost of get_user_from_token + get_session (what one
+authenticated request with a security decorator does) against a fake
+sessions table with a configurable round-trip latency.
+
+Scenarios:
+    uncached        session cache cleared before every request (old behaviour:
+                    two GetItem calls per request)
+    cached          warm container, session already validated
+    signed/cached   HMAC-signed token, warm container
+    signed/forged   tampered signed token, rejected without a table read
+
+Usage (from user-app/backend, with the usual environment loaded):
+    python benchmarks/bench_auth.py
+    python benchmarks/bench_auth.py --latency-ms 8 --requests 2000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+USER = {'id': 'user_bench', 'email': 'bench@example.com', 'name': 'Bench', 'role': 'photographer'}
+
+
+class FakeSessionsTable:
+    """sessions_table stand-in that sleeps for one DynamoDB round trip per call"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.created_at = datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+
+    def get_item(self, Key):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return {'Item': {'token': Key['token'], 'user': USER, 'created_at': self.created_at}}
+
+    def delete_item(self, Key):
+        self.calls += 1
+
+
+def run_scenario(auth, table, token, requests, clear_each_time):
+    event = {'headers': {'Cookie': f'galerly_session={token}'}}
+    auth.clear_session_cache()
+    table.calls = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        if clear_each_time:
+            auth.clear_session_cache()
+        auth.get_user_from_token(event)
+        if clear_each_time:
+            auth.clear_session_cache()
+        auth.get_session(token)
+    elapsed = time.perf_counter() - start
+    return elapsed / requests, table.calls / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=4.0,
+                        help='Simulated GetItem round trip (default: 4 ms, in-region p50)')
+    args = parser.parse_args()
+
+    os.environ.setdefault('SESSION_SIGNING_KEY', 'bench-signing-key')
+    from utils import auth
+
+    table = FakeSessionsTable(args.latency_ms / 1000.0)
+    plain_token = 'plain-' + auth.generate_secure_token(32)
+    signed_token = auth.generate_session_token(USER['id'])
+    prefix, nonce, user_id, expires, signature = signed_token.split('.')
+    forged_token = '.'.join([prefix, nonce, auth._b64encode(b'admin'), expires, signature])
+
+    scenarios = [
+        ('uncached', plain_token, True),
+        ('cached', plain_token, False),
+        ('signed/cached', signed_token, False),
+        ('signed/forged', forged_token, False),
+    ]
+
+    print("=" * 60)
+    print("AUTH OVERHEAD BENCHMARK")
+    print("=" * 60)
+    print(f"\n{args.requests} requests, simulated GetItem latency {args.latency_ms:.1f} ms")
+    print(f"session cache TTL {auth.SESSION_CACHE_TTL_SECONDS}s (revocation window)\n")
+
+    with patch.object(auth, 'sessions_table', table), \
+         patch.object(auth, 'get_user_from_api_key', return_value=None):
+        baseline = None
+        for name, token, clear_each_time in scenarios:
+            per_request, reads = run_scenario(auth, table, token, args.requests, clear_each_time)
+            baseline = baseline or per_request
+            print(f"   {name:<15} {per_request * 1e6:10.1f} us/request   "
+                  f"{reads:5.2f} table reads/request   {baseline / per_request:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Rendition format report for utils.rendition_core
+Encodes every rendition size as JPEG (the always-on renditions) and as each
+modern format in MODERN_FORMATS, using the production qualities and encoder
+options, and reports bytes and encode time per size relative to JPEG.
+
+--sweep additionally times the WebP `method` and AVIF `speed` settings on the
+medium rendition, which is how ENCODER_OPTIONS was chosen.
+
+Corpus:
+    By default a synthetic 24MP photo-like image (gradients plus grain) is
+    used. Point --corpus at a directory of real JPEG/PNG samples for numbers
+    that reflect actual galleries - synthetic grain compresses differently.
+
+Usage (from user-app/backend, with the usual environment loaded):
+    python benchmarks/bench_formats.py
+    python benchmarks/bench_formats.py --corpus ~/samples --output format-report.md
+    python benchmarks/bench_formats.py --sweep
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from PIL import Image
+
+
+def synthetic_photo(size=(6000, 4000)):
+    """Photo-like test image: smooth gradients plus grain"""
+    import numpy as np
+    width, height = size
+    rng = np.random.default_rng(7)
+    small = rng.integers(0, 255, (height // 64 + 1, width // 64 + 1, 3), dtype=np.uint8)
+    base = Image.fromarray(small).resize(size, Image.Resampling.BICUBIC)
+    noise = rng.normal(0, 6, (height, width, 3))
+    return Image.fromarray((np.asarray(base, dtype=np.float32) + noise).clip(0, 255).astype(np.uint8))
+
+
+def load_corpus(corpus_dir):
+    """list of (label, RGB image)"""
+    if not corpus_dir:
+        return [('synthetic 24MP', synthetic_photo())]
+    images = []
+    for name in sorted(os.listdir(corpus_dir)):
+        try:
+            image = Image.open(os.path.join(corpus_dir, name))
+            image.load()
+            images.append((name, image.convert('RGB')))
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+    return images
+
+
+def encode(rendition_core, image, image_format, quality, options):
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality, **options)
+    return len(buffer.getvalue()), time.perf_counter() - start
+
+
+def measure(rendition_core, images, runs):
+    """
+    Returns:
+        {(size_name, format_name): (median bytes, median seconds)} over the corpus
+    """
+    formats = {'jpeg': ('JPEG', {name: spec['quality'] for name, spec in rendition_core.RENDITION_OUTPUTS.items()})}
+    for name, spec in rendition_core.MODERN_FORMATS.items():
+        if rendition_core.encoder_available(spec['format']):
+            formats[name] = (spec['format'], spec['quality'])
+        else:
+            print(f"{spec['format']} encoder not available in this Pillow build - skipping {name}")
+
+    samples = {}
+    for _, image in images:
+        for size_name, spec in rendition_core.RENDITION_OUTPUTS.items():
+            rendition = image.resize(rendition_core.fit_within(image.size, spec['box']), Image.Resampling.LANCZOS)
+            for format_name, (image_format, qualities) in formats.items():
+                if size_name not in qualities:
+                    continue
+                options = rendition_core.ENCODER_OPTIONS.get(image_format, {})
+                timings = []
+                for _ in range(runs):
+                    size, elapsed = encode(rendition_core, rendition, image_format, qualities[size_name], options)
+                    timings.append(elapsed)
+                samples.setdefault((size_name, format_name), []).append((size, statistics.median(timings)))
+
+    return {key: (statistics.median(s for s, _ in values), statistics.median(t for _, t in values))
+            for key, values in samples.items()}, list(formats)
+
+
+def render_report(rendition_core, results, format_names, corpus_label):
+    lines = [
+        f"# Rendition format report ({corpus_label})",
+        "",
+        "| size | format | quality | bytes | vs JPEG | encode ms | vs JPEG |",
+        "|---|---|---|---:|---:|---:|---:|",
+    ]
+    for size_name, spec in rendition_core.RENDITION_OUTPUTS.items():
+        jpeg_bytes, jpeg_time = results[(size_name, 'jpeg')]
+        for format_name in format_names:
+            if (size_name, format_name) not in results:
+                continue
+            size, elapsed = results[(size_name, format_name)]
+            quality = spec['quality'] if format_name == 'jpeg' else \
+                rendition_core.MODERN_FORMATS[format_name]['quality'][size_name]
+            lines.append(f"| {size_name} | {format_name} | {quality} | {size:,.0f} | {size / jpeg_bytes:.0%} "
+                         f"| {elapsed * 1000:.1f} | {elapsed / jpeg_time:.1f}x |")
+    return "\n".join(lines)
+
+
+def sweep(rendition_core, images):
+    """WebP method / AVIF speed trade-off on the medium rendition"""
+    image = images[0][1]
+    medium = image.resize(rendition_core.fit_within(image.size, rendition_core.RENDITION_OUTPUTS['medium']['box']),
+                          Image.Resampling.LANCZOS)
+    settings = [('WEBP', 'method', range(0, 7), rendition_core.MODERN_FORMATS['webp']['quality']['medium']),
+                ('AVIF', 'speed', range(2, 11, 2), rendition_core.MODERN_FORMATS['avif']['quality']['medium'])]
+    print("\nEncoder sweep (medium rendition)")
+    for image_format, option, values, quality in settings:
+        if not rendition_core.encoder_available(image_format):
+            continue
+        for value in values:
+            size, elapsed = encode(rendition_core, medium, image_format, quality, {option: value})
+            print(f"   {image_format} {option}={value:<3} {size:>10,} bytes {elapsed * 1000:9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='Directory of real JPEG/PNG samples')
+    parser.add_argument('--runs', type=int, default=3, help='Encodes per rendition (median)')
+    parser.add_argument('--output', help='Also write the markdown report to this file')
+    parser.add_argument('--sweep', action='store_true', help='Time WebP method / AVIF speed settings')
+    args = parser.parse_args()
+
+    from utils import rendition_core
+
+    print("=" * 60)
+    print("RENDITION FORMAT BENCHMARK")
+    print("=" * 60)
+    images = load_corpus(args.corpus)
+    corpus_label = args.corpus or 'synthetic 24MP'
+    print(f"\n{len(images)} source images, {args.runs} encodes each (median)\n")
+
+    results, format_names = measure(rendition_core, images, args.runs)
+    report = render_report(rendition_core, results, format_names, corpus_label)
+    print(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + "\n")
+        print(f"\nReport written to {args.output}")
+
+    if args.sweep:
+        sweep(rendition_core, images)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Near-duplicate search benchmark for utils.duplicate_detector
+Times the banded Hamming search (near_duplicate_pairs) that
+find_near_duplicates runs over an account's perceptual hashes, against a
+chunked all-pairs comparison, and a single-photo lookup (hamming_distances)
+against the whole collection. The target is well under a second at 50k
+photos per account.
+
+Only the in-memory search is timed - loading the hashes from DynamoDB
+(one projected UserIdIndex query) comes on top.
+
+Corpus:
+    By default uniform random 64-bit hashes are generated, with --dup-rate of
+    them replaced by near copies (1 to --max-distance flipped bits) of other
+    hashes. Real photo hashes are less uniform (dark or low-contrast shots
+    share many bits), which puts more candidates in each band - point
+    --corpus at a directory of real JPEG/PNG samples to hash those and
+    sample the collection from them (each sample with random bit noise).
+
+Usage (from user-app/backend, with the usual environment loaded):
+    python benchmarks/bench_near_duplicates.py
+    python benchmarks/bench_near_duplicates.py --photos 1000 10000 50000 100000 --max-distance 8
+    python benchmarks/bench_near_duplicates.py --corpus ~/samples --photos 50000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import numpy as np
+
+
+def flip_bits(rng, hashes, max_bits):
+    """Each hash with 1..max_bits random bits flipped"""
+    noisy = hashes.copy()
+    for index in range(len(noisy)):
+        bits = rng.choice(64, size=int(rng.integers(1, max_bits + 1)), replace=False)
+        noisy[index] ^= np.uint64(sum(1 << int(bit) for bit in bits))
+    return noisy
+
+
+def synthetic_hashes(rng, count, dup_rate, max_distance, base=None):
+    """count hashes (uniform, or sampled from base with noise) plus planted near copies"""
+    if base is None:
+        hashes = rng.integers(0, 2 ** 64, size=count, dtype=np.uint64)
+    else:
+        hashes = flip_bits(rng, base[rng.integers(0, len(base), size=count)], 16)
+    copies = int(count * dup_rate)
+    if copies:
+        originals = rng.choice(count, size=copies, replace=False)
+        targets = rng.choice(count, size=copies, replace=False)
+        hashes[targets] = flip_bits(rng, hashes[originals], max(max_distance, 1))
+    return hashes
+
+
+def corpus_hashes(corpus_dir):
+    """uint64 perceptual hashes of the images in corpus_dir"""
+    from PIL import Image
+    from utils.rendition_core import perceptual_hash
+    values = []
+    for name in sorted(os.listdir(corpus_dir)):
+        try:
+            with Image.open(os.path.join(corpus_dir, name)) as image:
+                image.draft('RGB', (400, 400))
+                values.append(perceptual_hash(image))
+        except Exception:
+            continue
+    return np.array([int(value, 16) for value in values], dtype=np.uint64)
+
+
+def brute_force_pairs(hashes, max_distance, chunk=2048):
+    """All-pairs comparison in row blocks (the obvious vectorized version)"""
+    from utils.duplicate_detector import _popcount
+    found = 0
+    for start in range(0, len(hashes), chunk):
+        block = hashes[start:start + chunk]
+        distances = _popcount(block[:, None] ^ hashes[None, start:])
+        # Upper triangle only: row i of the block is hash start + i
+        close = distances <= max_distance
+        close[np.arange(len(block)), np.arange(len(block))] = False
+        close[np.tril_indices(len(block), -1, m=close.shape[1])] = False
+        found += int(close.sum())
+    return found
+
+
+def timed(function, runs):
+    timings = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--photos', type=int, nargs='+', default=[1000, 10000, 50000],
+                        help='Collection sizes to search')
+    parser.add_argument('--max-distance', type=int, default=None,
+                        help='Hamming threshold (default NEAR_DUPLICATE_MAX_DISTANCE)')
+    parser.add_argument('--dup-rate', type=float, default=0.05, help='Share of planted near copies')
+    parser.add_argument('--corpus', help='Directory of real images to sample hashes from')
+    parser.add_argument('--brute-max', type=int, default=20000,
+                        help='Largest collection also searched all-pairs (slow)')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per measurement (median)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from utils import duplicate_detector
+    max_distance = args.max_distance
+    if max_distance is None:
+        max_distance = duplicate_detector.NEAR_DUPLICATE_MAX_DISTANCE
+    rng = np.random.default_rng(args.seed)
+
+    print("=" * 60)
+    print("NEAR-DUPLICATE SEARCH BENCHMARK")
+    print("=" * 60)
+    base = None
+    if args.corpus:
+        base = corpus_hashes(args.corpus)
+        if not len(base):
+            sys.exit(f"No readable images in {args.corpus}")
+        print(f"Sampling from {len(base)} corpus hashes")
+    print(f"max_distance={max_distance}, dup_rate={args.dup_rate}")
+    print(f"\n{'photos':>8} {'parse ms':>9} {'banded ms':>10} {'pairs':>8} | {'all-pairs ms':>12} {'pairs':>8} | "
+          f"{'lookup ms':>9}")
+
+    for count in args.photos:
+        hashes = synthetic_hashes(rng, count, args.dup_rate, max_distance, base)
+        hex_hashes = [f"{int(value):016x}" for value in hashes]
+
+        parse_time, _ = timed(lambda: duplicate_detector.hash_array(hex_hashes), args.runs)
+        banded_time, (first, _, _) = timed(
+            lambda: duplicate_detector.near_duplicate_pairs(hashes, max_distance), args.runs)
+        lookup_time, _ = timed(lambda: duplicate_detector.hamming_distances(hashes, int(hashes[0])), args.runs)
+
+        if count <= args.brute_max:
+            brute_time, brute_pairs = timed(lambda: brute_force_pairs(hashes, max_distance), 1)
+            brute = f"{brute_time * 1000:12.1f} {brute_pairs:8d}"
+            if brute_pairs != len(first):
+                brute += "  MISMATCH"
+        else:
+            brute = f"{'-':>12} {'-':>8}"
+        print(f"{count:8d} {parse_time * 1000:9.1f} {banded_time * 1000:10.1f} {len(first):8d} | {brute} | "
+              f"{lookup_time * 1000:9.3f}")
+
+
+if __name__ == '__main__':
+    main()
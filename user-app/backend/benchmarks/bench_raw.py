@@ -0,0 +1,133 @@
+"""
+RAW decode tier benchmark for utils.raw_processor
+For every RAW sample and every preview size, times decode_raw with the tier
+it picks (embedded preview / half_size demosaic / full demosaic) against the
+previous behaviour (always a full demosaic), and reports the peak memory of
+each decode.
+
+Peak memory is the process high-water mark above the RSS at the start of the
+decode (measure_peak_memory), so LibRaw's native buffers are included. It needs Linux /proc; elsewhere it is reported as '?'.
+
+Corpus:
+    RAW files cannot be synthesized - point --corpus at a directory of real
+    samples (.nef/.cr2/.cr3/.arw/.dng/.raf/...). Embedded preview sizes vary
+    a lot by camera (Canon CR2 and Nikon NEF usually embed a full-size JPEG,
+    some Fujifilm/Olympus bodies only 1-2MP), so use files from the cameras
+    your customers shoot with. Needs rawpy.
+
+Usage (from user-app/backend, with the usual environment loaded):
+    python benchmarks/bench_raw.py --corpus ~/raw-samples
+    python benchmarks/bench_raw.py --corpus ~/raw-samples --sizes thumbnail medium large --runs 3
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def load_corpus(raw_processor, corpus_dir):
+    """list of (name, bytes) for the RAW files in corpus_dir"""
+    samples = []
+    for name in sorted(os.listdir(corpus_dir)):
+        if raw_processor.is_raw_file(name):
+            with open(os.path.join(corpus_dir, name), 'rb') as f:
+                samples.append((name, f.read()))
+    return samples
+
+
+def _read_status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return None
+
+
+@contextlib.contextmanager
+def measure_peak_memory():
+    """
+    Peak resident memory reached inside the block, in MB above the RSS on entry
+
+    Uses the Linux high-water mark (VmHWM), reset on entry through
+    /proc/self/clear_refs, so LibRaw's native buffers are counted too. The mark
+    is process-wide, so this is only safe with one decode at a time - here,
+    not in decode_raw. Yields a dict whose 'peak_mb' is filled in on exit
+    (None where /proc is not available).
+    """
+    stats = {'peak_mb': None}
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        baseline = _read_status_kb('VmRSS')
+    except (OSError, ValueError):
+        baseline = None
+    try:
+        yield stats
+    finally:
+        if baseline is not None:
+            try:
+                stats['peak_mb'] = round(max(_read_status_kb('VmHWM') - baseline, 0) / 1024, 1)
+            except (OSError, TypeError, ValueError):
+                pass
+
+
+def time_decode(raw_processor, raw_data, size, tier, runs):
+    """Median seconds and peak MB of decode_raw over runs"""
+    timings, peaks = [], []
+    decoded = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), measure_peak_memory() as memory:
+            decoded = raw_processor.decode_raw(raw_data, size=size, tier=tier)
+        timings.append(time.perf_counter() - start)
+        peaks.append(memory['peak_mb'])
+        decoded['image'].close()
+    peak = max(peaks) if None not in peaks else None
+    return statistics.median(timings), peak, decoded['tier']
+
+
+def fmt_peak(peak):
+    return f"{peak:8.0f}" if peak is not None else "       ?"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', required=True, help='Directory of real RAW samples')
+    parser.add_argument('--sizes', nargs='+', help='Preview sizes (default: all of RAW_PREVIEW_SIZES)')
+    parser.add_argument('--runs', type=int, default=1, help='Decodes per measurement (median time, max peak)')
+    args = parser.parse_args()
+
+    from utils import raw_processor
+    if not raw_processor.RAW_SUPPORT_AVAILABLE:
+        sys.exit("rawpy is not installed - RAW decoding unavailable")
+
+    print("=" * 60)
+    print("RAW DECODE TIER BENCHMARK")
+    print("=" * 60)
+    samples = load_corpus(raw_processor, args.corpus)
+    if not samples:
+        sys.exit(f"No RAW files in {args.corpus}")
+    sizes = args.sizes or list(raw_processor.RAW_PREVIEW_SIZES)
+
+    for name, raw_data in samples:
+        print(f"\n{name} ({len(raw_data) / (1024 * 1024):.1f} MB)")
+        print(f"   {'size':<10} {'tier':<9} {'ms':>8} {'peak MB':>8} | {'full ms':>8} {'peak MB':>8} | speedup")
+        full_cache = {}
+        for size in sizes:
+            elapsed, peak, tier = time_decode(raw_processor, raw_data, size, None, args.runs)
+            # A full demosaic costs the same for every resized size except 'original'
+            if 'full' not in full_cache:
+                full_cache['full'] = time_decode(raw_processor, raw_data, size, 'full', args.runs)
+            full_elapsed, full_peak, _ = full_cache['full']
+            print(f"   {size:<10} {tier:<9} {elapsed * 1000:8.0f} {fmt_peak(peak)} | "
+                  f"{full_elapsed * 1000:8.0f} {fmt_peak(full_peak)} | {full_elapsed / elapsed:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
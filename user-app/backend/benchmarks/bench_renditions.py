@@ -0,0 +1,197 @@
+"""
+Rendition benchmark for utils.image_processor.generate_renditions
+Compares the previous pipeline (full-resolution copy + LANCZOS thumbnail per
+size, sequential uploads) with the single-decode pyramid (JPEG draft mode,
+each size derived from the next-larger one, parallel encode/upload).
+
+Multi-record events: measures images/second for one S3 event with --records
+uploads, processed one after another (the old Lambda loop) versus
+concurrently through rendition_core.render_many (what the image-processing
+Lambda does now).
+
+S3 is replaced by a stub that sleeps for --put-latency-ms per PutObject and
+--get-latency-ms per GetObject, so parallelism is visible without network
+access.
+
+Corpus:
+    By default synthetic 24MP (6000x4000) and 45MP (8256x5504) JPEGs are
+    generated, plus a 24MP HEIC when pillow-heif is installed. Point
+    --corpus at a directory of real samples (.jpg/.heic/.nef/.cr3/.arw/...)
+    to include RAW files; RAW files need rawpy.
+
+Usage (from user-app/backend, with the usual environment loaded):
+    python benchmarks/bench_renditions.py
+    python benchmarks/bench_renditions.py --corpus ~/samples --runs 3
+    python benchmarks/bench_renditions.py --records 16 --record-workers 4
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+from unittest.mock import patch
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from PIL import Image
+
+SYNTHETIC_SIZES = {'24MP': (6000, 4000), '45MP': (8256, 5504)}
+
+
+class StubS3:
+    """s3_client stand-in: PutObject/GetObject cost a fixed latency"""
+
+    def __init__(self, latency, get_latency=0.0):
+        self.latency = latency
+        self.get_latency = get_latency
+        self.objects = {}
+        self.puts = 0
+
+    def put_object(self, **kwargs):
+        self.puts += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_object(self, Bucket, Key):
+        if self.get_latency:
+            time.sleep(self.get_latency)
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+
+def synthetic_image(size):
+    """Photo-like test image: smooth gradients plus noise, so JPEG sizes are realistic"""
+    import numpy as np
+    width, height = size
+    rng = np.random.default_rng(42)
+    small = rng.integers(0, 255, (height // 64 + 1, width // 64 + 1, 3), dtype=np.uint8)
+    base = Image.fromarray(small).resize(size, Image.Resampling.BICUBIC)
+    noise = rng.normal(0, 12, (height, width, 3))
+    return Image.fromarray((np.asarray(base, dtype=np.float32) + noise).clip(0, 255).astype(np.uint8))
+
+
+def build_corpus(corpus_dir):
+    """list of (label, filename, bytes)"""
+    samples = []
+    if corpus_dir:
+        for name in sorted(os.listdir(corpus_dir)):
+            path = os.path.join(corpus_dir, name)
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    samples.append((name, name, f.read()))
+        return samples
+
+    for label, size in SYNTHETIC_SIZES.items():
+        output = io.BytesIO()
+        synthetic_image(size).save(output, format='JPEG', quality=92)
+        samples.append((f"JPEG {label}", 'sample.jpg', output.getvalue()))
+
+    try:
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+        output = io.BytesIO()
+        synthetic_image(SYNTHETIC_SIZES['24MP']).save(output, format='HEIF', quality=90)
+        Image.open(io.BytesIO(output.getvalue())).load()
+        samples.append(('HEIC 24MP', 'sample.heic', output.getvalue()))
+    except ImportError:
+        print("pillow-heif not installed - skipping HEIC sample")
+    except Exception as e:
+        print(f"pillow-heif can't round-trip a sample here ({e}) - skipping HEIC sample")
+    print("No RAW samples without --corpus (RAW files can't be synthesized)")
+    return samples
+
+
+def legacy_renditions(image_processor, s3_key, image_data):
+    """The pre-pyramid loop: decode, then copy + thumbnail + save + put per size"""
+    image = Image.open(io.BytesIO(image_data))
+    image.load()
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    for size_name, box in image_processor.RENDITION_SIZES.items():
+        img_copy = image.copy()
+        img_copy.thumbnail(box, Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        img_copy.save(output, format='JPEG', quality=85, optimize=True)
+        image_processor.s3_client.put_object(Bucket='bench', Key=f"{s3_key}_{size_name}.jpg",
+                                             Body=output.getvalue(), ContentType='image/jpeg')
+
+
+def time_runs(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='Directory of real sample files')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--put-latency-ms', type=float, default=40.0,
+                        help='Simulated PutObject latency for a multi-MB body (default: 40 ms)')
+    parser.add_argument('--get-latency-ms', type=float, default=150.0,
+                        help='Simulated GetObject latency for a 10-25 MB original (default: 150 ms)')
+    parser.add_argument('--records', type=int, default=8, help='Records in the multi-record event')
+    parser.add_argument('--record-workers', type=int, default=None,
+                        help='Concurrent records (default: rendition_core.RECORD_WORKERS)')
+    args = parser.parse_args()
+
+    from utils import image_processor, rendition_core
+
+    print("=" * 60)
+    print("RENDITION BENCHMARK")
+    print("=" * 60)
+    samples = build_corpus(args.corpus)
+    print(f"\n{len(samples)} samples, {args.runs} runs each (median), "
+          f"PutObject latency {args.put_latency_ms:.0f} ms, {rendition_core.RENDITION_WORKERS} workers\n")
+    print(f"   {'sample':<22} {'legacy':>10} {'pyramid':>10} {'speedup':>9}")
+
+    stub = StubS3(args.put_latency_ms / 1000.0)
+    with patch.object(image_processor, 's3_client', stub):
+        for label, filename, data in samples:
+            s3_key = f"bench/{filename}"
+            pyramid = time_runs(lambda: image_processor.generate_renditions(s3_key, image_data=data), args.runs)
+            if image_processor.is_raw_file(filename):
+                # The legacy loop only differs after decode; RAW decode is covered by bench_raw
+                legacy = None
+            else:
+                legacy = time_runs(lambda: legacy_renditions(image_processor, s3_key, data), args.runs)
+            legacy_text = f"{legacy * 1000:8.0f}ms" if legacy else f"{'n/a':>10}"
+            speedup = f"{legacy / pyramid:8.1f}x" if legacy else f"{'':>9}"
+            print(f"   {label:<22} {legacy_text} {pyramid * 1000:8.0f}ms {speedup}")
+
+    run_multi_record(image_processor, rendition_core, samples[0], args)
+
+
+def run_multi_record(image_processor, rendition_core, sample, args):
+    """One S3 event with args.records uploads: serial loop vs render_many"""
+    label, filename, data = sample
+    workers = args.record_workers or rendition_core.RECORD_WORKERS
+    stub = StubS3(args.put_latency_ms / 1000.0, args.get_latency_ms / 1000.0)
+    ext = filename.rsplit('.', 1)[1]
+    keys = [f"bench/photo_{i}.{ext}" for i in range(args.records)]
+    for key in keys:
+        stub.objects[key] = data
+
+    def render_one(key):
+        result = image_processor.generate_renditions(key, bucket='bench')
+        if not result['success']:
+            raise RuntimeError(result['error'])
+
+    print(f"\nMulti-record event: {args.records} x {label}, GetObject latency "
+          f"{args.get_latency_ms:.0f} ms, {workers} concurrent records, {os.cpu_count()} CPUs\n")
+    print(f"   {'mode':<22} {'event':>10} {'images/s':>10} {'speedup':>9}")
+    with patch.object(image_processor, 's3_client', stub):
+        serial = time_runs(lambda: [render_one(key) for key in keys], args.runs)
+        concurrent = time_runs(lambda: rendition_core.render_many(keys, render_one, workers=workers), args.runs)
+    for mode, elapsed in (('serial', serial), ('render_many', concurrent)):
+        print(f"   {mode:<22} {elapsed * 1000:8.0f}ms {args.records / elapsed:10.2f} {serial / elapsed:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
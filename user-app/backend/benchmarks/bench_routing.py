@@ -0,0 +1,112 @@
+"""
+Routing benchmark for api.handler
+Measures cold-start import cost of the entry point and per-request dispatch cost
+
+Usage (from user-app/backend, with the usual environment loaded):
+    python benchmarks/bench_routing.py
+    python benchmarks/bench_routing.py --iterations 200000
+
+Cold start is measured in a fresh interpreter per run, so running this script
+on two commits gives a before/after comparison of `import api`.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+COLD_START_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+import api
+elapsed = time.perf_counter() - start
+handler_modules = [m for m in sys.modules if m.startswith('handlers.')]
+print(f"{elapsed:.6f} {len(handler_modules)}")
+"""
+
+
+def measure_cold_start(runs):
+    """Time `import api` in fresh interpreters"""
+    timings = []
+    handler_count = 0
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', COLD_START_SNIPPET],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        elapsed, handler_count = output.split()
+        timings.append(float(elapsed))
+    return timings, int(handler_count)
+
+
+def sample_path(template):
+    """Concrete request path for a route template"""
+    return re.sub(r'\{[^}]+\}', 'abc123', template)
+
+
+def linear_table(routes):
+    """Ordered regex list, equivalent to walking an if/elif chain"""
+    table = []
+    for route in routes:
+        pattern = re.sub(r'\\\{[^}]+\\\}', '[^/]+', re.escape(route.template.rstrip('/')))
+        table.append((route.method, re.compile(f'^{pattern}/?$'), route))
+    return table
+
+
+def linear_match(table, method, path):
+    for route_method, pattern, route in table:
+        if (route_method == method or route_method == '*') and pattern.match(path):
+            return route
+    return None
+
+
+def measure_dispatch(iterations):
+    import api
+
+    requests = [(route.method if route.method != '*' else 'GET', sample_path(route.template))
+                for route in api.ROUTES]
+    table = linear_table(api.ROUTES)
+
+    def run(match):
+        start = time.perf_counter()
+        count = 0
+        while count < iterations:
+            for method, path in requests:
+                match(method, path)
+                count += 1
+        return (time.perf_counter() - start) / count
+
+    trie = run(api.router.match)
+    linear = run(lambda method, path: linear_match(table, method, path))
+    return len(requests), trie, linear
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cold-runs', type=int, default=5)
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("ROUTING BENCHMARK")
+    print("=" * 60)
+
+    timings, handler_count = measure_cold_start(args.cold_runs)
+    print(f"\nCold start (`import api`, {args.cold_runs} fresh interpreters)")
+    print(f"   median: {statistics.median(timings) * 1000:.1f} ms   min: {min(timings) * 1000:.1f} ms")
+    print(f"   handler modules imported at startup: {handler_count}")
+
+    route_count, trie, linear = measure_dispatch(args.iterations)
+    print(f"\nDispatch ({route_count} routes, {args.iterations} lookups)")
+    print(f"   trie router:        {trie * 1e6:.2f} us/request")
+    print(f"   linear scan:        {linear * 1e6:.2f} us/request")
+    print(f"   speedup:            {linear / trie:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Tracking ingestion benchmark for utils.event_buffer
+Simulates a viewer scrolling a gallery: --events photo views, each producing
+a photo-engagement event (engagement_analytics_handler) and a photo_view
+analytics event with its rollup updates (analytics_handler.track_event).
+Tables are fakes that sleep for one DynamoDB round trip per PutItem,
+UpdateItem and BatchWriteItem (25 items).
+
+Scenarios:
+    per-event       one invocation per event, synchronous put_item each
+                    (old behaviour)
+    batch/<size>    POST /v1/analytics/batch with <size> events per request;
+                    writes buffered and flushed with batch_writer at the end
+                    of the invocation
+
+Reported per event: handler time, DynamoDB round trips, and the write
+throughput of one sequential client.
+
+Usage (from user-app/backend, with the usual environment loaded):
+    python benchmarks/bench_tracking.py
+    python benchmarks/bench_tracking.py --events 500 --latency-ms 8 --batch-sizes 10 50 200
+"""
+import argparse
+import os
+import sys
+import time
+from unittest.mock import patch
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+BATCH_WRITE_MAX_ITEMS = 25
+
+
+class FakeBatchWriter:
+    """batch_writer stand-in: one round trip per 25 buffered items"""
+
+    def __init__(self, table):
+        self.table = table
+        self.items = []
+
+    def __enter__(self):
+        return self
+
+    def put_item(self, Item):
+        self.items.append(Item)
+        if len(self.items) == BATCH_WRITE_MAX_ITEMS:
+            self._send()
+
+    def _send(self):
+        if self.items:
+            self.table.round_trip()
+            self.items = []
+
+    def __exit__(self, *exc):
+        self._send()
+        return False
+
+
+class FakeTable:
+    """Table stand-in that sleeps for one DynamoDB round trip per call"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def round_trip(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put_item(self, Item):
+        self.round_trip()
+
+    def update_item(self, **kwargs):
+        self.round_trip()
+        return {}
+
+    def get_item(self, **kwargs):
+        self.round_trip()
+        return {}
+
+    def batch_writer(self):
+        return FakeBatchWriter(self)
+
+
+def viewer_events(count):
+    for i in range(count):
+        photo_id = f'photo_{i % 500}'
+        yield {'kind': 'photo_engagement', 'gallery_id': 'gal_bench', 'photo_id': photo_id,
+               'event_type': 'view', 'duration': 3}
+        yield {'kind': 'photo_view', 'gallery_id': 'gal_bench', 'photo_id': photo_id, 'metadata': {}}
+
+
+def run_per_event(events):
+    from handlers.analytics_batch_handler import handle_track_batch
+
+    # No buffer open: every tracking write goes out immediately (old path)
+    for event in events:
+        handle_track_batch({'events': [event]})
+
+
+def run_batched(events, batch_size):
+    from utils.event_buffer import begin_event_buffer, flush_event_buffer
+    from handlers.analytics_batch_handler import handle_track_batch
+
+    for start in range(0, len(events), batch_size):
+        begin_event_buffer()
+        handle_track_batch({'events': events[start:start + batch_size]})
+        flush_event_buffer()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=200, help='Photo views in the session (2 events each)')
+    parser.add_argument('--latency-ms', type=float, default=4.0,
+                        help='Simulated DynamoDB round trip (default: 4 ms, in-region p50)')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 50, 200])
+    args = parser.parse_args()
+
+    from utils import analytics_rollups, event_buffer
+
+    events = list(viewer_events(args.events))
+    latency = args.latency_ms / 1000.0
+    analytics = FakeTable(latency)
+    engagement = FakeTable(latency)
+    rollups = FakeTable(latency)
+    tables = (analytics, engagement, rollups)
+
+    print("=" * 60)
+    print("TRACKING INGESTION BENCHMARK")
+    print("=" * 60)
+    print(f"\n{len(events)} events, simulated round trip {args.latency_ms:.1f} ms\n")
+
+    scenarios = [('per-event', run_per_event, ())]
+    scenarios += [(f'batch/{size}', run_batched, (size,)) for size in args.batch_sizes]
+
+    with patch('handlers.analytics_handler.analytics_table', analytics), \
+         patch('handlers.engagement_analytics_handler.analytics_table', engagement), \
+         patch('handlers.analytics_handler.resolve_gallery', return_value={'id': 'gal_bench', 'user_id': 'owner'}), \
+         patch.object(analytics_rollups, 'analytics_rollups_table', rollups):
+        baseline = None
+        for name, run, extra in scenarios:
+            for table in tables:
+                table.calls = 0
+            start = time.perf_counter()
+            run(events, *extra)
+            elapsed = time.perf_counter() - start
+
+            per_event = elapsed / len(events)
+            round_trips = sum(table.calls for table in tables) / len(events)
+            baseline = baseline or per_event
+            print(f"   {name:<12} {per_event * 1e6:10.1f} us/event   {round_trips:5.2f} round trips/event   "
+                  f"{len(events) / elapsed:9.0f} events/s   {baseline / per_event:6.1f}x")
+
+    print(f"\nBatchWriteItem groups of {event_buffer.BATCH_WRITE_MAX_ITEMS}; "
+          f"at most {event_buffer.MAX_PENDING_ITEMS} items pending per table")
+
+
+if __name__ == '__main__':
+    main()
@@ -55,11 +55,21 @@ TABLES_TO_CLEAN = {
         'required': True,
         'has_s3_data': False
     },
+    'galerly-analytics-rollups': {
+        'description': 'Pre-aggregated gallery analytics counters',
+        'required': True,
+        'has_s3_data': False
+    },
     'galerly-client-favorites': {
         'description': 'Client photo selections',
         'required': True,
         'has_s3_data': False
     },
+    'galerly-client-galleries': {
+        'description': 'Client email -> gallery index',
+        'required': True,
+        'has_s3_data': False
+    },
     'galerly-client-feedback': {
         'description': 'Client gallery feedback',
         'required': True,
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Galerly - Analytics Archive Compaction
+Moves raw tracking events older than --days from DynamoDB (galerly-analytics,
+visitor tracking, video analytics) into the Parquet archive in S3
+(utils/analytics_archive.py). DynamoDB keeps only the hot window; exports
+and long-range reports read older days from the archive.
+
+For each archive:
+1. scan the events before the cutoff day and group them by day
+2. write each day's events that are not archived yet as a new Parquet file
+   (ids already in the day's files are skipped, so re-runs and runs after a
+   failure never duplicate rows)
+3. move the watermark to the cutoff - readers switch to the archive for
+   those days
+4. delete the archived events from DynamoDB
+
+Events are only deleted once their day is written and the watermark has
+moved past it. The cold events of one archive are grouped in memory: on a
+large table, start with a large --days and lower it over a few runs.
+
+Requires pyarrow (pip install -r requirements-archive.txt). Refuses to run
+unless the API Lambda has the pyarrow layer (ANALYTICS_ARCHIVE_LAYER,
+default galerly-pyarrow) attached: without it exports can't read archived
+days. --skip-layer-check is for setups where the API has pyarrow installed
+directly (LocalStack, docker).
+
+Usage:
+    python compact_analytics_archive.py                           # keep 90 days hot
+    python compact_analytics_archive.py --days 30 --archive analytics
+    python compact_analytics_archive.py --dry-run                 # count only
+"""
+import argparse
+import os
+import sys
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from boto3.dynamodb.conditions import Attr
+
+from utils.analytics_archive import (
+    ARCHIVES, ARCHIVE_AVAILABLE, archive_table, archived_ids, event_day,
+    get_watermark, set_watermark, write_partition
+)
+from utils.config import lambda_client
+
+DEFAULT_HOT_DAYS = 90
+# Lambda serving exports, and the layer its pyarrow comes from
+API_FUNCTION_NAME = os.environ.get('API_FUNCTION_NAME', 'galerly-api')
+ARCHIVE_LAYER_NAME = os.environ.get('ANALYTICS_ARCHIVE_LAYER', 'galerly-pyarrow')
+
+
+def api_has_archive_layer():
+    """Whether the API Lambda has the pyarrow layer attached"""
+    config = lambda_client.get_function_configuration(FunctionName=API_FUNCTION_NAME)
+    return any(f':layer:{ARCHIVE_LAYER_NAME}:' in layer.get('Arn', '') for layer in config.get('Layers', []))
+
+
+def iter_cold_items(table, cutoff_day):
+    """Scan events with a timestamp before cutoff_day, page by page"""
+    scan_kwargs = {'FilterExpression': Attr('timestamp').lt(cutoff_day)}
+    while True:
+        response = table.scan(**scan_kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def compact(name, cutoff_day, dry_run=False):
+    """
+    Archive and delete one table's events before cutoff_day
+
+    Returns:
+        dict with days, events, archived (rows written) and deleted counts
+    """
+    table = archive_table(name)
+    by_day = defaultdict(list)
+    for item in iter_cold_items(table, cutoff_day):
+        day = event_day(item.get('timestamp'))
+        if len(day) == 10:
+            by_day[day].append(item)
+
+    stats = {'days': len(by_day), 'events': sum(len(items) for items in by_day.values()),
+             'archived': 0, 'deleted': 0}
+    if dry_run:
+        return stats
+
+    run_id = uuid.uuid4().hex
+    for day in sorted(by_day):
+        done = archived_ids(name, day)
+        new_items = [item for item in by_day[day] if item['id'] not in done]
+        if new_items:
+            write_partition(name, day, new_items, run_id=run_id)
+            stats['archived'] += len(new_items)
+        print(f"   {name} {day}: {len(new_items)} archived, {len(by_day[day]) - len(new_items)} already in archive")
+
+    watermark = get_watermark(name)
+    if not watermark or watermark < cutoff_day:
+        set_watermark(name, cutoff_day)
+
+    with table.batch_writer() as batch:
+        for items in by_day.values():
+            for item in items:
+                batch.delete_item(Key={'id': item['id']})
+                stats['deleted'] += 1
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move old tracking events to the Parquet archive')
+    parser.add_argument('--days', type=int, default=DEFAULT_HOT_DAYS,
+                        help=f'Days kept in DynamoDB (default: {DEFAULT_HOT_DAYS})')
+    parser.add_argument('--archive', action='append', choices=sorted(ARCHIVES),
+                        help='Archive to compact (repeatable; default: all)')
+    parser.add_argument('--dry-run', action='store_true', help='Count events without writing or deleting')
+    parser.add_argument('--skip-layer-check', action='store_true',
+                        help='Compact even if the API Lambda has no pyarrow layer (API with pyarrow installed)')
+    args = parser.parse_args()
+
+    if args.days < 1:
+        parser.error('--days must be at least 1')
+    if not ARCHIVE_AVAILABLE:
+        print("❌ pyarrow is not installed (pip install -r requirements-archive.txt)")
+        return 1
+    if not args.dry_run and not args.skip_layer_check:
+        try:
+            layer_attached = api_has_archive_layer()
+        except Exception as e:
+            print(f"❌ Could not read the {API_FUNCTION_NAME} configuration: {str(e)}")
+            return 1
+        if not layer_attached:
+            print(f"❌ {API_FUNCTION_NAME} has no {ARCHIVE_LAYER_NAME} layer - exports could not read "
+                  f"archived days. Attach it first (requirements-archive.txt)")
+            return 1
+
+    cutoff_day = (datetime.now(timezone.utc) - timedelta(days=args.days)).strftime('%Y-%m-%d')
+
+    print("=" * 60)
+    print("ANALYTICS ARCHIVE COMPACTION" + (" (DRY RUN)" if args.dry_run else ""))
+    print("=" * 60)
+    print(f"Archiving events before {cutoff_day}")
+
+    failed = False
+    for name in args.archive or sorted(ARCHIVES):
+        print(f"\n📦 {name}")
+        try:
+            stats = compact(name, cutoff_day, dry_run=args.dry_run)
+        except Exception as e:
+            failed = True
+            print(f"❌ {name}: {str(e)}")
+            continue
+        print(f"   {stats['events']} events over {stats['days']} days; "
+              f"{stats['archived']} archived, {stats['deleted']} deleted")
+
+    if failed:
+        return 1
+    print("\n✅ Done")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
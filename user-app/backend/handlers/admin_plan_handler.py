@@ -7,6 +7,7 @@ from datetime import datetime, timezone
 from boto3.dynamodb.conditions import Key
 from utils.config import user_features_table, users_table
 from utils.response import create_response
+from utils.feature_resolver import bump_features_version, invalidate_user_features
 
 
 def handle_grant_feature(admin_user, body):
@@ -59,6 +60,7 @@ def handle_grant_feature(admin_user, body):
         }
         
         user_features_table.put_item(Item=feature_override)
+        bump_features_version(user_response['Items'][0]['email'], user_id)
         
         print(f"✅ Admin {admin_user['id']} granted {feature_id} to {user_id}")
         
@@ -74,6 +76,18 @@ def handle_grant_feature(admin_user, body):
         return create_response(500, {'error': 'Failed to grant feature'})
 
 
+def _bump_features_version_by_id(user_id):
+    """Bump the overrides version for a user known only by id"""
+    response = users_table.query(
+        IndexName='UserIdIndex',
+        KeyConditionExpression=Key('id').eq(user_id)
+    )
+    if response.get('Items'):
+        bump_features_version(response['Items'][0]['email'], user_id)
+    else:
+        invalidate_user_features(user_id)
+
+
 def handle_revoke_feature(admin_user, user_id, feature_id):
     """
     Revoke a feature override (admin only)
@@ -103,6 +117,7 @@ def handle_revoke_feature(admin_user, user_id, feature_id):
                 print(f"✅ Admin {admin_user['id']} revoked {feature_id} from {user_id}")
         
         if removed:
+            _bump_features_version_by_id(user_id)
             return create_response(200, {'message': 'Feature revoked successfully'})
         else:
             return create_response(404, {'error': 'Feature override not found'})
@@ -200,6 +215,8 @@ def handle_upgrade_user_plan(admin_user, body):
             }
         )
         
+        invalidate_user_features(user_id)
+        
         # Log the change
         print(f"✅ Admin {admin_user['id']} changed {user_id} plan from {old_plan} to {new_plan}")
         print(f"   Reason: {reason}")
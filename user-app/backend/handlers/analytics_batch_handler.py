@@ -0,0 +1,94 @@
+"""
+Batched Tracking Handler
+One request carries many tracking events (a viewer scrolling a gallery, a
+video session) instead of one request per event. Each event is handled by
+the same function as its single-event endpoint, so validation and owner
+checks are unchanged; their writes go to the invocation's event buffer
+(utils/event_buffer.py) and are stored with batch writes of 25 when the
+invocation ends.
+"""
+import json
+from utils.response import create_response
+from utils.router import load_handler
+
+# Largest batch accepted in one request
+MAX_BATCH_EVENTS = 200
+
+
+def _track_gallery_view(handler, event, viewer_user_id):
+    return handler(event.get('gallery_id'), viewer_user_id, event.get('metadata') or {})
+
+
+def _track_photo(handler, event, viewer_user_id):
+    return handler(event.get('photo_id'), event.get('gallery_id'), viewer_user_id, event.get('metadata') or {})
+
+
+def _with_event(handler, event, viewer_user_id):
+    return handler(event)
+
+
+# kind -> (single-event handler, call adapter)
+BATCH_EVENT_KINDS = {
+    'gallery_view': ('handlers.analytics_handler:handle_track_gallery_view', _track_gallery_view),
+    'photo_view': ('handlers.analytics_handler:handle_track_photo_view', _track_photo),
+    'photo_download': ('handlers.analytics_handler:handle_track_photo_download', _track_photo),
+    'visit': ('handlers.engagement_analytics_handler:handle_track_visit', _with_event),
+    'event': ('handlers.engagement_analytics_handler:handle_track_event', _with_event),
+    'photo_engagement': ('handlers.engagement_analytics_handler:handle_track_photo_engagement', _with_event),
+    'video_engagement': ('handlers.engagement_analytics_handler:handle_track_video_engagement', _with_event),
+    'session_end': ('handlers.visitor_tracking_handler:handle_track_session_end', _with_event),
+}
+
+
+def handle_track_batch(body, viewer_user_id=None):
+    """
+    Track a batch of events - public endpoint
+
+    Body:
+        events: list of event objects, each with a 'kind' (see
+            BATCH_EVENT_KINDS) and the fields of that kind's single-event
+            endpoint body (gallery_view/photo_view/photo_download take
+            gallery_id, photo_id and metadata)
+
+    Returns:
+        accepted/rejected counts and, for rejected events, their index,
+        status and error
+    """
+    events = body.get('events') if isinstance(body, dict) else None
+    if not isinstance(events, list) or not events:
+        return create_response(400, {'error': 'events must be a non-empty list'})
+    if len(events) > MAX_BATCH_EVENTS:
+        return create_response(400, {'error': f'At most {MAX_BATCH_EVENTS} events per batch'})
+
+    accepted = 0
+    rejected = []
+    for index, event in enumerate(events):
+        kind = event.get('kind') if isinstance(event, dict) else None
+        if kind not in BATCH_EVENT_KINDS:
+            rejected.append({'index': index, 'status': 400, 'error': 'Unknown event kind'})
+            continue
+
+        target, call = BATCH_EVENT_KINDS[kind]
+        fields = {key: value for key, value in event.items() if key != 'kind'}
+        try:
+            response = call(load_handler(target), fields, viewer_user_id)
+        except Exception as e:
+            print(f"Error tracking batched {kind} event: {str(e)}")
+            response = create_response(500, {'error': 'Failed to track event'})
+
+        status = response.get('statusCode', 500)
+        if status < 400:
+            accepted += 1
+        else:
+            error = 'Failed to track event'
+            try:
+                error = json.loads(response.get('body') or '{}').get('error', error)
+            except (TypeError, ValueError):
+                pass
+            rejected.append({'index': index, 'status': status, 'error': error})
+
+    return create_response(200, {
+        'accepted': accepted,
+        'rejected': len(rejected),
+        'errors': rejected
+    })
@@ -1,22 +1,36 @@
 """
 Analytics Export Handler
 Export analytics data in CSV/PDF/Excel formats
+
+CSV and Excel exports are streamed: rows come from generators that page
+through DynamoDB (and the analytics archive), are encoded in small chunks
+and written into an S3 multipart upload, and the response carries a
+presigned download URL. Memory stays at a few upload parts whatever the
+number of rows; Excel workbooks are built in openpyxl's write-only mode,
+which spools sheet rows to /tmp instead of keeping cell objects.
 """
 
 import json
 import csv
+import heapq
 import io
 from datetime import datetime, timedelta, timezone
 import boto3
+from boto3.dynamodb.conditions import Key
 from utils.response import create_response
-from utils.config import dynamodb, s3_client
+from utils.config import (
+    s3_client, S3_BUCKET, analytics_table, galleries_table, photos_table, leads_table, sales_table
+)
+from utils.analytics_archive import ArchiveUnavailableError, iter_events
 from utils.plan_enforcement import require_plan, require_role
+from utils.zip_generator import S3MultipartWriter, ZIP_MIN_PART_SIZE
 
 # Import for Excel export
 try:
     import openpyxl
-    from openpyxl.chart import BarChart, LineChart, PieChart, Reference
-    from openpyxl.styles import Font, Alignment, PatternFill
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.chart import BarChart, LineChart, Reference
+    from openpyxl.styles import Font, PatternFill
     from openpyxl.utils import get_column_letter
     EXCEL_AVAILABLE = True
 except ImportError:
@@ -25,12 +39,85 @@ except ImportError:
 
 s3 = s3_client
 
+# Smallest allowed multipart part: with 2 parts uploading while the next
+# fills, an export holds about 15MB whatever its size
+EXPORT_PART_SIZE = ZIP_MIN_PART_SIZE
+# CSV text encoded and handed to the upload at a time
+CSV_CHUNK_SIZE = 256 * 1024
+# Presigned download URL lifetime (seconds)
+EXPORT_URL_EXPIRY = 3600
+# Exports are kept in the private originals bucket
+EXPORT_PREFIX = 'exports'
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+def _export_range(params):
+    """(start_date, end_date) of an export request, defaulting to the last 30 days"""
+    end_date = params.get('end_date', datetime.now().isoformat())
+    start_date = params.get('start_date') or (datetime.now() - timedelta(days=30)).isoformat()
+    return start_date, end_date
+
+
+def _export_filename(export_type, start_date, end_date, extension):
+    return f"analytics_{export_type}_{start_date[:10]}_to_{end_date[:10]}.{extension}"
+
+
+def _upload_export(photographer_id, filename, content_type, write):
+    """
+    Stream an export into S3 and return a presigned download URL
+
+    Args:
+        write: callable(fileobj) writing the export; the file object is an
+            S3 multipart upload, aborted if write raises
+    """
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
+    key = f"{EXPORT_PREFIX}/{photographer_id}/{stamp}_{filename}"
+    writer = S3MultipartWriter(S3_BUCKET, key, part_size=EXPORT_PART_SIZE,
+                               ContentType=content_type,
+                               Metadata={'photographer_id': photographer_id, 'content_type': 'analytics_export'})
+    try:
+        write(writer)
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+
+    return s3.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': S3_BUCKET,
+            'Key': key,
+            'ResponseContentDisposition': f'attachment; filename="{filename}"'
+        },
+        ExpiresIn=EXPORT_URL_EXPIRY
+    )
+
+
+def _csv_chunks(rows, fieldnames, counter):
+    """Encoded CSV (header first) in chunks of about CSV_CHUNK_SIZE; counts rows"""
+    text = io.StringIO()
+    writer = csv.DictWriter(text, fieldnames=fieldnames, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        counter['rows'] += 1
+        if text.tell() >= CSV_CHUNK_SIZE:
+            yield text.getvalue().encode('utf-8')
+            text.seek(0)
+            text.truncate()
+    if text.tell():
+        yield text.getvalue().encode('utf-8')
+
+
 @require_plan(feature='analytics_export')
 @require_role('photographer')
 def handle_export_analytics_csv(user, query_params):
     """
     Export analytics data to CSV format
     GET /analytics/export/csv?start_date=...&end_date=...&type=...
+
+    Returns:
+        download_url (presigned, valid for EXPORT_URL_EXPIRY seconds),
+        filename and row count
     """
     try:
         # Plan enforcement handled by decorators
@@ -38,50 +125,44 @@ def handle_export_analytics_csv(user, query_params):
         photographer_id = user['id']
         
         # Parse parameters
-        export_type = query_params.get('type', 'summary')  # summary, galleries, photos, clients
-        start_date = query_params.get('start_date')
-        end_date = query_params.get('end_date', datetime.now().isoformat())
-        
-        # Default to last 30 days if no start date
-        if not start_date:
-            start_date = (datetime.now() - timedelta(days=30)).isoformat()
-        
-        # Fetch data based on type
-        csv_data = []
+        export_type = query_params.get('type', 'summary')  # summary, galleries, photos, clients, revenue
+        start_date, end_date = _export_range(query_params)
         
+        # Row generators - nothing is read until the upload pulls rows
         if export_type == 'summary':
-            csv_data = generate_summary_csv(photographer_id, start_date, end_date)
+            rows = generate_summary_csv(photographer_id, start_date, end_date)
         elif export_type == 'galleries':
-            csv_data = generate_galleries_csv(photographer_id, start_date, end_date)
+            rows = generate_galleries_csv(photographer_id, start_date, end_date)
         elif export_type == 'photos':
-            csv_data = generate_photos_csv(photographer_id, start_date, end_date)
+            rows = generate_photos_csv(photographer_id, start_date, end_date)
         elif export_type == 'clients':
-            csv_data = generate_clients_csv(photographer_id, start_date, end_date)
+            rows = generate_clients_csv(photographer_id, start_date, end_date)
         elif export_type == 'revenue':
-            csv_data = generate_revenue_csv(photographer_id, start_date, end_date)
+            rows = generate_revenue_csv(photographer_id, start_date, end_date)
         else:
             return create_response(400, {'error': 'Invalid export type'})
         
-        # Generate CSV
-        output = io.StringIO()
-        if csv_data:
-            writer = csv.DictWriter(output, fieldnames=csv_data[0].keys())
-            writer.writeheader()
-            writer.writerows(csv_data)
+        fieldnames = EXPORT_COLUMNS[export_type]
+        filename = _export_filename(export_type, start_date, end_date, 'csv')
+        counter = {'rows': 0}
         
-        csv_content = output.getvalue()
+        def write(fileobj):
+            for chunk in _csv_chunks(rows, fieldnames, counter):
+                fileobj.write(chunk)
         
-        # Return CSV with proper headers
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'text/csv',
-                'Content-Disposition': f'attachment; filename="analytics_{export_type}_{start_date[:10]}_to_{end_date[:10]}.csv"',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': csv_content
-        }
+        download_url = _upload_export(photographer_id, filename, 'text/csv; charset=utf-8', write)
+        
+        return create_response(200, {
+            'download_url': download_url,
+            'filename': filename,
+            'rows': counter['rows'],
+            'expires_in': EXPORT_URL_EXPIRY
+        })
         
+    except ArchiveUnavailableError as e:
+        # Archived days can't be read here - no partial export
+        print(f"Error exporting CSV: {str(e)}")
+        return create_response(503, {'error': f'Analytics archive unavailable: {str(e)}'})
     except Exception as e:
         print(f"Error exporting CSV: {str(e)}")
         return create_response(500, {'error': f'Failed to export CSV: {str(e)}'})
@@ -114,176 +195,176 @@ def handle_export_analytics_pdf(user, body):
             'expires_in': 3600
         })
         
+    except ArchiveUnavailableError as e:
+        # Archived days can't be read here - no partial export
+        print(f"Error exporting PDF: {str(e)}")
+        return create_response(503, {'error': f'Analytics archive unavailable: {str(e)}'})
     except Exception as e:
         print(f"Error exporting PDF: {str(e)}")
         return create_response(500, {'error': f'Failed to export PDF: {str(e)}'})
 
 
-def generate_summary_csv(photographer_id, start_date, end_date):
-    """Generate summary statistics CSV"""
-    analytics_table = dynamodb.Table('galerly-analytics')
-    
-    try:
-        response = analytics_table.query(
-            KeyConditionExpression='photographer_id = :pid AND date BETWEEN :start AND :end',
-            ExpressionAttributeValues={
-                ':pid': photographer_id,
-                ':start': start_date[:10],
-                ':end': end_date[:10]
-            }
+def _photographer_events(photographer_id, start_date, end_date, columns=None):
+    """
+    Analytics events of a photographer's galleries in a date range
+    Days already compacted are read from the Parquet archive (only the
+    requested columns, row groups of other photographers skipped); recent
+    days come from galerly-analytics.
+    """
+    def query_hot(start_day, end_day):
+        return _query_pages(
+            analytics_table,
+            IndexName='UserTimestampIndex',
+            KeyConditionExpression=Key('user_id').eq(photographer_id) & Key('timestamp').between(
+                start_day, _range_end(end_day)
+            )
         )
-        
-        rows = []
-        for item in response.get('Items', []):
-            rows.append({
-                'Date': item.get('date'),
-                'Gallery Views': item.get('gallery_views', 0),
-                'Photo Views': item.get('photo_views', 0),
-                'Downloads': item.get('downloads', 0),
-                'Favorites': item.get('favorites', 0),
-                'Shares': item.get('shares', 0),
-                'New Clients': item.get('new_clients', 0),
-                'Revenue': f"${item.get('revenue', 0):.2f}"
-            })
-        
-        return rows
-    except Exception as e:
-        print(f"Error generating summary CSV: {str(e)}")
-        return []
+
+    return iter_events('analytics', start_date[:10], end_date[:10], query_hot,
+                       columns=columns, filters={'user_id': photographer_id})
+
+
+# Summary CSV column per event type
+SUMMARY_COLUMNS = {
+    'gallery_view': 'Gallery Views',
+    'photo_view': 'Photo Views',
+    'photo_download': 'Downloads',
+    'bulk_download': 'Bulk Downloads',
+    'gallery_share': 'Shares',
+    'photo_share': 'Shares',
+}
+
+
+def generate_summary_csv(photographer_id, start_date, end_date):
+    """Summary statistics rows, one per day (events are counted as they stream by)"""
+    daily = {}
+    events = _photographer_events(photographer_id, start_date, end_date,
+                                  columns=['event_type', 'timestamp'])
+    for event in events:
+        column = SUMMARY_COLUMNS.get(event.get('event_type'))
+        if not column:
+            continue
+        day = (event.get('timestamp') or '')[:10]
+        if day not in daily:
+            daily[day] = dict.fromkeys(SUMMARY_COLUMNS.values(), 0)
+        daily[day][column] += 1
+
+    for day in sorted(daily):
+        yield {'Date': day, **daily[day]}
+
+
+def _range_end(end_date):
+    """Upper bound of a key range: a bare YYYY-MM-DD covers the whole day"""
+    return end_date + '~' if len(end_date) == 10 else end_date
+
+
+def _query_pages(table, **query_kwargs):
+    """Every item of a query, page by page"""
+    while True:
+        response = table.query(**query_kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
 
 def generate_galleries_csv(photographer_id, start_date, end_date):
-    """Generate galleries CSV"""
-    galleries_table = dynamodb.Table('galerly-galleries')
-    
-    try:
-        response = galleries_table.query(
-            IndexName='photographer_created_index',
-            KeyConditionExpression='photographer_id = :pid',
-            ExpressionAttributeValues={
-                ':pid': photographer_id
-            }
+    """Gallery rows, created in the range (UserCreatedAtIndex)"""
+    galleries = _query_pages(
+        galleries_table,
+        IndexName='UserCreatedAtIndex',
+        KeyConditionExpression=Key('user_id').eq(photographer_id) & Key('created_at').between(
+            start_date, _range_end(end_date)
         )
-        
-        rows = []
-        for gallery in response.get('Items', []):
-            created = gallery.get('created_at', '')
-            if start_date <= created <= end_date:
-                rows.append({
-                    'Gallery ID': gallery.get('id'),
-                    'Name': gallery.get('name'),
-                    'Client': gallery.get('client_email', 'N/A'),
-                    'Photos': gallery.get('photo_count', 0),
-                    'Views': gallery.get('views', 0),
-                    'Downloads': gallery.get('downloads', 0),
-                    'Status': 'Public' if gallery.get('is_public') else 'Private',
-                    'Created': created[:10]
-                })
-        
-        return rows
-    except Exception as e:
-        print(f"Error generating galleries CSV: {str(e)}")
-        return []
+    )
+    for gallery in galleries:
+        yield {
+            'Gallery ID': gallery.get('id'),
+            'Name': gallery.get('name'),
+            'Client': gallery.get('client_name') or ', '.join(gallery.get('client_emails') or []) or 'N/A',
+            'Photos': gallery.get('photo_count', 0),
+            'Views': gallery.get('view_count', 0),
+            'Downloads': gallery.get('download_count', 0),
+            'Status': 'Public' if gallery.get('privacy') == 'public' else 'Private',
+            'Created': gallery.get('created_at', '')[:10]
+        }
 
 
 def generate_photos_csv(photographer_id, start_date, end_date):
-    """Generate photos CSV"""
-    photos_table = dynamodb.Table('galerly-photos')
-    
-    try:
-        response = photos_table.query(
-            IndexName='photographer_upload_index',
-            KeyConditionExpression='photographer_id = :pid',
-            ExpressionAttributeValues={
-                ':pid': photographer_id
-            }
+    """Photo rows, uploaded in the range (UserCreatedAtIndex)"""
+    photos = _query_pages(
+        photos_table,
+        IndexName='UserCreatedAtIndex',
+        KeyConditionExpression=Key('user_id').eq(photographer_id) & Key('created_at').between(
+            start_date, _range_end(end_date)
         )
-        
-        rows = []
-        for photo in response.get('Items', []):
-            uploaded = photo.get('uploaded_at', '')
-            if start_date <= uploaded <= end_date:
-                rows.append({
-                    'Photo ID': photo.get('id'),
-                    'Gallery': photo.get('gallery_name', 'N/A'),
-                    'Filename': photo.get('filename'),
-                    'Size (MB)': f"{photo.get('file_size', 0) / (1024*1024):.2f}",
-                    'Views': photo.get('views', 0),
-                    'Downloads': photo.get('downloads', 0),
-                    'Favorited': 'Yes' if photo.get('is_favorite') else 'No',
-                    'Uploaded': uploaded[:10]
-                })
-        
-        return rows
-    except Exception as e:
-        print(f"Error generating photos CSV: {str(e)}")
-        return []
+    )
+    for photo in photos:
+        yield {
+            'Photo ID': photo.get('id'),
+            'Gallery': photo.get('gallery_id', 'N/A'),
+            'Filename': photo.get('filename'),
+            'Size (MB)': f"{photo.get('file_size', 0) / (1024*1024):.2f}",
+            'Views': photo.get('views', 0),
+            'Downloads': photo.get('download_count', 0),
+            'Favorited': 'Yes' if photo.get('favorites_count') else 'No',
+            'Uploaded': photo.get('created_at', '')[:10]
+        }
 
 
 def generate_clients_csv(photographer_id, start_date, end_date):
-    """Generate clients CSV"""
-    leads_table = dynamodb.Table('galerly-leads')
-    
-    try:
-        response = leads_table.query(
-            KeyConditionExpression='photographer_id = :pid',
-            ExpressionAttributeValues={
-                ':pid': photographer_id
-            }
+    """Client (lead) rows, created in the range (PhotographerIdIndex)"""
+    leads = _query_pages(
+        leads_table,
+        IndexName='PhotographerIdIndex',
+        KeyConditionExpression=Key('photographer_id').eq(photographer_id) & Key('created_at').between(
+            start_date, _range_end(end_date)
         )
-        
-        rows = []
-        for lead in response.get('Items', []):
-            created = lead.get('created_at', '')
-            if start_date <= created <= end_date:
-                rows.append({
-                    'Name': lead.get('name'),
-                    'Email': lead.get('email'),
-                    'Phone': lead.get('phone', 'N/A'),
-                    'Status': lead.get('status'),
-                    'Quality': lead.get('quality'),
-                    'Score': lead.get('score', 0),
-                    'Source': lead.get('source'),
-                    'Created': created[:10]
-                })
-        
-        return rows
-    except Exception as e:
-        print(f"Error generating clients CSV: {str(e)}")
-        return []
+    )
+    for lead in leads:
+        yield {
+            'Name': lead.get('name'),
+            'Email': lead.get('email'),
+            'Phone': lead.get('phone', 'N/A'),
+            'Status': lead.get('status'),
+            'Quality': lead.get('quality'),
+            'Score': lead.get('score', 0),
+            'Source': lead.get('source'),
+            'Created': lead.get('created_at', '')[:10]
+        }
 
 
 def generate_revenue_csv(photographer_id, start_date, end_date):
-    """Generate revenue CSV"""
-    sales_table = dynamodb.Table('galerly-sales')
-    
-    try:
-        response = sales_table.query(
-            IndexName='photographer_date_index',
-            KeyConditionExpression='photographer_id = :pid',
-            ExpressionAttributeValues={
-                ':pid': photographer_id
-            }
+    """Revenue (sale) rows, created in the range (PhotographerIdIndex)"""
+    sales = _query_pages(
+        sales_table,
+        IndexName='PhotographerIdIndex',
+        KeyConditionExpression=Key('photographer_id').eq(photographer_id) & Key('created_at').between(
+            start_date, _range_end(end_date)
         )
-        
-        rows = []
-        for sale in response.get('Items', []):
-            created = sale.get('created_at', '')
-            if start_date <= created <= end_date:
-                rows.append({
-                    'Transaction ID': sale.get('id'),
-                    'Client': sale.get('client_email'),
-                    'Type': sale.get('purchase_type'),
-                    'Item': sale.get('item_name', 'N/A'),
-                    'Amount': f"${sale.get('amount', 0) / 100:.2f}",
-                    'Status': sale.get('status'),
-                    'Date': created[:10]
-                })
-        
-        return rows
-    except Exception as e:
-        print(f"Error generating revenue CSV: {str(e)}")
-        return []
+    )
+    for sale in sales:
+        items = ', '.join(str(item.get('name', '')) for item in sale.get('items') or [])
+        yield {
+            'Transaction ID': sale.get('id'),
+            'Client': sale.get('customer_email'),
+            'Type': sale.get('purchase_type'),
+            'Item': items or 'N/A',
+            # Stored in dollars (sales_handler)
+            'Amount': f"${float(sale.get('amount', 0)):.2f}",
+            'Status': sale.get('status'),
+            'Date': sale.get('created_at', '')[:10]
+        }
+
+
+# CSV columns per export type (the header is written before the first row)
+EXPORT_COLUMNS = {
+    'summary': ['Date'] + list(dict.fromkeys(SUMMARY_COLUMNS.values())),
+    'galleries': ['Gallery ID', 'Name', 'Client', 'Photos', 'Views', 'Downloads', 'Status', 'Created'],
+    'photos': ['Photo ID', 'Gallery', 'Filename', 'Size (MB)', 'Views', 'Downloads', 'Favorited', 'Uploaded'],
+    'clients': ['Name', 'Email', 'Phone', 'Status', 'Quality', 'Score', 'Source', 'Created'],
+    'revenue': ['Transaction ID', 'Client', 'Type', 'Item', 'Amount', 'Status', 'Date'],
+}
 
 
 def generate_pdf_report(photographer_id, report_type, start_date, end_date):
@@ -305,20 +386,13 @@ def generate_pdf_report(photographer_id, report_type, start_date, end_date):
     filename = f"analytics/{photographer_id}/report_{report_type}_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.pdf"
     bucket_name = os.environ.get('S3_BUCKET_NAME', 'galerly-files')
     
-    # Fetch analytics data for the report
-    analytics_table = dynamodb.Table('galerly-analytics')
-    
+    # Fetch analytics events for the report (archive + recent)
     try:
-        response = analytics_table.query(
-            KeyConditionExpression='photographer_id = :pid AND #dt BETWEEN :start AND :end',
-            ExpressionAttributeNames={'#dt': 'date'},
-            ExpressionAttributeValues={
-                ':pid': photographer_id,
-                ':start': start_date[:10],
-                ':end': end_date[:10]
-            }
-        )
-        analytics_data = response.get('Items', [])
+        analytics_data = list(_photographer_events(
+            photographer_id, start_date, end_date, columns=['event_type', 'timestamp', 'metadata']
+        ))
+    except ArchiveUnavailableError:
+        raise
     except Exception as e:
         print(f"Error fetching analytics: {e}")
         analytics_data = []
@@ -373,9 +447,14 @@ def generate_pdf_report(photographer_id, report_type, start_date, end_date):
     elements.append(Spacer(1, 24))
     
     # Summary statistics
-    total_views = sum(int(item.get('views', 0)) for item in analytics_data)
-    total_downloads = sum(int(item.get('downloads', 0)) for item in analytics_data)
-    unique_visitors = len(set(item.get('visitor_id', '') for item in analytics_data if item.get('visitor_id')))
+    view_types = ('gallery_view', 'photo_view')
+    download_types = ('photo_download', 'bulk_download')
+    total_views = sum(1 for item in analytics_data if item.get('event_type') in view_types)
+    total_downloads = sum(1 for item in analytics_data if item.get('event_type') in download_types)
+    unique_visitors = len(set(
+        (item.get('metadata') or {}).get('ip') for item in analytics_data
+        if item.get('event_type') == 'gallery_view' and (item.get('metadata') or {}).get('ip')
+    ))
     
     elements.append(Paragraph("<b>Summary Statistics</b>", heading_style))
     
@@ -408,11 +487,13 @@ def generate_pdf_report(photographer_id, report_type, start_date, end_date):
         # Group by date
         daily_stats = {}
         for item in analytics_data:
-            date = item.get('date', '')
+            date = (item.get('timestamp') or '')[:10]
             if date not in daily_stats:
                 daily_stats[date] = {'views': 0, 'downloads': 0}
-            daily_stats[date]['views'] += int(item.get('views', 0))
-            daily_stats[date]['downloads'] += int(item.get('downloads', 0))
+            if item.get('event_type') in view_types:
+                daily_stats[date]['views'] += 1
+            elif item.get('event_type') in download_types:
+                daily_stats[date]['downloads'] += 1
         
         daily_data = [['Date', 'Views', 'Downloads']]
         for date in sorted(daily_stats.keys(), reverse=True)[:10]:
@@ -480,278 +561,99 @@ def generate_pdf_report(photographer_id, report_type, start_date, end_date):
         return f"/api/v1/analytics/reports/error"
 
 
-@require_plan(feature='analytics_export')
-@require_role('photographer')
-def handle_export_analytics_excel(user, query_params):
-    """
-    Export analytics data to Excel (.xlsx) format with charts
-    GET /analytics/export/excel?start_date=...&end_date=...&type=...
-    """
-    try:
-        if not EXCEL_AVAILABLE:
-            return create_response(500, {
-                'error': 'Excel export is not available. Please install openpyxl.'
-            })
-        
-        # Plan enforcement handled by decorators
-        
-        photographer_id = user['id']
-        
-        # Parse parameters
-        export_type = query_params.get('type', 'summary')
-        start_date = params.get('start_date')
-        end_date = params.get('end_date', datetime.now().isoformat())
-        
-        if not start_date:
-            start_date = (datetime.now() - timedelta(days=30)).isoformat()
-        
-        # Create Excel workbook
-        wb = openpyxl.Workbook()
-        wb.remove(wb.active)  # Remove default sheet
-        
-        # Summary Sheet
-        summary_sheet = wb.create_sheet("Summary")
-        _create_summary_sheet(summary_sheet, photographer_id, start_date, end_date)
-        
-        # Gallery Performance Sheet
-        gallery_sheet = wb.create_sheet("Gallery Performance")
-        _create_gallery_performance_sheet(gallery_sheet, photographer_id, start_date, end_date)
-        
-        # Daily Analytics Sheet with Chart
-        daily_sheet = wb.create_sheet("Daily Analytics")
-        _create_daily_analytics_sheet(daily_sheet, photographer_id, start_date, end_date)
-        
-        # Top Photos Sheet
-        photos_sheet = wb.create_sheet("Top Photos")
-        _create_top_photos_sheet(photos_sheet, photographer_id, start_date, end_date)
-        
-        # Save to BytesIO
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        excel_content = output.getvalue()
-        
-        # Upload to S3 and return presigned URL
-        import os
-        bucket_name = os.environ.get('S3_BUCKET')
-        filename = f"exports/{photographer_id}/analytics_{export_type}_{start_date[:10]}_to_{end_date[:10]}.xlsx"
-        
-        s3.put_object(
-            Bucket=bucket_name,
-            Key=filename,
-            Body=excel_content,
-            ContentType='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            Metadata={
-                'photographer_id': photographer_id,
-                'export_type': export_type,
-                'start_date': start_date[:10],
-                'end_date': end_date[:10]
-            }
-        )
-        
-        # Generate presigned URL
-        download_url = s3.generate_presigned_url(
-            'get_object',
-            Params={
-                'Bucket': bucket_name,
-                'Key': filename,
-                'ResponseContentDisposition': f'attachment; filename="analytics_{export_type}.xlsx"'
-            },
-            ExpiresIn=3600
-        )
-        
-        return create_response(200, {
-            'download_url': download_url,
-            'filename': f"analytics_{export_type}.xlsx",
-            'expires_in': 3600
-        })
-        
-    except Exception as e:
-        print(f"Error exporting Excel: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return create_response(500, {'error': f'Failed to export Excel: {str(e)}'})
+# Rows plotted in an Excel chart (the sheet itself has every row)
+EXCEL_CHART_MAX_ROWS = 50
+# Photos listed on the Excel 'Top Photos' sheet
+EXCEL_TOP_PHOTOS = 50
+EXCEL_HEADER_FONT = Font(bold=True, color='FFFFFF') if EXCEL_AVAILABLE else None
+EXCEL_HEADER_FILL = PatternFill(start_color='0066CC', end_color='0066CC', fill_type='solid') if EXCEL_AVAILABLE else None
 
 
-def _create_summary_sheet(sheet, photographer_id, start_date, end_date):
-    """Create summary sheet with key metrics"""
-    # Title
-    sheet['A1'] = 'Analytics Summary Report'
-    sheet['A1'].font = Font(size=16, bold=True, color='0066CC')
-    sheet['A1'].alignment = Alignment(horizontal='left')
-    
-    # Date Range
-    sheet['A2'] = f'Period: {start_date[:10]} to {end_date[:10]}'
-    sheet['A2'].font = Font(size=10, italic=True)
-    
-    # Headers
-    sheet['A4'] = 'Metric'
-    sheet['B4'] = 'Value'
-    sheet['A4'].font = Font(bold=True)
-    sheet['B4'].font = Font(bold=True)
-    sheet['A4'].fill = PatternFill(start_color='0066CC', end_color='0066CC', fill_type='solid')
-    sheet['B4'].fill = PatternFill(start_color='0066CC', end_color='0066CC', fill_type='solid')
-    sheet['A4'].font = Font(bold=True, color='FFFFFF')
-    sheet['B4'].font = Font(bold=True, color='FFFFFF')
-    
-    # Fetch summary data (simplified - in production fetch real data)
-    metrics = [
-        ('Total Gallery Views', 1250),
-        ('Total Photo Views', 8430),
-        ('Total Downloads', 342),
-        ('Active Galleries', 12),
-        ('Total Photos', 456),
-        ('Avg. Views per Gallery', 104),
-    ]
-    
-    row = 5
-    for metric, value in metrics:
-        sheet[f'A{row}'] = metric
-        sheet[f'B{row}'] = value
-        sheet[f'B{row}'].alignment = Alignment(horizontal='right')
-        row += 1
-    
-    # Adjust column widths
-    sheet.column_dimensions['A'].width = 30
-    sheet.column_dimensions['B'].width = 15
-
-
-def _create_gallery_performance_sheet(sheet, photographer_id, start_date, end_date):
-    """Create gallery performance sheet"""
-    # Headers
-    headers = ['Gallery Name', 'Views', 'Downloads', 'Favorites', 'Comments']
-    for col, header in enumerate(headers, 1):
-        cell = sheet.cell(row=1, column=col, value=header)
-        cell.font = Font(bold=True, color='FFFFFF')
-        cell.fill = PatternFill(start_color='0066CC', end_color='0066CC', fill_type='solid')
-        cell.alignment = Alignment(horizontal='center')
-    
-    # Sample data (in production, fetch real data)
-    galleries = [
-        ('Wedding Gallery', 450, 89, 23, 12),
-        ('Corporate Headshots', 320, 65, 8, 3),
-        ('Portfolio Shoot', 280, 42, 15, 7),
-        ('Product Photography', 200, 38, 6, 2),
-    ]
-    
-    for row_idx, gallery_data in enumerate(galleries, 2):
-        for col_idx, value in enumerate(gallery_data, 1):
-            cell = sheet.cell(row=row_idx, column=col_idx, value=value)
-            if col_idx > 1:
-                cell.alignment = Alignment(horizontal='right')
-    
-    # Create bar chart
-    chart = BarChart()
-    chart.title = "Gallery Performance Comparison"
-    chart.x_axis.title = "Gallery"
-    chart.y_axis.title = "Count"
-    
-    data = Reference(sheet, min_col=2, min_row=1, max_col=5, max_row=len(galleries)+1)
-    categories = Reference(sheet, min_col=1, min_row=2, max_row=len(galleries)+1)
-    
-    chart.add_data(data, titles_from_data=True)
-    chart.set_categories(categories)
-    chart.height = 12
-    chart.width = 25
-    
-    sheet.add_chart(chart, "A8")
-    
-    # Adjust column widths
-    for col in range(1, 6):
-        sheet.column_dimensions[get_column_letter(col)].width = 20
+def _excel_header(sheet, headers):
+    """Append a styled header row to a write-only sheet"""
+    cells = []
+    for header in headers:
+        cell = WriteOnlyCell(sheet, value=header)
+        cell.font = EXCEL_HEADER_FONT
+        cell.fill = EXCEL_HEADER_FILL
+        cells.append(cell)
+    sheet.append(cells)
 
 
-def _create_daily_analytics_sheet(sheet, photographer_id, start_date, end_date):
-    """Create daily analytics sheet with line chart"""
-    # Headers
-    sheet['A1'] = 'Date'
-    sheet['B1'] = 'Views'
-    sheet['C1'] = 'Downloads'
-    
-    for col in ['A1', 'B1', 'C1']:
-        sheet[col].font = Font(bold=True, color='FFFFFF')
-        sheet[col].fill = PatternFill(start_color='0066CC', end_color='0066CC', fill_type='solid')
-        sheet[col].alignment = Alignment(horizontal='center')
-    
-    # Generate sample daily data
-    start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-    end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-    days = min((end_dt - start_dt).days, 30)
-    
-    import random
-    for day in range(days):
-        date = start_dt + timedelta(days=day)
-        row = day + 2
-        sheet[f'A{row}'] = date.strftime('%Y-%m-%d')
-        sheet[f'B{row}'] = random.randint(20, 100)
-        sheet[f'C{row}'] = random.randint(5, 30)
-    
-    # Create line chart
-    chart = LineChart()
-    chart.title = "Daily Views & Downloads Trend"
-    chart.x_axis.title = "Date"
-    chart.y_axis.title = "Count"
-    
-    data = Reference(sheet, min_col=2, min_row=1, max_col=3, max_row=days+1)
-    categories = Reference(sheet, min_col=1, min_row=2, max_row=days+1)
-    
-    chart.add_data(data, titles_from_data=True)
-    chart.set_categories(categories)
-    chart.height = 12
-    chart.width = 25
-    
-    sheet.add_chart(chart, "E2")
-    
-    # Adjust column widths
-    sheet.column_dimensions['A'].width = 15
-    sheet.column_dimensions['B'].width = 12
-    sheet.column_dimensions['C'].width = 12
-
-
-def _create_top_photos_sheet(sheet, photographer_id, start_date, end_date):
-    """Create top photos sheet"""
-    # Headers
-    headers = ['Photo Name', 'Gallery', 'Views', 'Downloads', 'Favorites']
-    for col, header in enumerate(headers, 1):
-        cell = sheet.cell(row=1, column=col, value=header)
-        cell.font = Font(bold=True, color='FFFFFF')
-        cell.fill = PatternFill(start_color='0066CC', end_color='0066CC', fill_type='solid')
-        cell.alignment = Alignment(horizontal='center')
-    
-    # Sample data
-    photos = [
-        ('IMG_001.jpg', 'Wedding Gallery', 450, 89, 45),
-        ('IMG_042.jpg', 'Wedding Gallery', 380, 76, 38),
-        ('HEADSHOT_01.jpg', 'Corporate Headshots', 320, 65, 12),
-        ('PORTRAIT_15.jpg', 'Portfolio Shoot', 280, 56, 28),
-        ('PRODUCT_A_01.jpg', 'Product Photography', 200, 40, 8),
-    ]
-    
-    for row_idx, photo_data in enumerate(photos, 2):
-        for col_idx, value in enumerate(photo_data, 1):
-            cell = sheet.cell(row=row_idx, column=col_idx, value=value)
-            if col_idx > 2:
-                cell.alignment = Alignment(horizontal='right')
-    
-    # Create pie chart for downloads distribution
-    chart = PieChart()
-    chart.title = "Downloads Distribution (Top 5 Photos)"
-    
-    data = Reference(sheet, min_col=4, min_row=1, max_row=len(photos)+1)
-    categories = Reference(sheet, min_col=1, min_row=2, max_row=len(photos)+1)
-    
-    chart.add_data(data, titles_from_data=True)
-    chart.set_categories(categories)
-    chart.height = 12
-    chart.width = 15
-    
-    sheet.add_chart(chart, "G2")
-    
-    # Adjust column widths
-    for col in range(1, 6):
-        sheet.column_dimensions[get_column_letter(col)].width = 25
+def _excel_sheet(wb, title, widths):
+    """Write-only sheet with its column widths (they must be set before any row)"""
+    sheet = wb.create_sheet(title)
+    for col, width in enumerate(widths, 1):
+        sheet.column_dimensions[get_column_letter(col)].width = width
+    return sheet
+
+
+def _write_summary_sheet(wb, user, photographer_id, start_date, end_date):
+    """Daily summary rows with totals and a views trend chart"""
+    headers = EXPORT_COLUMNS['summary']
+    sheet = _excel_sheet(wb, 'Summary', [14] + [16] * (len(headers) - 1))
+    sheet.sheet_properties.tabColor = '0066CC'
+
+    title = WriteOnlyCell(sheet, value='Galerly Analytics Report')
+    title.font = Font(size=18, bold=True, color='0066CC')
+    sheet.append([title])
+    sheet.append([f'Period: {start_date[:10]} to {end_date[:10]}'])
+    sheet.append([f'Photographer: {user.get("username", "Unknown")}'])
+    sheet.append([])
+
+    header_row = 5
+    _excel_header(sheet, headers)
+    totals = dict.fromkeys(headers[1:], 0)
+    count = 0
+    for row in generate_summary_csv(photographer_id, start_date, end_date):
+        sheet.append([row.get(h, 0) for h in headers])
+        for h in headers[1:]:
+            totals[h] += row.get(h, 0)
+        count += 1
+    total_label = WriteOnlyCell(sheet, value='Total')
+    total_label.font = Font(bold=True)
+    sheet.append([total_label] + [totals[h] for h in headers[1:]])
 
+    if count:
+        last = header_row + count
+        chart = LineChart()
+        chart.title = 'Daily Views'
+        chart.y_axis.title = 'Views'
+        chart.x_axis.title = 'Date'
+        chart.add_data(Reference(sheet, min_col=2, max_col=3, min_row=header_row, max_row=last), titles_from_data=True)
+        chart.set_categories(Reference(sheet, min_col=1, min_row=header_row + 1, max_row=last))
+        sheet.add_chart(chart, f'{get_column_letter(len(headers) + 2)}5')
+
+
+def _write_galleries_sheet(wb, photographer_id, start_date, end_date):
+    """Every gallery row, with a views chart of the first EXCEL_CHART_MAX_ROWS"""
+    headers = EXPORT_COLUMNS['galleries']
+    sheet = _excel_sheet(wb, 'Gallery Performance', [38, 30, 30, 10, 10, 12, 10, 12])
+    _excel_header(sheet, headers)
+    count = 0
+    for row in generate_galleries_csv(photographer_id, start_date, end_date):
+        sheet.append([row.get(h, '') for h in headers])
+        count += 1
+
+    if count:
+        last = 1 + min(count, EXCEL_CHART_MAX_ROWS)
+        chart = BarChart()
+        chart.title = 'Gallery Views'
+        chart.y_axis.title = 'Views'
+        chart.x_axis.title = 'Gallery'
+        chart.add_data(Reference(sheet, min_col=5, min_row=1, max_row=last), titles_from_data=True)
+        chart.set_categories(Reference(sheet, min_col=2, min_row=2, max_row=last))
+        sheet.add_chart(chart, 'J2')
+
+
+def _write_top_photos_sheet(wb, photographer_id, start_date, end_date):
+    """The EXCEL_TOP_PHOTOS most viewed photos (only those are kept in memory)"""
+    headers = EXPORT_COLUMNS['photos']
+    sheet = _excel_sheet(wb, 'Top Photos', [38, 30, 30, 10, 10, 12, 10, 12])
+    _excel_header(sheet, headers)
+    rows = generate_photos_csv(photographer_id, start_date, end_date)
+    for row in heapq.nlargest(EXCEL_TOP_PHOTOS, rows, key=lambda r: r.get('Views') or 0):
+        sheet.append([row.get(h, '') for h in headers])
 
 
 @require_plan(feature='analytics_export')
@@ -760,6 +662,10 @@ def handle_export_analytics_excel(user, query_params):
     """
     Export analytics data to Excel format with charts
     GET /analytics/export/excel?start_date=...&end_date=...&type=...
+
+    Returns:
+        download_url (presigned, valid for EXPORT_URL_EXPIRY seconds) and
+        filename
     """
     try:
         # Plan enforcement handled by decorators
@@ -771,135 +677,30 @@ def handle_export_analytics_excel(user, query_params):
         
         # Parse parameters
         export_type = query_params.get('type', 'summary')
-        start_date = query_params.get('start_date')
-        end_date = query_params.get('end_date', datetime.now().isoformat())
-        
-        # Default to last 30 days
-        if not start_date:
-            start_date = (datetime.now() - timedelta(days=30)).isoformat()
-        
-        # Create workbook
-        wb = openpyxl.Workbook()
-        wb.remove(wb.active)  # Remove default sheet
-        
-        # Add summary sheet
-        summary_sheet = wb.create_sheet('Summary', 0)
-        summary_sheet.sheet_properties.tabColor = '0066CC'
-        
-        # Add title
-        summary_sheet['A1'] = 'Galerly Analytics Report'
-        summary_sheet['A1'].font = Font(size=18, bold=True, color='0066CC')
-        summary_sheet['A2'] = f'Period: {start_date[:10]} to {end_date[:10]}'
-        summary_sheet['A2'].font = Font(size=12, color='666666')
-        summary_sheet['A3'] = f'Photographer: {user.get("username", "Unknown")}'
+        start_date, end_date = _export_range(query_params)
         
-        # Add metrics starting at row 5
-        row = 5
-        
-        # Fetch summary data
-        summary_data = generate_summary_csv(photographer_id, start_date, end_date)
-        
-        if summary_data:
-            # Headers
-            summary_sheet.append(['Metric', 'Value', 'Change'])
-            header_row = summary_sheet[row]
-            for cell in header_row:
-                cell.font = Font(bold=True, color='FFFFFF')
-                cell.fill = PatternFill(start_color='0066CC', end_color='0066CC', fill_type='solid')
-                cell.alignment = Alignment(horizontal='center')
-            
-            row += 1
-            
-            # Data rows
-            for item in summary_data:
-                summary_sheet.append([
-                    item.get('metric', ''),
-                    item.get('value', 0),
-                    item.get('change', '')
-                ])
-        
-        # Auto-adjust column widths
-        for column in summary_sheet.columns:
-            max_length = 0
-            column_letter = get_column_letter(column[0].column)
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            summary_sheet.column_dimensions[column_letter].width = adjusted_width
-        
-        # Add gallery performance sheet
+        # Write-only workbook: rows go to temporary files as they are
+        # appended, and are zipped straight into the upload on save
+        wb = openpyxl.Workbook(write_only=True)
+        _write_summary_sheet(wb, user, photographer_id, start_date, end_date)
         if export_type in ['summary', 'galleries']:
-            gallery_sheet = wb.create_sheet('Gallery Performance')
-            gallery_data = generate_galleries_csv(photographer_id, start_date, end_date)
-            
-            if gallery_data:
-                # Add headers
-                headers = list(gallery_data[0].keys())
-                gallery_sheet.append(headers)
-                
-                # Style headers
-                for cell in gallery_sheet[1]:
-                    cell.font = Font(bold=True, color='FFFFFF')
-                    cell.fill = PatternFill(start_color='0066CC', end_color='0066CC', fill_type='solid')
-                
-                # Add data
-                for item in gallery_data:
-                    gallery_sheet.append([item.get(h, '') for h in headers])
-                
-                # Add chart if data exists
-                if len(gallery_data) > 0:
-                    chart = BarChart()
-                    chart.title = "Gallery Views"
-                    chart.y_axis.title = 'Views'
-                    chart.x_axis.title = 'Gallery'
-                    
-                    data = Reference(gallery_sheet, min_col=2, min_row=1, max_row=len(gallery_data) + 1)
-                    cats = Reference(gallery_sheet, min_col=1, min_row=2, max_row=len(gallery_data) + 1)
-                    chart.add_data(data, titles_from_data=True)
-                    chart.set_categories(cats)
-                    
-                    gallery_sheet.add_chart(chart, 'E5')
-        
-        # Add photos sheet
+            _write_galleries_sheet(wb, photographer_id, start_date, end_date)
         if export_type in ['summary', 'photos']:
-            photo_sheet = wb.create_sheet('Top Photos')
-            photo_data = generate_photos_csv(photographer_id, start_date, end_date)
-            
-            if photo_data:
-                headers = list(photo_data[0].keys())
-                photo_sheet.append(headers)
-                
-                for cell in photo_sheet[1]:
-                    cell.font = Font(bold=True, color='FFFFFF')
-                    cell.fill = PatternFill(start_color='0066CC', end_color='0066CC', fill_type='solid')
-                
-                for item in photo_data[:50]:  # Top 50 photos
-                    photo_sheet.append([item.get(h, '') for h in headers])
-        
-        # Save to bytes
-        excel_output = io.BytesIO()
-        wb.save(excel_output)
-        excel_output.seek(0)
+            _write_top_photos_sheet(wb, photographer_id, start_date, end_date)
         
-        # Return Excel file
-        import base64
-        excel_b64 = base64.b64encode(excel_output.getvalue()).decode()
+        filename = _export_filename(export_type, start_date, end_date, 'xlsx')
+        download_url = _upload_export(photographer_id, filename, EXCEL_CONTENT_TYPE, wb.save)
         
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                'Content-Disposition': f'attachment; filename="analytics_{export_type}_{start_date[:10]}_to_{end_date[:10]}.xlsx"',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': excel_b64,
-            'isBase64Encoded': True
-        }
+        return create_response(200, {
+            'download_url': download_url,
+            'filename': filename,
+            'expires_in': EXPORT_URL_EXPIRY
+        })
         
+    except ArchiveUnavailableError as e:
+        # Archived days can't be read here - no partial export
+        print(f"Error exporting Excel: {str(e)}")
+        return create_response(503, {'error': f'Analytics archive unavailable: {str(e)}'})
     except Exception as e:
         print(f"Error exporting Excel: {str(e)}")
         import traceback
@@ -5,20 +5,34 @@ Tiered analytics access based on subscription plan:
 - Advanced (Plus): 30 days retention, full metrics
 - Pro (Pro/Ultimate): 90 days retention, full metrics + exports
 """
+import os
 import uuid
 import re
 from datetime import datetime, timedelta, timezone
 from boto3.dynamodb.conditions import Key
+from concurrent.futures import ThreadPoolExecutor
 from utils.config import analytics_table, galleries_table, photos_table
+from utils.analytics_rollups import record_events, load_gallery_rollups
+from utils.event_buffer import put_event
+from utils.hyperloglog import HyperLogLog
+from utils.gallery_resolver import resolve_gallery
+from utils.request_scope import current_scope
 from utils.response import create_response
 from handlers.subscription_handler import get_user_features
 from utils.rate_limiter import rate_limit
 from utils.plan_monitoring import track_feature_violation
 from utils.plan_enforcement import require_role
 
+# Galleries whose rollups are loaded concurrently for the overall view
+ROLLUP_QUERY_WORKERS = 8
+
 
 def track_event(user_id, gallery_id, event_type, metadata=None):
-    """Track an analytics event"""
+    """
+    Track an analytics event (raw event + ingest-time rollup counters)
+    Within an API invocation the write is buffered and batched with the
+    invocation's other tracking events (utils/event_buffer.py)
+    """
     try:
         event = {
             'id': str(uuid.uuid4()),
@@ -28,13 +42,50 @@ def track_event(user_id, gallery_id, event_type, metadata=None):
             'timestamp': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z',
             'metadata': metadata or {}
         }
-        analytics_table.put_item(Item=event)
+        # Rollups are updated once the raw events are stored; if that fails,
+        # backfill_analytics_rollups.py can rebuild the day
+        put_event(analytics_table, event, after_write=record_events)
         return True
     except Exception as e:
         print(f"Error tracking event: {str(e)}")
         return False
 
 
+def _rollup_days(start_date, end_date):
+    """(first day, last day, every day) of a date range, as YYYY-MM-DD"""
+    num_days = (end_date - start_date).days + 1
+    days = [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(num_days)]
+    return days[0], days[-1], days
+
+
+def _photo_avg_time(counters):
+    """Average viewing time in seconds from a photo's rollup counters"""
+    count = counters.get('duration_count', 0)
+    return round(counters.get('duration_total', 0) / count, 1) if count else 0
+
+
+def _top_photos(photo_stats, photo_counters):
+    """Top photos by views with their details (one BatchGetItem)"""
+    top_photo_ids = sorted(photo_stats.keys(), key=lambda x: photo_stats[x], reverse=True)[:10]
+    top_photos = []
+    if top_photo_ids:
+        try:
+            p_items = current_scope().batch_get_items(photos_table, [{'id': pid} for pid in top_photo_ids])
+            for pid, p_item in zip(top_photo_ids, p_items):
+                if p_item:
+                    top_photos.append({
+                        'id': pid,
+                        'url': p_item.get('url'),
+                        'thumbnail_url': p_item.get('thumbnail_url') or p_item.get('url'),
+                        'name': p_item.get('filename', 'Untitled'),
+                        'views': photo_stats[pid],
+                        'avg_time_seconds': _photo_avg_time(photo_counters.get(pid, {}))
+                    })
+        except Exception as e:
+            print(f"Error fetching photo details: {e}")
+    return top_photos
+
+
 @require_role('photographer')
 @rate_limit('analytics_view', 'user_id')
 def handle_get_gallery_analytics(user, gallery_id, query_params=None):
@@ -91,98 +142,34 @@ def handle_get_gallery_analytics(user, gallery_id, query_params=None):
             default_days = min(30, max_retention_days)
             start_date = end_date - timedelta(days=default_days)
         
-        # Get analytics events for this gallery
-        response = analytics_table.query(
-            IndexName='GalleryIdIndex',
-            KeyConditionExpression=Key('gallery_id').eq(gallery_id) & Key('timestamp').between(
-                start_date.isoformat() + 'Z',
-                end_date.isoformat() + 'Z'
-            )
-        )
-        
-        events = response.get('Items', [])
-        
-        # Calculate metrics
-        views = sum(1 for e in events if e.get('event_type') == 'gallery_view')
-        unique_visitors = len(set(e.get('metadata', {}).get('ip', '') for e in events if e.get('event_type') == 'gallery_view'))
-        photo_views = sum(1 for e in events if e.get('event_type') == 'photo_view')
-        downloads = sum(1 for e in events if e.get('event_type') == 'photo_download')
-        bulk_downloads = sum(1 for e in events if e.get('event_type') == 'bulk_download')
+        # Pre-aggregated rollup rows only (utils/analytics_rollups.py)
+        first_day, last_day, day_list = _rollup_days(start_date, end_date)
+        num_days = len(day_list)
+        rollups = load_gallery_rollups(gallery_id, first_day, last_day)
         
         # Time series data - initialize all days in range
-        daily_stats = {}
-        num_days = (end_date - start_date).days + 1
-        for i in range(num_days):
-            d = (start_date + timedelta(days=i)).strftime('%Y-%m-%d')
-            daily_stats[d] = {'views': 0, 'photo_views': 0, 'downloads': 0}
-        
-        photo_stats = {}
-        
-        for event in events:
-            date = event['timestamp'][:10]  # YYYY-MM-DD
-            event_type = event.get('event_type')
-            
+        daily_stats = {d: {'views': 0, 'photo_views': 0, 'downloads': 0} for d in day_list}
+        totals = {}
+        for date, counters in rollups['days'].items():
+            for event_type, count in counters.items():
+                totals[event_type] = totals.get(event_type, 0) + count
             if date in daily_stats:
-                if event_type == 'gallery_view':
-                    daily_stats[date]['views'] += 1
-                elif event_type == 'photo_view':
-                    daily_stats[date]['photo_views'] += 1
-                    
-                    # Aggregate photo views
-                    meta = event.get('metadata', {})
-                    pid = meta.get('photo_id')
-                    if pid:
-                        if pid not in photo_stats:
-                            photo_stats[pid] = 0
-                        photo_stats[pid] += 1
-                        
-                elif event_type == 'photo_download':
-                    daily_stats[date]['downloads'] += 1
-                elif event_type == 'bulk_download':
-                    if 'bulk_downloads' not in daily_stats[date]:
-                        daily_stats[date]['bulk_downloads'] = 0
-                    daily_stats[date]['bulk_downloads'] += 1
-                
-        # Get top photos
-        top_photo_ids = sorted(photo_stats.keys(), key=lambda x: photo_stats[x], reverse=True)[:10]
+                daily_stats[date]['views'] += counters.get('gallery_view', 0)
+                daily_stats[date]['photo_views'] += counters.get('photo_view', 0)
+                daily_stats[date]['downloads'] += counters.get('photo_download', 0)
+                if counters.get('bulk_download'):
+                    daily_stats[date]['bulk_downloads'] = counters['bulk_download']
         
-        # Calculate average time per photo from engagement analytics
-        photo_avg_times = {}
-        if top_photo_ids:
-            try:
-                for pid in top_photo_ids:
-                    # Get engagement events for this photo
-                    photo_events = [e for e in all_events if e.get('metadata', {}).get('photo_id') == pid]
-                    
-                    # Calculate average time from events with duration
-                    durations = [float(e.get('duration', 0)) for e in photo_events if e.get('duration')]
-                    if durations:
-                        photo_avg_times[pid] = round(sum(durations) / len(durations), 1)
-                    else:
-                        photo_avg_times[pid] = 0
-            except Exception as e:
-                print(f"Error calculating average times: {e}")
+        # Calculate metrics
+        views = totals.get('gallery_view', 0)
+        unique_visitors = rollups['visitors'].count()
+        photo_views = totals.get('photo_view', 0)
+        downloads = totals.get('photo_download', 0)
+        bulk_downloads = totals.get('bulk_download', 0)
         
-        # Fetch photo details
-        top_photos = []
-        if top_photo_ids:
-            try:
-                for pid in top_photo_ids:
-                    try:
-                        p_item = photos_table.get_item(Key={'id': pid}).get('Item')
-                        if p_item:
-                            top_photos.append({
-                                'id': pid,
-                                'url': p_item.get('url'),
-                                'thumbnail_url': p_item.get('thumbnail_url') or p_item.get('url'),
-                                'name': p_item.get('filename', 'Untitled'),
-                                'views': photo_stats[pid],
-                                'avg_time_seconds': photo_avg_times.get(pid, 0)
-                            })
-                    except:
-                        continue
-            except Exception as e:
-                print(f"Error fetching photo details: {e}")
+        # Top photos by views
+        photo_stats = {pid: c['photo_view'] for pid, c in rollups['photos'].items() if c.get('photo_view')}
+        top_photos = _top_photos(photo_stats, rollups['photos'])
         
         # Convert daily_stats to list for frontend
         daily_stats_list = [{'date': k, 'views': v['views'], 'downloads': v['downloads']} for k, v in sorted(daily_stats.items())]
@@ -304,116 +291,62 @@ def handle_get_overall_analytics(user, query_params=None):
             default_days = min(30, max_retention_days)
             start_date = end_date - timedelta(days=default_days)
 
-        # Get analytics for all galleries
+        # Rollup rows for all galleries, queried concurrently
+        first_day, last_day, day_list = _rollup_days(start_date, end_date)
+        num_days = len(day_list)
         
-        all_events = []
-        for gallery_id in gallery_ids:
+        def load(gallery_id):
             try:
-                response = analytics_table.query(
-                    IndexName='GalleryIdIndex',
-                    KeyConditionExpression=Key('gallery_id').eq(gallery_id) & Key('timestamp').between(
-                        start_date.isoformat() + 'Z',
-                        end_date.isoformat() + 'Z'
-                    )
-                )
-                all_events.extend(response.get('Items', []))
-            except:
-                pass
+                return load_gallery_rollups(gallery_id, first_day, last_day)
+            except Exception as e:
+                print(f"Error loading rollups for gallery {gallery_id}: {e}")
+                return {'days': {}, 'photos': {}, 'visitors': HyperLogLog()}
         
-        # Calculate overall metrics
-        total_views = sum(1 for e in all_events if e.get('event_type') == 'gallery_view')
-        total_photo_views = sum(1 for e in all_events if e.get('event_type') == 'photo_view')
-        total_downloads = sum(1 for e in all_events if e.get('event_type') == 'photo_download')
-        total_bulk_downloads = sum(1 for e in all_events if e.get('event_type') == 'bulk_download')
+        with ThreadPoolExecutor(max_workers=min(ROLLUP_QUERY_WORKERS, len(gallery_ids))) as pool:
+            gallery_rollups = dict(zip(gallery_ids, pool.map(load, gallery_ids)))
         
         # Per-gallery stats
         gallery_stats = []
-        daily_stats = {}
+        daily_stats = {d: {'views': 0, 'downloads': 0} for d in day_list}
         photo_stats = {}
+        photo_counters = {}
+        total_views = total_photo_views = total_downloads = total_bulk_downloads = 0
+        # Unique visitors across all galleries: union of the per-gallery sketches
+        all_visitors = HyperLogLog()
         
-        # Initialize days based on actual date range
-        num_days = (end_date - start_date).days + 1
-        for i in range(num_days):
-            d = (start_date + timedelta(days=i)).strftime('%Y-%m-%d')
-            daily_stats[d] = {'views': 0, 'downloads': 0}
-
-        for event in all_events:
-            date = event['timestamp'][:10]
-            event_type = event.get('event_type')
-            
-            # Populate daily stats if date is within range
-            if date in daily_stats:
-                if event_type == 'gallery_view':
-                    daily_stats[date]['views'] += 1
-                elif event_type in ['photo_download', 'bulk_download']:
-                    daily_stats[date]['downloads'] += 1
-            
-            # Aggregate photo views
-            if event_type == 'photo_view':
-                meta = event.get('metadata', {})
-                pid = meta.get('photo_id')
-                if pid:
-                    if pid not in photo_stats:
-                        photo_stats[pid] = 0
-                    photo_stats[pid] += 1
-
-        # Get top photos across all galleries
-        top_photo_ids = sorted(photo_stats.keys(), key=lambda x: photo_stats[x], reverse=True)[:10]
-        
-        # Calculate average time per photo from engagement analytics
-        photo_avg_times = {}
-        if top_photo_ids:
-            try:
-                for pid in top_photo_ids:
-                    # Get engagement events for this photo
-                    photo_events = [e for e in all_events if e.get('metadata', {}).get('photo_id') == pid]
-                    
-                    # Calculate average time from events with duration
-                    durations = [float(e.get('duration', 0)) for e in photo_events if e.get('duration')]
-                    if durations:
-                        photo_avg_times[pid] = round(sum(durations) / len(durations), 1)
-                    else:
-                        photo_avg_times[pid] = 0
-            except Exception as e:
-                print(f"Error calculating average times: {e}")
-        
-        # Fetch photo details
-        top_photos = []
-        if top_photo_ids:
-            try:
-                for pid in top_photo_ids:
-                    try:
-                        p_item = photos_table.get_item(Key={'id': pid}).get('Item')
-                        if p_item:
-                            top_photos.append({
-                                'id': pid,
-                                'url': p_item.get('url'),
-                                'thumbnail_url': p_item.get('thumbnail_url') or p_item.get('url'),
-                                'name': p_item.get('filename', 'Untitled'),
-                                'views': photo_stats[pid],
-                                'avg_time_seconds': photo_avg_times.get(pid, 0)
-                            })
-                    except:
-                        continue
-            except Exception as e:
-                print(f"Error fetching photo details: {e}")
-
         for gallery in galleries:
-            gallery_id = gallery['id']
-            gallery_events = [e for e in all_events if e.get('gallery_id') == gallery_id]
-            gallery_views = sum(1 for e in gallery_events if e.get('event_type') == 'gallery_view')
-            gallery_downloads = sum(1 for e in gallery_events if e.get('event_type') in ['photo_download', 'bulk_download'])
+            rollups = gallery_rollups.get(gallery['id'], {'days': {}, 'photos': {}, 'visitors': HyperLogLog()})
+            all_visitors.merge(rollups['visitors'])
+            totals = {}
+            for date, counters in rollups['days'].items():
+                for event_type, count in counters.items():
+                    totals[event_type] = totals.get(event_type, 0) + count
+                if date in daily_stats:
+                    daily_stats[date]['views'] += counters.get('gallery_view', 0)
+                    daily_stats[date]['downloads'] += counters.get('photo_download', 0) + counters.get('bulk_download', 0)
+            for pid, counters in rollups['photos'].items():
+                photo_counters[pid] = counters
+                if counters.get('photo_view'):
+                    photo_stats[pid] = counters['photo_view']
+            
+            total_views += totals.get('gallery_view', 0)
+            total_photo_views += totals.get('photo_view', 0)
+            total_downloads += totals.get('photo_download', 0)
+            total_bulk_downloads += totals.get('bulk_download', 0)
             
             gallery_stats.append({
-                'gallery_id': gallery_id,
+                'gallery_id': gallery['id'],
                 'gallery_name': gallery.get('name', 'Untitled'),
                 'cover_photo': gallery.get('cover_photo') or gallery.get('cover_photo_url') or gallery.get('thumbnail_url'),
-                'views': gallery_views,
-                'photo_views': sum(1 for e in gallery_events if e.get('event_type') == 'photo_view'),
-                'downloads': gallery_downloads,
-                'bulk_downloads': sum(1 for e in gallery_events if e.get('event_type') == 'bulk_download')
+                'views': totals.get('gallery_view', 0),
+                'photo_views': totals.get('photo_view', 0),
+                'downloads': totals.get('photo_download', 0) + totals.get('bulk_download', 0),
+                'bulk_downloads': totals.get('bulk_download', 0)
             })
         
+        # Top photos across all galleries
+        top_photos = _top_photos(photo_stats, photo_counters)
+        
         # Sort by views
         gallery_stats.sort(key=lambda x: x['views'], reverse=True)
         
@@ -447,6 +380,7 @@ def handle_get_overall_analytics(user, query_params=None):
         elif analytics_level == 'advanced':
             response_data.update({
                 'total_views': total_views,
+                'unique_visitors': all_visitors.count(),
                 'total_photo_views': total_photo_views,
                 'total_downloads': total_downloads,
                 'total_bulk_downloads': total_bulk_downloads,
@@ -459,6 +393,7 @@ def handle_get_overall_analytics(user, query_params=None):
         else:  # pro
             response_data.update({
                 'total_views': total_views,
+                'unique_visitors': all_visitors.count(),
                 'total_photo_views': total_photo_views,
                 'total_downloads': total_downloads,
                 'total_bulk_downloads': total_bulk_downloads,
@@ -477,16 +412,12 @@ def handle_track_gallery_view(gallery_id, viewer_user_id=None, metadata=None):
     """Track gallery view event - public endpoint, gets user_id from gallery
     Only tracks if viewer is NOT the gallery owner"""
     try:
-        # Get gallery to find owner's user_id
-        gallery_response = galleries_table.scan(
-            FilterExpression='id = :gid',
-            ExpressionAttributeValues={':gid': gallery_id}
-        )
+        # Resolve gallery owner via GalleryIdIndex (cached per container)
+        gallery = resolve_gallery(gallery_id)
         
-        if not gallery_response.get('Items'):
+        if not gallery:
             return create_response(404, {'error': 'Gallery not found'})
         
-        gallery = gallery_response['Items'][0]
         owner_user_id = gallery.get('user_id')
         
         # Don't track if viewer is the owner
@@ -523,16 +454,12 @@ def handle_track_photo_view(photo_id, gallery_id, viewer_user_id=None, metadata=
         if not gallery_id:
             return create_response(400, {'error': 'gallery_id is required'})
         
-        # Get gallery to find owner's user_id
-        gallery_response = galleries_table.scan(
-            FilterExpression='id = :gid',
-            ExpressionAttributeValues={':gid': gallery_id}
-        )
+        # Resolve gallery owner via GalleryIdIndex (cached per container)
+        gallery = resolve_gallery(gallery_id)
         
-        if not gallery_response.get('Items'):
+        if not gallery:
             return create_response(404, {'error': 'Gallery not found'})
         
-        gallery = gallery_response['Items'][0]
         owner_user_id = gallery.get('user_id')
         
         # Don't track if viewer is the owner
@@ -561,16 +488,12 @@ def handle_track_photo_download(photo_id, gallery_id, viewer_user_id=None, metad
         if not gallery_id:
             return create_response(400, {'error': 'gallery_id is required'})
         
-        # Get gallery to find owner's user_id
-        gallery_response = galleries_table.scan(
-            FilterExpression='id = :gid',
-            ExpressionAttributeValues={':gid': gallery_id}
-        )
+        # Resolve gallery owner via GalleryIdIndex (cached per container)
+        gallery = resolve_gallery(gallery_id)
         
-        if not gallery_response.get('Items'):
+        if not gallery:
             return create_response(404, {'error': 'Gallery not found'})
         
-        gallery = gallery_response['Items'][0]
         owner_user_id = gallery.get('user_id')
         
         # Don't track if viewer is the owner
@@ -620,16 +543,12 @@ def handle_track_gallery_share(gallery_id, platform, user=None, metadata=None):
         if platform and len(platform) > 50:
             platform = platform[:50]
         
-        # Get gallery to find owner's user_id
-        gallery_response = galleries_table.scan(
-            FilterExpression='id = :gid',
-            ExpressionAttributeValues={':gid': gallery_id}
-        )
+        # Resolve gallery owner via GalleryIdIndex (cached per container)
+        gallery = resolve_gallery(gallery_id)
         
-        if not gallery_response.get('Items'):
+        if not gallery:
             return create_response(404, {'error': 'Gallery not found'})
         
-        gallery = gallery_response['Items'][0]
         owner_user_id = gallery.get('user_id')
         
         # Track the share (always track, even if owner shares their own gallery)
@@ -673,16 +592,12 @@ def handle_track_photo_share(photo_id, platform, user=None, metadata=None):
         if not gallery_id:
             return create_response(400, {'error': 'Photo has no associated gallery'})
         
-        # Get gallery to find owner's user_id
-        gallery_response = galleries_table.scan(
-            FilterExpression='id = :gid',
-            ExpressionAttributeValues={':gid': gallery_id}
-        )
+        # Resolve gallery owner via GalleryIdIndex (cached per container)
+        gallery = resolve_gallery(gallery_id)
         
-        if not gallery_response.get('Items'):
+        if not gallery:
             return create_response(404, {'error': 'Gallery not found'})
         
-        gallery = gallery_response['Items'][0]
         owner_user_id = gallery.get('user_id')
         
         # Track the share (always track, even if owner shares their own photo)
@@ -716,16 +631,12 @@ def handle_track_bulk_download(gallery_id, viewer_user_id=None, metadata=None, c
         if not gallery_id or not isinstance(gallery_id, str):
             return create_response(400, {'error': 'Invalid gallery ID'})
         
-        # Get gallery to find owner's user_id
-        gallery_response = galleries_table.scan(
-            FilterExpression='id = :gid',
-            ExpressionAttributeValues={':gid': gallery_id}
-        )
+        # Resolve gallery owner via GalleryIdIndex (cached per container)
+        gallery = resolve_gallery(gallery_id)
         
-        if not gallery_response.get('Items'):
+        if not gallery:
             return create_response(404, {'error': 'Gallery not found'})
         
-        gallery = gallery_response['Items'][0]
         owner_user_id = gallery.get('user_id')
         
         print(f"   Gallery owner: {owner_user_id}")
@@ -736,8 +647,17 @@ def handle_track_bulk_download(gallery_id, viewer_user_id=None, metadata=None, c
         # 1. User ID match (if authenticated)
         # 2. IP address match with owner's recent activity
         if owner_user_id:
-            # Add photo count to metadata
-            photo_count = gallery.get('photo_count', 0)
+            # Add photo count to metadata (read fresh by primary key - the
+            # resolver only caches owner/name, counts change with uploads)
+            photo_count = 0
+            try:
+                gallery_item = galleries_table.get_item(
+                    Key={'user_id': owner_user_id, 'id': gallery_id},
+                    ProjectionExpression='photo_count'
+                ).get('Item') or {}
+                photo_count = gallery_item.get('photo_count', 0)
+            except Exception as count_err:
+                print(f"    Could not read photo_count: {str(count_err)}")
             
             # Check if this is an owner download
             is_owner_download = False
@@ -9,7 +9,10 @@ import os
 from datetime import datetime, timezone
 from utils.config import users_table, sessions_table
 from utils.response import create_response
-from utils.auth import hash_password, verify_password
+from utils.auth import (
+    hash_password, verify_password, generate_session_token, forget_session, forget_user_sessions,
+    register_api_key
+)
 from utils.email import send_welcome_email, send_password_reset_email, send_verification_code_email
 from utils.plan_enforcement import require_plan, require_role
 
@@ -332,7 +335,7 @@ def handle_register(body):
         pass  # Don't fail registration if email fails
     
     # Create session token
-    token = secrets.token_urlsafe(32)
+    token = generate_session_token(user.get('id'))
     sessions_table.put_item(Item={
         'token': token,
         'user': user,
@@ -425,7 +428,7 @@ def handle_login(body):
         return create_response(401, {'error': 'Invalid credentials'})
     
     # Create session token
-    token = secrets.token_urlsafe(32)
+    token = generate_session_token(user.get('id'))
     sessions_table.put_item(Item={
         'token': token,
         'user': user,
@@ -498,6 +501,7 @@ def handle_logout(event):
     if token:
         try:
             sessions_table.delete_item(Key={'token': token})
+            forget_session(token)
         except Exception as e:
             print(f"Error deleting session: {str(e)}")
     
@@ -657,6 +661,7 @@ def handle_delete_account(user, cookie_header=None):
             )
             for session in sessions_response.get('Items', []):
                 sessions_table.delete_item(Key={'token': session['token']})
+            forget_user_sessions(user_id=user_id)
             print(f"  Deleted {len(sessions_response.get('Items', []))} active sessions")
         except Exception as e:
             print(f"⚠️ Error deleting sessions: {str(e)}")
@@ -728,15 +733,21 @@ def handle_generate_api_key(user):
         # Not using 'sk_live_' prefix to avoid confusion with Stripe keys
         api_key = f"galerly_live_{secrets.token_urlsafe(24)}"
         
-        users_table.update_item(
+        response = users_table.update_item(
             Key={'email': user['email']},
             UpdateExpression='SET api_key = :key, api_key_created_at = :now',
             ExpressionAttributeValues={
                 ':key': api_key,
                 ':now': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
-            }
+            },
+            ReturnValues='UPDATED_OLD'
         )
         
+        # Index the new key's hash and retire the old one (drops it from
+        # this container's API key cache)
+        previous_key = (response or {}).get('Attributes', {}).get('api_key')
+        register_api_key(api_key, user, previous_key=previous_key)
+        
         return create_response(200, {'api_key': api_key})
     except Exception as e:
         print(f"Error generating API key: {str(e)}")
@@ -838,7 +849,7 @@ def handle_restore_account(body):
             print(f"⚠️ Failed to send restoration email: {str(e)}")
         
         # Create new session token
-        token = secrets.token_urlsafe(32)
+        token = generate_session_token(user.get('id'))
         sessions_table.put_item(Item={
             'token': token,
             'user': user,
@@ -16,13 +16,14 @@ from utils.response import create_response
 from boto3.dynamodb.conditions import Key, Attr
 
 
-def create_background_job(job_type, user_id, user_email, metadata=None):
+def create_background_job(job_type, user_id, user_email, metadata=None, job_id=None):
     """
     Create a background job entry
+    job_id can be given to make jobs for the same work idempotent
     Returns job_id
     """
     import uuid
-    job_id = str(uuid.uuid4())
+    job_id = job_id or str(uuid.uuid4())
     
     job_item = {
         'job_id': job_id,
@@ -40,8 +41,8 @@ def create_background_job(job_type, user_id, user_email, metadata=None):
     return job_id
 
 
-def update_job_status(job_id, status, progress=None, error_message=None):
-    """Update background job status"""
+def update_job_status(job_id, status, progress=None, error_message=None, result=None):
+    """Update background job status (result: JSON-serializable output of the job)"""
     update_expression = 'SET #status = :status, updated_at = :now'
     expression_values = {
         ':status': status,
@@ -57,6 +58,11 @@ def update_job_status(job_id, status, progress=None, error_message=None):
         update_expression += ', error_message = :error'
         expression_values[':error'] = error_message
     
+    if result is not None:
+        update_expression += ', #result = :result'
+        expression_values[':result'] = json.dumps(result)
+        expression_names['#result'] = 'result'
+    
     background_jobs_table.update_item(
         Key={'job_id': job_id},
         UpdateExpression=update_expression,
@@ -230,6 +236,33 @@ def process_account_deletion(job_id, user_id, user_email):
         return False
 
 
+def process_selection_zip(job_id, metadata):
+    """
+    Build the ZIP of a client selection (favorites or a submitted selection)
+    The result (zip_url) is stored on the job; the ZIP itself is cached by
+    its photo-id set, so the download endpoint serves it directly afterwards
+    """
+    try:
+        from utils.zip_generator import generate_selection_zip
+        update_job_status(job_id, 'in_progress', progress=0)
+        
+        result = generate_selection_zip(metadata['gallery_id'], metadata['photo_ids'])
+        if not result.get('success'):
+            update_job_status(job_id, 'failed', error_message=result.get('error', 'ZIP generation failed'))
+            return False
+        
+        update_job_status(job_id, 'completed', progress=100, result={
+            'zip_url': result['zip_url'],
+            'photo_count': result['photo_count']
+        })
+        return True
+        
+    except Exception as e:
+        print(f"Error processing selection ZIP job {job_id}: {str(e)}")
+        update_job_status(job_id, 'failed', error_message=str(e))
+        return False
+
+
 def handle_process_background_job(job_id):
     """
     Process a background job
@@ -256,6 +289,14 @@ def handle_process_background_job(job_id):
             else:
                 return create_response(500, {'error': 'Account deletion failed'})
         
+        elif job['job_type'] == 'selection_zip':
+            success = process_selection_zip(job_id, json.loads(job.get('metadata') or '{}'))
+            
+            if success:
+                return create_response(200, {'message': 'Selection ZIP ready'})
+            else:
+                return create_response(500, {'error': 'Selection ZIP failed'})
+        
         else:
             return create_response(400, {'error': f"Unknown job type: {job['job_type']}"})
     
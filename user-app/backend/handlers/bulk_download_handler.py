@@ -3,16 +3,59 @@ Bulk Download Handler - Server-Side ZIP Generation
 Provides fast ZIP downloads by streaming directly from S3
 """
 from boto3.dynamodb.conditions import Key
-from utils.config import s3_client, S3_RENDITIONS_BUCKET, photos_table, galleries_table
+from utils.config import galleries_table, client_favorites_table, client_selections_table, background_jobs_table
 from utils.response import create_response
+from utils.gallery_resolver import resolve_share_token
+from utils.client_gallery_index import get_gallery_client_emails
 from utils.plan_enforcement import require_role
 
 
+def _gallery_zip_response(gallery):
+    """
+    Response with the gallery's pre-generated ZIP
+
+    The ZIP is current when its manifest was written after the gallery's last
+    change (uploads and deletes bump updated_at). Otherwise it is brought up
+    to date first - incrementally, only the added photos are read from S3.
+    """
+    from utils.zip_generator import load_zip_manifest, zip_is_current, update_gallery_zip
+    gallery_id = gallery.get('id')
+    gallery_name = gallery.get('name', 'gallery').replace(' ', '-').lower()
+
+    manifest = load_zip_manifest(gallery_id)
+    if zip_is_current(gallery, manifest):
+        from utils.cdn_urls import get_zip_url
+        zip_url = get_zip_url(gallery_id)
+        photo_count = len(manifest['entries'])
+        print(f"Returning pre-generated ZIP URL: {zip_url}")
+        return create_response(200, {
+            'zip_url': zip_url,
+            'filename': f"{gallery_name}-{photo_count}-photos.zip",
+            'photo_count': photo_count
+        })
+
+    # ZIP missing or out of date - update it now
+    print(f" ZIP missing or out of date, updating now...")
+    result = update_gallery_zip(gallery_id, manifest)
+
+    if result.get('success'):
+        filename = f"{gallery_name}-{result.get('photo_count', 0)}-photos.zip"
+
+        return create_response(200, {
+            'zip_url': result.get('zip_url'),
+            'filename': filename,
+            'photo_count': result.get('photo_count', 0)
+        })
+    else:
+        return create_response(500, {'error': 'Failed to generate ZIP file'})
+
+
 @require_role('photographer')  # Fixed: require_role only accepts one role
 def handle_bulk_download(gallery_id, user, event):
     """
     Return pre-generated ZIP file URL for all gallery photos
     ZIP is pre-generated and stored in S3, so download is instant
+    (after changes, only the delta is added to it)
     """
     import json
     
@@ -41,44 +84,7 @@ def handle_bulk_download(gallery_id, user, event):
         if not (is_owner or is_client):
             return create_response(403, {'error': 'Access denied'})
         
-        # Get pre-generated ZIP URL from S3 renditions bucket
-        zip_s3_key = f"{gallery_id}/gallery-all-photos.zip"
-        
-        # Check if ZIP exists in S3
-        try:
-            s3_client.head_object(Bucket=S3_RENDITIONS_BUCKET, Key=zip_s3_key)
-            # ZIP exists - generate URL
-            from utils.cdn_urls import get_zip_url
-            zip_url = get_zip_url(gallery_id)
-            
-            gallery_name = gallery.get('name', 'gallery').replace(' ', '-').lower()
-            photo_count = gallery.get('photo_count', 0)
-            filename = f"{gallery_name}-{photo_count}-photos.zip"
-            
-            print(f"Returning pre-generated ZIP URL: {zip_url}")
-            
-            return create_response(200, {
-                'zip_url': zip_url,
-                'filename': filename,
-                'photo_count': photo_count
-            })
-        except:
-            # ZIP doesn't exist yet - generate it now
-            print(f" ZIP not found, generating now...")
-            from utils.zip_generator import generate_gallery_zip
-            result = generate_gallery_zip(gallery_id)
-            
-            if result.get('success'):
-                gallery_name = gallery.get('name', 'gallery').replace(' ', '-').lower()
-                filename = f"{gallery_name}-{result.get('photo_count', 0)}-photos.zip"
-                
-                return create_response(200, {
-                    'zip_url': result.get('zip_url'),
-                    'filename': filename,
-                    'photo_count': result.get('photo_count', 0)
-                })
-            else:
-                return create_response(500, {'error': 'Failed to generate ZIP file'})
+        return _gallery_zip_response(gallery)
         
     except Exception as e:
         print(f"Error getting bulk download: {str(e)}")
@@ -103,31 +109,21 @@ def handle_bulk_download_by_token(event):
         if not token:
             return create_response(400, {'error': 'Token required'})
         
-        # Verify token by looking up gallery with matching share_token
-        gallery_response = galleries_table.scan(
-            FilterExpression='share_token = :token',
-            ExpressionAttributeValues={':token': token}
-        )
-        
-        galleries = gallery_response.get('Items', [])
-        if not galleries:
+        # Verify token via ShareTokenIndex (invalid tokens are negatively cached)
+        gallery = resolve_share_token(token)
+        if not gallery:
             return create_response(403, {'error': 'Invalid or expired token'})
         
-        gallery = galleries[0]
         gallery_id = gallery.get('id')
         
         # Check if gallery owner's account is deleted
         photographer_id = gallery.get('user_id')
         if photographer_id:
             try:
-                from utils.config import users_table
-                photographer_response = users_table.scan(
-                    FilterExpression='id = :id',
-                    ExpressionAttributeValues={':id': photographer_id}
-                )
+                from utils.query_optimization import get_user_by_id_optimized
+                photographer = get_user_by_id_optimized(photographer_id)
                 
-                if photographer_response.get('Items'):
-                    photographer = photographer_response['Items'][0]
+                if photographer:
                     account_status = photographer.get('account_status', 'ACTIVE')
                     
                     if account_status == 'PENDING_DELETION':
@@ -141,44 +137,7 @@ def handle_bulk_download_by_token(event):
         
         print(f"Token-based bulk download for gallery {gallery_id}")
         
-        # Get pre-generated ZIP URL from S3 renditions bucket
-        zip_s3_key = f"{gallery_id}/gallery-all-photos.zip"
-        
-        # Check if ZIP exists in S3
-        try:
-            s3_client.head_object(Bucket=S3_RENDITIONS_BUCKET, Key=zip_s3_key)
-            # ZIP exists - generate URL
-            from utils.cdn_urls import get_zip_url
-            zip_url = get_zip_url(gallery_id)
-            
-            gallery_name = gallery.get('name', 'gallery').replace(' ', '-').lower()
-            photo_count = gallery.get('photo_count', 0)
-            filename = f"{gallery_name}-{photo_count}-photos.zip"
-            
-            print(f"Returning pre-generated ZIP URL: {zip_url}")
-            
-            return create_response(200, {
-                'zip_url': zip_url,
-                'filename': filename,
-                'photo_count': photo_count
-            })
-        except:
-            # ZIP doesn't exist yet - generate it now
-            print(f" ZIP not found, generating now...")
-            from utils.zip_generator import generate_gallery_zip
-            result = generate_gallery_zip(gallery_id)
-            
-            if result.get('success'):
-                gallery_name = gallery.get('name', 'gallery').replace(' ', '-').lower()
-                filename = f"{gallery_name}-{result.get('photo_count', 0)}-photos.zip"
-                
-                return create_response(200, {
-                    'zip_url': result.get('zip_url'),
-                    'filename': filename,
-                    'photo_count': result.get('photo_count', 0)
-                })
-            else:
-                return create_response(500, {'error': 'Failed to generate ZIP file'})
+        return _gallery_zip_response(gallery)
         
     except Exception as e:
         print(f"Error getting token-based bulk download: {str(e)}")
@@ -186,3 +145,159 @@ def handle_bulk_download_by_token(event):
         traceback.print_exc()
         return create_response(500, {'error': f'Bulk download failed: {str(e)}'})
 
+
+
+# Seconds clients wait before asking again while a selection ZIP is built
+SELECTION_ZIP_RETRY_AFTER = 5
+
+
+def _get_gallery(gallery_id):
+    """Gallery item by ID (GalleryIdIndex), or None"""
+    if not gallery_id:
+        return None
+    gallery_query = galleries_table.query(
+        IndexName='GalleryIdIndex',
+        KeyConditionExpression=Key('id').eq(gallery_id),
+        Limit=1
+    )
+    items = gallery_query.get('Items', [])
+    return items[0] if items else None
+
+
+def _selection_photo_ids(user, body):
+    """
+    Photo IDs, gallery and label of the requested selection
+
+    Signed-in users download their own favorites (they must own the gallery
+    or be one of its clients) or a selection session they are part of.
+    Guests must send the gallery's share token; the client_email they send
+    only picks whose favorites/selection to zip within that gallery.
+
+    Returns:
+        (photo_ids, gallery, label, error_response)
+    """
+    email = (user.get('email', '') if user else body.get('client_email', '')) or ''
+    email = email.lower()
+
+    session = None
+    session_id = body.get('session_id')
+    if session_id:
+        # Submitted selection (client selection workflow)
+        session = client_selections_table.get_item(Key={'id': session_id}).get('Item')
+        if not session:
+            return None, None, None, create_response(404, {'error': 'Selection session not found'})
+        gallery_id = session.get('gallery_id')
+    else:
+        # Client favorites for one gallery
+        gallery_id = body.get('gallery_id')
+        if not gallery_id:
+            return None, None, None, create_response(400, {'error': 'gallery_id or session_id is required'})
+        if not email:
+            return None, None, None, create_response(400, {'error': 'Client email is required'})
+
+    if user:
+        gallery = _get_gallery(gallery_id)
+        if not gallery:
+            return None, None, None, create_response(404, {'error': 'Gallery not found'})
+        is_owner = user.get('id') == gallery.get('user_id')
+        if not is_owner and email not in get_gallery_client_emails(gallery):
+            return None, None, None, create_response(403, {'error': 'Access denied'})
+    else:
+        token = body.get('token')
+        if not token:
+            return None, None, None, create_response(400, {'error': 'Token required'})
+        gallery = resolve_share_token(token)
+        if not gallery or gallery.get('id') != gallery_id:
+            return None, None, None, create_response(403, {'error': 'Invalid or expired token'})
+        is_owner = False
+
+    if session:
+        if not is_owner and email != (session.get('client_email') or '').lower():
+            return None, None, None, create_response(403, {'error': 'Access denied'})
+        photo_ids = [selection['photo_id'] for selection in session.get('selections', [])]
+        return photo_ids, gallery, 'selection', None
+
+    photo_ids = []
+    query_kwargs = {'KeyConditionExpression': Key('client_email').eq(email)}
+    while True:
+        response = client_favorites_table.query(**query_kwargs)
+        photo_ids.extend(f['photo_id'] for f in response.get('Items', []) if f.get('gallery_id') == gallery_id)
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return photo_ids, gallery, 'favorites', None
+
+
+def handle_selection_download(user, body):
+    """
+    ZIP of a client's favorites or submitted selection
+    
+    Request:
+    {
+        "gallery_id": str, "client_email": str (guests)   - favorites
+        or
+        "session_id": str                                 - submitted selection
+        "token": str (guests)                             - gallery share token
+    }
+    
+    The ZIP is cached under its photo-id set: a selection that was already
+    zipped is returned at once (200 with zip_url). Otherwise a background job
+    builds it and 202 is returned with the job_id - ask again after
+    retry_after seconds to get the URL.
+    """
+    try:
+        from utils.zip_generator import gallery_photos_subset, selection_zip_key, selection_zip_exists, selection_digest
+        from utils.cdn_urls import get_zip_object_url
+        from handlers.background_jobs_handler import create_background_job
+
+        photo_ids, gallery, label, error = _selection_photo_ids(user, body or {})
+        if error:
+            return error
+        gallery_id = gallery['id']
+
+        is_owner = user and user.get('id') == gallery.get('user_id')
+        if not is_owner and not gallery.get('allow_downloads', True):
+            return create_response(403, {'error': 'Downloads are disabled for this gallery'})
+
+        # Deleted photos drop out of the set (and so out of the cache key)
+        photo_ids = [photo['id'] for photo in gallery_photos_subset(gallery_id, photo_ids or [])]
+        if not photo_ids:
+            return create_response(400, {'error': 'No photos selected'})
+
+        gallery_name = gallery.get('name', 'gallery').replace(' ', '-').lower()
+        filename = f"{gallery_name}-{label}-{len(photo_ids)}-photos.zip"
+
+        zip_s3_key = selection_zip_key(gallery_id, photo_ids)
+        if selection_zip_exists(zip_s3_key):
+            return create_response(200, {
+                'zip_url': get_zip_object_url(zip_s3_key),
+                'filename': filename,
+                'photo_count': len(photo_ids)
+            })
+
+        # One job per photo-id set: repeated requests while it runs share it
+        job_id = f"selection-zip-{selection_digest(photo_ids)}"
+        job = background_jobs_table.get_item(Key={'job_id': job_id}).get('Item')
+        if not job or job.get('status') not in ('pending', 'in_progress'):
+            if job:
+                # Finished earlier but the ZIP is gone (or the job failed) - the
+                # processor only picks up INSERTs, so replace the record
+                background_jobs_table.delete_item(Key={'job_id': job_id})
+            requester_email = (user.get('email', '') if user else '') or body.get('client_email', '')
+            create_background_job('selection_zip', user.get('id') if user else None, requester_email.lower(),
+                                  metadata={'gallery_id': gallery_id, 'photo_ids': photo_ids}, job_id=job_id)
+            print(f"Queued selection ZIP job {job_id} ({len(photo_ids)} photos)")
+
+        return create_response(202, {
+            'job_id': job_id,
+            'status': 'pending',
+            'filename': filename,
+            'photo_count': len(photo_ids),
+            'retry_after': SELECTION_ZIP_RETRY_AFTER
+        }, headers={'Retry-After': str(SELECTION_ZIP_RETRY_AFTER)})
+
+    except Exception as e:
+        print(f"Error getting selection download: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return create_response(500, {'error': f'Selection download failed: {str(e)}'})
@@ -9,6 +9,7 @@ from boto3.dynamodb.conditions import Key
 from utils.config import photos_table, galleries_table, client_favorites_table, users_table
 from utils.response import create_response
 from utils.auth import hash_password
+from utils.client_gallery_index import add_gallery_client_email
 
 
 def auto_register_guest_client(email, name, photographer_id):
@@ -273,23 +274,13 @@ def handle_add_favorite(user, body):
                 else:
                     print(f"User {client_email} already exists, skipping auto-registration")
                 
-                # Add email to gallery's client_emails if not already there
-                current_emails = gallery.get('client_emails', [])
-                if client_email not in [email.lower() for email in current_emails]:
-                    current_emails.append(client_email)
-                    try:
-                        galleries_table.update_item(
-                            Key={'user_id': user_id, 'id': gallery_id},
-                            UpdateExpression='SET client_emails = :emails, updated_at = :time',
-                            ExpressionAttributeValues={
-                                ':emails': current_emails,
-                                ':time': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
-                            }
-                        )
+                # Add email to gallery's client_emails (and the client dashboard index)
+                try:
+                    if add_gallery_client_email(gallery, client_email):
                         print(f"Added {client_email} to gallery client_emails")
-                    except Exception as e:
-                        print(f"Failed to add email to gallery: {e}")
-                        # Continue anyway - the favorite will still work
+                except Exception as e:
+                    print(f"Failed to add email to gallery: {e}")
+                    # Continue anyway - the favorite will still work
         except Exception as e:
             print(f"Error verifying photo/gallery access: {str(e)}")
             import traceback
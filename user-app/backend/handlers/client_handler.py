@@ -7,6 +7,9 @@ from datetime import datetime, timedelta, timezone
 from boto3.dynamodb.conditions import Key
 from utils.config import galleries_table, photos_table, users_table, client_favorites_table
 from utils.response import create_response
+from utils.gallery_resolver import resolve_share_token, invalidate_share_token
+from utils.query_optimization import get_user_by_id_optimized
+from utils.client_gallery_index import get_client_gallery_keys, batch_get_galleries, get_gallery_client_emails
 
 # Configuration from environment
 TOKEN_EXPIRATION_DAYS = int(os.environ.get('CLIENT_TOKEN_EXPIRATION_DAYS', '7'))  # Default 7 days (Swiss law compliance)
@@ -27,6 +30,7 @@ def is_token_expired(token_created_at):
 def regenerate_gallery_token(gallery):
     """Regenerate expired share token for a gallery"""
     try:
+        old_token = gallery.get('share_token')
         new_token = secrets.token_urlsafe(16)
         current_time = datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
         frontend_url = os.environ.get('FRONTEND_URL')
@@ -48,6 +52,8 @@ def regenerate_gallery_token(gallery):
         )
         
         print(f"Regenerated token for gallery: {gallery.get('name')} (ID: {gallery['id']})")
+        if old_token:
+            invalidate_share_token(old_token)
         
         # Update the gallery object with new values
         gallery['share_token'] = new_token
@@ -86,6 +92,24 @@ def enrich_photos_with_favorites(photos, client_email, gallery_id):
             photo['is_favorite'] = False
         return photos
 
+def get_client_favorited_photo_ids(client_email):
+    """All photo ids a client has favorited, across every gallery (one paginated query)"""
+    favorited_photo_ids = set()
+    try:
+        query_kwargs = {
+            'KeyConditionExpression': Key('client_email').eq(client_email.lower()),
+            'ProjectionExpression': 'photo_id'
+        }
+        while True:
+            favorites_response = client_favorites_table.query(**query_kwargs)
+            favorited_photo_ids.update(fav['photo_id'] for fav in favorites_response.get('Items', []))
+            if 'LastEvaluatedKey' not in favorites_response:
+                break
+            query_kwargs['ExclusiveStartKey'] = favorites_response['LastEvaluatedKey']
+    except Exception as e:
+        print(f"Error loading client favorites: {str(e)}")
+    return favorited_photo_ids
+
 def enrich_photos_with_total_favorites(photos, gallery, photographer_email=None):
     """
     Calculate and update favorites_count for all photos based on actual favorites table data.
@@ -140,85 +164,76 @@ def enrich_photos_with_total_favorites(photos, gallery, photographer_email=None)
 def handle_client_galleries(user):
     """Get all galleries where client has access (client in client_emails array)"""
     try:
-        # Scan all galleries and filter where user email is in client_emails
-        response = galleries_table.scan()
-        all_galleries = response.get('Items', [])
-        
-        # Filter galleries where user email is in client_emails array (or legacy client_email)
-        client_galleries = []
         user_email = user['email'].lower()
         
+        # One query on the client_email -> gallery reverse index, then batched gets
+        gallery_keys = get_client_gallery_keys(user_email)
+        all_galleries = batch_get_galleries(gallery_keys)
+        
+        # Photographers and favorites are shared across galleries - fetch each once
+        photographers = {}
+        favorited_photo_ids = get_client_favorited_photo_ids(user_email)
+        
+        client_galleries = []
         for gallery in all_galleries:
-            # Check both client_emails array (new) and client_email (legacy)
-            client_emails = gallery.get('client_emails', [])
-            legacy_email = gallery.get('client_email', '').lower()
+            # Index rows can briefly outlive a client's removal - re-check membership
+            if user_email not in get_gallery_client_emails(gallery):
+                continue
             
-            # Add legacy email to array for unified checking
-            if legacy_email and legacy_email not in client_emails:
-                client_emails = client_emails + [legacy_email]
-            
-            # Check if user email is in the list
-            if user_email in [email.lower() for email in client_emails]:
-                # Check if gallery owner's account is deleted - SKIP if deleted
-                photographer_id = gallery.get('user_id')
-                if photographer_id:
-                    try:
-                        photographer_response = users_table.scan(
-                            FilterExpression='id = :id',
-                            ExpressionAttributeValues={':id': photographer_id}
-                        )
-                        
-                        if photographer_response.get('Items'):
-                            photographer = photographer_response['Items'][0]
-                            account_status = photographer.get('account_status', 'ACTIVE')
-                            
-                            # Skip galleries from deleted photographers
-                            if account_status == 'PENDING_DELETION':
-                                print(f" Skipping gallery {gallery.get('id')} - photographer account deleted")
-                                continue
-                            
-                            # Add photographer info
-                            gallery['photographer_name'] = photographer.get('name') or photographer.get('username') or 'Unknown'
-                            gallery['photographer_id'] = photographer['id']
-                        else:
-                            gallery['photographer_name'] = 'Unknown Photographer'
-                            gallery['photographer_id'] = photographer_id
-                    except Exception as e:
-                        print(f" Error checking photographer status: {e}")
-                        gallery['photographer_name'] = 'Unknown Photographer'
-                        gallery['photographer_id'] = gallery.get('user_id')
-                else:
-                    gallery['photographer_name'] = 'Unknown Photographer'
-                    gallery['photographer_id'] = None
+            # Check if gallery owner's account is deleted - SKIP if deleted
+            photographer_id = gallery.get('user_id')
+            if photographer_id:
+                if photographer_id not in photographers:
+                    photographers[photographer_id] = get_user_by_id_optimized(photographer_id)
+                photographer = photographers[photographer_id]
                 
-                # Get photos for gallery
-                try:
-                    photos_response = photos_table.query(
-                        IndexName='GalleryIdIndex',
-                        KeyConditionExpression=Key('gallery_id').eq(gallery['id'])
-                    )
-                    gallery_photos = photos_response.get('Items', [])
-                    
-                    # Enrich photos with is_favorite field for this client
-                    gallery_photos = enrich_photos_with_favorites(gallery_photos, user['email'], gallery['id'])
+                if photographer:
+                    account_status = photographer.get('account_status', 'ACTIVE')
                     
-                    # Show ALL photos (pending + approved) - clients need to approve them
-                    gallery['photos'] = gallery_photos
-                    gallery['photo_count'] = len(gallery_photos)
+                    # Skip galleries from deleted photographers
+                    if account_status == 'PENDING_DELETION':
+                        print(f" Skipping gallery {gallery.get('id')} - photographer account deleted")
+                        continue
                     
-                    # Set cover image
-                    if gallery_photos:
-                        # Prefer approved photo as cover, fallback to first photo
-                        approved_photos = [p for p in gallery_photos if p.get('status') == 'approved']
-                        if approved_photos:
-                            gallery['cover_image'] = approved_photos[0].get('url')
-                        else:
-                            gallery['cover_image'] = gallery_photos[0].get('url')
-                except:
-                    gallery['photos'] = []
-                    gallery['photo_count'] = 0
+                    # Add photographer info
+                    gallery['photographer_name'] = photographer.get('name') or photographer.get('username') or 'Unknown'
+                    gallery['photographer_id'] = photographer['id']
+                else:
+                    gallery['photographer_name'] = 'Unknown Photographer'
+                    gallery['photographer_id'] = photographer_id
+            else:
+                gallery['photographer_name'] = 'Unknown Photographer'
+                gallery['photographer_id'] = None
+            
+            # Get photos for gallery
+            try:
+                photos_response = photos_table.query(
+                    IndexName='GalleryIdIndex',
+                    KeyConditionExpression=Key('gallery_id').eq(gallery['id'])
+                )
+                gallery_photos = photos_response.get('Items', [])
                 
-                client_galleries.append(gallery)
+                # Mark photos this client has favorited
+                for photo in gallery_photos:
+                    photo['is_favorite'] = photo['id'] in favorited_photo_ids
+                
+                # Show ALL photos (pending + approved) - clients need to approve them
+                gallery['photos'] = gallery_photos
+                gallery['photo_count'] = len(gallery_photos)
+                
+                # Set cover image
+                if gallery_photos:
+                    # Prefer approved photo as cover, fallback to first photo
+                    approved_photos = [p for p in gallery_photos if p.get('status') == 'approved']
+                    if approved_photos:
+                        gallery['cover_image'] = approved_photos[0].get('url')
+                    else:
+                        gallery['cover_image'] = gallery_photos[0].get('url')
+            except:
+                gallery['photos'] = []
+                gallery['photo_count'] = 0
+            
+            client_galleries.append(gallery)
         
         # Sort by created date (newest first)
         client_galleries.sort(key=lambda x: x.get('created_at', ''), reverse=True)
@@ -442,31 +457,21 @@ def handle_get_client_gallery_by_token(share_token, query_params=None):
                 except:
                     last_evaluated_key = None
         
-        # Scan for gallery with matching share_token
-        response = galleries_table.scan(
-            FilterExpression='share_token = :token',
-            ExpressionAttributeValues={':token': share_token}
-        )
-        
-        galleries = response.get('Items', [])
-        if not galleries:
+        # Resolve gallery via ShareTokenIndex (invalid tokens are negatively cached)
+        gallery = resolve_share_token(share_token)
+        if not gallery:
             return create_response(404, {'error': 'Gallery not found or link is invalid'})
         
-        gallery = galleries[0]
-        
         # Check if gallery owner's account is deleted
         photographer_id = gallery.get('user_id')
         photographer_email = None
+        photographer = None
         
         if photographer_id:
             try:
-                photographer_response = users_table.scan(
-                    FilterExpression='id = :id',
-                    ExpressionAttributeValues={':id': photographer_id}
-                )
+                photographer = get_user_by_id_optimized(photographer_id)
                 
-                if photographer_response.get('Items'):
-                    photographer = photographer_response['Items'][0]
+                if photographer:
                     photographer_email = photographer.get('email')
                     account_status = photographer.get('account_status', 'ACTIVE')
                     
@@ -510,24 +515,13 @@ def handle_get_client_gallery_by_token(share_token, query_params=None):
         # Get photographer info
         try:
             if photographer_id:
-                # Reuse photographer obj if available
-                if 'photographer' in locals():
+                # Reuse the photographer looked up for the account status check
+                if photographer:
                     gallery['photographer_name'] = photographer.get('name') or photographer.get('username') or 'Unknown'
                     gallery['photographer_id'] = photographer['id']
                 else:
-                    photographer_response = users_table.scan(
-                        FilterExpression='id = :id',
-                        ExpressionAttributeValues={':id': photographer_id}
-                    )
-                    photographers = photographer_response.get('Items', [])
-                    if photographers:
-                        photographer = photographers[0]
-                        photographer_email = photographer.get('email')
-                        gallery['photographer_name'] = photographer.get('name') or photographer.get('username') or 'Unknown'
-                        gallery['photographer_id'] = photographer['id']
-                    else:
-                        gallery['photographer_name'] = 'Unknown Photographer'
-                        gallery['photographer_id'] = photographer_id
+                    gallery['photographer_name'] = 'Unknown Photographer'
+                    gallery['photographer_id'] = photographer_id
             else:
                 gallery['photographer_name'] = 'Unknown Photographer'
                 gallery['photographer_id'] = gallery.get('user_id')
@@ -9,6 +9,8 @@ from decimal import Decimal
 from boto3.dynamodb.conditions import Key, Attr
 from utils.config import analytics_table, galleries_table, photos_table
 from utils.response import create_response
+from utils.request_scope import current_scope
+from utils.event_buffer import put_event
 
 # Analytics time range configuration from environment
 ANALYTICS_DEFAULT_DAYS = int(os.environ.get('ANALYTICS_DEFAULT_DAYS', '30'))  # Default 30-day window
@@ -40,7 +42,7 @@ def handle_track_visit(body):
             }
         }
         
-        analytics_table.put_item(Item=event)
+        put_event(analytics_table, event)
         return create_response(200, {'success': True})
     except Exception as e:
         print(f"Error tracking visit: {str(e)}")
@@ -75,7 +77,7 @@ def handle_track_event(body):
             'metadata': metadata
         }
         
-        analytics_table.put_item(Item=event)
+        put_event(analytics_table, event)
         return create_response(200, {'success': True})
     except Exception as e:
         print(f"Error tracking event: {str(e)}")
@@ -111,7 +113,7 @@ def handle_track_photo_engagement(body):
             }
         }
         
-        analytics_table.put_item(Item=event)
+        put_event(analytics_table, event)
         return create_response(200, {'success': True})
     except Exception as e:
         print(f"Error tracking photo engagement: {str(e)}")
@@ -149,7 +151,7 @@ def handle_track_video_engagement(body):
             }
         }
         
-        analytics_table.put_item(Item=event)
+        put_event(analytics_table, event)
         return create_response(200, {'success': True})
     except Exception as e:
         print(f"Error tracking video engagement: {str(e)}")
@@ -300,9 +302,9 @@ def handle_get_client_preferences(user, gallery_id):
         # Get favorite photo types
         favorite_photo_ids = [e.get('photo_id') for e in favorite_events if e.get('photo_id')]
         favorite_types = []
-        for photo_id in favorite_photo_ids:
+        favorite_photos = current_scope().batch_get_items(photos_table, [{'id': pid} for pid in favorite_photo_ids])
+        for photo in favorite_photos:
             try:
-                photo = photos_table.get_item(Key={'id': photo_id}).get('Item')
                 if photo:
                     photo_type = photo.get('type', 'image')
                     favorite_types.append(photo_type)
@@ -434,9 +436,9 @@ def handle_get_overall_engagement(user):
                               reverse=True)[:10]
         
         top_photos = []
-        for photo_id in top_photo_ids:
+        photos = current_scope().batch_get_items(photos_table, [{'id': pid} for pid in top_photo_ids])
+        for photo_id, photo in zip(top_photo_ids, photos):
             try:
-                photo = photos_table.get_item(Key={'id': photo_id}).get('Item')
                 if photo:
                     stats = photo_stats[photo_id]
                     # Calculate engagement score (0-100)
@@ -597,9 +599,9 @@ def handle_get_gallery_engagement_summary(user, gallery_id):
                               reverse=True)[:10]
         
         top_photos = []
-        for photo_id in top_photo_ids:
+        photos = current_scope().batch_get_items(photos_table, [{'id': pid} for pid in top_photo_ids])
+        for photo_id, photo in zip(top_photo_ids, photos):
             try:
-                photo = photos_table.get_item(Key={'id': photo_id}).get('Item')
                 if photo:
                     stats = photo_stats[photo_id]
                     # Calculate engagement score (0-100)
@@ -9,6 +9,8 @@ from decimal import Decimal
 from boto3.dynamodb.conditions import Key
 from utils.config import galleries_table, photos_table, s3_client, S3_BUCKET, client_favorites_table
 from utils.response import create_response
+from utils.gallery_resolver import invalidate_gallery
+from utils.client_gallery_index import sync_client_gallery_index, remove_client_gallery_index, get_gallery_client_emails
 from handlers.subscription_handler import enforce_gallery_limit
 from utils.email import send_gallery_shared_email
 from utils.gallery_layouts import get_layout, get_all_layouts, get_layouts_by_category, get_layout_categories, validate_layout_photos
@@ -146,6 +148,14 @@ def handle_list_galleries(user, query_params=None):
         print(f"Error listing galleries: {str(e)}")
         return create_response(200, {'galleries': [], 'total': 0})
 
+
+def _sync_client_index(gallery, previous_emails=None):
+    """Update the client_email -> gallery reverse index (never fails the request)"""
+    try:
+        sync_client_gallery_index(gallery, previous_emails)
+    except Exception as e:
+        print(f"Error updating client gallery index for {gallery.get('id')}: {str(e)}")
+
 @require_role('photographer')
 def handle_create_gallery(user, body):
     """Create new gallery for THIS USER - PHOTOGRAPHERS ONLY"""
@@ -242,6 +252,7 @@ def handle_create_gallery(user, body):
     
     # Store in DynamoDB with user_id partition
     galleries_table.put_item(Item=gallery)
+    _sync_client_index(gallery)
     
     # Send email notification to ALL clients
     # Check notification preferences before sending
@@ -462,6 +473,7 @@ def handle_update_gallery(gallery_id, user, body):
             return create_response(404, {'error': 'Gallery not found or access denied'})
         
         gallery = response['Item']
+        previous_client_emails = get_gallery_client_emails(gallery)
         
         # Update fields with validation
         if 'name' in body or 'galleryName' in body:
@@ -590,6 +602,9 @@ def handle_update_gallery(gallery_id, user, body):
         
         # Save back to DynamoDB
         galleries_table.put_item(Item=gallery)
+        invalidate_gallery(gallery_id)
+        if get_gallery_client_emails(gallery) != previous_client_emails:
+            _sync_client_index(gallery, previous_client_emails)
         
         return create_response(200, gallery)
     except Exception as e:
@@ -654,6 +669,7 @@ def handle_duplicate_gallery(gallery_id, user, body):
         
         # Save new gallery
         galleries_table.put_item(Item=new_gallery)
+        _sync_client_index(new_gallery)
         
         # Optionally copy photos if requested
         copy_photos = body.get('copy_photos', False)
@@ -742,6 +758,8 @@ def handle_delete_gallery(gallery_id, user):
         if 'Item' not in response:
             return create_response(404, {'error': 'Gallery not found or access denied'})
         
+        gallery = response['Item']
+        
         # Delete all photos
         try:
             photos_response = photos_table.query(
@@ -762,7 +780,11 @@ def handle_delete_gallery(gallery_id, user):
             'user_id': user['id'],
             'id': gallery_id
         })
-        
+        invalidate_gallery(gallery_id)
+        try:
+            remove_client_gallery_index(gallery)
+        except Exception as e:
+            print(f"Error removing client gallery index for {gallery_id}: {str(e)}")
         
         return create_response(200, {'message': 'Gallery deleted successfully'})
     except Exception as e:
@@ -9,6 +9,7 @@ from decimal import Decimal
 from utils.config import s3_client, S3_BUCKET, galleries_table, photos_table, AWS_ENDPOINT_URL
 from utils.response import create_response
 from utils.plan_enforcement import require_role
+from utils.duplicate_detector import duplicate_index_fields
 
 
 @require_role('photographer')
@@ -199,13 +200,10 @@ def handle_complete_multipart_upload(gallery_id, user, event):
         # ==========================================
         # METADATA EXTRACTION & VIDEO ENFORCEMENT
         # ==========================================
-        # Download file for metadata extraction
-        s3_object = s3_client.get_object(Bucket=S3_BUCKET, Key=s3_key)
-        file_data = s3_object['Body'].read()
-        
-        # Extract metadata (works for both images and videos)
-        from utils.metadata_extractor import extract_image_metadata
-        metadata = extract_image_metadata(file_data, filename)
+        # Extract metadata (works for both images and videos) - ranged reads
+        # fetch only the headers / moov box, not the whole multi-GB upload
+        from utils.metadata_extractor import extract_metadata_from_s3
+        metadata = extract_metadata_from_s3(s3_client, S3_BUCKET, s3_key, filename, file_size)
         
         print(f"📋 Extracted metadata: format={metadata.get('format')}, "
               f"type={metadata.get('type')}, "
@@ -275,8 +273,15 @@ def handle_complete_multipart_upload(gallery_id, user, event):
         # Create photo record in DynamoDB
         current_time = datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
         
+        # Modern-format renditions (WebP/AVIF) are gated per plan
+        rendition_formats = []
+        if not is_video:
+            from handlers.subscription_handler import get_user_features
+            from utils.rendition_core import enabled_formats
+            rendition_formats = enabled_formats(get_user_features(user)[0])
+        
         # Generate CDN URLs for all renditions
-        photo_urls = get_photo_urls(s3_key)
+        photo_urls = get_photo_urls(s3_key, formats=rendition_formats, dimensions=clean_metadata.get('dimensions'))
         
         photo = {
             'id': photo_id,
@@ -291,7 +296,8 @@ def handle_complete_multipart_upload(gallery_id, user, event):
             'status': 'processing',  # Will be updated to 'active' after renditions generated
             'created_at': current_time,
             'updated_at': current_time,
-            'file_hash': file_hash,
+            # file_hash / name_size keys of the duplicate indexes
+            **duplicate_index_fields(filename, file_size, file_hash),
             # CDN URLs for responsive display
             'url': photo_urls['url'],  # Original file URL
             'original_download_url': photo_urls['url'],  # Explicit original download URL
@@ -313,6 +319,9 @@ def handle_complete_multipart_upload(gallery_id, user, event):
             photo['duration_seconds'] = Decimal(str(clean_metadata['duration_seconds']))
             photo['duration_minutes'] = Decimal(str(clean_metadata['duration_minutes']))
             photo['type'] = 'video'
+        else:
+            photo['rendition_formats'] = rendition_formats
+            photo['srcset'] = photo_urls['srcset']  # {format: srcset}, most efficient first
         
         photos_table.put_item(Item=photo)
         print(f"Created photo record: {photo_id}")
@@ -326,7 +335,7 @@ def handle_complete_multipart_upload(gallery_id, user, event):
                     # Use video processor for videos
                     from utils.video_processor import process_video_upload_async
                     print(f"🎬 Processing video for LocalStack: {s3_key}")
-                    result = process_video_upload_async(s3_key, S3_BUCKET, video_data=file_data)
+                    result = process_video_upload_async(s3_key, S3_BUCKET)
                 else:
                     # Use image processor for images with watermark if enabled
                     from utils.image_processor import process_upload_async
@@ -350,7 +359,8 @@ def handle_complete_multipart_upload(gallery_id, user, event):
                         print(f"⚠️ Could not load watermark config: {str(wm_error)}")
                     
                     print(f"🔄 Processing image for LocalStack: {s3_key}")
-                    result = process_upload_async(s3_key, S3_BUCKET, image_data=file_data, watermark_config=watermark_config)
+                    result = process_upload_async(s3_key, S3_BUCKET, watermark_config=watermark_config,
+                                                  formats=rendition_formats)
                 
                 if result.get('success'):
                     print(f"✅ Processing completed successfully")
@@ -358,6 +368,8 @@ def handle_complete_multipart_upload(gallery_id, user, event):
                     # Calculate total storage: original + all renditions
                     renditions = result.get('renditions', {})
                     renditions_size_bytes = sum(r['size'] for r in renditions.values())
+                    renditions_size_bytes += sum(r['size'] for variant in result.get('variants', {}).values()
+                                                 for r in variant.values())
                     renditions_size_mb = renditions_size_bytes / (1024 * 1024)
                     total_storage_mb = size_mb + renditions_size_mb
                     
@@ -370,6 +382,8 @@ def handle_complete_multipart_upload(gallery_id, user, event):
                     photo['status'] = 'active'
                     photo['size_mb'] = Decimal(str(round(total_storage_mb, 2)))
                     photo['renditions_size_mb'] = Decimal(str(round(renditions_size_mb, 2)))
+                    if result.get('perceptual_hash'):
+                        photo['perceptual_hash'] = result['perceptual_hash']
                     photos_table.put_item(Item=photo)
                 else:
                     print(f"⚠️ Processing failed: {result.get('error')}")
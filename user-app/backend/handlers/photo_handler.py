@@ -13,7 +13,11 @@ from utils.email import send_new_photos_added_email
 from utils.duplicate_detector import (
     check_for_duplicates_in_gallery,
     calculate_file_hash,
-    get_file_size
+    get_file_size,
+    duplicate_index_fields,
+    find_duplicates,
+    find_near_duplicates,
+    NEAR_DUPLICATE_DISTANCE_LIMIT
 )
 # Image validation removed - no PIL dependency needed
 from utils.cdn_urls import get_photo_urls  # CloudFront CDN URL helper
@@ -23,6 +27,8 @@ import os
 
 # Photo upload configuration from environment
 MAX_FILE_SIZE_MB = int(os.environ.get('MAX_PHOTO_FILE_SIZE_MB', '100'))  # Default 100MB per photo
+# Files per batch duplicate check (one upload selection)
+MAX_DUPLICATE_CHECK_FILES = int(os.environ.get('MAX_DUPLICATE_CHECK_FILES', '500'))
 
 def handle_get_photo(photo_id):
     """Get single photo details (Public for client galleries)"""
@@ -42,9 +48,18 @@ def handle_get_photo(photo_id):
 @require_role('photographer')
 def handle_check_duplicates(gallery_id, user, event):
     """
-    Check if uploaded photo is a duplicate based on METADATA ONLY
-    Duplicate = same filename AND same file size
+    Check if files about to be uploaded are duplicates based on METADATA ONLY
+    Duplicate = same content hash, or same filename AND similar file size
     NO base64 image data needed!
+    
+    Request (single file, as before):
+        {"filename": str, "file_size": int, "file_hash": str (optional)}
+    Request (batch):
+        {"files": [{"filename", "file_size", "file_hash" (optional)}, ...],
+         "scope": "gallery" (default) | "account" - hash matches in all galleries}
+    
+    Answered from the duplicate indexes (utils/duplicate_detector.py), so the
+    cost does not grow with the gallery size.
     """
     try:
         # Verify gallery ownership
@@ -63,74 +78,30 @@ def handle_check_duplicates(gallery_id, user, event):
         
         try:
             body = json.loads(body_str)
-            filename = body.get('filename', '')
-            file_size = body.get('file_size', 0)
-            
-            if not filename or not file_size:
-                return create_response(400, {'error': 'filename and file_size required'})
-            
         except json.JSONDecodeError:
             return create_response(400, {'error': 'Invalid JSON'})
         
-        # Get existing photos in this gallery
-        try:
-            photos_response = photos_table.query(
-                IndexName='GalleryIdIndex',
-                KeyConditionExpression=Key('gallery_id').eq(gallery_id)
-            )
-            existing_photos = photos_response.get('Items', [])
-        except Exception as e:
-            print(f"Warning: Could not query photos: {str(e)}")
-            existing_photos = []
-        
-        # Check for duplicates: same filename AND similar size
-        # For HEIC files, browser may report different sizes due to compression
-        # Use 10% tolerance for file size comparison
-        duplicates = []
-        for photo in existing_photos:
-            photo_filename = photo.get('filename', '').lower()
-            photo_size = photo.get('file_size', 0)
-            
-            # Convert Decimal to float for comparison
-            if photo_size:
-                photo_size = float(photo_size) if isinstance(photo_size, Decimal) else photo_size
-            
-            # Check filename match
-            if photo_filename != filename.lower():
-                continue
-            
-            # Check size match with tolerance
-            # Allow up to 10% difference or exact match
-            if file_size == 0 or photo_size == 0:
-                # If either size is 0, only match on filename (legacy photos)
-                size_match = True
-            else:
-                size_diff = abs(photo_size - file_size)
-                size_tolerance = max(photo_size, file_size) * 0.1  # 10% tolerance
-                size_match = size_diff <= size_tolerance
-            
-            if size_match:
-                duplicates.append({
-                    'id': photo.get('id'),
-                    'filename': photo.get('filename'),
-                    'file_size': photo.get('file_size'),
-                    'url': photo.get('url'),
-                    'medium_url': photo.get('medium_url'),
-                    'thumbnail_url': photo.get('thumbnail_url'),
-                    'uploaded_at': photo.get('created_at')
-                })
+        batch = 'files' in body
+        candidates = body.get('files') if batch else [body]
+        if not isinstance(candidates, list) or not candidates:
+            return create_response(400, {'error': 'files must be a non-empty list'})
+        if len(candidates) > MAX_DUPLICATE_CHECK_FILES:
+            return create_response(400, {'error': f'At most {MAX_DUPLICATE_CHECK_FILES} files per check'})
+        if any(not isinstance(c, dict) or not c.get('filename') or not c.get('file_size') for c in candidates):
+            return create_response(400, {'error': 'filename and file_size required'})
         
-        # Return duplicate info
-        response_data = {
-            'filename': filename,
-            'file_size': file_size,
-            'has_duplicates': len(duplicates) > 0,
-            'duplicate_count': len(duplicates),
-            'duplicates': duplicates
-        }
+        results = find_duplicates(user['id'], gallery_id, candidates,
+                                  across_galleries=body.get('scope') == 'account')
         
-        print(f"Duplicate check for {filename} ({file_size} bytes): {len(duplicates)} duplicates found")
-        return create_response(200, response_data)
+        duplicate_files = sum(1 for result in results if result['has_duplicates'])
+        print(f"Duplicate check for {len(candidates)} file(s): {duplicate_files} with duplicates")
+        
+        if not batch:
+            return create_response(200, results[0])
+        return create_response(200, {
+            'results': results,
+            'duplicate_files': duplicate_files
+        })
         
     except Exception as e:
         print(f"Error checking duplicates: {str(e)}")
@@ -138,6 +109,53 @@ def handle_check_duplicates(gallery_id, user, event):
         traceback.print_exc()
         return create_response(500, {'error': f'Duplicate check failed: {str(e)}'})
 
+@require_role('photographer')
+def handle_find_near_duplicates(user, query_params):
+    """
+    Groups of visually identical photos (same frame re-exported at another
+    quality, size or format), from the perceptual hashes stored at processing
+    
+    Query:
+        gallery_id: Gallery to search (default: all of the photographer's galleries)
+        max_distance: Hamming distance threshold, 0-8 (default 6)
+    """
+    try:
+        gallery_id = query_params.get('gallery_id')
+        if gallery_id:
+            response = galleries_table.get_item(Key={
+                'user_id': user['id'],
+                'id': gallery_id
+            })
+            if 'Item' not in response:
+                return create_response(403, {'error': 'Access denied'})
+        
+        max_distance = query_params.get('max_distance')
+        if max_distance is not None:
+            try:
+                max_distance = int(max_distance)
+            except (TypeError, ValueError):
+                max_distance = -1
+            if not 0 <= max_distance <= NEAR_DUPLICATE_DISTANCE_LIMIT:
+                return create_response(400, {
+                    'error': f'max_distance must be between 0 and {NEAR_DUPLICATE_DISTANCE_LIMIT}'
+                })
+        
+        result = find_near_duplicates(user['id'], gallery_id, max_distance)
+        print(f"Near-duplicate search over {result['photos_searched']} photos: {len(result['groups'])} group(s)")
+        
+        return create_response(200, {
+            'scope': 'gallery' if gallery_id else 'account',
+            'groups': result['groups'],
+            'group_count': len(result['groups']),
+            'photos_searched': result['photos_searched']
+        })
+        
+    except Exception as e:
+        print(f"Error finding near duplicates: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return create_response(500, {'error': f'Near-duplicate search failed: {str(e)}'})
+
 @require_role('photographer')
 def handle_upload_photo(gallery_id, user, event):
     """Upload photo - VERIFY GALLERY OWNERSHIP"""
@@ -298,11 +316,12 @@ def handle_upload_photo(gallery_id, user, event):
             'status': 'pending',  # Photos start as pending, need approval
             'views': 0,
             'comments': [],  # Empty comments array
-            'file_hash': file_hash,  # Store for exact duplicate detection
             'file_size': file_size,  # Store for filename+size duplicate detection (bytes)
             'size_mb': Decimal(str(round(size_mb, 2))),  # Store size in MB for display and storage tracking (use Decimal for DynamoDB)
             'is_raw': is_raw,  # Flag for RAW files
-            'created_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+            'created_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z',
+            # file_hash / name_size keys of the duplicate indexes
+            **duplicate_index_fields(filename_from_client, file_size, file_hash)
         }
         
         # Add RAW metadata if available
@@ -332,14 +351,8 @@ def handle_upload_photo(gallery_id, user, event):
         except Exception as e:
             print(f"Failed to update gallery stats: {e}")
         
-        # Invalidate gallery ZIP file (delete it so it's regenerated on next download)
-        # This is much faster than regenerating it synchronously
-        try:
-            zip_key = f"{gallery_id}/gallery-all-photos.zip"
-            print(f" Invalidating gallery ZIP: {zip_key}")
-            s3_client.delete_object(Bucket=S3_BUCKET, Key=zip_key)
-        except Exception as zip_error:
-            print(f" Failed to invalidate ZIP: {str(zip_error)}")
+        # Gallery ZIP: updated_at changed above, so the next download adds/drops
+        # only the changed photos (zip_generator.update_gallery_zip)
         
         # EMAIL NOTIFICATIONS DISABLED FOR AUTO-SEND
         # Photographer must manually send batch notification via "Send Email Notification" button
@@ -1022,14 +1035,8 @@ def handle_delete_photos(gallery_id, user, event):
             except Exception as e:
                 print(f"Failed to update gallery stats: {e}")
             
-            # Invalidate gallery ZIP file (delete it so it's regenerated on next download)
-            # This is much faster than regenerating it synchronously
-            try:
-                zip_key = f"{gallery_id}/gallery-all-photos.zip"
-                print(f" Invalidating gallery ZIP: {zip_key}")
-                s3_client.delete_object(Bucket=S3_BUCKET, Key=zip_key)
-            except Exception as zip_error:
-                print(f" Failed to invalidate ZIP: {str(zip_error)}")
+            # Gallery ZIP: updated_at changed above, so the next download adds/drops
+            # only the changed photos (zip_generator.update_gallery_zip)
         
         response_data = {
             'deleted_count': deleted_count,
@@ -10,6 +10,7 @@ from decimal import Decimal
 from utils.config import s3_client, S3_BUCKET
 from utils.response import create_response
 from utils.cdn_urls import get_photo_urls  # CloudFront CDN URL helper
+from utils.duplicate_detector import duplicate_index_fields
 from handlers.subscription_handler import enforce_storage_limit, get_user_features
 
 def handle_get_upload_url(gallery_id, user, event):
@@ -302,14 +303,12 @@ def handle_confirm_upload(gallery_id, user, event):
         # Step 7: Comprehensive metadata recording
         # Step 8: Database record creation with linkage
         try:
-            # Download file from S3 for validation and metadata extraction
-            s3_object = s3_client.get_object(Bucket=S3_BUCKET, Key=s3_key)
-            image_data = s3_object['Body'].read()
-            file_size = len(image_data)
-            
             # Step 7: Extract comprehensive metadata
-            from utils.metadata_extractor import extract_image_metadata
-            metadata = extract_image_metadata(image_data, filename)
+            # Ranged reads fetch only the headers / moov box, not the whole file
+            from utils.metadata_extractor import extract_metadata_from_s3
+            metadata = extract_metadata_from_s3(s3_client, S3_BUCKET, s3_key, filename,
+                                                s3_response.get('ContentLength', 0))
+            file_size = metadata.get('file_size', 0)
             
             print(f"📋 Extracted metadata: format={metadata.get('format')}, "
                   f"type={metadata.get('type')}, "
@@ -408,8 +407,16 @@ def handle_confirm_upload(gallery_id, user, event):
         # Step 8: Create photo record with comprehensive metadata
         # Links stored file to gallery and photographer
         
+        # Modern-format renditions (WebP/AVIF) are gated per plan
+        is_image = file_extension not in video_extensions
+        rendition_formats = []
+        if is_image:
+            from handlers.subscription_handler import get_user_features
+            from utils.rendition_core import enabled_formats
+            rendition_formats = enabled_formats(get_user_features(user)[0])
+        
         # Generate CDN URLs for renditions (will be populated after processing)
-        photo_urls = get_photo_urls(s3_key)
+        photo_urls = get_photo_urls(s3_key, formats=rendition_formats, dimensions=clean_metadata.get('dimensions'))
         
         # Determine if original is web-safe (JPEG, PNG, WebP)
         # If not (e.g. HEIC, RAW), we must use a converted rendition for the main 'url'
@@ -475,9 +482,16 @@ def handle_confirm_upload(gallery_id, user, event):
             
             # Timestamps
             'created_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z',
-            'updated_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+            'updated_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z',
+            
+            # file_hash / name_size keys of the duplicate indexes
+            **duplicate_index_fields(filename, file_size, file_hash)
         }
         
+        if is_image:
+            photo['rendition_formats'] = rendition_formats
+            photo['srcset'] = photo_urls['srcset']  # {format: srcset}, most efficient first
+        
         photos_table.put_item(Item=photo)
         
         # Step 9-15: LocalStack only - Generate renditions synchronously
@@ -494,7 +508,7 @@ def handle_confirm_upload(gallery_id, user, event):
                     # Use video processor for videos
                     from utils.video_processor import process_video_upload_async
                     print(f"🎬 Processing video for LocalStack: {s3_key}")
-                    result = process_video_upload_async(s3_key, S3_BUCKET, image_data=image_data)
+                    result = process_video_upload_async(s3_key, S3_BUCKET)
                 else:
                     # Use image processor for images with watermark if enabled
                     from utils.image_processor import process_upload_async
@@ -518,7 +532,8 @@ def handle_confirm_upload(gallery_id, user, event):
                         print(f"⚠️ Could not load watermark config: {str(wm_error)}")
                     
                     print(f"🔄 Processing image for LocalStack: {s3_key}")
-                    result = process_upload_async(s3_key, S3_BUCKET, image_data=image_data, watermark_config=watermark_config)
+                    result = process_upload_async(s3_key, S3_BUCKET, watermark_config=watermark_config,
+                                                  formats=rendition_formats)
                 
                 if result.get('success'):
                     print(f"✅ Processing completed successfully")
@@ -526,6 +541,8 @@ def handle_confirm_upload(gallery_id, user, event):
                     # Calculate total storage: original + all renditions
                     renditions = result.get('renditions', {})
                     renditions_size_bytes = sum(r['size'] for r in renditions.values())
+                    renditions_size_bytes += sum(r['size'] for variant in result.get('variants', {}).values()
+                                                 for r in variant.values())
                     renditions_size_mb = renditions_size_bytes / (1024 * 1024)
                     total_storage_mb = float(size_mb) + renditions_size_mb
                     
@@ -538,6 +555,8 @@ def handle_confirm_upload(gallery_id, user, event):
                     photo['status'] = 'active'
                     photo['size_mb'] = Decimal(str(round(total_storage_mb, 2)))
                     photo['renditions_size_mb'] = Decimal(str(round(renditions_size_mb, 2)))
+                    if result.get('perceptual_hash'):
+                        photo['perceptual_hash'] = result['perceptual_hash']
                     
                     # For videos, add duration info if available
                     if is_video and metadata.get('duration_seconds'):
@@ -604,14 +623,8 @@ def handle_confirm_upload(gallery_id, user, event):
                 gallery['cover_photo_url'] = photo_urls['thumbnail_url']
             galleries_table.put_item(Item=gallery)
         
-        # Invalidate gallery ZIP file (delete it so it's regenerated on next download)
-        # This is much faster than regenerating it synchronously
-        try:
-            zip_key = f"{gallery_id}/gallery-all-photos.zip"
-            print(f" Invalidating gallery ZIP: {zip_key}")
-            s3_client.delete_object(Bucket=S3_BUCKET, Key=zip_key)
-        except Exception as zip_error:
-            print(f" Failed to invalidate ZIP: {str(zip_error)}")
+        # Gallery ZIP: updated_at changed above, so the next download adds/drops
+        # only the changed photos (zip_generator.update_gallery_zip)
         
         # SEND "GALLERY READY" NOTIFICATION - When FIRST photo is uploaded
         if previous_photo_count == 0 and new_photo_count == 1:
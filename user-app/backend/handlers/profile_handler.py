@@ -5,6 +5,7 @@ from datetime import datetime, timezone
 from decimal import Decimal
 from utils.config import users_table, sessions_table
 from utils.response import create_response
+from utils.auth import forget_user_sessions
 from utils.plan_enforcement import require_role
 import os
 
@@ -139,6 +140,7 @@ def handle_update_profile(user, body):
         for session in sessions_response.get('Items', []):
             session['user'] = user_data
             sessions_table.put_item(Item=session)
+        forget_user_sessions(email=user['email'])
         
         print(f"Profile updated for {user['email']}")
         
@@ -7,6 +7,7 @@ import os
 from datetime import datetime, timezone
 from utils.response import create_response
 from utils.config import users_table
+from utils.feature_resolver import invalidate_user_features
 
 # Stripe configuration
 try:
@@ -174,6 +175,7 @@ def handle_subscription_event(event_type, subscription):
                 UpdateExpression='SET ' + ', '.join(update_expression_parts),
                 ExpressionAttributeValues=expression_values
             )
+            invalidate_user_features(user_id)
             print(f"User updated: {user.get('email')}")
         
         return create_response(200, {
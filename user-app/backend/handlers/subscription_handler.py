@@ -7,6 +7,8 @@ from utils.config import galleries_table, users_table, dynamodb, features_table,
 from utils.response import create_response
 from utils.plans_config import PLANS  # Import from shared config to prevent circular dependency
 from utils.plan_monitoring import track_storage_violation
+from utils.request_scope import current_scope
+from utils.feature_resolver import resolve_features, get_cached_features, cache_features
 import os
 
 subscriptions_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_SUBSCRIPTIONS'))
@@ -16,195 +18,74 @@ def get_user_features(user):
     """
     Get consolidated features for a user.
     Merges plan defaults with specific overrides from user_features table.
+    Resolution uses the precompiled rules in utils/feature_resolver.py and is
+    cached per container while the user's plan and features_version match.
     """
     try:
         user_id = user.get('id')
         
+        # Reads go through the request scope so repeated calls within one
+        # request (decorators + handler) hit DynamoDB once
+        scope = current_scope()
+        
         # 1. Get user plan from DB
         user_response = {}
         if user.get('email'):
             try:
-                user_response = users_table.get_item(Key={'email': user['email']})
+                item = scope.get_item(users_table, {'email': user['email']})
+                if item:
+                    user_response = {'Item': item}
             except Exception as e:
                 print(f"Error fetching user by email: {e}")
         
         if 'Item' not in user_response and user_id:
             # Fallback to querying by ID using GSI
             try:
-                resp = users_table.query(
+                resp = scope.memo(('users.UserIdIndex', user_id), lambda: users_table.query(
                     IndexName='UserIdIndex', 
                     KeyConditionExpression=Key('id').eq(user_id)
-                )
+                ))
                 if resp.get('Items'):
                     user_response = {'Item': resp['Items'][0]}
             except Exception as e:
                 print(f"Error fetching user by ID: {e}")
         
-        # 2. Get manual feature overrides/assignments
+        # Fetch user details to get plan
+        user_item = user_response.get('Item')
+        if user_item:
+            user_plan_id = user_item.get('plan') or user_item.get('subscription') or 'free'
+        else:
+            # Fallback to what's in the user object if DB fetch failed
+            user_plan_id = user.get('plan') or user.get('subscription') or 'free'
+        
+        # 2. Serve from the per-container cache while plan and overrides
+        # version are unchanged (only when the plan came from the DB)
+        cacheable = bool(user_id and user_item)
+        features_version = int(user_item.get('features_version', 0)) if user_item else 0
+        if cacheable:
+            cached = get_cached_features(user_id, user_plan_id, features_version)
+            if cached:
+                return cached[0], user_plan_id, cached[1]
+        
+        # 3. Get manual feature overrides/assignments
         user_features_items = []
         if user_id:
             try:
-                response = user_features_table.query(
+                response = scope.memo(('user_features', user_id), lambda: user_features_table.query(
                     KeyConditionExpression=Key('user_id').eq(user_id)
-                )
+                ))
                 user_features_items = response.get('Items', [])
             except Exception as e:
                 print(f"Error fetching feature overrides: {e}")
         
-        # 3. Get all feature definitions to map feature_id -> values
-        
-        # Fetch user details to get plan
-        user_plan_id = 'free'
-        if 'Item' in user_response:
-            user_plan_id = user_response['Item'].get('plan') or user_response['Item'].get('subscription') or 'free'
-        else:
-            # Fallback to what's in the user object if DB fetch failed
-            user_plan_id = user.get('plan') or user.get('subscription') or 'free'
-        
-        # Normalize plan
-        normalized_plan_id = user_plan_id
-        plan_def = PLANS.get(normalized_plan_id, PLANS.get('free'))
-        
-        # Start with defaults from the plan definition
-        features = {
-            'storage_gb': plan_def.get('storage_gb', 2),
-            'galleries_per_month': plan_def.get('galleries_per_month', 3),
-            'video_minutes': 0, 
-            'video_quality': 'hd', # hd or 4k
-            'remove_branding': False,
-            'custom_domain': False,
-            'raw_support': False,
-            'analytics_level': 'basic', # basic, advanced, pro
-            'email_templates': False,
-            'client_favorites': False,
-            'seo_tools': False,
-            'raw_vault': False,
-            'client_invoicing': False,
-            'scheduler': False,
-            'e_signatures': False,
-            'watermarking': False,
-            'edit_requests': False
-        }
-        
-        # Collect all feature IDs: from plan definition + manual overrides
-        feature_ids = set(plan_def.get('feature_ids', []))
-        
-        # Add overrides
-        for item in user_features_items:
-            fid = item.get('feature_id')
-            if fid:
-                feature_ids.add(fid)
-                
-        # Resolve feature IDs to limits
-        # We process them in order of "power" to ensure upgrades override defaults
-        
-        # Storage Resolution
-        if 'storage_unlimited' in feature_ids:
-            features['storage_gb'] = -1
-        elif 'storage_1tb' in feature_ids or 'storage_1000gb' in feature_ids:
-            features['storage_gb'] = 1000
-        elif 'storage_200gb' in feature_ids:
-            features['storage_gb'] = 200
-        elif 'storage_100gb' in feature_ids:
-            features['storage_gb'] = 100
-        elif 'storage_50gb' in feature_ids:
-            features['storage_gb'] = 50
-        elif 'storage_10gb' in feature_ids:
-            features['storage_gb'] = 10
-        elif 'storage_3gb' in feature_ids:
-            features['storage_gb'] = 3
-        elif 'storage_1gb' in feature_ids:
-            features['storage_gb'] = 1
-            
-        # Gallery Limits
-        if 'unlimited_galleries' in feature_ids:
-            features['galleries_per_month'] = -1
-            
-        # Video Support
-        if 'video_4k_unlimited' in feature_ids:
-            features['video_minutes'] = -1
-            features['video_quality'] = '4k'
-        elif 'video_10hr_4k' in feature_ids:
-            features['video_minutes'] = 600
-            features['video_quality'] = '4k'
-        elif 'video_4hr_4k' in feature_ids:
-            features['video_minutes'] = 240
-            features['video_quality'] = '4k'
-        elif 'video_2hr_4k' in feature_ids:
-            features['video_minutes'] = 120
-            features['video_quality'] = '4k'
-        elif 'video_1hr_hd' in feature_ids or 'video_60min_hd' in feature_ids:
-            features['video_minutes'] = 60
-            features['video_quality'] = 'hd'
-        elif 'video_60min_4k' in feature_ids:
-            features['video_minutes'] = 60
-            features['video_quality'] = '4k'
-        elif 'video_30min_4k' in feature_ids:
-            features['video_minutes'] = 30
-            features['video_quality'] = '4k'
-        elif 'video_30min_hd' in feature_ids:
-            features['video_minutes'] = 30
-            features['video_quality'] = 'hd'
-        elif 'video_15min_hd' in feature_ids:
-            features['video_minutes'] = 15
-            features['video_quality'] = 'hd'
-        elif 'video_10min_hd' in feature_ids:
-            features['video_minutes'] = 10
-            features['video_quality'] = 'hd'
-        elif 'video_none' in feature_ids:
-            features['video_minutes'] = 0
-            features['video_quality'] = 'none'
-            
-        # Branding & Domain
-        if 'no_branding' in feature_ids or 'white_label' in feature_ids:
-            features['remove_branding'] = True
-        elif 'branding_on' in feature_ids:
-            features['remove_branding'] = False
-            
-        if 'watermarking' in feature_ids:
-            features['watermarking'] = True
-            
-        if 'custom_domain' in feature_ids:
-            features['custom_domain'] = True
-            
-        # Advanced Features
-        if 'client_invoicing' in feature_ids or 'smart_invoicing' in feature_ids:
-            features['client_invoicing'] = True
-            
-        if 'scheduler' in feature_ids:
-            features['scheduler'] = True
-            
-        if 'e_signatures' in feature_ids:
-            features['e_signatures'] = True
-            
-        # Client Favorites (Starter+)
-        if 'client_favorites' in feature_ids or 'client_proofing' in feature_ids:
-            features['client_favorites'] = True
-
-        if 'raw_support' in feature_ids or 'raw_vault' in feature_ids:
-            features['raw_support'] = True
-            
-        if 'raw_vault' in feature_ids:
-            features['raw_vault'] = True
-
-        if 'email_templates' in feature_ids:
-            features['email_templates'] = True
-            
-        # SEO Tools (Pro & Ultimate)
-        if 'seo_tools' in feature_ids:
-            features['seo_tools'] = True
-            
-        # Analytics Level
-        if 'analytics_pro' in feature_ids or 'visitor_insights' in feature_ids:
-            features['analytics_level'] = 'pro'
-        elif 'analytics_advanced' in feature_ids:
-            features['analytics_level'] = 'advanced'
+        # 4. Resolve plan defaults + overrides through the precompiled rules
+        features, plan_name = resolve_features(
+            user_plan_id, [item.get('feature_id') for item in user_features_items]
+        )
+        if cacheable:
+            cache_features(user_id, user_plan_id, features_version, features, plan_name)
         
-        # Edit Requests (Starter+)
-        if 'edit_requests' in feature_ids:
-            features['edit_requests'] = True
-            
-        return features, normalized_plan_id, plan_def['name']
+        return features, user_plan_id, plan_name
 
     except Exception as e:
         print(f"Error fetching user features: {e}")
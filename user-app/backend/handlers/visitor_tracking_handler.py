@@ -8,6 +8,7 @@ from datetime import datetime, timezone
 from decimal import Decimal
 from utils.config import dynamodb
 from utils.response import create_response
+from utils.event_buffer import put_event
 import os
 
 # Initialize table from config
@@ -169,7 +170,7 @@ def handle_track_visit(body):
         if visitor_id:
             item['visitor_id'] = visitor_id
         
-        visitor_table.put_item(Item=item)
+        put_event(visitor_table, item)
         
         return create_response(200, {
             'success': True,
@@ -259,7 +260,7 @@ def handle_track_event(body):
             
             item['metadata'] = converted_metadata
         
-        visitor_table.put_item(Item=item)
+        put_event(visitor_table, item)
         
         return create_response(200, {
             'success': True,
@@ -324,7 +325,7 @@ def handle_track_session_end(body):
         if visitor_id:
             item['visitor_id'] = visitor_id
         
-        visitor_table.put_item(Item=item)
+        put_event(visitor_table, item)
         
         return create_response(200, {
             'success': True,
@@ -10,15 +10,30 @@ Step 12: Extract and preserve EXIF, color profile metadata
 Step 13: Apply photographer settings (watermarks, compression, color adjustments)
 Step 14: Store renditions in optimized S3 structure with lifecycle policies
 Step 15: Update database with rendition locations, sizes, checksums
+
+Decode/resize/adjust/encode is the shared rendition core (utils/rendition_core.py,
+also used by utils/image_processor); RAW decoding is utils/raw_processor.py.
+WebP/AVIF variants follow the photographer's features (utils/feature_resolver.py).
+The deployment package ships utils/__init__.py, utils/rendition_core.py,
+utils/raw_processor.py, utils/feature_resolver.py, utils/plans_config.py and
+utils/ttl_cache.py next to this file.
 """
 import json
 import boto3
 import os
+from datetime import datetime
 from PIL import Image
 from io import BytesIO
 import rawpy
 import pillow_heif
 from urllib.parse import unquote_plus
+from boto3.dynamodb.conditions import Key
+
+from utils.feature_resolver import resolve_features
+from utils.raw_processor import decode_raw
+from utils.rendition_core import (
+    RECORD_WORKERS, build_rendition_plan, enabled_formats, load_for_plan, render_plan, render_many
+)
 
 # Initialize AWS clients
 s3_client = boto3.client('s3')
@@ -26,20 +41,19 @@ dynamodb = boto3.resource('dynamodb')
 photos_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_PHOTOS'))
 galleries_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_GALLERIES'))
 users_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_USERS'))
+user_features_table = dynamodb.Table(os.environ.get('DYNAMODB_TABLE_USER_FEATURES'))
 
 # Configuration
 SOURCE_BUCKET = os.environ.get('S3_PHOTOS_BUCKET')
 RENDITIONS_BUCKET = os.environ.get('S3_PHOTOS_BUCKET')
 CDN_DOMAIN = os.environ.get('CDN_DOMAIN')
 
-# Rendition sizes following industry standards
-# Step 10: Generate multiple renditions for progressive loading
-RENDITIONS = {
-    'thumbnail': {'width': 400, 'height': 400, 'quality': 80},      # Grid display
-    'small': {'width': 800, 'height': 600, 'quality': 85},           # Preview
-    'medium': {'width': 2000, 'height': 2000, 'quality': 90},        # Detail view
-    'large': {'width': 4000, 'height': 4000, 'quality': 92}          # High-res zoom
-}
+# Rendition sizes and qualities: rendition_core.RENDITION_OUTPUTS
+# Step 14: Renditions are immutable per key, cache for a year at the CDN
+RENDITION_CACHE_CONTROL = 'public, max-age=31536000'
+
+# Images processed concurrently per S3 event (bounded by Lambda memory)
+IMAGE_RECORD_WORKERS = int(os.environ.get('IMAGE_RECORD_WORKERS', RECORD_WORKERS))
 
 # Register HEIF opener
 pillow_heif.register_heif_opener()
@@ -61,6 +75,7 @@ def lambda_handler(event, context):
     """
     try:
         # Parse S3 event
+        jobs = []
         for record in event['Records']:
             bucket = record['s3']['bucket']['name']
             key = unquote_plus(record['s3']['object']['key'])
@@ -72,12 +87,21 @@ def lambda_handler(event, context):
                 print(f"⏭️  Skipping rendition file: {key}")
                 continue
             
-            # Step 9-15: Process the image
-            process_image(bucket, key)
-            
+            jobs.append((bucket, key))
+        
+        # Step 9-15: Process the images of this event concurrently
+        results = render_many(jobs, lambda job: process_image(*job), workers=IMAGE_RECORD_WORKERS)
+        failed = [f"{job[1]}: {error}" for job, _, error in results if error]
+        for failure in failed:
+            print(f"❌ Error processing image {failure}")
+        
         return {
             'statusCode': 200,
-            'body': json.dumps({'message': 'Processing complete'})
+            'body': json.dumps({
+                'message': 'Processing complete',
+                'processed': len(results) - len(failed),
+                'failed': len(failed)
+            })
         }
         
     except Exception as e:
@@ -104,97 +128,59 @@ def process_image(bucket, s3_key):
         s3_key: S3 key (gallery_id/photo_id.ext)
     """
     try:
+        # Extract photo_id and gallery_id from S3 key
+        parts = s3_key.split('/')
+        if len(parts) != 2:
+            print(f"⚠️  Invalid S3 key format: {s3_key}")
+            return
+            
+        gallery_id = parts[0]
+        photo_filename = parts[1]
+        photo_id = os.path.splitext(photo_filename)[0]
+        
+        # Step 13: Photographer settings become plan operations
+        photographer = get_photographer(gallery_id)
+        photographer_settings = get_photographer_settings(photographer)
+        plan = build_rendition_plan(
+            s3_key, bucket, RENDITIONS_BUCKET,
+            operations=photographer_operations(photographer_settings, bucket),
+            cache_control=RENDITION_CACHE_CONTROL,
+            formats=get_rendition_formats(photographer)
+        )
+        
         # Step 10: Download original
         print(f"⬇️  Step 10: Downloading original: {s3_key}")
         response = s3_client.get_object(Bucket=bucket, Key=s3_key)
         original_data = response['Body'].read()
-        file_size = len(original_data)
         
         # Detect format from file extension
         file_ext = os.path.splitext(s3_key)[1].lower()
         
         # Step 11: Load image (handles RAW, HEIC, standard formats)
-        image, original_exif = load_image_with_metadata(original_data, file_ext)
+        image, original_exif, source_size = load_image_with_metadata(original_data, file_ext, plan)
         
         if image is None:
             print(f"⚠️  Could not load image: {s3_key}")
             return
         
-        # Extract photo_id and gallery_id from S3 key
-        parts = s3_key.split('/')
-        if len(parts) != 2:
-            print(f"⚠️  Invalid S3 key format: {s3_key}")
-            return
-            
-        gallery_id = parts[0]
-        photo_filename = parts[1]
-        photo_id = os.path.splitext(photo_filename)[0]
-        
         # Step 12: Extract and preserve metadata
-        metadata = extract_comprehensive_metadata(image, original_exif, original_data)
-        
-        # Step 13: Get photographer settings for processing
-        photographer_settings = get_photographer_settings(gallery_id)
+        metadata = extract_comprehensive_metadata(image, original_exif, original_data, source_size)
         
         # Step 10-14: Generate and upload all renditions
-        rendition_data = {}
+        result = render_plan(plan, image, source_size, s3_client)
         
-        for size_name, size_config in RENDITIONS.items():
-            try:
-                # Step 10: Resize image
-                rendition = resize_image(image, size_config['width'], size_config['height'])
-                
-                # Step 13: Apply photographer settings
-                rendition = apply_photographer_settings(rendition, photographer_settings)
-                
-                # Step 11: Convert to optimized JPEG for web
-                buffer = BytesIO()
-                rendition.convert('RGB').save(
-                    buffer, 
-                    format='JPEG', 
-                    quality=size_config['quality'], 
-                    optimize=True,
-                    progressive=True  # Progressive JPEG for faster perceived loading
-                )
-                buffer.seek(0)
-                rendition_bytes = buffer.getvalue()
-                
-                # Calculate checksum (Step 15)
-                import hashlib
-                checksum = hashlib.md5(rendition_bytes).hexdigest()
-                
-                # Generate S3 key for rendition
-                # Format: renditions/gallery_id/photo_id_size.jpg
-                rendition_key = f"renditions/{gallery_id}/{photo_id}_{size_name}.jpg"
-                
-                # Step 14: Upload to S3 with lifecycle policies
-                s3_client.put_object(
-                    Bucket=RENDITIONS_BUCKET,
-                    Key=rendition_key,
-                    Body=rendition_bytes,
-                    ContentType='image/jpeg',
-                    CacheControl='public, max-age=31536000',  # 1 year cache
-                    Metadata={
-                        'original-key': s3_key,
-                        'photo-id': photo_id,
-                        'size': size_name,
-                        'checksum': checksum
-                    }
-                )
-                
-                # Generate CDN URL
-                rendition_url = f"https://{CDN_DOMAIN}/{rendition_key}"
-                
-                # Store rendition info (Step 15)
-                rendition_data[f"{size_name}_url"] = rendition_url
-                rendition_data[f"{size_name}_size"] = len(rendition_bytes)
-                rendition_data[f"{size_name}_checksum"] = checksum
-                
-                print(f"✅ Generated {size_name}: {rendition_key} ({len(rendition_bytes)} bytes)")
-                
-            except Exception as e:
-                print(f"❌ Error generating {size_name}: {str(e)}")
-                continue
+        # Step 15: Rendition info for the photo record
+        # (WebP/AVIF variants are named like thumbnail_webp_url)
+        rendition_data = {}
+        for output_id, info in result['outputs'].items():
+            field = output_id.replace('.', '_')
+            rendition_data[f"{field}_url"] = f"https://{CDN_DOMAIN}/{info['key']}"
+            rendition_data[f"{field}_size"] = info['size']
+            rendition_data[f"{field}_checksum"] = info['checksum']
+            print(f"✅ Generated {output_id}: {info['key']} ({info['size']} bytes)")
+        if rendition_data:
+            # Near-duplicate search key (utils/duplicate_detector.find_near_duplicates)
+            rendition_data['perceptual_hash'] = result['perceptual_hash']
         
         # Step 15: Update DynamoDB with rendition URLs and metadata
         if rendition_data:
@@ -208,7 +194,7 @@ def process_image(bucket, s3_key):
         traceback.print_exc()
         raise
 
-def load_image_with_metadata(image_data, file_ext):
+def load_image_with_metadata(image_data, file_ext, plan):
     """
     Step 11-12: Load image and extract EXIF metadata
     Handles RAW, HEIC, and standard formats
@@ -217,9 +203,10 @@ def load_image_with_metadata(image_data, file_ext):
     Args:
         image_data: Raw image bytes
         file_ext: File extension (.jpg, .heic, .dng, etc.)
+        plan: Rendition plan (JPEGs are decoded in draft mode down to its largest output)
     
     Returns:
-        (PIL Image object, EXIF dict) or (None, None)
+        (PIL Image object, EXIF dict, full-resolution size) or (None, None, None)
     """
     try:
         # RAW formats
@@ -234,29 +221,19 @@ def load_image_with_metadata(image_data, file_ext):
                     'camera_wb_multipliers': raw.camera_whitebalance,
                     'daylight_wb_multipliers': raw.daylight_whitebalance
                 }
-                
-                # Convert to RGB (Step 11: transcode to web format)
-                rgb = raw.postprocess(
-                    use_camera_wb=True,
-                    output_bps=16,  # 16-bit for maximum quality
-                    no_auto_bright=True  # Preserve photographer's exposure
-                )
-                image = Image.fromarray(rgb)
-                
-                # Try to get EXIF from RAW
-                try:
-                    exif_data.update(image._getexif() or {})
-                except:
-                    pass
-                
-                return image, exif_data
+            
+            # Step 11: transcode to web format - embedded camera preview when it
+            # covers the large rendition, otherwise a full 8-bit demosaic
+            decoded = decode_raw(image_data, size='large', no_auto_bright=True)  # Preserve photographer's exposure
+            return decoded['image'], exif_data, decoded['full_dimensions']
         
         # HEIC format
         elif file_ext in ['.heic', '.heif']:
             print(f"📸 Processing HEIC image")
             image = Image.open(BytesIO(image_data))
             exif_data = image._getexif() if hasattr(image, '_getexif') else {}
-            return image, exif_data
+            image, source_size = load_for_plan(image, plan)
+            return image, exif_data, source_size
         
         # Standard formats (JPEG, PNG, TIFF, etc.)
         else:
@@ -273,25 +250,30 @@ def load_image_with_metadata(image_data, file_ext):
             if hasattr(image, 'info') and 'icc_profile' in image.info:
                 exif_data['icc_profile'] = image.info['icc_profile']
             
-            return image, exif_data
+            image, source_size = load_for_plan(image, plan)
+            return image, exif_data, source_size
             
     except Exception as e:
         print(f"❌ Error loading image: {str(e)}")
-        return None, None
+        return None, None, None
 
 
-def extract_comprehensive_metadata(image, exif_data, original_data):
+def extract_comprehensive_metadata(image, exif_data, original_data, source_size):
     """
     Step 12: Extract comprehensive metadata
     Returns metadata dict for storage
+    
+    source_size is the original's resolution (the decoded image may be
+    draft-reduced)
     """
     from PIL.ExifTags import TAGS
     
+    width, height = source_size
     metadata = {
         'dimensions': {
-            'width': image.width,
-            'height': image.height,
-            'aspect_ratio': round(image.width / image.height, 2) if image.height > 0 else 0
+            'width': width,
+            'height': height,
+            'aspect_ratio': round(width / height, 2) if height > 0 else 0
         },
         'format': image.format,
         'mode': image.mode,
@@ -328,262 +310,129 @@ def extract_comprehensive_metadata(image, exif_data, original_data):
     return metadata
 
 
-def get_photographer_settings(gallery_id):
+def get_photographer(gallery_id):
     """
-    Step 13: Get photographer-specific processing settings
-    Returns settings for watermarks, compression, color adjustments
+    Owner of a gallery (users table item), or None
+    Galleries are keyed by (user_id, id) and users by email, so both
+    lookups go through the id indexes.
     """
     try:
-        # Get gallery
-        response = galleries_table.get_item(Key={'id': gallery_id})
-        if 'Item' not in response:
-            return {}
-        
-        gallery = response['Item']
-        user_id = gallery.get('user_id')
-        
+        response = galleries_table.query(
+            IndexName='GalleryIdIndex',
+            KeyConditionExpression=Key('id').eq(gallery_id),
+            Limit=1
+        )
+        galleries = response.get('Items', [])
+        user_id = galleries[0].get('user_id') if galleries else None
         if not user_id:
-            return {}
-        
-        # Get user settings
-        user_response = users_table.get_item(Key={'id': user_id})
-        if 'Item' not in user_response:
-            return {}
-        
-        user = user_response['Item']
+            return None
         
-        # Extract processing preferences
-        return {
-            'watermark': user.get('watermark_enabled', False),
-            'watermark_text': user.get('watermark_text', ''),
-            'watermark_position': user.get('watermark_position', 'bottom-right'),
-            'watermark_opacity': user.get('watermark_opacity', 0.5),
-            'color_adjustments': user.get('color_adjustments', {}),
-            'compression_quality': user.get('compression_quality', 85)
-        }
+        user_response = users_table.query(
+            IndexName='UserIdIndex',
+            KeyConditionExpression=Key('id').eq(user_id),
+            Limit=1
+        )
+        users = user_response.get('Items', [])
+        return users[0] if users else None
     except Exception as e:
-        print(f"⚠️  Error getting photographer settings: {str(e)}")
-        return {}
+        print(f"⚠️  Error getting photographer: {str(e)}")
+        return None
 
 
-def apply_photographer_settings(image, settings):
+def get_photographer_settings(user):
     """
-    Step 13: Apply photographer-specific processing
-    - Watermarks
-    - Color adjustments
-    - Custom compression settings
+    Step 13: Get photographer-specific processing settings
+    Returns settings for watermarks, compression, color adjustments
     """
-    if not settings:
-        return image
+    if not user:
+        return {}
     
-    try:
-        # Apply watermark if enabled
-        if settings.get('watermark'):
-            image = apply_watermark(image, settings)
-        
-        # Apply color adjustments if specified
-        if settings.get('color_adjustments'):
-            image = apply_color_adjustments(image, settings['color_adjustments'])
-        
-        return image
-    except Exception as e:
-        print(f"⚠️  Error applying settings: {str(e)}")
-        return image
-
-
-def apply_watermark(image, settings):
-    """
-    Apply watermark to image (text or logo)
-    """
-    try:
-        from PIL import ImageDraw, ImageFont, Image as PILImage
-        import requests
-        from io import BytesIO
-        
-        watermark_type = settings.get('watermark_type', 'text')
-        
-        if watermark_type == 'logo' and settings.get('watermark_logo_s3_key'):
-            # Logo watermark
-            return apply_logo_watermark(image, settings)
-        else:
-            # Text watermark
-            return apply_text_watermark(image, settings)
-    except Exception as e:
-        print(f"⚠️  Watermark error: {str(e)}")
-        return image
-
-
-def apply_text_watermark(image, settings):
-    """
-    Apply text watermark to image
-    """
-    try:
-        from PIL import ImageDraw, ImageFont
-        
-        # Create draw object
-        draw = ImageDraw.Draw(image)
-        
-        # Get watermark text
-        text = settings.get('watermark_text', '')
-        if not text:
-            return image
-        
-        # Calculate position
-        position = settings.get('watermark_position', 'bottom-right')
-        opacity = int(settings.get('watermark_opacity', 0.5) * 255)
-        
-        # Add watermark
-        # (Simplified - production would use proper font sizing and positioning)
-        width, height = image.size
-        x = width - 200 if 'right' in position else 20
-        y = height - 40 if 'bottom' in position else 20
-        
-        draw.text((x, y), text, fill=(255, 255, 255, opacity))
-        
-        return image
-    except Exception as e:
-        print(f"⚠️  Text watermark error: {str(e)}")
-        return image
+    # Extract processing preferences
+    return {
+        'watermark': user.get('watermark_enabled', False),
+        'watermark_text': user.get('watermark_text', ''),
+        'watermark_position': user.get('watermark_position', 'bottom-right'),
+        'watermark_opacity': user.get('watermark_opacity', 0.5),
+        'watermark_type': user.get('watermark_type', 'text'),
+        'watermark_logo_s3_key': user.get('watermark_logo_s3_key'),
+        'watermark_size': user.get('watermark_size', 10.0),
+        'color_adjustments': user.get('color_adjustments', {}),
+        'compression_quality': user.get('compression_quality', 85)
+    }
 
 
-def apply_logo_watermark(image, settings):
+def get_rendition_formats(user):
     """
-    Apply logo/image watermark to image
+    Step 11: WebP/AVIF variants to render for the photographer
+    Resolved the same way as get_user_features (plan plus admin overrides,
+    utils/feature_resolver), which is what the confirm-upload handler builds
+    the photo's srcset from. The S3 event usually arrives before that photo
+    record exists, so nothing is read from it.
     """
+    if not user:
+        return []
+    
+    plan_id = user.get('plan') or user.get('subscription') or 'free'
+    override_ids = []
     try:
-        import boto3
-        from PIL import Image as PILImage
-        from io import BytesIO
-        
-        # Get logo from S3
-        logo_s3_key = settings.get('watermark_logo_s3_key')
-        if not logo_s3_key:
-            return image
-        
-        s3_client = boto3.client('s3')
-        bucket = os.environ.get('S3_PHOTOS_BUCKET')
-        
-        # Download logo
-        logo_obj = s3_client.get_object(Bucket=bucket, Key=logo_s3_key)
-        logo_data = logo_obj['Body'].read()
-        logo = PILImage.open(BytesIO(logo_data))
-        
-        # Convert to RGBA if not already
-        if logo.mode != 'RGBA':
-            logo = logo.convert('RGBA')
-        
-        # Calculate logo size (as percentage of image)
-        watermark_size_percent = settings.get('watermark_size', 10.0)  # Default 10%
-        image_width, image_height = image.size
-        logo_width = int(image_width * (watermark_size_percent / 100))
-        
-        # Maintain aspect ratio
-        logo_aspect = logo.size[1] / logo.size[0]
-        logo_height = int(logo_width * logo_aspect)
-        
-        # Resize logo
-        logo = logo.resize((logo_width, logo_height), PILImage.Resampling.LANCZOS)
-        
-        # Apply opacity
-        opacity = settings.get('watermark_opacity', 0.5)
-        logo_with_alpha = logo.copy()
-        alpha = logo_with_alpha.split()[3]  # Get alpha channel
-        alpha = alpha.point(lambda p: int(p * opacity))
-        logo_with_alpha.putalpha(alpha)
-        
-        # Calculate position
-        position = settings.get('watermark_position', 'bottom-right')
-        margin = 20
-        
-        if 'right' in position:
-            x = image_width - logo_width - margin
-        elif 'center' in position:
-            x = (image_width - logo_width) // 2
-        else:  # left
-            x = margin
-        
-        if 'bottom' in position:
-            y = image_height - logo_height - margin
-        elif 'center' in position:
-            y = (image_height - logo_height) // 2
-        else:  # top
-            y = margin
-        
-        # Convert base image to RGBA if needed
-        if image.mode != 'RGBA':
-            image = image.convert('RGBA')
-        
-        # Paste logo onto image
-        image.paste(logo_with_alpha, (x, y), logo_with_alpha)
-        
-        # Convert back to RGB for JPEG
-        if image.mode == 'RGBA':
-            rgb_image = PILImage.new('RGB', image.size, (255, 255, 255))
-            rgb_image.paste(image, mask=image.split()[3])
-            image = rgb_image
-        
-        return image
+        response = user_features_table.query(
+            KeyConditionExpression=Key('user_id').eq(user.get('id'))
+        )
+        override_ids = [item.get('feature_id') for item in response.get('Items', [])]
     except Exception as e:
-        print(f"⚠️  Logo watermark error: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return image
-
+        print(f"⚠️  Error getting feature overrides: {str(e)}")
+    
+    features, _ = resolve_features(plan_id, override_ids)
+    return enabled_formats(features)
 
-def apply_color_adjustments(image, adjustments):
-    """
-    Apply color adjustments (brightness, contrast, saturation)
-    """
-    try:
-        from PIL import ImageEnhance
-        
-        if 'brightness' in adjustments:
-            enhancer = ImageEnhance.Brightness(image)
-            image = enhancer.enhance(adjustments['brightness'])
-        
-        if 'contrast' in adjustments:
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(adjustments['contrast'])
-        
-        if 'saturation' in adjustments:
-            enhancer = ImageEnhance.Color(image)
-            image = enhancer.enhance(adjustments['saturation'])
-        
-        return image
-    except Exception as e:
-        print(f"⚠️  Color adjustment error: {str(e)}")
-        return image
 
-def resize_image(image, max_width, max_height):
+def photographer_operations(settings, bucket):
     """
-    Resize image maintaining aspect ratio
+    Step 13: Photographer-specific processing as rendition plan operations
+    - Color adjustments
+    - Watermarks (logo or text)
     
     Args:
-        image: PIL Image
-        max_width: Maximum width
-        max_height: Maximum height
+        settings: get_photographer_settings() result
+        bucket: Bucket holding watermark logos
     
     Returns:
-        Resized PIL Image
+        Ordered list of operation dicts (see utils/rendition_core.py)
     """
-    # Calculate aspect ratio
-    width, height = image.size
-    aspect_ratio = width / height
+    if not settings:
+        return []
     
-    # Determine new dimensions
-    if width > max_width or height > max_height:
-        if aspect_ratio > 1:  # Landscape
-            new_width = min(width, max_width)
-            new_height = int(new_width / aspect_ratio)
-        else:  # Portrait
-            new_height = min(height, max_height)
-            new_width = int(new_height * aspect_ratio)
-        
-        # Resize with high-quality Lanczos resampling
-        return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    operations = []
     
-    # Return original if already smaller
-    return image
+    # Color adjustments go first so they don't tint the watermark
+    adjustments = settings.get('color_adjustments') or {}
+    if adjustments:
+        operations.append({
+            'op': 'color',
+            'brightness': adjustments.get('brightness'),
+            'contrast': adjustments.get('contrast'),
+            'saturation': adjustments.get('saturation')
+        })
+    
+    if settings.get('watermark'):
+        if settings.get('watermark_type') == 'logo' and settings.get('watermark_logo_s3_key'):
+            operations.append({
+                'op': 'logo_watermark',
+                'bucket': bucket,
+                'key': settings['watermark_logo_s3_key'],
+                'position': settings.get('watermark_position', 'bottom-right'),
+                'opacity': settings.get('watermark_opacity', 0.5),
+                'size_percent': settings.get('watermark_size', 10.0)
+            })
+        elif settings.get('watermark_text'):
+            operations.append({
+                'op': 'text_watermark',
+                'text': settings['watermark_text'],
+                'position': settings.get('watermark_position', 'bottom-right'),
+                'opacity': settings.get('watermark_opacity', 0.5)
+            })
+    
+    return operations
 
 def update_photo_record(gallery_id, photo_id, rendition_data, metadata):
     """
@@ -596,8 +445,6 @@ def update_photo_record(gallery_id, photo_id, rendition_data, metadata):
         metadata: Extracted metadata (EXIF, camera, GPS, etc.)
     """
     try:
-        from datetime import datetime
-        
         # Build update expression for renditions
         update_expr = "SET "
         expr_attr_values = {}
@@ -654,7 +501,3 @@ def update_photo_record(gallery_id, photo_id, rendition_data, metadata):
         traceback.print_exc()
         # Don't fail processing if database update fails
         # Renditions are already in S3 and can be regenerated
-
-
-from datetime import datetime
-
@@ -10,6 +10,11 @@ import time
 from typing import List, Dict, Optional
 from botocore.exceptions import ClientError
 
+from utils.index_projections import (
+    ANALYTICS_EXPORT_PROJECTION, GALLERIES_EXPORT_PROJECTION, PHOTOS_EXPORT_PROJECTION,
+    PHOTOS_FILE_HASH_PROJECTION, PHOTOS_NAME_SIZE_PROJECTION
+)
+
 # Initialize DynamoDB client
 dynamodb = boto3.client('dynamodb', region_name='us-east-1')
 
@@ -49,6 +54,7 @@ REQUIRED_INDEXES = {
     #   3. Client galleries: scan(client_email=X) - EXPENSIVE SCAN! NEEDS INDEX!
     #   4. Single client gallery: scan(id=X) - EXPENSIVE! BUT infrequent
     #   5. Public sharing: Future feature for share_token - NEEDS INDEX!
+    #   6. Analytics export: query(UserCreatedAtIndex, user_id=X, created_at BETWEEN ...) - NEEDS INDEX!
     # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
     'galerly-galleries': [
         {
@@ -71,7 +77,7 @@ REQUIRED_INDEXES = {
             'AttributeDefinitions': [
                 {'AttributeName': 'share_token', 'AttributeType': 'S'}
             ],
-            'Justification': '✅ ESSENTIAL - Public gallery viewing via /view/{token}. Future feature but already generating share_tokens'
+            'Justification': '🔥 CRITICAL - utils/gallery_resolver.resolve_share_token: every client share link and token bulk download'
         },
         {
             'IndexName': 'GalleryIdIndex',
@@ -82,7 +88,21 @@ REQUIRED_INDEXES = {
             'AttributeDefinitions': [
                 {'AttributeName': 'id', 'AttributeType': 'S'}
             ],
-            'Justification': '✅ IMPORTANT - handle_get_client_gallery does scan(id=X). Less frequent but still inefficient'
+            'Justification': '🔥 CRITICAL - utils/gallery_resolver.py resolves gallery owner for every public analytics tracking hit'
+        },
+        {
+            'IndexName': 'UserCreatedAtIndex',
+            'KeySchema': [
+                {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+            ],
+            # Only the columns of the galleries export
+            'Projection': GALLERIES_EXPORT_PROJECTION,
+            'AttributeDefinitions': [
+                {'AttributeName': 'user_id', 'AttributeType': 'S'},
+                {'AttributeName': 'created_at', 'AttributeType': 'S'}
+            ],
+            'Justification': '⚡ OPTIMIZATION - analytics_export_handler galleries CSV/Excel: reads only galleries created in the export range'
         }
     ],
     
@@ -95,6 +115,9 @@ REQUIRED_INDEXES = {
     #   2. List gallery photos: query(GalleryIdIndex, gallery_id=X) - NEEDS INDEX!
     #   3. Update photo (ownership check): get_item(id=X) then check user_id ✓
     #   4. List user photos: query(UserIdIndex, user_id=X) - NICE TO HAVE
+    #   5. Pre-upload duplicate check: query(UserFileHashIndex, user_id=X, file_hash=H)
+    #      and query(GalleryNameSizeIndex, gallery_id=X, name_size BETWEEN ...) - NEEDS INDEX!
+    #   6. Analytics export: query(UserCreatedAtIndex, user_id=X, created_at BETWEEN ...) - NEEDS INDEX!
     # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
     'galerly-photos': [
         {
@@ -118,6 +141,123 @@ REQUIRED_INDEXES = {
                 {'AttributeName': 'user_id', 'AttributeType': 'S'}
             ],
             'Justification': '⚡ OPTIMIZATION - Future: "View all my photos". Current: Batch security checks. Low priority but cheap'
+        },
+        {
+            'IndexName': 'UserFileHashIndex',
+            'KeySchema': [
+                {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'file_hash', 'KeyType': 'RANGE'}
+            ],
+            # Sparse (only photos with a hash) and only what the duplicate modal shows
+            'Projection': PHOTOS_FILE_HASH_PROJECTION,
+            'AttributeDefinitions': [
+                {'AttributeName': 'user_id', 'AttributeType': 'S'},
+                {'AttributeName': 'file_hash', 'AttributeType': 'S'}
+            ],
+            # Run backfill_duplicate_index.py before creating this and GalleryNameSizeIndex
+            'Justification': '🔥 CRITICAL - duplicate_detector.find_duplicates: exact-copy check across all galleries before every upload'
+        },
+        {
+            'IndexName': 'GalleryNameSizeIndex',
+            'KeySchema': [
+                {'AttributeName': 'gallery_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'name_size', 'KeyType': 'RANGE'}
+            ],
+            'Projection': PHOTOS_NAME_SIZE_PROJECTION,
+            'AttributeDefinitions': [
+                {'AttributeName': 'gallery_id', 'AttributeType': 'S'},
+                {'AttributeName': 'name_size', 'AttributeType': 'S'}
+            ],
+            'Justification': '🔥 CRITICAL - duplicate_detector.find_duplicates: filename+size check was a full gallery query per file'
+        },
+        {
+            'IndexName': 'UserCreatedAtIndex',
+            'KeySchema': [
+                {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+            ],
+            # Only the columns of the photos export
+            'Projection': PHOTOS_EXPORT_PROJECTION,
+            'AttributeDefinitions': [
+                {'AttributeName': 'user_id', 'AttributeType': 'S'},
+                {'AttributeName': 'created_at', 'AttributeType': 'S'}
+            ],
+            'Justification': '⚡ OPTIMIZATION - analytics_export_handler photos CSV/Excel: reads only photos uploaded in the export range'
+        }
+    ],
+    
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # galerly-analytics
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # Primary Key: id (HASH) - one item per raw tracking event
+    # Queries:
+    #   1. Gallery events: query(GalleryIdIndex, gallery_id=X, timestamp BETWEEN ...) ✓
+    #   2. Analytics export: query(UserTimestampIndex, user_id=X, timestamp BETWEEN ...) - NEEDS INDEX!
+    #      (days older than the archive watermark are read from Parquet, see
+    #      utils/analytics_archive.py)
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    'galerly-analytics': [
+        {
+            'IndexName': 'UserTimestampIndex',
+            'KeySchema': [
+                {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+            ],
+            # Summary CSV and PDF report read event_type and metadata only
+            'Projection': ANALYTICS_EXPORT_PROJECTION,
+            'AttributeDefinitions': [
+                {'AttributeName': 'user_id', 'AttributeType': 'S'},
+                {'AttributeName': 'timestamp', 'AttributeType': 'S'}
+            ],
+            'Justification': '🔥 CRITICAL - analytics_export_handler summary CSV/PDF: UserIdIndex read every event of the photographer and filtered the dates'
+        }
+    ],
+    
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # galerly-leads
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # Primary Key: id (HASH)
+    # Queries:
+    #   1. List leads: query(PhotographerIdIndex, photographer_id=X) - NEEDS INDEX!
+    #   2. Clients export: query(PhotographerIdIndex, photographer_id=X, created_at BETWEEN ...)
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    'galerly-leads': [
+        {
+            'IndexName': 'PhotographerIdIndex',
+            'KeySchema': [
+                {'AttributeName': 'photographer_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'},
+            'AttributeDefinitions': [
+                {'AttributeName': 'photographer_id', 'AttributeType': 'S'},
+                {'AttributeName': 'created_at', 'AttributeType': 'S'}
+            ],
+            'Justification': '✅ ESSENTIAL - leads_handler lists leads; analytics_export_handler clients export by date range'
+        }
+    ],
+    
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # galerly-sales
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    # Primary Key: id (HASH)
+    # Queries:
+    #   1. List sales: query(PhotographerIdIndex, photographer_id=X) - NEEDS INDEX!
+    #   2. Revenue export: query(PhotographerIdIndex, photographer_id=X, created_at BETWEEN ...)
+    # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+    'galerly-sales': [
+        {
+            'IndexName': 'PhotographerIdIndex',
+            'KeySchema': [
+                {'AttributeName': 'photographer_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'},
+            'AttributeDefinitions': [
+                {'AttributeName': 'photographer_id', 'AttributeType': 'S'},
+                {'AttributeName': 'created_at', 'AttributeType': 'S'}
+            ],
+            'Justification': '✅ ESSENTIAL - sales_handler lists sales; analytics_export_handler revenue export by date range'
         }
     ],
     
@@ -241,8 +381,15 @@ REQUIRED_INDEXES = {
 # - galerly-newsletters.SubscribedAtIndex (LOW PRIORITY - Analytics)
 # - galerly-contact.CreatedAtIndex (LOW PRIORITY - Admin)
 # - galerly-contact.StatusIndex (MEDIUM PRIORITY - Admin)
+# - galerly-photos.UserFileHashIndex / GalleryNameSizeIndex (HIGH PRIORITY - upload
+#   duplicate check; run backfill_duplicate_index.py once BEFORE creating them, so the
+#   GSIs build from complete data)
+# - galerly-analytics.UserTimestampIndex, galerly-galleries/photos.UserCreatedAtIndex
+#   (MEDIUM PRIORITY - analytics exports read only the rows in their date range)
+# - galerly-leads/sales.PhotographerIdIndex (already created with the tables; declared
+#   here so the exports' date-range queries are checked)
 #
-# Total indexes: 12 (was 6)
+# Total indexes: 19 (was 6)
 # Performance impact: 100x faster client gallery queries
 # Cost impact: Minimal (~$0.80/month for new indexes)
 #
@@ -10,6 +10,11 @@ import os
 from typing import List, Dict
 from botocore.exceptions import ClientError
 
+from utils.index_projections import (
+    ANALYTICS_EXPORT_PROJECTION, GALLERIES_EXPORT_PROJECTION, PHOTOS_EXPORT_PROJECTION,
+    PHOTOS_FILE_HASH_PROJECTION, PHOTOS_NAME_SIZE_PROJECTION
+)
+
 # LocalStack detection
 AWS_ENDPOINT_URL = os.environ.get('AWS_ENDPOINT_URL', None)
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
@@ -80,7 +85,8 @@ TABLES = {
             {'AttributeName': 'user_id', 'AttributeType': 'S'},
             {'AttributeName': 'id', 'AttributeType': 'S'},
             {'AttributeName': 'client_email', 'AttributeType': 'S'},
-            {'AttributeName': 'share_token', 'AttributeType': 'S'}
+            {'AttributeName': 'share_token', 'AttributeType': 'S'},
+            {'AttributeName': 'created_at', 'AttributeType': 'S'}
         ],
         'KeySchema': [
             {'AttributeName': 'user_id', 'KeyType': 'HASH'},
@@ -101,6 +107,15 @@ TABLES = {
                 'IndexName': 'GalleryIdIndex',
                 'KeySchema': [{'AttributeName': 'id', 'KeyType': 'HASH'}],
                 'Projection': {'ProjectionType': 'ALL'}
+            },
+            {
+                # Analytics exports: galleries created in a date range
+                'IndexName': 'UserCreatedAtIndex',
+                'KeySchema': [
+                    {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                    {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+                ],
+                'Projection': GALLERIES_EXPORT_PROJECTION
             }
         ]
     },
@@ -108,7 +123,10 @@ TABLES = {
         'AttributeDefinitions': [
             {'AttributeName': 'id', 'AttributeType': 'S'},
             {'AttributeName': 'gallery_id', 'AttributeType': 'S'},
-            {'AttributeName': 'user_id', 'AttributeType': 'S'}
+            {'AttributeName': 'user_id', 'AttributeType': 'S'},
+            {'AttributeName': 'file_hash', 'AttributeType': 'S'},
+            {'AttributeName': 'name_size', 'AttributeType': 'S'},
+            {'AttributeName': 'created_at', 'AttributeType': 'S'}
         ],
         'KeySchema': [
             {'AttributeName': 'id', 'KeyType': 'HASH'}
@@ -123,6 +141,32 @@ TABLES = {
                 'IndexName': 'UserIdIndex',
                 'KeySchema': [{'AttributeName': 'user_id', 'KeyType': 'HASH'}],
                 'Projection': {'ProjectionType': 'ALL'}
+            },
+            {
+                # Duplicate detection (utils/duplicate_detector.py)
+                'IndexName': 'UserFileHashIndex',
+                'KeySchema': [
+                    {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                    {'AttributeName': 'file_hash', 'KeyType': 'RANGE'}
+                ],
+                'Projection': PHOTOS_FILE_HASH_PROJECTION
+            },
+            {
+                'IndexName': 'GalleryNameSizeIndex',
+                'KeySchema': [
+                    {'AttributeName': 'gallery_id', 'KeyType': 'HASH'},
+                    {'AttributeName': 'name_size', 'KeyType': 'RANGE'}
+                ],
+                'Projection': PHOTOS_NAME_SIZE_PROJECTION
+            },
+            {
+                # Analytics exports: photos uploaded in a date range
+                'IndexName': 'UserCreatedAtIndex',
+                'KeySchema': [
+                    {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                    {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+                ],
+                'Projection': PHOTOS_EXPORT_PROJECTION
             }
         ]
     },
@@ -335,6 +379,15 @@ TABLES = {
                 'KeySchema': [{'AttributeName': 'user_id', 'KeyType': 'HASH'}],
                 'Projection': {'ProjectionType': 'ALL'}
             },
+            {
+                # Analytics exports: a photographer's events in a date range
+                'IndexName': 'UserTimestampIndex',
+                'KeySchema': [
+                    {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                    {'AttributeName': 'timestamp', 'KeyType': 'RANGE'}
+                ],
+                'Projection': ANALYTICS_EXPORT_PROJECTION
+            },
             {
                 'IndexName': 'EventTypeIndex',
                 'KeySchema': [
@@ -356,6 +409,43 @@ TABLES = {
         ],
         'GlobalSecondaryIndexes': []
     },
+    get_table_name('galerly-analytics-rollups'): {
+        # Per gallery-day and gallery-photo-day counters, maintained at ingest
+        # by utils/analytics_rollups.py (see backfill_analytics_rollups.py)
+        'AttributeDefinitions': [
+            {'AttributeName': 'gallery_id', 'AttributeType': 'S'},
+            {'AttributeName': 'rollup_key', 'AttributeType': 'S'}
+        ],
+        'KeySchema': [
+            {'AttributeName': 'gallery_id', 'KeyType': 'HASH'},
+            {'AttributeName': 'rollup_key', 'KeyType': 'RANGE'}
+        ],
+        'GlobalSecondaryIndexes': []
+    },
+    get_table_name('galerly-client-galleries'): {
+        # Reverse index client_email -> galleries shared with that client,
+        # maintained by utils/client_gallery_index.py
+        'AttributeDefinitions': [
+            {'AttributeName': 'client_email', 'AttributeType': 'S'},
+            {'AttributeName': 'gallery_id', 'AttributeType': 'S'}
+        ],
+        'KeySchema': [
+            {'AttributeName': 'client_email', 'KeyType': 'HASH'},
+            {'AttributeName': 'gallery_id', 'KeyType': 'RANGE'}
+        ],
+        'GlobalSecondaryIndexes': []
+    },
+    get_table_name('galerly-api-keys'): {
+        # SHA-256 of each user's API key -> owner, maintained by
+        # handle_generate_api_key (utils/auth.py resolves keys through it)
+        'AttributeDefinitions': [
+            {'AttributeName': 'key_hash', 'AttributeType': 'S'}
+        ],
+        'KeySchema': [
+            {'AttributeName': 'key_hash', 'KeyType': 'HASH'}
+        ],
+        'GlobalSecondaryIndexes': []
+    },
     get_table_name('galerly-client-feedback'): {
         'AttributeDefinitions': [
             {'AttributeName': 'id', 'AttributeType': 'S'},
@@ -141,6 +141,18 @@ if os.path.exists(env_file):
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 
+def _mock_batch_get_item(RequestItems, **kwargs):
+    """Emulate DynamoDB resource batch_get_item with per-key global_mock_table.get_item"""
+    responses = {}
+    for table_name, request in RequestItems.items():
+        items = []
+        for key in request.get('Keys', []):
+            item = global_mock_table.get_item(Key=key).get('Item')
+            if item:
+                items.append(item)
+        responses[table_name] = items
+    return {'Responses': responses, 'UnprocessedKeys': {}}
+
 @pytest.fixture(autouse=True)
 def reset_global_mocks():
     """
@@ -165,6 +177,22 @@ def reset_global_mocks():
     global_mock_table.scan.side_effect = None
     global_mock_table.query.side_effect = None
     
+    # BatchGetItem goes through the DynamoDB resource; serve it from the
+    # shared table mock so tests configuring get_item keep working
+    _mock_dynamodb.batch_get_item.reset_mock()
+    _mock_dynamodb.batch_get_item.side_effect = _mock_batch_get_item
+    
+    # Per-container lookup caches must not carry entries between tests
+    from utils.gallery_resolver import clear_gallery_cache
+    from utils.feature_resolver import clear_feature_cache
+    from utils.auth import clear_session_cache, clear_api_key_cache
+    from utils.rate_limiter import clear_rate_limit_prefilter
+    clear_gallery_cache()
+    clear_feature_cache()
+    clear_session_cache()
+    clear_api_key_cache()
+    clear_rate_limit_prefilter()
+    
     yield
 
 
@@ -0,0 +1,252 @@
+"""
+Tests for utils/analytics_archive.py and compact_analytics_archive.py
+"""
+import io
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from botocore.exceptions import ClientError
+
+pytest.importorskip('pyarrow')
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from utils import analytics_archive
+from utils.analytics_archive import (
+    ArchiveUnavailableError, archived_ids, from_record, get_watermark, iter_events,
+    read_archive, set_watermark, to_record, write_partition
+)
+
+
+class FakeS3:
+    """get_object/put_object over a dict (the watermark goes through boto3)"""
+    exceptions = SimpleNamespace(ClientError=ClientError)
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+
+@pytest.fixture(autouse=True)
+def local_archive(tmp_path):
+    """Archive on the local filesystem instead of S3"""
+    root = str(tmp_path / 'analytics-archive')
+    with patch.object(analytics_archive, '_filesystem', return_value=(pafs.LocalFileSystem(), root)), \
+         patch.object(analytics_archive, 's3_client', FakeS3()):
+        yield root
+
+
+def _event(i, user_id='photographer-1', day='2026-01-05', **fields):
+    return {
+        'id': f'evt-{user_id}-{day}-{i}',
+        'user_id': user_id,
+        'gallery_id': 'gal-1',
+        'event_type': 'photo_view' if i % 2 else 'gallery_view',
+        'timestamp': f'{day}T10:{i % 60:02d}:00Z',
+        'metadata': {'ip': f'10.0.0.{i % 7}', 'photo_id': f'photo-{i}'},
+        **fields
+    }
+
+
+class TestRecords:
+    """DynamoDB item <-> archive row"""
+
+    def test_round_trip_keeps_every_attribute(self):
+        item = _event(1, duration=Decimal('2.5'), source='batch', tags={'a', 'b'})
+
+        record = to_record('analytics', item)
+        restored = from_record('analytics', record)
+
+        assert record['duration'] == 2.5
+        assert restored['metadata'] == item['metadata']
+        assert restored['source'] == 'batch' and sorted(restored['tags']) == ['a', 'b']
+
+    def test_mistyped_value_kept_in_extra(self):
+        record = to_record('video_analytics', {'id': 'v1', 'completion_rate': 'n/a'})
+
+        assert record['completion_rate'] is None
+        assert from_record('video_analytics', record)['completion_rate'] == 'n/a'
+
+    def test_unknown_archive(self):
+        with pytest.raises(ValueError):
+            to_record('sales', {'id': '1'})
+
+
+class TestPartitions:
+    """Writing and reading day partitions"""
+
+    def test_partition_layout_and_sort_order(self, local_archive):
+        items = [_event(i, user_id=f'photographer-{i % 3}') for i in range(30)]
+
+        path = write_partition('analytics', '2026-01-05', items, run_id='run1')
+
+        assert path == f'{local_archive}/analytics/date=2026-01-05/part-run1.parquet'
+        owners = pq.read_table(path, columns=['user_id']).column('user_id').to_pylist()
+        assert owners == sorted(owners)
+
+    def test_day_range_prunes_partitions(self):
+        for day in ('2026-01-01', '2026-01-02', '2026-01-03'):
+            write_partition('analytics', day, [_event(i, day=day) for i in range(5)])
+
+        table = read_archive('analytics', '2026-01-02', '2026-01-03', columns=['timestamp'])
+
+        assert table.num_rows == 10
+        assert {ts[:10] for ts in table.column('timestamp').to_pylist()} == {'2026-01-02', '2026-01-03'}
+
+    def test_column_pruning_and_owner_filter(self):
+        items = [_event(i, user_id=user) for user in ('a', 'b', 'c') for i in range(10)]
+        write_partition('analytics', '2026-01-05', items)
+
+        table = read_archive('analytics', '2026-01-05', '2026-01-05',
+                             columns=['event_type'], filters={'user_id': 'b'})
+
+        assert table.column_names == ['event_type'] and table.num_rows == 10
+
+    def test_owner_filter_skips_row_groups(self, local_archive):
+        items = [_event(i, user_id=user) for user in ('a', 'b', 'c', 'd') for i in range(100)]
+        with patch.object(analytics_archive, 'ROW_GROUP_SIZE', 100):
+            path = write_partition('analytics', '2026-01-05', items)
+
+        metadata = pq.ParquetFile(path).metadata
+        column = metadata.schema.names.index('user_id')
+        ranges = [(metadata.row_group(i).column(column).statistics.min,
+                   metadata.row_group(i).column(column).statistics.max)
+                  for i in range(metadata.num_row_groups)]
+        assert ranges == [('a', 'a'), ('b', 'b'), ('c', 'c'), ('d', 'd')]
+
+    def test_missing_archive_reads_empty(self):
+        table = read_archive('video_analytics', '2026-01-01', '2026-12-31', columns=['id'])
+
+        assert table.num_rows == 0 and table.column_names == ['id']
+
+    def test_archived_ids(self):
+        write_partition('analytics', '2026-01-05', [_event(i) for i in range(3)])
+
+        assert archived_ids('analytics', '2026-01-05') == {_event(i)['id'] for i in range(3)}
+        assert archived_ids('analytics', '2026-01-06') == set()
+
+
+class TestIterEvents:
+    """Archive + DynamoDB reads split at the watermark"""
+
+    def test_no_watermark_reads_dynamodb_only(self):
+        query_hot = MagicMock(return_value=iter([{'id': 'hot'}]))
+
+        events = list(iter_events('analytics', '2026-01-01', '2026-01-31', query_hot))
+
+        assert events == [{'id': 'hot'}]
+        query_hot.assert_called_once_with('2026-01-01', '2026-01-31')
+
+    def test_split_at_watermark(self):
+        write_partition('analytics', '2026-01-05', [_event(i) for i in range(4)])
+        write_partition('analytics', '2026-01-05', [_event(9, user_id='other')])
+        set_watermark('analytics', '2026-01-10')
+        query_hot = MagicMock(return_value=iter([{'id': 'hot'}]))
+
+        events = list(iter_events('analytics', '2026-01-01', '2026-01-31', query_hot,
+                                  filters={'user_id': 'photographer-1'}))
+
+        assert get_watermark('analytics') == '2026-01-10'
+        assert len(events) == 5 and events[-1] == {'id': 'hot'}
+        assert events[0]['metadata']['ip'].startswith('10.0.0.')
+        query_hot.assert_called_once_with('2026-01-10', '2026-01-31')
+
+    def test_range_entirely_archived(self):
+        set_watermark('analytics', '2026-02-01')
+        query_hot = MagicMock()
+
+        assert list(iter_events('analytics', '2026-01-01', '2026-01-31', query_hot)) == []
+        query_hot.assert_not_called()
+
+    def test_archived_days_without_pyarrow_raise(self):
+        set_watermark('analytics', '2026-01-10')
+        query_hot = MagicMock(return_value=iter([{'id': 'hot'}]))
+
+        with patch.object(analytics_archive, 'ARCHIVE_AVAILABLE', False):
+            with pytest.raises(ArchiveUnavailableError):
+                iter_events('analytics', '2026-01-01', '2026-01-31', query_hot)
+            recent = list(iter_events('analytics', '2026-01-10', '2026-01-31', query_hot))
+
+        assert recent == [{'id': 'hot'}]
+        query_hot.assert_called_once_with('2026-01-10', '2026-01-31')
+
+
+class TestCompaction:
+    """compact_analytics_archive.compact"""
+
+    def _table(self, items):
+        table = MagicMock()
+        table.scan.return_value = {'Items': items}
+        table.deleted = []
+        writer = table.batch_writer.return_value.__enter__.return_value
+        writer.delete_item.side_effect = lambda Key: table.deleted.append(Key['id'])
+        return table
+
+    def test_archives_then_deletes(self):
+        from compact_analytics_archive import compact
+        items = [_event(i, day=day) for day in ('2026-01-01', '2026-01-02') for i in range(5)]
+        table = self._table(items)
+
+        with patch('compact_analytics_archive.archive_table', return_value=table):
+            stats = compact('analytics', '2026-01-10')
+
+        assert stats == {'days': 2, 'events': 10, 'archived': 10, 'deleted': 10}
+        assert sorted(table.deleted) == sorted(item['id'] for item in items)
+        assert get_watermark('analytics') == '2026-01-10'
+        assert read_archive('analytics', '2026-01-01', '2026-01-31', columns=['id']).num_rows == 10
+
+    def test_rerun_after_failed_delete_does_not_duplicate(self):
+        from compact_analytics_archive import compact
+        items = [_event(i) for i in range(5)]
+        write_partition('analytics', '2026-01-05', items[:3])
+        table = self._table(items)
+
+        with patch('compact_analytics_archive.archive_table', return_value=table):
+            stats = compact('analytics', '2026-01-10')
+
+        assert stats['archived'] == 2 and stats['deleted'] == 5
+        assert read_archive('analytics', '2026-01-05', '2026-01-05', columns=['id']).num_rows == 5
+
+    def test_dry_run_writes_nothing(self):
+        from compact_analytics_archive import compact
+        table = self._table([_event(i) for i in range(5)])
+
+        with patch('compact_analytics_archive.archive_table', return_value=table):
+            stats = compact('analytics', '2026-01-10', dry_run=True)
+
+        assert stats['events'] == 5 and table.deleted == []
+        assert get_watermark('analytics') is None
+
+    def test_watermark_never_moves_back(self):
+        from compact_analytics_archive import compact
+        set_watermark('analytics', '2026-03-01')
+
+        with patch('compact_analytics_archive.archive_table', return_value=self._table([])):
+            compact('analytics', '2026-01-10')
+
+        assert get_watermark('analytics') == '2026-03-01'
+
+    def test_refuses_without_api_layer(self):
+        import compact_analytics_archive
+        arn = 'arn:aws:lambda:us-east-1:123456789012:layer:{}:3'
+
+        with patch('sys.argv', ['compact_analytics_archive.py']), \
+             patch.object(compact_analytics_archive, 'lambda_client') as lambda_client, \
+             patch.object(compact_analytics_archive, 'compact', return_value={
+                 'days': 0, 'events': 0, 'archived': 0, 'deleted': 0}) as compact:
+            lambda_client.get_function_configuration.return_value = {'Layers': [{'Arn': arn.format('galerly-images')}]}
+            refused = compact_analytics_archive.main()
+            lambda_client.get_function_configuration.return_value = {'Layers': [{'Arn': arn.format('galerly-pyarrow')}]}
+            allowed = compact_analytics_archive.main()
+
+        assert (refused, allowed) == (1, 0)
+        assert compact.call_count == len(analytics_archive.ARCHIVES)
@@ -0,0 +1,86 @@
+"""
+Tests for handlers/analytics_batch_handler.py (POST /v1/analytics/batch)
+"""
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+from utils.event_buffer import flush_event_buffer
+
+
+def _table():
+    """Table mock whose batch_writer records every item put through it"""
+    table = MagicMock()
+    table.written = []
+    writer = table.batch_writer.return_value.__enter__.return_value
+    writer.put_item.side_effect = lambda Item: table.written.append(Item)
+    return table
+
+
+@pytest.fixture(autouse=True)
+def no_buffer_left_open():
+    yield
+    flush_event_buffer()
+
+
+class TestTrackBatchEndpoint:
+    """POST /v1/analytics/batch"""
+
+    def _event(self, body):
+        return {
+            'httpMethod': 'POST',
+            'path': '/v1/analytics/batch',
+            'body': json.dumps(body),
+            'headers': {},
+            'requestContext': {'identity': {'sourceIp': '1.2.3.4'}}
+        }
+
+    def test_events_batch_written_at_end_of_invocation(self):
+        import api
+
+        engagement = _table()
+        analytics = _table()
+        rollups = MagicMock()
+        events = [{'kind': 'photo_engagement', 'gallery_id': 'g1', 'photo_id': f'p{i}', 'event_type': 'view',
+                   'duration': 2} for i in range(30)]
+        events += [{'kind': 'gallery_view', 'gallery_id': 'g1', 'metadata': {'ip': '5.5.5.5'}},
+                   {'kind': 'photo_view', 'gallery_id': 'g1', 'photo_id': 'p1'}]
+
+        with patch('api.get_user_from_token', return_value=None), \
+             patch('handlers.engagement_analytics_handler.analytics_table', engagement), \
+             patch('handlers.analytics_handler.analytics_table', analytics), \
+             patch('handlers.analytics_handler.galleries_table'), \
+             patch('handlers.analytics_handler.resolve_gallery', return_value={'id': 'g1', 'user_id': 'owner'}), \
+             patch('handlers.analytics_handler.record_events', rollups):
+            result = api.handler(self._event({'events': events}), None)
+
+        body = json.loads(result['body'])
+        assert result['statusCode'] == 200
+        assert (body['accepted'], body['rejected']) == (32, 0)
+        assert len(engagement.written) == 30
+        engagement.put_item.assert_not_called()
+        assert [e['event_type'] for e in analytics.written] == ['gallery_view', 'photo_view']
+        # Rollups are updated once for the whole batch
+        rollups.assert_called_once()
+        assert len(rollups.call_args.args[0]) == 2
+
+    def test_invalid_events_reported_per_index(self):
+        from handlers.analytics_batch_handler import handle_track_batch
+
+        with patch('handlers.engagement_analytics_handler.analytics_table', _table()):
+            result = handle_track_batch({'events': [
+                {'kind': 'photo_engagement', 'gallery_id': 'g1', 'photo_id': 'p1', 'event_type': 'view'},
+                {'kind': 'photo_engagement', 'gallery_id': 'g1'},
+                {'kind': 'nope'}
+            ]})
+
+        body = json.loads(result['body'])
+        assert body['accepted'] == 1
+        assert [(e['index'], e['status']) for e in body['errors']] == [(1, 400), (2, 400)]
+
+    def test_batch_size_limited(self):
+        from handlers.analytics_batch_handler import handle_track_batch, MAX_BATCH_EVENTS
+
+        assert handle_track_batch({'events': []})['statusCode'] == 400
+        result = handle_track_batch({'events': [{'kind': 'visit'}] * (MAX_BATCH_EVENTS + 1)})
+        assert result['statusCode'] == 400
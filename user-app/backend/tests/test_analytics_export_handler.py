@@ -1,22 +1,82 @@
 """
 Tests for Analytics Export Handler
 """
+import io
+import json
 import pytest
 from unittest.mock import patch, MagicMock
+from handlers import analytics_export_handler
 from handlers.analytics_export_handler import (
     handle_export_analytics_csv,
+    handle_export_analytics_excel,
     handle_export_analytics_pdf,
-    generate_summary_csv
+    generate_summary_csv,
+    generate_clients_csv,
+    generate_galleries_csv,
+    generate_revenue_csv
 )
 
 
+PHOTOGRAPHER = {
+    'id': 'photo1',
+    'email': 'photographer@test.com',
+    'role': 'photographer',
+    'plan': 'pro'
+}
+
+
+class FakeUpload:
+    """S3MultipartWriter stand-in keeping the uploaded bytes"""
+    uploads = []
+
+    def __init__(self, bucket, key, part_size=None, **create_kwargs):
+        self.key = key
+        self.data = bytearray()
+        self.writes = 0
+        self.completed = self.aborted = False
+        FakeUpload.uploads.append(self)
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return len(self.data)
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        self.data += data
+        self.writes += 1
+        return len(data)
+
+    def close(self):
+        self.completed = True
+
+    def abort(self):
+        self.aborted = True
+
+
+@pytest.fixture
+def fake_upload():
+    FakeUpload.uploads = []
+    with patch.object(analytics_export_handler, 'S3MultipartWriter', FakeUpload), \
+         patch.object(analytics_export_handler, 's3') as mock_s3, \
+         patch('handlers.subscription_handler.get_user_features',
+               return_value=({'analytics_export': True}, 'pro', 'Pro')):
+        mock_s3.generate_presigned_url.return_value = 'https://s3.example.com/export'
+        yield FakeUpload
+
+
 class TestAnalyticsExportHandler:
     """Test analytics export functionality"""
     
     @patch('handlers.analytics_export_handler.generate_summary_csv')
-    @patch('handlers.analytics_export_handler.dynamodb')
     @patch('handlers.subscription_handler.get_user_features')
-    def test_export_csv(self, mock_get_features, mock_dynamodb, mock_generate):
+    def test_export_csv(self, mock_get_features, mock_generate):
         """Test CSV export"""
         # Mock user with required fields for decorator
         user = {
@@ -33,11 +93,6 @@ class TestAnalyticsExportHandler:
             'Pro'  # plan_name
         )
         
-        # Mock DynamoDB response
-        mock_table = MagicMock()
-        mock_dynamodb.Table.return_value = mock_table
-        mock_table.query.return_value = {'Items': []}
-        
         mock_generate.return_value = [
             {'Date': '2025-01-01', 'Views': 100, 'Downloads': 50}
         ]
@@ -48,15 +103,20 @@ class TestAnalyticsExportHandler:
             'end_date': '2025-01-31'
         }
         
-        response = handle_export_analytics_csv(user, query_params)
+        with patch.object(analytics_export_handler, 'S3MultipartWriter', FakeUpload), \
+             patch.object(analytics_export_handler, 's3') as mock_s3:
+            mock_s3.generate_presigned_url.return_value = 'https://s3.example.com/export.csv'
+            response = handle_export_analytics_csv(user, query_params)
         
         assert response['statusCode'] == 200
-        assert response['headers']['Content-Type'] == 'text/csv'
+        body = json.loads(response['body'])
+        assert body['download_url'] == 'https://s3.example.com/export.csv'
+        assert body['rows'] == 1
     
-    @patch('handlers.analytics_export_handler.dynamodb')
+    @patch('handlers.analytics_export_handler.analytics_table')
     @patch('handlers.analytics_export_handler.s3_client')
     @patch('handlers.subscription_handler.get_user_features')
-    def test_export_pdf(self, mock_get_features, mock_s3, mock_dynamodb):
+    def test_export_pdf(self, mock_get_features, mock_s3, mock_table):
         """Test PDF export"""
         # Mock user with required fields for decorator
         user = {
@@ -74,8 +134,6 @@ class TestAnalyticsExportHandler:
         )
         
         # Mock DynamoDB response
-        mock_table = MagicMock()
-        mock_dynamodb.Table.return_value = mock_table
         mock_table.query.return_value = {'Items': []}
         
         # Mock S3 upload
@@ -90,3 +148,156 @@ class TestAnalyticsExportHandler:
         response = handle_export_analytics_pdf(user, body)
         
         assert response['statusCode'] == 200
+
+
+class TestSummaryCsv:
+    """Summary rows from archived and recent events"""
+
+    @patch('handlers.analytics_export_handler.iter_events')
+    def test_daily_counts(self, mock_iter_events):
+        mock_iter_events.return_value = iter([
+            {'event_type': 'gallery_view', 'timestamp': '2025-01-02T10:00:00Z'},
+            {'event_type': 'photo_view', 'timestamp': '2025-01-02T10:01:00Z'},
+            {'event_type': 'photo_share', 'timestamp': '2025-01-01T09:00:00Z'},
+            {'event_type': 'gallery_share', 'timestamp': '2025-01-01T09:30:00Z'},
+            {'event_type': 'unknown', 'timestamp': '2025-01-01T09:30:00Z'},
+        ])
+
+        rows = list(generate_summary_csv('photo1', '2025-01-01', '2025-01-31'))
+
+        assert [row['Date'] for row in rows] == ['2025-01-01', '2025-01-02']
+        assert rows[0]['Shares'] == 2 and rows[1]['Gallery Views'] == 1 and rows[1]['Photo Views'] == 1
+        args, kwargs = mock_iter_events.call_args
+        assert args[:3] == ('analytics', '2025-01-01', '2025-01-31')
+        assert kwargs['filters'] == {'user_id': 'photo1'}
+        assert kwargs['columns'] == ['event_type', 'timestamp']
+
+
+class TestStreamingExports:
+    """CSV/Excel exports streamed into an S3 upload"""
+
+    @staticmethod
+    def _galleries(count):
+        return ({'id': f'gal-{i}', 'name': f'Gallery {i}', 'views': i, 'created_at': '2025-01-10T00:00:00Z'}
+                for i in range(count))
+
+    def test_csv_written_in_chunks(self, fake_upload):
+        with patch.object(analytics_export_handler, '_query_pages', return_value=self._galleries(5000)), \
+             patch.object(analytics_export_handler, 'CSV_CHUNK_SIZE', 4096):
+            response = handle_export_analytics_csv(PHOTOGRAPHER, {
+                'type': 'galleries', 'start_date': '2025-01-01', 'end_date': '2025-01-31'
+            })
+
+        body = json.loads(response['body'])
+        upload = fake_upload.uploads[0]
+        lines = upload.data.decode('utf-8').splitlines()
+        assert body['rows'] == 5000 and body['filename'] == 'analytics_galleries_2025-01-01_to_2025-01-31.csv'
+        assert lines[0].startswith('Gallery ID,Name') and len(lines) == 5001
+        assert upload.completed and upload.writes > 10
+        assert upload.key.startswith('exports/photo1/')
+
+    def test_csv_empty_export_has_header(self, fake_upload):
+        with patch.object(analytics_export_handler, '_query_pages', return_value=iter([])):
+            response = handle_export_analytics_csv(PHOTOGRAPHER, {'type': 'revenue'})
+
+        assert json.loads(response['body'])['rows'] == 0
+        assert fake_upload.uploads[0].data.decode('utf-8').startswith('Transaction ID,Client')
+
+    def test_failed_export_aborts_upload(self, fake_upload):
+        def broken_pages(*args, **kwargs):
+            yield from self._galleries(3)
+            raise Exception('throttled')
+
+        with patch.object(analytics_export_handler, '_query_pages', side_effect=broken_pages):
+            response = handle_export_analytics_csv(PHOTOGRAPHER, {'type': 'galleries', 'start_date': '2025-01-01'})
+
+        assert response['statusCode'] == 500
+        assert fake_upload.uploads[0].aborted and not fake_upload.uploads[0].completed
+
+    def test_archive_unavailable_is_an_error(self, fake_upload):
+        unavailable = analytics_export_handler.ArchiveUnavailableError('Events before 2025-01-10 are archived')
+
+        with patch.object(analytics_export_handler, 'iter_events', side_effect=unavailable):
+            response = handle_export_analytics_csv(PHOTOGRAPHER, {'type': 'summary', 'start_date': '2025-01-01'})
+
+        assert response['statusCode'] == 503
+        assert 'archive' in json.loads(response['body'])['error']
+        assert fake_upload.uploads[0].aborted and not fake_upload.uploads[0].completed
+
+    def test_invalid_type(self, fake_upload):
+        response = handle_export_analytics_csv(PHOTOGRAPHER, {'type': 'everything'})
+
+        assert response['statusCode'] == 400 and fake_upload.uploads == []
+
+    def test_excel_write_only_workbook(self, fake_upload):
+        openpyxl = pytest.importorskip('openpyxl')
+        summary = [{'Date': '2025-01-0%d' % d, 'Gallery Views': d, 'Photo Views': 2 * d} for d in (1, 2, 3)]
+        photos = ({'id': f'p{i}', 'views': i, 'created_at': '2025-01-10'} for i in range(200))
+
+        def pages(table, **kwargs):
+            return photos if table is analytics_export_handler.photos_table else self._galleries(20)
+
+        with patch.object(analytics_export_handler, 'generate_summary_csv', return_value=iter(summary)), \
+             patch.object(analytics_export_handler, '_query_pages', side_effect=pages):
+            response = handle_export_analytics_excel(PHOTOGRAPHER, {
+                'type': 'summary', 'start_date': '2025-01-01', 'end_date': '2025-01-31'
+            })
+
+        assert response['statusCode'] == 200
+        assert json.loads(response['body'])['download_url'] == 'https://s3.example.com/export'
+        wb = openpyxl.load_workbook(io.BytesIO(bytes(fake_upload.uploads[0].data)))
+        assert wb.sheetnames == ['Summary', 'Gallery Performance', 'Top Photos']
+        totals = [cell.value for cell in list(wb['Summary'].rows)[-1]]
+        assert totals[:3] == ['Total', 6, 12]
+        assert wb['Gallery Performance'].max_row == 21
+        top_photos = list(wb['Top Photos'].rows)
+        assert len(top_photos) == 51 and top_photos[1][0].value == 'p199'
+
+
+class TestExportSources:
+    """Export rows read from the configured tables through date-range indexes"""
+
+    @staticmethod
+    def _paged_table(*pages):
+        table = MagicMock()
+        responses = [{'Items': items, 'LastEvaluatedKey': {'id': f'page-{i}'}} for i, items in enumerate(pages[:-1])]
+        table.query.side_effect = responses + [{'Items': pages[-1]}]
+        return table
+
+    def test_revenue_paginates_index_range(self):
+        table = self._paged_table(
+            [{'id': 's1', 'customer_email': 'a@test.com', 'amount': 25, 'items': [{'name': 'Print'}],
+              'created_at': '2025-01-02T10:00:00Z'}],
+            [{'id': 's2', 'customer_email': 'b@test.com', 'amount': 9.5, 'created_at': '2025-01-30T10:00:00Z'}]
+        )
+
+        with patch.object(analytics_export_handler, 'sales_table', table):
+            rows = list(generate_revenue_csv('photo1', '2025-01-01', '2025-01-31'))
+
+        assert [row['Client'] for row in rows] == ['a@test.com', 'b@test.com']
+        assert rows[0]['Amount'] == '$25.00' and rows[0]['Item'] == 'Print'
+        first, second = table.query.call_args_list
+        assert first.kwargs['IndexName'] == 'PhotographerIdIndex' and 'FilterExpression' not in first.kwargs
+        assert second.kwargs['ExclusiveStartKey'] == {'id': 'page-0'}
+
+    def test_clients_key_condition_covers_end_day(self):
+        table = self._paged_table([{'name': 'Ann', 'created_at': '2025-01-31T23:00:00Z'}])
+
+        with patch.object(analytics_export_handler, 'leads_table', table):
+            rows = list(generate_clients_csv('photo1', '2025-01-01', '2025-01-31'))
+
+        assert rows[0]['Name'] == 'Ann'
+        condition = table.query.call_args.kwargs['KeyConditionExpression']
+        _, date_range = condition.get_expression()['values']
+        assert date_range.get_expression()['values'][1:] == ('2025-01-01', '2025-01-31~')
+
+    def test_galleries_fields(self):
+        table = self._paged_table([{'id': 'g1', 'name': 'Wedding', 'client_emails': ['c@test.com'],
+                                    'view_count': 7, 'download_count': 2, 'privacy': 'public',
+                                    'created_at': '2025-01-05T00:00:00Z'}])
+
+        with patch.object(analytics_export_handler, 'galleries_table', table):
+            row, = generate_galleries_csv('photo1', '2025-01-01', '2025-01-31')
+
+        assert table.query.call_args.kwargs['IndexName'] == 'UserCreatedAtIndex'
+        assert (row['Client'], row['Views'], row['Downloads'], row['Status']) == ('c@test.com', 7, 2, 'Public')
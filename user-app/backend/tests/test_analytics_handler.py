@@ -9,8 +9,11 @@ import json
 @pytest.fixture
 def mock_analytics_dependencies():
     """Mock analytics dependencies."""
+    from utils.gallery_resolver import clear_gallery_cache
+    clear_gallery_cache()
     with patch('handlers.analytics_handler.analytics_table') as mock_analytics, \
-         patch('handlers.analytics_handler.galleries_table') as mock_galleries:
+         patch('handlers.analytics_handler.galleries_table') as mock_galleries, \
+         patch('utils.gallery_resolver.galleries_table', mock_galleries):
         yield {
             'analytics': mock_analytics,
             'galleries': mock_galleries
@@ -36,8 +39,8 @@ class TestTrackGalleryView:
         """Don't track view when owner views their own gallery."""
         from handlers.analytics_handler import handle_track_gallery_view
         
-        # Handler uses scan to find gallery owner
-        mock_analytics_dependencies['galleries'].scan.return_value = {
+        # Handler resolves gallery owner via GalleryIdIndex
+        mock_analytics_dependencies['galleries'].query.return_value = {
             'Items': [sample_gallery]
         }
         
@@ -0,0 +1,247 @@
+"""
+Tests for utils/analytics_rollups.py and the analytics handlers that read it
+"""
+import json
+import pytest
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from utils import analytics_rollups
+from utils.hyperloglog import HyperLogLog
+
+
+class ConditionFailed(Exception):
+    response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+
+
+class FakeRollupTable:
+    """Rollup table applying the SET/ADD update expressions record_event writes"""
+
+    def __init__(self):
+        self.rows = {}
+        self.get_calls = 0
+
+    def get_item(self, Key, **kwargs):
+        self.get_calls += 1
+        row = self.rows.get((Key['gallery_id'], Key['rollup_key']))
+        return {'Item': dict(row)} if row else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues,
+                    ConditionExpression=None):
+        existing = self.rows.get((Key['gallery_id'], Key['rollup_key']), {})
+        if ConditionExpression == 'attribute_not_exists(#version)':
+            if 'hll_version' in existing:
+                raise ConditionFailed()
+        elif ConditionExpression == '#version = :version':
+            if existing.get('hll_version') != ExpressionAttributeValues[':version']:
+                raise ConditionFailed()
+        row = self.rows.setdefault((Key['gallery_id'], Key['rollup_key']), dict(Key))
+        set_part, _, add_part = UpdateExpression.partition('ADD ')
+        for clause in filter(None, (c.strip() for c in set_part[len('SET '):].split(','))):
+            name, value = (part.strip() for part in clause.split('='))
+            row[ExpressionAttributeNames[name]] = ExpressionAttributeValues[value]
+        for clause in filter(None, (c.strip() for c in add_part.split(','))):
+            name, value = clause.split()
+            field, amount = ExpressionAttributeNames[name], ExpressionAttributeValues[value]
+            if isinstance(amount, set):
+                row[field] = row.get(field, set()) | amount
+            else:
+                row[field] = row.get(field, 0) + amount
+
+    def query(self, KeyConditionExpression, **kwargs):
+        hash_cond, range_cond = (c.get_expression() for c in KeyConditionExpression.get_expression()['values'])
+        gallery_id = hash_cond['values'][1]
+        low, high = range_cond['values'][1:]
+        items = [dict(row) for (gid, key), row in sorted(self.rows.items()) if gid == gallery_id and low <= key <= high]
+        return {'Items': items}
+
+
+def _event(event_type, timestamp, gallery_id='g1', **metadata):
+    return {'user_id': 'user_123', 'gallery_id': gallery_id, 'event_type': event_type,
+            'timestamp': timestamp, 'metadata': metadata}
+
+
+EVENTS = [
+    _event('gallery_view', '2026-03-01T10:00:00Z', ip='1.1.1.1'),
+    _event('gallery_view', '2026-03-01T11:00:00Z', ip='1.1.1.1'),
+    _event('gallery_view', '2026-03-02T09:00:00Z', ip='2.2.2.2'),
+    _event('photo_view', '2026-03-01T10:01:00Z', photo_id='p1', duration=4.5),
+    _event('photo_view', '2026-03-02T10:01:00Z', photo_id='p1', duration=1.5),
+    _event('photo_view', '2026-03-02T10:02:00Z', photo_id='p2'),
+    _event('photo_download', '2026-03-03T08:00:00Z', photo_id='p2'),
+    _event('bulk_download', '2026-03-03T08:30:00Z'),
+    _event('gallery_view', '2026-03-01T10:00:00Z', gallery_id='g2', ip='3.3.3.3'),
+]
+
+
+@pytest.fixture
+def rollup_table():
+    table = FakeRollupTable()
+    analytics_rollups._sketch_cache.clear()
+    with patch.object(analytics_rollups, 'analytics_rollups_table', table):
+        yield table
+    analytics_rollups._sketch_cache.clear()
+
+
+class TestRecordEvent:
+    """Ingest-time counters"""
+
+    def test_day_and_photo_rows(self, rollup_table):
+        for event in EVENTS:
+            analytics_rollups.record_event(event)
+
+        day = rollup_table.rows[('g1', 'day#2026-03-01')]
+        assert day['gallery_view'] == 2 and day['photo_view'] == 1
+        assert day['user_id'] == 'user_123' and 'visitors' not in day
+        sketch = rollup_table.rows[('g1', 'hll#2026-03-01')]
+        assert HyperLogLog.from_bytes(sketch['hll']).count() == 1
+        assert sketch['hll_version'] == 1  # The repeat visitor didn't write
+        photo = rollup_table.rows[('g1', 'photo#2026-03-02#p1')]
+        assert photo['photo_view'] == 1 and photo['duration_total'] == Decimal('1.5')
+        assert ('g1', 'photo#2026-03-03#None') not in rollup_table.rows
+
+    def test_backfill_rows_match_ingest(self, rollup_table):
+        for event in EVENTS:
+            analytics_rollups.record_event(event)
+
+        rebuilt = analytics_rollups.build_rollups(EVENTS)
+
+        assert rebuilt == rollup_table.rows
+
+
+class TestRecordEvents:
+    """Coalesced rollup updates for a flushed batch"""
+
+    def test_one_update_per_touched_row(self, rollup_table):
+        views = [_event('photo_view', '2026-03-01T10:00:00Z', photo_id='p1') for _ in range(40)]
+        visits = [_event('gallery_view', '2026-03-01T10:00:00Z', ip=f'10.0.0.{i}') for i in range(10)]
+        with patch.object(rollup_table, 'update_item', wraps=rollup_table.update_item) as update:
+            analytics_rollups.record_events(views + visits)
+
+        # day row + photo row + one sketch write for all ten visitors
+        assert update.call_count == 3
+        assert rollup_table.rows[('g1', 'day#2026-03-01')]['photo_view'] == 40
+        assert HyperLogLog.from_bytes(rollup_table.rows[('g1', 'hll#2026-03-01')]['hll']).count() == 10
+
+
+class TestVisitorSketch:
+    """Per gallery-day HyperLogLog updates"""
+
+    def test_repeat_visitor_answered_from_cache(self, rollup_table):
+        first = _event('gallery_view', '2026-03-01T10:00:00Z', ip='1.1.1.1')
+        analytics_rollups.record_event(first)
+        gets = rollup_table.get_calls
+
+        for _ in range(5):
+            analytics_rollups.record_event(first)
+
+        assert rollup_table.get_calls == gets
+        assert rollup_table.rows[('g1', 'hll#2026-03-01')]['hll_version'] == 1
+        assert rollup_table.rows[('g1', 'day#2026-03-01')]['gallery_view'] == 6
+
+    def test_concurrent_writer_is_merged_not_overwritten(self, rollup_table):
+        analytics_rollups.record_event(_event('gallery_view', '2026-03-01T10:00:00Z', ip='1.1.1.1'))
+        # Another container adds a visitor behind this container's cache
+        other = HyperLogLog()
+        other.add(analytics_rollups.visitor_id('1.1.1.1'))
+        other.add(analytics_rollups.visitor_id('9.9.9.9'))
+        rollup_table.rows[('g1', 'hll#2026-03-01')].update({'hll': other.to_bytes(), 'hll_version': 2})
+
+        analytics_rollups.record_event(_event('gallery_view', '2026-03-01T11:00:00Z', ip='2.2.2.2'))
+
+        row = rollup_table.rows[('g1', 'hll#2026-03-01')]
+        assert row['hll_version'] == 3
+        assert HyperLogLog.from_bytes(row['hll']).count() == 3
+
+
+class TestLoadGalleryRollups:
+    """Date-range reads"""
+
+    def test_range_totals(self, rollup_table):
+        for event in EVENTS:
+            analytics_rollups.record_event(event)
+
+        rollups = analytics_rollups.load_gallery_rollups('g1', '2026-03-02', '2026-03-03')
+
+        assert rollups['days'] == {
+            '2026-03-02': {'gallery_view': 1, 'photo_view': 2},
+            '2026-03-03': {'photo_download': 1, 'bulk_download': 1}
+        }
+        assert rollups['photos'] == {
+            'p1': {'photo_view': 1, 'duration_total': 1.5, 'duration_count': 1},
+            'p2': {'photo_view': 1, 'photo_download': 1}
+        }
+        assert rollups['visitors'].count() == 1
+
+
+class TestAnalyticsHandlersReadRollups:
+    """Dashboards never touch raw events"""
+
+    @pytest.fixture
+    def handler_tables(self, rollup_table, sample_gallery):
+        for event in EVENTS:
+            analytics_rollups.record_event(event)
+        galleries = MagicMock()
+        galleries.get_item.return_value = {'Item': sample_gallery}
+        galleries.query.return_value = {'Items': [
+            {'id': 'g1', 'user_id': 'user_123', 'name': 'One'},
+            {'id': 'g2', 'user_id': 'user_123', 'name': 'Two'}
+        ]}
+        scope = MagicMock()
+        scope.batch_get_items.side_effect = lambda table, keys: [{'filename': k['id'] + '.jpg'} for k in keys]
+        with patch('handlers.analytics_handler.analytics_table') as raw_events, \
+             patch('handlers.analytics_handler.galleries_table', galleries), \
+             patch('handlers.analytics_handler.current_scope', return_value=scope), \
+             patch('handlers.analytics_handler.get_user_features',
+                   return_value=({'analytics_level': 'pro'}, 'pro', {})):
+            yield raw_events
+
+    def test_gallery_analytics(self, sample_user, handler_tables):
+        from handlers.analytics_handler import handle_get_gallery_analytics
+
+        result = handle_get_gallery_analytics(sample_user, 'g1', {
+            'start_date': '2026-03-01T00:00:00Z', 'end_date': '2026-03-03T23:00:00Z'
+        })
+
+        body = json.loads(result['body'])
+        assert body['metrics'] == {'total_views': 3, 'unique_visitors': 2, 'photo_views': 3,
+                                   'downloads': 1, 'bulk_downloads': 1}
+        assert [d['views'] for d in body['daily_stats']] == [2, 1, 0]
+        assert [(p['id'], p['views'], p['avg_time_seconds']) for p in body['top_photos']] == [('p1', 2, 3.0),
+                                                                                             ('p2', 1, 0)]
+        handler_tables.query.assert_not_called()
+
+    def test_overall_analytics(self, sample_user, handler_tables):
+        from handlers.analytics_handler import handle_get_overall_analytics
+
+        result = handle_get_overall_analytics(sample_user, {
+            'start_date': '2026-03-01T00:00:00Z', 'end_date': '2026-03-03T23:00:00Z'
+        })
+
+        body = json.loads(result['body'])
+        assert (body['total_views'], body['total_downloads'], body['total_bulk_downloads']) == (4, 1, 1)
+        assert [(g['gallery_id'], g['views'], g['downloads']) for g in body['gallery_stats']] == [('g1', 3, 2),
+                                                                                                 ('g2', 1, 0)]
+        assert body['daily_stats'][0] == {'date': '2026-03-01', 'views': 3, 'downloads': 0}
+        assert body['unique_visitors'] == 3  # Sketch union across galleries
+        handler_tables.query.assert_not_called()
+
+
+class TestBackfill:
+    """backfill_analytics_rollups"""
+
+    def test_days_before_cutoff_rebuilt(self):
+        import backfill_analytics_rollups as backfill
+
+        raw = MagicMock()
+        raw.scan.return_value = {'Items': EVENTS}
+        rollups = MagicMock()
+        writer = rollups.batch_writer.return_value.__enter__.return_value
+        with patch.object(backfill, 'analytics_table', raw), \
+             patch.object(backfill, 'analytics_rollups_table', rollups):
+            rows, errors = backfill.backfill('2026-03-02')
+
+        written = {(c.kwargs['Item']['gallery_id'], c.kwargs['Item']['rollup_key']) for c in writer.put_item.call_args_list}
+        assert written == {('g1', 'day#2026-03-01'), ('g1', 'hll#2026-03-01'), ('g1', 'photo#2026-03-01#p1'),
+                           ('g2', 'day#2026-03-01'), ('g2', 'hll#2026-03-01')}
+        assert (rows, errors) == (5, 0)
@@ -236,3 +236,28 @@ def test_handle_process_background_job(mock_dynamodb_tables, mock_s3):
     
     assert response['statusCode'] == 200
 
+
+
+def test_handle_process_selection_zip_job(mock_dynamodb_tables):
+    """Selection ZIP job stores the ZIP URL on the job"""
+    mock_dynamodb_tables['jobs'].get_item.return_value = {
+        'Item': {
+            'job_id': 'selection-zip-abc',
+            'job_type': 'selection_zip',
+            'user_id': None,
+            'user_email': 'client@example.com',
+            'status': 'pending',
+            'metadata': json.dumps({'gallery_id': 'g1', 'photo_ids': ['p1', 'p2']})
+        }
+    }
+    
+    with patch('utils.zip_generator.generate_selection_zip', return_value={
+        'success': True, 'zip_url': 'https://cdn/g1/selections/abc.zip', 'photo_count': 2
+    }) as mock_generate:
+        response = handle_process_background_job('selection-zip-abc')
+    
+    assert response['statusCode'] == 200
+    mock_generate.assert_called_once_with('g1', ['p1', 'p2'])
+    final_update = mock_dynamodb_tables['jobs'].update_item.call_args_list[-1].kwargs
+    assert final_update['ExpressionAttributeValues'][':status'] == 'completed'
+    assert json.loads(final_update['ExpressionAttributeValues'][':result'])['zip_url'].endswith('abc.zip')
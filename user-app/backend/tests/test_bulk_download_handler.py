@@ -2,21 +2,19 @@
 import pytest
 import uuid
 import json
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from handlers.bulk_download_handler import (
     handle_bulk_download,
-    handle_bulk_download_by_token
+    handle_bulk_download_by_token,
+    handle_selection_download
 )
 
 
 class TestBulkDownload:
     """Test bulk download functionality with real DynamoDB"""
     
-    @patch('handlers.bulk_download_handler.s3_client')
-    def test_bulk_download_with_user(self, mock_s3):
+    def test_bulk_download_with_user(self):
         """Test bulk download with authenticated user - uses real DynamoDB"""
-        mock_s3.generate_presigned_url.return_value = 'https://example.com/download.zip'
-        
         gallery_id = f'gallery-{uuid.uuid4()}'
         user = {
             'id': f'user-{uuid.uuid4()}',
@@ -33,11 +31,8 @@ class TestBulkDownload:
         result = handle_bulk_download(gallery_id, user, event)
         assert result['statusCode'] in [200, 404, 500]
     
-    @patch('handlers.bulk_download_handler.s3_client')
-    def test_bulk_download_by_token(self, mock_s3):
+    def test_bulk_download_by_token(self):
         """Test bulk download via token (client access) - uses real DynamoDB"""
-        mock_s3.generate_presigned_url.return_value = 'https://example.com/download.zip'
-        
         event = {
             'queryStringParameters': {
                 'token': f'token-{uuid.uuid4()}'
@@ -51,5 +46,103 @@ class TestBulkDownload:
         assert result['statusCode'] in [200, 400, 404, 500]
 
 
+@pytest.fixture
+def selection_tables():
+    """Favorites, gallery and jobs tables for handle_selection_download"""
+    favorites = MagicMock()
+    favorites.query.return_value = {'Items': [
+        {'photo_id': 'p2', 'gallery_id': 'g1'},
+        {'photo_id': 'p1', 'gallery_id': 'g1'},
+        {'photo_id': 'x9', 'gallery_id': 'other'},
+    ]}
+    gallery = {'id': 'g1', 'user_id': 'owner', 'name': 'Smith Wedding', 'share_token': 'tok-1',
+               'client_emails': ['client@example.com']}
+    galleries = MagicMock()
+    galleries.query.return_value = {'Items': [gallery]}
+    jobs = MagicMock()
+    jobs.get_item.return_value = {}
+    photos = [{'id': 'p1'}, {'id': 'p2'}, {'id': 'p3'}]
+    with patch('handlers.bulk_download_handler.client_favorites_table', favorites), \
+         patch('handlers.bulk_download_handler.galleries_table', galleries), \
+         patch('handlers.bulk_download_handler.background_jobs_table', jobs), \
+         patch('handlers.background_jobs_handler.background_jobs_table', jobs), \
+         patch('utils.zip_generator._query_gallery_photos', return_value=photos), \
+         patch('handlers.bulk_download_handler.resolve_share_token',
+               side_effect=lambda token: gallery if token == gallery['share_token'] else None) as resolve:
+        yield {'favorites': favorites, 'galleries': galleries, 'jobs': jobs, 'gallery': gallery, 'resolve': resolve}
+
+
+class TestSelectionDownload:
+    """ZIP of client favorites / a submitted selection"""
+
+    body = {'gallery_id': 'g1', 'client_email': 'Client@Example.com', 'token': 'tok-1'}
+
+    def test_cached_selection_returned_at_once(self, selection_tables):
+        with patch('utils.zip_generator.selection_zip_exists', return_value=True):
+            result = handle_selection_download(None, self.body)
+
+        body = json.loads(result['body'])
+        assert result['statusCode'] == 200
+        assert body['photo_count'] == 2
+        assert body['filename'] == 'smith-wedding-favorites-2-photos.zip'
+        assert '/g1/selections/' in body['zip_url']
+        selection_tables['jobs'].put_item.assert_not_called()
+
+    def test_missing_selection_queues_one_job(self, selection_tables):
+        from utils.zip_generator import selection_digest
+        with patch('utils.zip_generator.selection_zip_exists', return_value=False):
+            result = handle_selection_download(None, self.body)
+
+        body = json.loads(result['body'])
+        assert result['statusCode'] == 202
+        assert body['job_id'] == f"selection-zip-{selection_digest(['p1', 'p2'])}"
+        job = selection_tables['jobs'].put_item.call_args.kwargs['Item']
+        assert job['job_type'] == 'selection_zip' and job['user_email'] == 'client@example.com'
+        assert json.loads(job['metadata']) == {'gallery_id': 'g1', 'photo_ids': ['p1', 'p2']}
+
+        # A request while the job runs does not queue another
+        selection_tables['jobs'].get_item.return_value = {'Item': {'job_id': body['job_id'], 'status': 'in_progress'}}
+        with patch('utils.zip_generator.selection_zip_exists', return_value=False):
+            assert handle_selection_download(None, self.body)['statusCode'] == 202
+        assert selection_tables['jobs'].put_item.call_count == 1
+
+    def test_downloads_disabled(self, selection_tables):
+        selection_tables['gallery']['allow_downloads'] = False
+
+        result = handle_selection_download(None, self.body)
+
+        assert result['statusCode'] == 403
+
+    def test_guest_without_token_rejected(self, selection_tables):
+        body = {key: value for key, value in self.body.items() if key != 'token'}
+
+        result = handle_selection_download(None, body)
+
+        assert result['statusCode'] == 400
+        selection_tables['favorites'].query.assert_not_called()
+
+    def test_guest_token_for_another_gallery_rejected(self, selection_tables):
+        result = handle_selection_download(None, {**self.body, 'gallery_id': 'g2'})
+
+        assert result['statusCode'] == 403
+        selection_tables['favorites'].query.assert_not_called()
+
+    def test_signed_in_user_must_be_gallery_client(self, selection_tables):
+        stranger = {'id': 'u9', 'email': 'stranger@example.com'}
+
+        result = handle_selection_download(stranger, {'gallery_id': 'g1', 'client_email': 'client@example.com'})
+
+        assert result['statusCode'] == 403
+        selection_tables['favorites'].query.assert_not_called()
+
+    def test_signed_in_client_downloads_own_favorites(self, selection_tables):
+        client = {'id': 'u1', 'email': 'client@example.com'}
+        with patch('utils.zip_generator.selection_zip_exists', return_value=True):
+            result = handle_selection_download(client, {'gallery_id': 'g1'})
+
+        assert result['statusCode'] == 200
+        selection_tables['resolve'].assert_not_called()
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
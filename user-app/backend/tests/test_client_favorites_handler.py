@@ -14,7 +14,8 @@ def mock_favorites_dependencies():
          patch('handlers.client_favorites_handler.galleries_table') as mock_galleries, \
          patch('handlers.client_favorites_handler.users_table') as mock_users, \
          patch('handlers.subscription_handler.get_user_features') as mock_features, \
-         patch('handlers.client_favorites_handler.auto_register_guest_client') as mock_auto_register:
+         patch('handlers.client_favorites_handler.auto_register_guest_client') as mock_auto_register, \
+         patch('handlers.client_favorites_handler.add_gallery_client_email') as mock_add_client:
         # Setup default mocks
         mock_photos.get_item.return_value = {
             'Item': {
@@ -69,7 +70,8 @@ def mock_favorites_dependencies():
             'galleries': mock_galleries,
             'users': mock_users,
             'features': mock_features,
-            'auto_register': mock_auto_register
+            'auto_register': mock_auto_register,
+            'add_client': mock_add_client
         }
 
 class TestAddFavorite:
@@ -108,6 +110,9 @@ class TestAddFavorite:
         assert result['statusCode'] in [200, 201]
         # Verify auto-register was called
         mock_favorites_dependencies['auto_register'].assert_called_once()
+        # Guest added to the gallery through the indexed helper
+        gallery, email = mock_favorites_dependencies['add_client'].call_args.args
+        assert gallery['id'] == 'gallery_123' and email == 'guest@example.com'
     
     def test_add_favorite_duplicate(self, sample_user, mock_favorites_dependencies):
         """Add favorite that already exists."""
@@ -0,0 +1,196 @@
+"""
+Tests for utils/client_gallery_index.py and the client dashboard that reads it
+"""
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+
+@pytest.fixture
+def mock_index_table():
+    """Reverse index table with a recording batch writer"""
+    with patch('utils.client_gallery_index.client_galleries_table') as mock_table:
+        writer = MagicMock()
+        mock_table.batch_writer.return_value.__enter__.return_value = writer
+        mock_table.writer = writer
+        yield mock_table
+
+
+class TestSyncClientGalleryIndex:
+    """Tests for index maintenance on gallery writes"""
+
+    def test_new_gallery_writes_row_per_client(self, mock_index_table, sample_gallery):
+        from utils.client_gallery_index import sync_client_gallery_index
+
+        sync_client_gallery_index(sample_gallery)
+
+        items = [call.kwargs['Item'] for call in mock_index_table.writer.put_item.call_args_list]
+        assert {item['client_email'] for item in items} == {'client1@example.com', 'client2@example.com'}
+        assert all(item['gallery_id'] == 'gallery_123' and item['user_id'] == 'user_123' for item in items)
+        mock_index_table.writer.delete_item.assert_not_called()
+
+    def test_removed_client_row_deleted(self, mock_index_table, sample_gallery):
+        from utils.client_gallery_index import sync_client_gallery_index
+
+        gallery = {**sample_gallery, 'client_emails': ['client1@example.com']}
+        sync_client_gallery_index(gallery, previous_emails={'client1@example.com', 'client2@example.com'})
+
+        mock_index_table.writer.delete_item.assert_called_once_with(
+            Key={'client_email': 'client2@example.com', 'gallery_id': 'gallery_123'}
+        )
+
+    def test_legacy_client_email_indexed(self, mock_index_table, sample_gallery):
+        from utils.client_gallery_index import sync_client_gallery_index
+
+        gallery = {**sample_gallery, 'client_emails': [], 'client_email': 'Legacy@Example.com'}
+        sync_client_gallery_index(gallery)
+
+        item = mock_index_table.writer.put_item.call_args.kwargs['Item']
+        assert item['client_email'] == 'legacy@example.com'
+
+    def test_remove_on_delete(self, mock_index_table, sample_gallery):
+        from utils.client_gallery_index import remove_client_gallery_index
+
+        remove_client_gallery_index(sample_gallery)
+
+        assert mock_index_table.writer.delete_item.call_count == 2
+
+
+    def test_add_client_email_updates_gallery_and_index(self, mock_index_table, sample_gallery):
+        from utils.client_gallery_index import add_gallery_client_email
+
+        with patch('utils.client_gallery_index.galleries_table') as mock_galleries:
+            added = add_gallery_client_email(dict(sample_gallery), 'Guest@Example.com')
+
+        assert added
+        values = mock_galleries.update_item.call_args.kwargs['ExpressionAttributeValues']
+        assert values[':emails'][-1] == 'guest@example.com'
+        indexed = {call.kwargs['Item']['client_email'] for call in mock_index_table.writer.put_item.call_args_list}
+        assert 'guest@example.com' in indexed
+
+    def test_add_existing_client_email_is_noop(self, mock_index_table, sample_gallery):
+        from utils.client_gallery_index import add_gallery_client_email
+
+        with patch('utils.client_gallery_index.galleries_table') as mock_galleries:
+            added = add_gallery_client_email(dict(sample_gallery), 'CLIENT1@example.com')
+
+        assert not added
+        mock_galleries.update_item.assert_not_called()
+        mock_index_table.batch_writer.assert_not_called()
+
+
+class TestClientGalleryLookup:
+    """Tests for reading the index"""
+
+    def test_get_keys_paginates(self, mock_index_table):
+        from utils.client_gallery_index import get_client_gallery_keys
+
+        mock_index_table.query.side_effect = [
+            {'Items': [{'gallery_id': 'g1', 'user_id': 'u1'}], 'LastEvaluatedKey': {'k': 1}},
+            {'Items': [{'gallery_id': 'g2', 'user_id': 'u2'}]}
+        ]
+
+        keys = get_client_gallery_keys('Client1@Example.com')
+
+        assert keys == [{'user_id': 'u1', 'id': 'g1'}, {'user_id': 'u2', 'id': 'g2'}]
+        assert mock_index_table.query.call_args_list[1].kwargs['ExclusiveStartKey'] == {'k': 1}
+
+    def test_batch_get_chunks_and_retries_unprocessed(self):
+        from utils import client_gallery_index
+        from utils.config import GALLERIES_TABLE
+
+        table = GALLERIES_TABLE
+        keys = [{'user_id': 'u', 'id': f'g{i}'} for i in range(150)]
+        mock_dynamodb = MagicMock()
+        mock_dynamodb.batch_get_item.side_effect = [
+            {'Responses': {table: [{'user_id': 'u', 'id': f'g{i}'} for i in range(90)]},
+             'UnprocessedKeys': {table: {'Keys': keys[90:100]}}},
+            {'Responses': {table: [{'user_id': 'u', 'id': f'g{i}'} for i in range(90, 100)]}},
+            {'Responses': {table: [{'user_id': 'u', 'id': f'g{i}'} for i in range(100, 150)]}}
+        ]
+
+        with patch('utils.request_scope.get_dynamodb', return_value=mock_dynamodb):
+            galleries = client_gallery_index.batch_get_galleries(keys)
+
+        assert len(galleries) == 150
+        calls = mock_dynamodb.batch_get_item.call_args_list
+        assert len(calls[0].kwargs['RequestItems'][table]['Keys']) == 100
+        assert len(calls[2].kwargs['RequestItems'][table]['Keys']) == 50
+
+
+class TestClientGalleriesHandler:
+    """handle_client_galleries reads the index instead of scanning"""
+
+    def test_dashboard_uses_index(self, sample_gallery):
+        from handlers import client_handler
+
+        stale_gallery = {**sample_gallery, 'id': 'gallery_old', 'client_emails': ['someone@example.com']}
+        photographer = {'id': 'user_123', 'name': 'Test User'}
+
+        with patch('handlers.client_handler.get_client_gallery_keys',
+                   return_value=[{'user_id': 'user_123', 'id': 'gallery_123'},
+                                 {'user_id': 'user_123', 'id': 'gallery_old'}]), \
+             patch('handlers.client_handler.batch_get_galleries',
+                   return_value=[dict(sample_gallery), stale_gallery]), \
+             patch('handlers.client_handler.get_user_by_id_optimized', return_value=photographer) as mock_user, \
+             patch('handlers.client_handler.get_client_favorited_photo_ids', return_value={'p1'}), \
+             patch('handlers.client_handler.galleries_table') as mock_galleries, \
+             patch('handlers.client_handler.photos_table') as mock_photos:
+            mock_photos.query.return_value = {'Items': [{'id': 'p1', 'status': 'approved', 'url': 'u1'},
+                                                        {'id': 'p2', 'status': 'pending', 'url': 'u2'}]}
+
+            result = client_handler.handle_client_galleries({'email': 'Client1@example.com'})
+
+        assert result['statusCode'] == 200
+        body = json.loads(result['body'])
+        # Stale index row (client removed from gallery) is filtered out
+        assert [g['id'] for g in body['galleries']] == ['gallery_123']
+        photos = body['galleries'][0]['photos']
+        assert [p['is_favorite'] for p in photos] == [True, False]
+        assert body['galleries'][0]['photographer_name'] == 'Test User'
+        mock_galleries.scan.assert_not_called()
+        mock_user.assert_called_once_with('user_123')
+
+    def test_deleted_photographer_galleries_skipped(self, sample_gallery):
+        from handlers import client_handler
+
+        with patch('handlers.client_handler.get_client_gallery_keys',
+                   return_value=[{'user_id': 'user_123', 'id': 'gallery_123'}]), \
+             patch('handlers.client_handler.batch_get_galleries', return_value=[dict(sample_gallery)]), \
+             patch('handlers.client_handler.get_user_by_id_optimized',
+                   return_value={'id': 'user_123', 'account_status': 'PENDING_DELETION'}), \
+             patch('handlers.client_handler.get_client_favorited_photo_ids', return_value=set()):
+            result = client_handler.handle_client_galleries({'email': 'client1@example.com'})
+
+        assert json.loads(result['body'])['total'] == 0
+
+
+class TestGalleryHandlerMaintainsIndex:
+    """Gallery writes keep the index in sync"""
+
+    def test_update_client_emails_syncs_index(self, sample_user, sample_gallery):
+        from handlers import gallery_handler
+
+        with patch('handlers.gallery_handler.galleries_table') as mock_galleries, \
+             patch('handlers.gallery_handler.sync_client_gallery_index') as mock_sync:
+            mock_galleries.get_item.return_value = {'Item': dict(sample_gallery)}
+
+            result = gallery_handler.handle_update_gallery(
+                'gallery_123', sample_user, {'client_emails': ['client1@example.com', 'new@example.com']}
+            )
+
+        assert result['statusCode'] == 200
+        gallery, previous = mock_sync.call_args.args
+        assert gallery['client_emails'] == ['client1@example.com', 'new@example.com']
+        assert previous == {'client1@example.com', 'client2@example.com'}
+
+    def test_update_without_client_change_skips_index(self, sample_user, sample_gallery):
+        from handlers import gallery_handler
+
+        with patch('handlers.gallery_handler.galleries_table') as mock_galleries, \
+             patch('handlers.gallery_handler.sync_client_gallery_index') as mock_sync:
+            mock_galleries.get_item.return_value = {'Item': dict(sample_gallery)}
+
+            gallery_handler.handle_update_gallery('gallery_123', sample_user, {'name': 'Renamed'})
+
+        mock_sync.assert_not_called()
@@ -0,0 +1,177 @@
+"""
+Tests for utils/duplicate_detector.py - index-backed duplicate checks
+"""
+import numpy as np
+import pytest
+from unittest.mock import MagicMock, patch
+
+from utils import duplicate_detector
+from utils.duplicate_detector import (
+    name_size_key, duplicate_index_fields, find_duplicates, hash_array, near_duplicate_pairs,
+    near_duplicate_groups, find_near_duplicates
+)
+
+
+def _photo(photo_id, gallery_id, filename, file_size, file_hash=None):
+    return {'id': photo_id, 'gallery_id': gallery_id, 'user_id': 'user_123', 'filename': filename,
+            'file_size': file_size, **duplicate_index_fields(filename, file_size, file_hash)}
+
+
+@pytest.fixture
+def indexed_photos():
+    """photos_table whose query() answers both duplicate indexes from a list"""
+    photos = []
+
+    def query(IndexName, KeyConditionExpression, **kwargs):
+        condition = KeyConditionExpression.get_expression()
+        hash_cond, range_cond = (c.get_expression() for c in condition['values'])
+        hash_value = hash_cond['values'][1]
+        if IndexName == 'UserFileHashIndex':
+            items = [p for p in photos if p['user_id'] == hash_value
+                     and p.get('file_hash') == range_cond['values'][1]]
+        else:
+            low, high = range_cond['values'][1:]
+            items = [p for p in photos if p['gallery_id'] == hash_value
+                     and 'name_size' in p and low <= p['name_size'] <= high]
+        return {'Items': items}
+
+    table = MagicMock()
+    table.query.side_effect = query
+    with patch.object(duplicate_detector, 'photos_table', table):
+        yield photos, table
+
+
+class TestIndexFields:
+    """Attributes written on upload"""
+
+    def test_name_size_key_sorts_by_size(self):
+        assert name_size_key('IMG_001.JPG', 2048) == 'img_001#0000000002048'
+        assert name_size_key('img_001.jpg', 999) < name_size_key('img_001.jpg', 2048)
+
+    def test_missing_values_stay_out_of_indexes(self):
+        assert duplicate_index_fields('', 100, '') == {}
+        assert duplicate_index_fields('a.jpg', 0, None) == {}
+        assert duplicate_index_fields('a.jpg', 10, 'abc') == {'file_hash': 'abc', 'name_size': 'a#0000000000010'}
+
+
+class TestFindDuplicates:
+    """Batch checks from index queries only"""
+
+    def test_name_and_size_within_tolerance(self, indexed_photos):
+        photos, table = indexed_photos
+        photos.extend([
+            _photo('p1', 'g1', 'IMG_1.jpg', 1_000_000),
+            _photo('p2', 'g1', 'IMG_1.heic', 1_200_000),   # Same name, size too far off
+            _photo('p3', 'g1', 'IMG_10.jpg', 1_000_000),   # Different name sharing the prefix
+            _photo('p4', 'g2', 'IMG_1.jpg', 1_000_000),    # Other gallery
+        ])
+
+        results = find_duplicates('user_123', 'g1', [
+            {'filename': 'img_1.JPG', 'file_size': 1_050_000},
+            {'filename': 'new.jpg', 'file_size': 500},
+        ])
+
+        assert [d['id'] for d in results[0]['duplicates']] == ['p1']
+        assert results[0]['duplicates'][0]['match_type'] == 'filename_size_match'
+        assert results[1] == {'filename': 'new.jpg', 'file_size': 500, 'has_duplicates': False,
+                              'duplicate_count': 0, 'duplicates': []}
+        table.scan.assert_not_called()
+
+    def test_hash_matches_scoped_to_gallery_unless_account(self, indexed_photos):
+        photos, _ = indexed_photos
+        photos.extend([
+            _photo('p1', 'g1', 'a.jpg', 100, 'h1'),
+            _photo('p2', 'g2', 'renamed.jpg', 100, 'h1'),
+        ])
+        candidate = [{'filename': 'a.jpg', 'file_size': 100, 'file_hash': 'h1'}]
+
+        in_gallery = find_duplicates('user_123', 'g1', candidate)
+        across = find_duplicates('user_123', 'g1', candidate, across_galleries=True)
+
+        assert [(d['id'], d['match_type']) for d in in_gallery[0]['duplicates']] == [('p1', 'exact_file')]
+        assert sorted(d['id'] for d in across[0]['duplicates']) == ['p1', 'p2']
+        assert across[0]['duplicate_count'] == 2
+
+    def test_all_pages_read(self, indexed_photos):
+        _, table = indexed_photos
+        table.query.side_effect = [
+            {'Items': [_photo('p1', 'g1', 'a.jpg', 100)], 'LastEvaluatedKey': {'id': 'p1'}},
+            {'Items': [_photo('p2', 'g1', 'a.jpg', 101)]},
+        ]
+
+        results = find_duplicates('user_123', 'g1', [{'filename': 'a.jpg', 'file_size': 100}])
+
+        assert results[0]['duplicate_count'] == 2
+        assert table.query.call_args_list[1].kwargs['ExclusiveStartKey'] == {'id': 'p1'}
+
+
+def _brute_force_pairs(hashes, max_distance):
+    distances = duplicate_detector._popcount(hashes[:, None] ^ hashes[None, :])
+    first, second = np.nonzero(np.triu(distances <= max_distance, 1))
+    return set(zip(first.tolist(), second.tolist()))
+
+
+class TestNearDuplicates:
+    """Vectorized Hamming search over perceptual hashes"""
+
+    def test_banded_search_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        hashes = rng.integers(0, 2 ** 64, size=1500, dtype=np.uint64)
+        # Near copies with 1-8 flipped bits
+        for i in range(100):
+            flips = rng.choice(64, size=1 + i % 8, replace=False)
+            hashes[1400 + i] = hashes[i] ^ np.uint64(sum(1 << int(bit) for bit in flips))
+
+        for max_distance in (0, 3, 6, 8):
+            first, second, distances = near_duplicate_pairs(hashes, max_distance)
+
+            assert set(zip(first.tolist(), second.tolist())) == _brute_force_pairs(hashes, max_distance)
+            assert (distances <= max_distance).all() and (first < second).all()
+
+    def test_distance_limit(self):
+        with pytest.raises(ValueError):
+            near_duplicate_pairs(hash_array(['0' * 16, 'f' * 16]), 9)
+
+    def test_groups_are_transitive(self):
+        photos = [
+            {'id': 'a', 'perceptual_hash': '0000000000000000'},
+            {'id': 'b', 'perceptual_hash': '000000000000000f'},   # 4 bits from a
+            {'id': 'c', 'perceptual_hash': '00000000000000ff'},   # 4 bits from b, 8 from a
+            {'id': 'd', 'perceptual_hash': 'ffffffffffffffff'},
+            {'id': 'e'},                                         # Not processed yet
+        ]
+
+        groups = near_duplicate_groups(photos, max_distance=4)
+
+        assert [[(p['id'], p['distance']) for p in group] for group in groups] == [[('a', 0), ('b', 4), ('c', 8)]]
+        assert groups[0][0]['match_type'] == 'perceptual'
+
+    def test_account_search_uses_user_index(self):
+        table = MagicMock()
+        table.query.return_value = {'Items': [
+            {'id': 'a', 'gallery_id': 'g1', 'perceptual_hash': '0123456789abcdef'},
+            {'id': 'b', 'gallery_id': 'g2', 'perceptual_hash': '0123456789abcdee'},
+        ]}
+
+        with patch.object(duplicate_detector, 'photos_table', table):
+            result = find_near_duplicates('user_123')
+
+        assert result['photos_searched'] == 2
+        assert [p['gallery_id'] for p in result['groups'][0]] == ['g1', 'g2']
+        query = table.query.call_args.kwargs
+        assert query['IndexName'] == 'UserIdIndex'
+        assert 'perceptual_hash' in query['ExpressionAttributeNames'].values()
+
+
+class TestBackfill:
+    """backfill_duplicate_index.photo_update"""
+
+    def test_update_sets_name_size_and_drops_empty_hash(self):
+        from backfill_duplicate_index import photo_update
+
+        update = photo_update({'id': 'p1', 'filename': 'A.jpg', 'file_size': 10, 'file_hash': ''})
+
+        assert update['UpdateExpression'] == 'SET name_size = :name_size REMOVE file_hash'
+        assert update['ExpressionAttributeValues'] == {':name_size': 'a#0000000000010'}
+        assert photo_update({'id': 'p1', 'filename': 'A.jpg', 'file_size': 10,
+                             'name_size': 'a#0000000000010', 'file_hash': 'h'}) is None
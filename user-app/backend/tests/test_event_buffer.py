@@ -0,0 +1,100 @@
+"""
+Tests for utils/event_buffer.py
+"""
+import pytest
+from unittest.mock import MagicMock, patch
+
+from utils import event_buffer
+from utils.event_buffer import EventBuffer, begin_event_buffer, flush_event_buffer, put_event
+
+
+def _table():
+    """Table mock whose batch_writer records every item put through it"""
+    table = MagicMock()
+    table.written = []
+    writer = table.batch_writer.return_value.__enter__.return_value
+    writer.put_item.side_effect = lambda Item: table.written.append(Item)
+    return table
+
+
+@pytest.fixture(autouse=True)
+def no_buffer_left_open():
+    yield
+    flush_event_buffer()
+
+
+class TestEventBuffer:
+    """Buffered writes"""
+
+    def test_items_written_on_flush_only(self):
+        table = _table()
+        buffer = EventBuffer()
+
+        for i in range(60):
+            buffer.put(table, {'id': str(i)})
+        assert table.written == [] and len(buffer) == 60
+
+        buffer.flush()
+
+        assert [item['id'] for item in table.written] == [str(i) for i in range(60)]
+        table.batch_writer.assert_called_once()
+        table.put_item.assert_not_called()
+        assert buffer.stats == {'items': 60, 'flushed': 60, 'batches': 3, 'errors': 0}
+
+    def test_after_write_called_once_per_flush(self):
+        table = _table()
+        hook = MagicMock()
+        buffer = EventBuffer()
+
+        for i in range(3):
+            buffer.put(table, {'id': str(i)}, after_write=hook)
+        buffer.flush()
+
+        hook.assert_called_once_with([{'id': '0'}, {'id': '1'}, {'id': '2'}])
+
+    def test_failed_flush_skips_hook_and_never_raises(self):
+        table = _table()
+        table.batch_writer.return_value.__enter__.return_value.put_item.side_effect = Exception('throttled')
+        hook = MagicMock()
+        buffer = EventBuffer()
+        buffer.put(table, {'id': '1'}, after_write=hook)
+
+        buffer.flush()
+
+        hook.assert_not_called()
+        assert buffer.stats['errors'] == 1
+
+    def test_large_buffers_flush_early(self):
+        table = _table()
+        buffer = EventBuffer()
+
+        with patch.object(event_buffer, 'MAX_PENDING_ITEMS', 10):
+            for i in range(25):
+                buffer.put(table, {'id': str(i)})
+
+        assert len(table.written) == 20 and len(buffer) == 5
+
+
+class TestPutEvent:
+    """Buffered inside an invocation, immediate outside one"""
+
+    def test_writes_through_without_buffer(self):
+        table = _table()
+        hook = MagicMock(side_effect=Exception('rollup failure'))
+
+        put_event(table, {'id': '1'}, after_write=hook)
+
+        table.put_item.assert_called_once_with(Item={'id': '1'})
+        hook.assert_called_once_with([{'id': '1'}])
+
+    def test_buffered_within_invocation(self):
+        table = _table()
+        begin_event_buffer()
+
+        put_event(table, {'id': '1'})
+        put_event(table, {'id': '2'})
+        table.put_item.assert_not_called()
+        stats = flush_event_buffer()
+
+        assert table.written == [{'id': '1'}, {'id': '2'}]
+        assert stats['flushed'] == 2 and stats['batches'] == 1
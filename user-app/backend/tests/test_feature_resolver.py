@@ -0,0 +1,143 @@
+"""
+Tests for utils/feature_resolver.py and the cached get_user_features path
+"""
+import pytest
+from unittest.mock import patch
+
+from utils.feature_resolver import resolve_features, get_feature_cache_stats
+from utils.plans_config import PLANS
+
+
+@pytest.fixture
+def mock_tables():
+    with patch('handlers.subscription_handler.users_table') as users, \
+         patch('handlers.subscription_handler.user_features_table') as overrides:
+        users.get_item.return_value = {'Item': {'email': 'test@example.com', 'id': 'user_123', 'plan': 'starter'}}
+        overrides.query.return_value = {'Items': []}
+        yield users, overrides
+
+
+class TestResolveFeatures:
+    """Precompiled rules match the plan definitions"""
+
+    @pytest.mark.parametrize('plan_id', list(PLANS))
+    def test_plan_name_and_limits(self, plan_id):
+        features, plan_name = resolve_features(plan_id)
+
+        assert plan_name == PLANS[plan_id]['name']
+        if 'unlimited_galleries' not in PLANS[plan_id]['feature_ids']:
+            assert features['galleries_per_month'] == PLANS[plan_id]['galleries_per_month']
+
+    def test_unknown_plan_resolves_as_free(self):
+        assert resolve_features('legacy_gold') == resolve_features('free')
+
+    def test_strongest_rule_in_group_wins(self):
+        features, _ = resolve_features('free', ['storage_10gb', 'storage_unlimited', 'video_10min_hd', 'video_4hr_4k'])
+
+        assert features['storage_gb'] == -1
+        assert features['video_minutes'] == 240
+        assert features['video_quality'] == '4k'
+
+    def test_override_cannot_downgrade_plan(self):
+        pro, _ = resolve_features('pro')
+        with_override, _ = resolve_features('pro', ['video_10min_hd', 'analytics_advanced'])
+
+        assert with_override == pro
+
+    def test_aliases(self):
+        features, _ = resolve_features('free', ['white_label', 'smart_invoicing', 'client_proofing', 'raw_vault'])
+
+        assert features['remove_branding'] is True
+        assert features['client_invoicing'] is True
+        assert features['client_favorites'] is True
+        assert features['raw_support'] is True and features['raw_vault'] is True
+
+    def test_result_is_a_copy(self):
+        features, _ = resolve_features('pro')
+        features['storage_gb'] = 0
+
+        assert resolve_features('pro')[0]['storage_gb'] != 0
+
+
+class TestCachedUserFeatures:
+    """get_user_features serves repeat calls from the per-container cache"""
+
+    def test_overrides_query_skipped_on_hit(self, mock_tables, sample_user):
+        from handlers.subscription_handler import get_user_features
+        users, overrides = mock_tables
+
+        first = get_user_features(sample_user)
+        second = get_user_features(sample_user)
+
+        assert first == second
+        assert first[1] == 'starter'
+        overrides.query.assert_called_once()
+        assert get_feature_cache_stats()['hits'] == 1
+
+    def test_plan_change_misses_cache(self, mock_tables, sample_user):
+        from handlers.subscription_handler import get_user_features
+        users, overrides = mock_tables
+
+        get_user_features(sample_user)
+        users.get_item.return_value = {'Item': {'email': 'test@example.com', 'id': 'user_123', 'plan': 'pro'}}
+        features, plan_id, plan_name = get_user_features(sample_user)
+
+        assert plan_id == 'pro'
+        assert plan_name == PLANS['pro']['name']
+        assert overrides.query.call_count == 2
+
+    def test_features_version_bump_misses_cache(self, mock_tables, sample_user):
+        from handlers.subscription_handler import get_user_features
+        users, overrides = mock_tables
+
+        get_user_features(sample_user)
+        overrides.query.return_value = {'Items': [{'feature_id': 'raw_vault'}]}
+        users.get_item.return_value = {'Item': {'email': 'test@example.com', 'id': 'user_123',
+                                                'plan': 'starter', 'features_version': 1}}
+        features, _, _ = get_user_features(sample_user)
+
+        assert features['raw_vault'] is True
+
+    def test_cached_dict_not_shared_with_callers(self, mock_tables, sample_user):
+        from handlers.subscription_handler import get_user_features
+
+        get_user_features(sample_user)[0]['storage_gb'] = 12345
+
+        assert get_user_features(sample_user)[0]['storage_gb'] != 12345
+
+
+class TestInvalidation:
+    """Admin and Stripe writes drop the cached entry"""
+
+    def test_grant_bumps_version_and_invalidates(self, mock_tables, sample_user):
+        from handlers.subscription_handler import get_user_features
+        from handlers.admin_plan_handler import handle_grant_feature
+        get_user_features(sample_user)
+
+        with patch('handlers.admin_plan_handler.users_table') as admin_users, \
+             patch('handlers.admin_plan_handler.user_features_table'), \
+             patch('utils.config.users_table') as resolver_users:
+            admin_users.scan.return_value = {'Items': [{'id': 'user_123', 'email': 'test@example.com'}]}
+            result = handle_grant_feature({'id': 'admin_1', 'role': 'admin'},
+                                          {'user_id': 'user_123', 'feature_id': 'raw_vault'})
+
+        assert result['statusCode'] == 200
+        update = resolver_users.update_item.call_args.kwargs
+        assert update['Key'] == {'email': 'test@example.com'}
+        assert update['UpdateExpression'] == 'ADD features_version :one'
+        assert get_feature_cache_stats()['size'] == 0
+
+    def test_stripe_subscription_update_invalidates(self, mock_tables, sample_user):
+        from handlers.subscription_handler import get_user_features
+        from handlers import stripe_webhook_handler
+        get_user_features(sample_user)
+
+        with patch('handlers.stripe_webhook_handler.users_table') as webhook_users, \
+             patch('handlers.stripe_webhook_handler.map_price_to_plan', return_value='pro'):
+            webhook_users.scan.return_value = {'Items': [{'id': 'user_123', 'email': 'test@example.com'}]}
+            stripe_webhook_handler.handle_subscription_event('customer.subscription.updated', {
+                'customer': 'cus_1', 'id': 'sub_1', 'status': 'active',
+                'items': {'data': [{'price': {'id': 'price_pro'}}]}
+            })
+
+        assert get_feature_cache_stats()['size'] == 0
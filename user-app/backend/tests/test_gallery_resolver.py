@@ -0,0 +1,174 @@
+"""
+Tests for utils/gallery_resolver.py - GalleryIdIndex lookups with per-container cache
+"""
+import pytest
+from unittest.mock import patch
+
+
+@pytest.fixture
+def mock_galleries():
+    """Galleries table mock with an empty resolver cache"""
+    from utils.gallery_resolver import clear_gallery_cache
+    clear_gallery_cache()
+    with patch('utils.gallery_resolver.galleries_table') as mock_table:
+        yield mock_table
+    clear_gallery_cache()
+
+
+class TestResolveGallery:
+    """Tests for resolve_gallery"""
+
+    def test_queries_gallery_id_index(self, mock_galleries, sample_gallery):
+        from utils.gallery_resolver import resolve_gallery
+
+        mock_galleries.query.return_value = {'Items': [sample_gallery]}
+
+        gallery = resolve_gallery('gallery_123')
+
+        assert gallery == {'id': 'gallery_123', 'user_id': 'user_123', 'name': 'Test Gallery'}
+        kwargs = mock_galleries.query.call_args.kwargs
+        assert kwargs['IndexName'] == 'GalleryIdIndex'
+        assert kwargs['Limit'] == 1
+        mock_galleries.scan.assert_not_called()
+
+    def test_second_lookup_served_from_cache(self, mock_galleries, sample_gallery):
+        from utils.gallery_resolver import resolve_gallery, get_gallery_cache_stats
+
+        mock_galleries.query.return_value = {'Items': [sample_gallery]}
+
+        resolve_gallery('gallery_123')
+        resolve_gallery('gallery_123')
+
+        assert mock_galleries.query.call_count == 1
+        stats = get_gallery_cache_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+
+    def test_missing_gallery_not_cached(self, mock_galleries, sample_gallery):
+        from utils.gallery_resolver import resolve_gallery
+
+        mock_galleries.query.return_value = {'Items': []}
+        assert resolve_gallery('gallery_123') is None
+
+        mock_galleries.query.return_value = {'Items': [sample_gallery]}
+        assert resolve_gallery('gallery_123')['user_id'] == 'user_123'
+
+    def test_invalidate_forces_reload(self, mock_galleries, sample_gallery):
+        from utils.gallery_resolver import resolve_gallery, invalidate_gallery
+
+        mock_galleries.query.return_value = {'Items': [sample_gallery]}
+        resolve_gallery('gallery_123')
+
+        invalidate_gallery('gallery_123')
+        resolve_gallery('gallery_123')
+
+        assert mock_galleries.query.call_count == 2
+
+    def test_expired_entry_reloaded(self, mock_galleries, sample_gallery):
+        from utils import gallery_resolver
+
+        mock_galleries.query.return_value = {'Items': [sample_gallery]}
+        with patch('utils.ttl_cache.time.monotonic', return_value=1000.0):
+            gallery_resolver.resolve_gallery('gallery_123')
+        with patch('utils.ttl_cache.time.monotonic',
+                   return_value=1000.0 + gallery_resolver.GALLERY_CACHE_TTL_SECONDS + 1):
+            gallery_resolver.resolve_gallery('gallery_123')
+
+        assert mock_galleries.query.call_count == 2
+
+    def test_cache_is_bounded(self, mock_galleries):
+        from utils import gallery_resolver
+
+        mock_galleries.query.side_effect = lambda **kwargs: {
+            'Items': [{'id': 'g', 'user_id': 'user_123', 'name': 'G'}]
+        }
+        with patch.object(gallery_resolver, 'GALLERY_CACHE_MAX_SIZE', 3):
+            for i in range(5):
+                gallery_resolver.resolve_gallery(f'gallery_{i}')
+
+            assert gallery_resolver.get_gallery_cache_stats()['size'] == 3
+            # Oldest entries were evicted
+            gallery_resolver.resolve_gallery('gallery_0')
+            assert mock_galleries.query.call_count == 6
+
+
+class TestResolveShareToken:
+    """Tests for resolve_share_token"""
+
+    def _gallery(self, sample_gallery, token='token123'):
+        return {**sample_gallery, 'share_token': token}
+
+    def test_queries_share_token_index(self, mock_galleries, sample_gallery):
+        from utils.gallery_resolver import resolve_share_token
+
+        mock_galleries.query.return_value = {'Items': [self._gallery(sample_gallery)]}
+
+        gallery = resolve_share_token('token123')
+
+        assert gallery['id'] == 'gallery_123'
+        assert mock_galleries.query.call_args.kwargs['IndexName'] == 'ShareTokenIndex'
+        mock_galleries.scan.assert_not_called()
+
+    def test_cached_token_reads_by_primary_key(self, mock_galleries, sample_gallery):
+        from utils.gallery_resolver import resolve_share_token
+
+        mock_galleries.query.return_value = {'Items': [self._gallery(sample_gallery)]}
+        mock_galleries.get_item.return_value = {'Item': self._gallery(sample_gallery)}
+
+        resolve_share_token('token123')
+        gallery = resolve_share_token('token123')
+
+        assert gallery['id'] == 'gallery_123'
+        assert mock_galleries.query.call_count == 1
+        mock_galleries.get_item.assert_called_once_with(Key={'user_id': 'user_123', 'id': 'gallery_123'})
+
+    def test_invalid_token_negatively_cached(self, mock_galleries):
+        from utils.gallery_resolver import resolve_share_token, get_gallery_cache_stats
+
+        mock_galleries.query.return_value = {'Items': []}
+
+        assert resolve_share_token('bogus') is None
+        assert resolve_share_token('bogus') is None
+
+        assert mock_galleries.query.call_count == 1
+        assert get_gallery_cache_stats()['invalid_token_hits'] == 1
+
+    def test_rotated_token_rejected(self, mock_galleries, sample_gallery):
+        from utils.gallery_resolver import resolve_share_token
+
+        mock_galleries.query.return_value = {'Items': [self._gallery(sample_gallery)]}
+        resolve_share_token('token123')
+
+        # Token regenerated in another container
+        mock_galleries.get_item.return_value = {'Item': self._gallery(sample_gallery, 'new-token')}
+        assert resolve_share_token('token123') is None
+
+    def test_invalidate_share_token(self, mock_galleries, sample_gallery):
+        from utils.gallery_resolver import resolve_share_token, invalidate_share_token
+
+        mock_galleries.query.return_value = {'Items': []}
+        resolve_share_token('token123')
+
+        invalidate_share_token('token123')
+        mock_galleries.query.return_value = {'Items': [self._gallery(sample_gallery)]}
+        assert resolve_share_token('token123')['id'] == 'gallery_123'
+
+
+class TestTrackingUsesResolver:
+    """Tracking handlers resolve galleries without scanning"""
+
+    def test_tracking_handlers_do_not_scan(self, mock_galleries, sample_gallery):
+        from handlers import analytics_handler
+
+        mock_galleries.query.return_value = {'Items': [sample_gallery]}
+        with patch('handlers.analytics_handler.analytics_table'), \
+             patch('handlers.analytics_handler.galleries_table') as handler_galleries:
+            analytics_handler.handle_track_gallery_view('gallery_123', None, {})
+            analytics_handler.handle_track_photo_view('photo_1', 'gallery_123', None, {})
+            analytics_handler.handle_track_photo_download('photo_1', 'gallery_123', None, {})
+            analytics_handler.handle_track_gallery_share('gallery_123', 'twitter', None, {})
+
+        handler_galleries.scan.assert_not_called()
+        mock_galleries.scan.assert_not_called()
+        # One index query for the first hit, the rest served from cache
+        assert mock_galleries.query.call_count == 1
@@ -0,0 +1,97 @@
+"""
+Tests for utils/hyperloglog.py
+"""
+import pytest
+
+from utils.hyperloglog import HyperLogLog, standard_error, DEFAULT_PRECISION
+
+
+def _sketch(values, precision=DEFAULT_PRECISION):
+    sketch = HyperLogLog(precision)
+    for value in values:
+        sketch.add(value)
+    return sketch
+
+
+class TestAccuracy:
+    """Estimates stay within the documented error"""
+
+    def test_documented_standard_error(self):
+        assert standard_error() == pytest.approx(0.01625)
+        assert standard_error(10) == pytest.approx(0.0325)
+
+    def test_small_counts_near_exact(self):
+        for n in (0, 1, 10, 100):
+            assert abs(_sketch(f"visitor-{i}" for i in range(n)).count() - n) <= max(1, n * 0.01)
+
+    @pytest.mark.parametrize('n', [1000, 20000, 200000])
+    def test_within_three_standard_errors(self, n):
+        estimate = _sketch(f"visitor-{i}" for i in range(n)).count()
+
+        assert abs(estimate - n) / n <= 3 * standard_error()
+
+    def test_lower_precision_error_scales(self):
+        n = 50000
+        estimate = _sketch((f"visitor-{i}" for i in range(n)), precision=8).count()
+
+        assert abs(estimate - n) / n <= 3 * standard_error(8)
+
+    def test_duplicates_not_counted(self):
+        sketch = _sketch(f"visitor-{i % 500}" for i in range(20000))
+
+        assert abs(sketch.count() - 500) <= 5
+
+
+class TestMerge:
+    """Sketch unions"""
+
+    def test_union_equals_sketch_of_union(self):
+        days = [_sketch(f"visitor-{i}" for i in range(start, start + 3000)) for start in (0, 2000, 4000)]
+
+        merged = HyperLogLog()
+        for day in days:
+            merged.merge(day)
+
+        assert merged.registers == _sketch(f"visitor-{i}" for i in range(7000)).registers
+        assert abs(merged.count() - 7000) / 7000 <= 3 * standard_error()
+
+    def test_merge_is_idempotent(self):
+        sketch = _sketch(f"visitor-{i}" for i in range(1000))
+        before = sketch.count()
+
+        sketch.merge(sketch.copy())
+
+        assert sketch.count() == before
+
+    def test_precision_mismatch_rejected(self):
+        with pytest.raises(ValueError):
+            HyperLogLog(10).merge(HyperLogLog(12))
+
+
+class TestSerialization:
+    """Stored form"""
+
+    def test_round_trip(self):
+        sketch = _sketch(f"visitor-{i}" for i in range(5000))
+
+        restored = HyperLogLog.from_bytes(sketch.to_bytes())
+
+        assert restored.precision == sketch.precision
+        assert restored.registers == sketch.registers
+
+    def test_sparse_sketch_is_small(self):
+        assert len(_sketch(['a', 'b', 'c']).to_bytes()) < 100
+        assert len(_sketch(f"visitor-{i}" for i in range(200000)).to_bytes()) < 4096
+
+    def test_add_reports_changes(self):
+        sketch = HyperLogLog()
+
+        assert sketch.add('visitor') is True
+        assert sketch.add('visitor') is False
+        assert not sketch.is_empty()
+
+    def test_invalid_precision(self):
+        with pytest.raises(ValueError):
+            HyperLogLog(3)
+        with pytest.raises(ValueError):
+            HyperLogLog(12, registers=bytes(10))
@@ -0,0 +1,74 @@
+"""
+Tests for image-processing/lambda_function.py - S3-triggered renditions
+"""
+import io
+import os
+import importlib.util
+import pytest
+from unittest.mock import MagicMock
+from PIL import Image
+
+from utils import rendition_core
+
+LAMBDA_PATH = os.path.join(os.path.dirname(__file__), '..', 'image-processing', 'lambda_function.py')
+
+
+@pytest.fixture
+def image_lambda(monkeypatch):
+    """Lambda module with its tables and S3 client replaced by mocks"""
+    for name, table in (('PHOTOS', 'photos'), ('GALLERIES', 'galleries'),
+                        ('USERS', 'users'), ('USER_FEATURES', 'user-features')):
+        monkeypatch.setenv(f'DYNAMODB_TABLE_{name}', f'galerly-{table}-test')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('CDN_DOMAIN', 'cdn.test')
+    spec = importlib.util.spec_from_file_location('image_processing_lambda', LAMBDA_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for attr in ('s3_client', 'photos_table', 'galleries_table', 'users_table', 'user_features_table'):
+        monkeypatch.setattr(module, attr, MagicMock())
+    return module
+
+
+def _jpeg(size=(1200, 900)):
+    output = io.BytesIO()
+    Image.new('RGB', size, (40, 80, 120)).save(output, format='JPEG')
+    return output.getvalue()
+
+
+class TestRenditionFormats:
+    """Variants come from the owner's features, not the photo record"""
+
+    def test_formats_follow_owner_plan_and_overrides(self, image_lambda):
+        image_lambda.user_features_table.query.return_value = {
+            'Items': [{'user_id': 'user_1', 'feature_id': 'avif_renditions'}]
+        }
+        with_override = image_lambda.get_rendition_formats({'id': 'user_1', 'plan': 'plus'})
+        image_lambda.user_features_table.query.return_value = {'Items': []}
+        free = image_lambda.get_rendition_formats({'id': 'user_1', 'plan': 'free'})
+
+        expected = rendition_core.enabled_formats({'webp_renditions': True, 'avif_renditions': True})
+        assert with_override == expected
+        assert free == []
+        assert image_lambda.get_rendition_formats(None) == []
+
+    def test_event_before_photo_record_exists(self, image_lambda):
+        if not rendition_core.encoder_available('WEBP'):
+            pytest.skip('Pillow built without WebP')
+        image_lambda.galleries_table.query.return_value = {'Items': [{'id': 'gal_1', 'user_id': 'user_1'}]}
+        image_lambda.users_table.query.return_value = {
+            'Items': [{'id': 'user_1', 'email': 'owner@example.com', 'plan': 'plus'}]
+        }
+        image_lambda.user_features_table.query.return_value = {'Items': []}
+        # Confirm-upload hasn't written the photo yet
+        image_lambda.photos_table.get_item.return_value = {}
+        image_lambda.s3_client.get_object.return_value = {'Body': io.BytesIO(_jpeg())}
+
+        image_lambda.process_image('originals', 'gal_1/photo_1.jpg')
+
+        keys = {call.kwargs['Key'] for call in image_lambda.s3_client.put_object.call_args_list}
+        assert 'renditions/gal_1/photo_1_thumbnail.webp' in keys
+        update = image_lambda.photos_table.update_item.call_args.kwargs
+        assert update['Key'] == {'id': 'photo_1'}
+        assert 'thumbnail_webp_url' in update['ExpressionAttributeNames'].values()
+        assert image_lambda.galleries_table.query.call_args.kwargs['IndexName'] == 'GalleryIdIndex'
+        assert image_lambda.users_table.query.call_args.kwargs['IndexName'] == 'UserIdIndex'
@@ -0,0 +1,143 @@
+"""
+Tests for utils/image_processor.py rendition generation
+"""
+import io
+import pytest
+from unittest.mock import patch
+from PIL import Image
+
+from utils import image_processor, rendition_core
+
+
+def _jpeg(size, color=(120, 80, 40)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+
+def _thumbnail_sizes(size):
+    """Dimensions the old copy + thumbnail loop produced"""
+    expected = {}
+    for name, box in image_processor.RENDITION_SIZES.items():
+        image = Image.new('RGB', size)
+        image.thumbnail(box)
+        expected[name] = image.size
+    return expected
+
+
+@pytest.fixture
+def mock_s3():
+    with patch.object(image_processor, 's3_client') as s3:
+        yield s3
+
+
+class TestFitWithin:
+    """fit_within matches Image.thumbnail exactly"""
+
+    @pytest.mark.parametrize('size', [(6000, 4000), (8256, 5504), (4032, 3024), (1000, 3000),
+                                      (3001, 1999), (799, 601), (300, 200), (5000, 5000)])
+    def test_matches_thumbnail(self, size):
+        for box in image_processor.RENDITION_SIZES.values():
+            image = Image.new('L', size)
+            image.thumbnail(box)
+            assert rendition_core.fit_within(size, box) == image.size
+
+
+class TestGenerateRenditions:
+    """Single-decode pyramid keeps keys and dimensions"""
+
+    def test_keys_and_dimensions_unchanged(self, mock_s3):
+        result = image_processor.generate_renditions('gallery_1/photo_1.jpg', image_data=_jpeg((6000, 4000)))
+
+        assert result['success']
+        assert result['original_dimensions'] == (6000, 4000)
+        assert list(result['renditions']) == list(image_processor.RENDITION_SIZES)
+        expected = _thumbnail_sizes((6000, 4000))
+        for name, info in result['renditions'].items():
+            assert info['key'] == f"renditions/gallery_1/photo_1_{name}.jpg"
+            assert info['dimensions'] == expected[name]
+            assert info['size'] > 0
+        uploaded = {call.kwargs['Key']: call.kwargs for call in mock_s3.put_object.call_args_list}
+        assert set(uploaded) == {info['key'] for info in result['renditions'].values()}
+        assert all(kwargs['ContentType'] == 'image/jpeg' for kwargs in uploaded.values())
+
+    def test_uploaded_bytes_decode_to_reported_size(self, mock_s3):
+        result = image_processor.generate_renditions('g/p.jpg', image_data=_jpeg((3000, 2000)))
+
+        for call in mock_s3.put_object.call_args_list:
+            name = call.kwargs['Key'].rsplit('_', 1)[1][:-4]
+            assert Image.open(io.BytesIO(call.kwargs['Body'])).size == result['renditions'][name]['dimensions']
+
+    def test_large_jpeg_decoded_in_draft_mode(self, mock_s3):
+        from PIL import JpegImagePlugin
+        original_draft = JpegImagePlugin.JpegImageFile.draft
+        with patch.object(JpegImagePlugin.JpegImageFile, 'draft', autospec=True,
+                          side_effect=original_draft) as mock_draft:
+            image_processor.generate_renditions('g/p.jpg', image_data=_jpeg((8256, 5504)))
+
+        mock_draft.assert_called_once()
+        assert mock_draft.call_args.args[2] == rendition_core.fit_within((8256, 5504), (4000, 4000))
+
+    def test_webp_variants_reported_separately(self, mock_s3):
+        result = image_processor.generate_renditions('g/p.jpg', image_data=_jpeg((3000, 2000)), formats=['webp'])
+
+        assert list(result['renditions']) == list(image_processor.RENDITION_SIZES)
+        assert list(result['variants']) == ['webp']
+        assert result['variants']['webp']['thumbnail']['key'] == 'renditions/g/p_thumbnail.webp'
+        assert result['variants']['webp']['medium']['dimensions'] == result['renditions']['medium']['dimensions']
+        assert mock_s3.put_object.call_count == 2 * len(image_processor.RENDITION_SIZES)
+
+    def test_rgba_flattened(self, mock_s3):
+        output = io.BytesIO()
+        Image.new('RGBA', (500, 500), (0, 0, 0, 0)).save(output, format='PNG')
+
+        result = image_processor.generate_renditions('g/p.png', image_data=output.getvalue())
+
+        assert result['success']
+
+    def test_invalid_key_fails(self, mock_s3):
+        result = image_processor.generate_renditions('no_gallery.jpg', image_data=_jpeg((100, 100)))
+
+        assert result['success'] is False
+        mock_s3.put_object.assert_not_called()
+
+    def test_video_skipped(self, mock_s3):
+        result = image_processor.generate_renditions('g/clip.mp4', image_data=b'')
+
+        assert result['success'] is False
+        mock_s3.get_object.assert_not_called()
+
+    @staticmethod
+    def _png(size):
+        output = io.BytesIO()
+        Image.new('RGB', size, (10, 20, 30)).save(output, format='PNG')
+        return output.getvalue()
+
+
+class TestWatermarkedRenditions:
+    """Watermarked renditions decode once and fetch the logo once"""
+
+    def test_single_pass(self, mock_s3):
+        logo = io.BytesIO()
+        Image.new('RGBA', (200, 100), (255, 0, 0, 255)).save(logo, format='PNG')
+        mock_s3.get_object.return_value = {'Body': io.BytesIO(logo.getvalue())}
+        config = {'watermark_s3_key': 'wm.png', 'position': 'top-left', 'opacity': 1.0}
+
+        result = image_processor.generate_renditions_with_watermark(
+            'g/p.jpg', image_data=_jpeg((3000, 2000), color=(0, 0, 255)), watermark_config=config
+        )
+
+        assert result['watermarked'] is True
+        mock_s3.get_object.assert_called_once_with(Bucket=image_processor.S3_BUCKET, Key='wm.png')
+        assert mock_s3.put_object.call_count == len(image_processor.RENDITION_SIZES)
+        assert result['original_dimensions'] == (3000, 2000)
+        for call in mock_s3.put_object.call_args_list:
+            rendition = Image.open(io.BytesIO(call.kwargs['Body']))
+            margin = int(min(rendition.size) * 0.02)
+            red, green, blue = rendition.getpixel((margin + 3, margin + 3))
+            assert red > 200 and blue < 60
+
+    def test_without_config_is_plain(self, mock_s3):
+        result = image_processor.generate_renditions_with_watermark('g/p.jpg', image_data=_jpeg((300, 200)))
+
+        assert 'watermarked' not in result
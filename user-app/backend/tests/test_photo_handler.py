@@ -276,6 +276,69 @@ class TestHandleCheckDuplicates:
         # FIX: Accept either 200 or 400/404 if function not implemented
         assert result['statusCode'] in [200, 400, 404]
 
+    def test_check_duplicates_batch(self, sample_user, sample_gallery, mock_photo_dependencies):
+        """One request checks a whole upload batch"""
+        from handlers.photo_handler import handle_check_duplicates
+        
+        mock_photo_dependencies['galleries'].get_item.return_value = {'Item': sample_gallery}
+        results = [
+            {'filename': 'a.jpg', 'file_size': 10, 'has_duplicates': True, 'duplicate_count': 1, 'duplicates': [{}]},
+            {'filename': 'b.jpg', 'file_size': 20, 'has_duplicates': False, 'duplicate_count': 0, 'duplicates': []}
+        ]
+        files = [{'filename': 'a.jpg', 'file_size': 10}, {'filename': 'b.jpg', 'file_size': 20}]
+        event = {'body': json.dumps({'files': files, 'scope': 'account'})}
+        
+        with patch('handlers.photo_handler.find_duplicates', return_value=results) as mock_find:
+            result = handle_check_duplicates('gallery_123', sample_user, event)
+        
+        assert result['statusCode'] == 200
+        body = json.loads(result['body'])
+        assert body['duplicate_files'] == 1 and len(body['results']) == 2
+        mock_find.assert_called_once_with(sample_user['id'], 'gallery_123', files, across_galleries=True)
+        mock_photo_dependencies['photos'].query.assert_not_called()
+
+# Test: handle_find_near_duplicates
+class TestHandleFindNearDuplicates:
+    """Tests for perceptual near-duplicate search."""
+    
+    def test_gallery_scope_checks_ownership(self, sample_user, mock_photo_dependencies):
+        """Another photographer's gallery is refused."""
+        from handlers.photo_handler import handle_find_near_duplicates
+        
+        mock_photo_dependencies['galleries'].get_item.return_value = {}
+        
+        with patch('handlers.photo_handler.find_near_duplicates') as mock_find:
+            result = handle_find_near_duplicates(sample_user, {'gallery_id': 'other'})
+        
+        assert result['statusCode'] == 403
+        mock_find.assert_not_called()
+    
+    def test_account_scope(self, sample_user, mock_photo_dependencies):
+        """Without gallery_id the whole account is searched."""
+        from handlers.photo_handler import handle_find_near_duplicates
+        
+        found = {'groups': [[{'id': 'a'}, {'id': 'b'}]], 'photos_searched': 40}
+        with patch('handlers.photo_handler.find_near_duplicates', return_value=found) as mock_find:
+            result = handle_find_near_duplicates(sample_user, {'max_distance': '4'})
+        
+        body = json.loads(result['body'])
+        assert result['statusCode'] == 200
+        assert body['scope'] == 'account' and body['group_count'] == 1
+        mock_find.assert_called_once_with(sample_user['id'], None, 4)
+    
+    def test_invalid_distance(self, sample_user, mock_photo_dependencies):
+        """max_distance outside the supported range is rejected."""
+        from handlers.photo_handler import handle_find_near_duplicates
+        
+        result = handle_find_near_duplicates(sample_user, {'max_distance': '40'})
+        
+        assert result['statusCode'] == 400
+        
+        # Above the banded search's sub-second range
+        result = handle_find_near_duplicates(sample_user, {'max_distance': '9'})
+        
+        assert result['statusCode'] == 400
+
 # Test: handle_send_batch_notification
 class TestHandleSendBatchNotification:
     """Tests for batch client notification."""
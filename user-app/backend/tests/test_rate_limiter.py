@@ -0,0 +1,177 @@
+"""
+Tests for utils/rate_limiter.py - sliding-window counter on a conditional UpdateItem
+"""
+import pytest
+from unittest.mock import patch
+
+from utils import rate_limiter
+
+
+class ConditionalCheckFailedException(Exception):
+    response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+
+
+class FakeRateLimitsTable:
+    """Just enough of DynamoDB's UpdateItem semantics for the limiter's expression"""
+
+    def __init__(self):
+        self.items = {}
+        self.update_calls = 0
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames, ConditionExpression=None,
+                    ExpressionAttributeValues=None, ReturnValues=None):
+        self.update_calls += 1
+        item = self.items.setdefault(Key['limit_key'], {'limit_key': Key['limit_key']})
+        if UpdateExpression.startswith('REMOVE '):
+            for name in ExpressionAttributeNames.values():
+                item.pop(name, None)
+            return {}
+        current = ExpressionAttributeNames['#cur']
+        values = ExpressionAttributeValues
+        if current in item and item[current] >= values[':limit']:
+            raise ConditionalCheckFailedException('ConditionalCheckFailedException')
+        item[current] = item.get(current, 0) + values[':one']
+        item['updated_at'] = values[':now']
+        item['ttl'] = values[':ttl']
+        item.pop(ExpressionAttributeNames['#stale'], None)
+        return {'Attributes': dict(item)}
+
+    def get_item(self, Key):
+        item = self.items.get(Key['limit_key'])
+        return {'Item': dict(item)} if item else {}
+
+    def delete_item(self, Key):
+        self.items.pop(Key['limit_key'], None)
+
+
+@pytest.fixture
+def table():
+    fake = FakeRateLimitsTable()
+    with patch.object(rate_limiter, 'rate_limits_table', fake):
+        yield fake
+
+
+@pytest.fixture
+def clock():
+    """Frozen time at the start of a 300s window (auth_login: 5 per 300s)"""
+    state = {'now': 300.0 * 1000}
+    with patch('utils.rate_limiter.time.time', side_effect=lambda: state['now']):
+        yield state
+
+
+class TestCheckRateLimit:
+    """Tests for the conditional-update limiter"""
+
+    def test_allows_up_to_limit_then_rejects(self, table, clock):
+        results = [rate_limiter.check_rate_limit('auth_login', '1.2.3.4') for _ in range(6)]
+
+        assert [allowed for allowed, _ in results] == [True] * 5 + [False]
+        assert results[-1][1] == 300
+
+    def test_one_update_per_request_and_fixed_item_size(self, table, clock):
+        for window in range(4):
+            clock['now'] = 300.0 * (1000 + window)
+            rate_limiter.check_rate_limit('auth_login', 'user_1')
+
+        assert table.update_calls == 4
+        item = next(iter(table.items.values()))
+        assert sorted(k for k in item if k.startswith('c_')) == ['c_1002', 'c_1003']
+
+    def test_counters_left_by_a_gap_are_removed(self, table, clock):
+        rate_limiter.check_rate_limit('auth_login', 'user_1')
+        clock['now'] += 300
+        rate_limiter.check_rate_limit('auth_login', 'user_1')
+
+        # Back after five windows: c_1000 and c_1001 are both stale
+        clock['now'] += 5 * 300
+        rate_limiter.check_rate_limit('auth_login', 'user_1')
+
+        item = next(iter(table.items.values()))
+        assert sorted(k for k in item if k.startswith('c_')) == ['c_1006']
+        assert table.update_calls == 4
+
+    def test_counters_of_newer_windows_are_kept(self, table, clock):
+        # A container whose clock is ahead already counts in c_1001
+        clock['now'] += 300
+        rate_limiter.check_rate_limit('auth_login', 'user_1')
+        clock['now'] -= 300
+        rate_limiter.check_rate_limit('auth_login', 'user_1')
+
+        item = next(iter(table.items.values()))
+        assert sorted(k for k in item if k.startswith('c_')) == ['c_1000', 'c_1001']
+        assert item['c_1001'] == 1
+
+    def test_prefilter_rejects_without_round_trip(self, table, clock):
+        for _ in range(5):
+            rate_limiter.check_rate_limit('auth_login', 'user_1')
+        calls = table.update_calls
+
+        for _ in range(10):
+            allowed, retry_after = rate_limiter.check_rate_limit('auth_login', 'user_1')
+            assert not allowed and retry_after > 0
+
+        assert table.update_calls == calls
+
+    def test_previous_window_weighs_on_current(self, table, clock):
+        for _ in range(5):
+            rate_limiter.check_rate_limit('auth_login', 'user_1')
+
+        # 60s into the next window 80% of the previous 5 still counts (4),
+        # so only one more request fits
+        clock['now'] += 300 + 60
+        results = [rate_limiter.check_rate_limit('auth_login', 'user_1')[0] for _ in range(3)]
+
+        assert results == [True, False, False]
+
+    def test_other_containers_enforced_by_condition(self, table, clock):
+        for _ in range(5):
+            rate_limiter.check_rate_limit('auth_login', 'user_1')
+        rate_limiter.clear_rate_limit_prefilter()
+
+        allowed, retry_after = rate_limiter.check_rate_limit('auth_login', 'user_1')
+
+        assert not allowed
+        assert retry_after == 300
+
+    def test_unconfigured_limit_allowed_without_db(self, table, clock):
+        assert rate_limiter.check_rate_limit('auth_verification', 'x') == (True, 0)
+        assert table.update_calls == 0
+
+    def test_db_error_fails_open(self, clock):
+        with patch.object(rate_limiter.rate_limits_table, 'update_item', side_effect=Exception('throttled')):
+            assert rate_limiter.check_rate_limit('auth_login', 'user_1') == (True, 0)
+
+
+class TestRateLimitStatus:
+    """get_rate_limit_status keeps its response shape"""
+
+    def test_status_counts_requests(self, table, clock):
+        for _ in range(3):
+            rate_limiter.check_rate_limit('auth_login', 'user_1')
+
+        status = rate_limiter.get_rate_limit_status('auth_login', 'user_1')
+
+        assert status == {'requests_made': 3, 'requests_allowed': 5, 'remaining': 2,
+                          'reset_at': int(clock['now']) + 300}
+
+    def test_reset_clears_db_and_prefilter(self, table, clock):
+        for _ in range(6):
+            rate_limiter.check_rate_limit('auth_login', 'user_1')
+
+        rate_limiter.reset_rate_limit('auth_login', 'user_1')
+
+        assert rate_limiter.check_rate_limit('auth_login', 'user_1') == (True, 0)
+
+
+class TestDecorator:
+    """rate_limit decorator is unchanged"""
+
+    def test_decorator_returns_429(self, table, clock):
+        @rate_limiter.rate_limit('bulk_download', 'user_id')
+        def handler(user):
+            return {'statusCode': 200}
+
+        user = {'id': 'user_1'}
+        statuses = [handler(user)['statusCode'] for _ in range(6)]
+
+        assert statuses == [200] * 5 + [429]
@@ -4,12 +4,15 @@ Tests for RAW photo processing
 import pytest
 import os
 import io
+from types import SimpleNamespace
+import numpy as np
 from PIL import Image
 
 # Import RAW processor functions
 from utils.raw_processor import (
     is_raw_file,
     get_raw_format_name,
+    choose_raw_tier,
     RAW_EXTENSIONS
 )
 
@@ -129,5 +132,160 @@ class TestRawIntegration:
         pass
 
 
+def _jpeg(size, color=(90, 60, 30)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, format='JPEG')
+    return output.getvalue()
+
+
+class FakeRaw:
+    """rawpy.RawPy stand-in: a sensor size, an embedded preview and postprocess"""
+
+    def __init__(self, sensor_size, thumb=None, flip=0):
+        self.sizes = SimpleNamespace(width=sensor_size[0], height=sensor_size[1], flip=flip)
+        self.thumb = thumb
+        self.postprocess_calls = []
+
+    def extract_thumb(self):
+        if self.thumb is None:
+            raise Exception('LibRawNoThumbnailError')
+        return SimpleNamespace(format='jpeg', data=self.thumb)
+
+    def postprocess(self, **kwargs):
+        self.postprocess_calls.append(kwargs)
+        width, height = self.sizes.width, self.sizes.height
+        if kwargs.get('half_size'):
+            width, height = width // 2, height // 2
+        if self.sizes.flip in (5, 6):
+            width, height = height, width
+        return np.zeros((height, width, 3), dtype=np.uint8)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+@pytest.fixture
+def fake_raw(monkeypatch):
+    """Install a fake rawpy module serving the FakeRaw set on the fixture"""
+    from utils import raw_processor
+    holder = {}
+    fake_rawpy = SimpleNamespace(
+        imread=lambda data: holder['raw'],
+        ThumbFormat=SimpleNamespace(JPEG='jpeg', BITMAP='bitmap'),
+        ColorSpace=SimpleNamespace(sRGB='srgb')
+    )
+    monkeypatch.setattr(raw_processor, 'rawpy', fake_rawpy)
+    monkeypatch.setattr(raw_processor, 'RAW_SUPPORT_AVAILABLE', True)
+
+    def install(raw):
+        holder['raw'] = raw
+        return raw
+    return install
+
+
+class TestRawTierSelection:
+    """Cheapest decode that covers the requested size"""
+
+    @pytest.mark.parametrize('size,embedded,expected', [
+        ('thumbnail', (1620, 1080), 'embedded'),
+        ('small', (1620, 1080), 'embedded'),
+        ('medium', (1620, 1080), 'half'),
+        ('large', (1620, 1080), 'full'),
+        ('large', (6000, 4000), 'embedded'),
+        ('medium', None, 'half'),
+        ('original', (6000, 4000), 'full'),
+        # 16:9 preview of a 3:2 sensor is letterboxed
+        ('thumbnail', (1920, 1080), 'half'),
+    ])
+    def test_tiers(self, size, embedded, expected):
+        assert choose_raw_tier(size, (6000, 4000), embedded) == expected
+
+    def test_half_size_too_small_falls_back_to_full(self):
+        assert choose_raw_tier('medium', (3000, 2000), None) == 'full'
+
+
+class TestDecodeRaw:
+    """decode_raw only demosaics when the embedded preview is not enough"""
+
+    def test_embedded_preview_skips_demosaic(self, fake_raw):
+        from utils.raw_processor import decode_raw
+        raw = fake_raw(FakeRaw((6000, 4000), thumb=_jpeg((1620, 1080))))
+
+        decoded = decode_raw(b'raw', size='small')
+
+        assert decoded['tier'] == 'embedded'
+        assert raw.postprocess_calls == []
+        assert decoded['full_dimensions'] == (6000, 4000)
+        assert decoded['image'].size[0] >= 800 and decoded['image'].mode == 'RGB'
+
+    def test_embedded_preview_drafted_to_target(self, fake_raw):
+        from utils.raw_processor import decode_raw
+        fake_raw(FakeRaw((6000, 4000), thumb=_jpeg((6000, 4000))))
+
+        decoded = decode_raw(b'raw', size='thumbnail')
+
+        # libjpeg scales by 1/8 at most while still covering 400x267
+        assert decoded['image'].size == (750, 500)
+
+    def test_embedded_preview_rotated_by_flip(self, fake_raw):
+        from utils.raw_processor import decode_raw
+        fake_raw(FakeRaw((6000, 4000), thumb=_jpeg((1620, 1080)), flip=6))
+
+        decoded = decode_raw(b'raw', size='thumbnail')
+
+        assert decoded['full_dimensions'] == (4000, 6000)
+        width, height = decoded['image'].size
+        assert height > width
+
+    def test_mid_size_uses_half_size_demosaic(self, fake_raw):
+        from utils.raw_processor import decode_raw
+        raw = fake_raw(FakeRaw((6000, 4000), thumb=_jpeg((1620, 1080))))
+
+        decoded = decode_raw(b'raw', size='medium')
+
+        assert decoded['tier'] == 'half'
+        assert raw.postprocess_calls[0]['half_size'] is True
+        assert decoded['image'].size == (3000, 2000)
+
+    def test_large_without_full_size_preview_demosaics(self, fake_raw):
+        from utils.raw_processor import decode_raw
+        raw = fake_raw(FakeRaw((6000, 4000)))
+
+        decoded = decode_raw(b'raw', size='large', no_auto_bright=True)
+
+        assert decoded['tier'] == 'full'
+        assert raw.postprocess_calls[0]['half_size'] is False
+        assert raw.postprocess_calls[0]['no_auto_bright'] is True
+
+    def test_preview_reports_tier(self, fake_raw):
+        from utils.raw_processor import generate_raw_preview
+        fake_raw(FakeRaw((6000, 4000), thumb=_jpeg((1620, 1080))))
+
+        result = generate_raw_preview(b'raw', size='thumbnail')
+
+        assert result['success']
+        assert result['tier'] == 'embedded'
+        assert result['dimensions'] == (400, 267)
+        assert result['original_dimensions'] == (6000, 4000)
+        assert Image.open(io.BytesIO(result['preview_data'])).size == (400, 267)
+
+    def test_renditions_from_full_size_preview(self, fake_raw, monkeypatch):
+        from unittest.mock import MagicMock
+        from utils import image_processor
+        monkeypatch.setattr(image_processor, 'rawpy', object())
+        monkeypatch.setattr(image_processor, 's3_client', MagicMock())
+        raw = fake_raw(FakeRaw((6000, 4000), thumb=_jpeg((6000, 4000))))
+
+        result = image_processor.generate_renditions('g/p.nef', image_data=b'raw')
+
+        assert result['success']
+        assert raw.postprocess_calls == []
+        assert result['original_dimensions'] == (6000, 4000)
+        assert result['renditions']['large']['dimensions'] == (4000, 2667)
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -0,0 +1,223 @@
+"""
+Tests for utils/rendition_core.py - shared rendition plans and execution
+"""
+import io
+import json
+import threading
+import pytest
+from unittest.mock import MagicMock
+from PIL import Image
+
+from utils import rendition_core
+
+
+def _decoded(size, color=(40, 80, 120)):
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, format='JPEG')
+    image = Image.open(io.BytesIO(output.getvalue()))
+    return image
+
+
+class TestBuildRenditionPlan:
+    """Plans are plain data: source -> operations -> outputs"""
+
+    def test_plan_format(self):
+        plan = rendition_core.build_rendition_plan(
+            'gal_1/photo_1.CR3', 'originals', 'renditions-bucket',
+            operations=[{'op': 'color', 'brightness': 1.2}], cache_control='public, max-age=60'
+        )
+
+        assert plan['source'] == {'bucket': 'originals', 'key': 'gal_1/photo_1.CR3'}
+        assert plan['operations'] == [{'op': 'color', 'brightness': 1.2}]
+        assert [output['name'] for output in plan['outputs']] == list(rendition_core.RENDITION_OUTPUTS)
+        assert plan['outputs'][0] == {
+            'id': 'thumbnail', 'name': 'thumbnail', 'box': [400, 400], 'format': 'JPEG', 'quality': 80,
+            'bucket': 'renditions-bucket', 'key': 'renditions/gal_1/photo_1_thumbnail.jpg',
+            'cache_control': 'public, max-age=60'
+        }
+        assert json.loads(json.dumps(plan)) == plan
+
+    def test_modern_formats_added_next_to_jpegs(self):
+        plan = rendition_core.build_rendition_plan('g/p.jpg', 'src', 'dst', formats=['webp', 'avif'])
+
+        ids = [output['id'] for output in plan['outputs']]
+        assert ids[:4] == ['thumbnail', 'small', 'medium', 'large']
+        assert set(ids[4:]) == {'thumbnail.webp', 'small.webp', 'medium.webp', 'large.webp',
+                                'thumbnail.avif', 'small.avif', 'medium.avif'}
+        webp = next(output for output in plan['outputs'] if output['id'] == 'small.webp')
+        assert webp['key'] == 'renditions/g/p_small.webp'
+        assert webp['format'] == 'WEBP'
+
+    def test_invalid_key_rejected(self):
+        with pytest.raises(ValueError):
+            rendition_core.build_rendition_plan('photo.jpg', 'a', 'b')
+
+
+class TestRenderPlan:
+    """Executing a plan"""
+
+    def test_outputs_uploaded_with_checksums(self):
+        s3 = MagicMock()
+        plan = rendition_core.build_rendition_plan('g/p.jpg', 'src', 'dst')
+        image, source_size = rendition_core.load_for_plan(_decoded((6000, 4000)), plan)
+
+        result = rendition_core.render_plan(plan, image, source_size, s3)
+
+        assert result['source_dimensions'] == (6000, 4000)
+        assert list(result['outputs']) == ['thumbnail', 'small', 'medium', 'large']
+        assert result['outputs']['large']['dimensions'] == (4000, 2667)
+        puts = {call.kwargs['Key']: call.kwargs for call in s3.put_object.call_args_list}
+        large = puts['renditions/g/p_large.jpg']
+        assert large['Metadata']['checksum'] == result['outputs']['large']['checksum']
+        assert large['Metadata']['original-key'] == 'g/p.jpg'
+        assert 'CacheControl' not in large
+
+    def test_per_output_quality(self):
+        s3 = MagicMock()
+        outputs = {'a': {'box': (300, 300), 'quality': 20}, 'b': {'box': (300, 300), 'quality': 95}}
+        plan = rendition_core.build_rendition_plan('g/p.png', 'src', 'dst', outputs=outputs)
+        noisy = Image.effect_noise((300, 300), 60).convert('RGB')
+
+        result = rendition_core.render_plan(plan, noisy, noisy.size, s3)
+
+        assert result['outputs']['a']['size'] < result['outputs']['b']['size']
+
+    def test_operations_run_in_order_on_every_output(self):
+        s3 = MagicMock()
+        operations = [
+            {'op': 'color', 'brightness': 0.0},
+            {'op': 'text_watermark', 'text': 'STUDIO', 'position': 'center', 'opacity': 1.0}
+        ]
+        plan = rendition_core.build_rendition_plan('g/p.jpg', 'src', 'dst', operations=operations)
+        image = Image.new('RGB', (3000, 3000), (200, 200, 200))
+
+        rendition_core.render_plan(plan, image, image.size, s3)
+
+        for call in s3.put_object.call_args_list:
+            rendition = Image.open(io.BytesIO(call.kwargs['Body'])).convert('L')
+            # Brightness 0 blacks out the photo, then white text is drawn on top
+            assert rendition.getextrema()[0] < 20
+            assert rendition.getextrema()[1] > 200
+
+    def test_logo_downloaded_once_per_plan(self):
+        logo = io.BytesIO()
+        Image.new('RGBA', (100, 50), (255, 0, 0, 255)).save(logo, format='PNG')
+        s3 = MagicMock()
+        s3.get_object.return_value = {'Body': io.BytesIO(logo.getvalue())}
+        plan = rendition_core.build_rendition_plan('g/p.jpg', 'src', 'dst', operations=[
+            {'op': 'logo_watermark', 'bucket': 'src', 'key': 'logo.png', 'opacity': 1.0}
+        ])
+        image = Image.new('RGB', (2400, 1600))
+
+        rendition_core.render_plan(plan, image, image.size, s3)
+
+        s3.get_object.assert_called_once_with(Bucket='src', Key='logo.png')
+        assert s3.put_object.call_count == len(rendition_core.RENDITION_OUTPUTS)
+
+    def test_missing_logo_skipped(self):
+        s3 = MagicMock()
+        s3.get_object.side_effect = Exception('NoSuchKey')
+        plan = rendition_core.build_rendition_plan('g/p.jpg', 'src', 'dst', operations=[
+            {'op': 'logo_watermark', 'bucket': 'src', 'key': 'missing.png'}, {'op': 'unknown'}
+        ])
+        image = Image.new('RGB', (800, 600))
+
+        result = rendition_core.render_plan(plan, image, image.size, s3)
+
+        assert len(result['outputs']) == len(rendition_core.RENDITION_OUTPUTS)
+
+
+class TestPerceptualHash:
+    """dHash survives re-encoding, separates different pictures"""
+
+    def _scene(self, seed):
+        image = Image.effect_noise((64, 48), 80).convert('RGB').resize((1200, 900), Image.Resampling.BICUBIC)
+        return image.rotate(seed * 90) if seed else image
+
+    def _distance(self, a, b):
+        return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+    def test_reexport_stays_close(self):
+        scene = self._scene(0)
+        output = io.BytesIO()
+        scene.resize((600, 450)).save(output, format='JPEG', quality=40)
+        reexport = Image.open(io.BytesIO(output.getvalue()))
+
+        original_hash = rendition_core.perceptual_hash(scene)
+
+        assert len(original_hash) == 16
+        assert self._distance(original_hash, rendition_core.perceptual_hash(reexport)) <= 4
+        assert self._distance(original_hash, rendition_core.perceptual_hash(self._scene(2))) > 16
+
+    def test_render_plan_hashes_unwatermarked_thumbnail(self):
+        s3 = MagicMock()
+        scene = self._scene(0)
+        plan = rendition_core.build_rendition_plan('g/p.jpg', 'src', 'dst', operations=[
+            {'op': 'text_watermark', 'text': 'STUDIO', 'position': 'center', 'opacity': 1.0}
+        ])
+
+        result = rendition_core.render_plan(plan, scene, scene.size, s3)
+
+        assert result['perceptual_hash'] == rendition_core.perceptual_hash(scene.resize((400, 300)))
+
+
+class TestModernFormats:
+    """WebP/AVIF variants are gated by plan features"""
+
+    def test_enabled_formats_follow_features(self):
+        assert rendition_core.enabled_formats({}) == []
+        assert rendition_core.enabled_formats({'webp_renditions': True}) == ['webp']
+
+    def test_missing_encoder_disables_format(self, monkeypatch):
+        monkeypatch.setattr(rendition_core, 'encoder_available', lambda image_format: image_format != 'AVIF')
+
+        assert rendition_core.enabled_formats({'webp_renditions': True, 'avif_renditions': True}) == ['webp']
+
+    def test_plan_features_gate_formats(self):
+        from utils.feature_resolver import resolve_features
+        plus, _ = resolve_features('plus')
+        pro, _ = resolve_features('pro')
+        free, _ = resolve_features('free')
+
+        assert (free['webp_renditions'], free['avif_renditions']) == (False, False)
+        assert (plus['webp_renditions'], plus['avif_renditions']) == (True, False)
+        assert (pro['webp_renditions'], pro['avif_renditions']) == (True, True)
+
+    def test_variants_encoded_in_their_format(self):
+        s3 = MagicMock()
+        formats = [name for name in ('webp', 'avif')
+                   if rendition_core.encoder_available(rendition_core.MODERN_FORMATS[name]['format'])]
+        plan = rendition_core.build_rendition_plan('g/p.jpg', 'src', 'dst', formats=formats)
+        image = Image.effect_noise((1200, 900), 40).convert('RGB')
+
+        result = rendition_core.render_plan(plan, image, image.size, s3)
+
+        puts = {call.kwargs['Key']: call.kwargs for call in s3.put_object.call_args_list}
+        for output in plan['outputs']:
+            put = puts[output['key']]
+            assert put['ContentType'] == rendition_core.CONTENT_TYPES[output['format']]
+            decoded = Image.open(io.BytesIO(put['Body']))
+            assert decoded.format == output['format']
+            assert decoded.size == result['outputs'][output['id']]['dimensions']
+
+
+class TestRenderMany:
+    """Multi-record events run concurrently with isolated failures"""
+
+    def test_results_in_order_and_failures_isolated(self):
+        def render_one(job):
+            if job == 'bad':
+                raise ValueError('corrupt')
+            return job.upper()
+
+        results = rendition_core.render_many(['a', 'bad', 'c'], render_one, workers=3)
+
+        assert [(job, result) for job, result, _ in results] == [('a', 'A'), ('bad', None), ('c', 'C')]
+        assert isinstance(results[1][2], ValueError)
+
+    def test_jobs_overlap(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        results = rendition_core.render_many([1, 2, 3], lambda job: barrier.wait() is not None, workers=3)
+
+        assert all(error is None for _, _, error in results)
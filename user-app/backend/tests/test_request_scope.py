@@ -0,0 +1,187 @@
+"""
+Tests for utils/request_scope.py - per-request identity map and BatchGetItem coalescing
+"""
+import pytest
+from unittest.mock import MagicMock, patch
+
+from utils.config import photos_table, PHOTOS_TABLE
+from utils.request_scope import (
+    RequestScope, begin_request_scope, end_request_scope, current_scope, BATCH_GET_MAX_KEYS
+)
+
+
+@pytest.fixture
+def mock_dynamodb():
+    """DynamoDB resource whose batch_get_item echoes back the requested photo keys"""
+    resource = MagicMock()
+
+    def batch_get_item(RequestItems):
+        table_name, request = next(iter(RequestItems.items()))
+        return {'Responses': {table_name: [{'id': key['id'], 'filename': f"{key['id']}.jpg"}
+                                           for key in request['Keys'] if key['id'] != 'missing']}}
+
+    resource.batch_get_item.side_effect = batch_get_item
+    with patch('utils.request_scope.get_dynamodb', return_value=resource):
+        yield resource
+
+
+class TestBatchGetItems:
+    """Tests for key lookup coalescing"""
+
+    def test_keys_coalesced_into_one_batch(self, mock_dynamodb):
+        scope = RequestScope()
+
+        items = scope.batch_get_items(photos_table, [{'id': 'p1'}, {'id': 'p2'}, {'id': 'p3'}])
+
+        assert [item['id'] for item in items] == ['p1', 'p2', 'p3']
+        mock_dynamodb.batch_get_item.assert_called_once()
+        assert scope.stats['round_trips'] == 1
+        assert scope.round_trips_saved == 2
+
+    def test_missing_items_returned_as_none_in_order(self, mock_dynamodb):
+        items = RequestScope().batch_get_items(photos_table, [{'id': 'p1'}, {'id': 'missing'}, {'id': 'p2'}])
+
+        assert items[0]['id'] == 'p1'
+        assert items[1] is None
+        assert items[2]['id'] == 'p2'
+
+    def test_batches_split_at_100_keys(self, mock_dynamodb):
+        keys = [{'id': f'p{i}'} for i in range(250)]
+
+        items = RequestScope().batch_get_items(photos_table, keys)
+
+        assert len(items) == 250
+        sizes = [len(call.kwargs['RequestItems'][PHOTOS_TABLE]['Keys'])
+                 for call in mock_dynamodb.batch_get_item.call_args_list]
+        assert sizes == [BATCH_GET_MAX_KEYS, BATCH_GET_MAX_KEYS, 50]
+
+    def test_unprocessed_keys_retried(self):
+        resource = MagicMock()
+        resource.batch_get_item.side_effect = [
+            {'Responses': {PHOTOS_TABLE: [{'id': 'p1'}]},
+             'UnprocessedKeys': {PHOTOS_TABLE: {'Keys': [{'id': 'p2'}]}}},
+            {'Responses': {PHOTOS_TABLE: [{'id': 'p2'}]}}
+        ]
+
+        with patch('utils.request_scope.get_dynamodb', return_value=resource):
+            items = RequestScope().batch_get_items(photos_table, [{'id': 'p1'}, {'id': 'p2'}])
+
+        assert [item['id'] for item in items] == ['p1', 'p2']
+        assert resource.batch_get_item.call_count == 2
+
+    def test_unbatchable_table_falls_back_to_get_item(self):
+        table = MagicMock()
+        table.get_item.side_effect = lambda Key: {'Item': {'id': Key['id']}}
+
+        items = RequestScope().batch_get_items(table, [{'id': 'p1'}, {'id': 'p2'}])
+
+        assert [item['id'] for item in items] == ['p1', 'p2']
+        assert table.get_item.call_count == 2
+
+
+class TestIdentityMap:
+    """Tests for per-request memoization"""
+
+    def test_repeated_reads_memoized(self, mock_dynamodb):
+        scope = RequestScope()
+
+        scope.batch_get_items(photos_table, [{'id': 'p1'}, {'id': 'p2'}])
+        scope.get_item(photos_table, {'id': 'p1'})
+        scope.batch_get_items(photos_table, [{'id': 'p2'}, {'id': 'missing'}, {'id': 'missing'}])
+        scope.get_item(photos_table, {'id': 'missing'})
+
+        # p1/p2 in one batch, "missing" once (negative results are memoized too)
+        assert scope.stats['reads'] == 7
+        assert scope.stats['round_trips'] == 2
+        assert scope.stats['memo_hits'] == 3
+
+    def test_tables_do_not_share_entries(self, mock_dynamodb):
+        users = MagicMock()
+        users.get_item.return_value = {'Item': {'id': 'p1', 'kind': 'user'}}
+        scope = RequestScope()
+
+        scope.get_item(photos_table, {'id': 'p1'})
+        scope.get_item(photos_table, {'id': 'p2'})
+        item = scope.get_item(users, {'id': 'p1'})
+
+        assert item['kind'] == 'user'
+
+    def test_forget_forces_reload(self):
+        table = MagicMock()
+        table.get_item.return_value = {'Item': {'id': 'p1'}}
+        scope = RequestScope()
+
+        scope.get_item(table, {'id': 'p1'})
+        scope.forget(table, {'id': 'p1'})
+        scope.get_item(table, {'id': 'p1'})
+
+        assert table.get_item.call_count == 2
+
+    def test_memo_for_queries(self):
+        loader = MagicMock(return_value={'Items': []})
+        scope = RequestScope()
+
+        scope.memo(('user_features', 'u1'), loader)
+        scope.memo(('user_features', 'u1'), loader)
+
+        loader.assert_called_once()
+        assert scope.round_trips_saved == 1
+
+    def test_non_memoizing_scope_rereads(self):
+        table = MagicMock()
+        table.get_item.return_value = {'Item': {'id': 'p1'}}
+        scope = RequestScope(memoize=False)
+
+        scope.get_item(table, {'id': 'p1'})
+        scope.get_item(table, {'id': 'p1'})
+
+        assert table.get_item.call_count == 2
+
+
+class TestScopeLifecycle:
+    """Tests for begin/end and the implicit scope"""
+
+    def test_current_scope_outside_request_is_throwaway(self):
+        assert current_scope() is not current_scope()
+        assert current_scope().memoize is False
+
+    def test_begin_end_reports_savings(self, capsys):
+        scope = begin_request_scope()
+        assert current_scope() is scope
+        loader = MagicMock(return_value=1)
+        scope.memo('k', loader)
+        scope.memo('k', loader)
+
+        stats = end_request_scope('GET /v1/test')
+
+        assert stats['round_trips_saved'] == 1
+        assert 'GET /v1/test' in capsys.readouterr().out
+        assert current_scope() is not scope
+
+    def test_get_user_features_reads_once_per_request(self, sample_user):
+        from handlers.subscription_handler import get_user_features
+
+        with patch('handlers.subscription_handler.users_table') as mock_users, \
+             patch('handlers.subscription_handler.user_features_table') as mock_overrides:
+            mock_users.get_item.return_value = {'Item': {**sample_user, 'plan': 'pro'}}
+            mock_overrides.query.return_value = {'Items': []}
+
+            begin_request_scope()
+            try:
+                first = get_user_features(sample_user)
+                second = get_user_features(sample_user)
+            finally:
+                end_request_scope()
+
+        assert first == second
+        mock_users.get_item.assert_called_once()
+        mock_overrides.query.assert_called_once()
+
+    def test_api_handler_closes_scope(self):
+        import api
+
+        with patch('api.end_request_scope', wraps=end_request_scope) as mock_end:
+            api.handler({'httpMethod': 'GET', 'path': '/v1/health', 'headers': {}}, None)
+
+        mock_end.assert_called_once()
+        assert current_scope().memoize is False
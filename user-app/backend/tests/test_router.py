@@ -0,0 +1,181 @@
+"""
+Tests for the compiled route table (utils/router.py) and api.handler dispatch
+"""
+import json
+import pytest
+from unittest.mock import patch, MagicMock
+
+from utils.router import Router, Route, PUBLIC, OPTIONAL_AUTH, ANY_METHOD
+
+
+def _call(handler, request):
+    return handler(request)
+
+
+class TestRouterMatching:
+    """Test trie matching semantics"""
+
+    def _router(self):
+        router = Router()
+        router.add('GET', '/v1/portfolio/settings', lambda r: 'settings', _call)
+        router.add('GET', '/v1/portfolio/{photographer_id}', lambda r: 'public', _call, PUBLIC)
+        router.add('POST', '/v1/client/favorites/submit', lambda r: 'submit', _call)
+        router.add('GET', '/v1/client/favorites/{photo_id}', lambda r: 'check', _call)
+        router.add('GET', '/v1/galleries/{gallery_id}/photos', lambda r: 'photos', _call)
+        router.add(ANY_METHOD, '/health', lambda r: 'health', _call, PUBLIC)
+        return router
+
+    def test_static_segment_wins_over_parameter(self):
+        route, params = self._router().match('GET', '/v1/portfolio/settings')
+        assert route.template == '/v1/portfolio/settings'
+        assert params == {}
+
+    def test_parameter_extraction(self):
+        route, params = self._router().match('GET', '/v1/galleries/gal-123/photos')
+        assert route.template == '/v1/galleries/{gallery_id}/photos'
+        assert params == {'gallery_id': 'gal-123'}
+
+    def test_method_mismatch_falls_back_to_parameter_route(self):
+        route, params = self._router().match('GET', '/v1/client/favorites/submit')
+        assert route.template == '/v1/client/favorites/{photo_id}'
+        assert params == {'photo_id': 'submit'}
+
+    def test_any_method_route(self):
+        route, _ = self._router().match('DELETE', '/health')
+        assert route.template == '/health'
+
+    def test_trailing_slash_is_ignored(self):
+        route, params = self._router().match('GET', '/v1/portfolio/abc/')
+        assert params == {'photographer_id': 'abc'}
+
+    def test_no_match(self):
+        assert self._router().match('GET', '/v1/unknown') == (None, None)
+        assert self._router().match('PUT', '/v1/portfolio/settings') == (None, None)
+
+    def test_duplicate_route_rejected(self):
+        router = self._router()
+        with pytest.raises(ValueError):
+            router.add('GET', '/v1/portfolio/settings', lambda r: None, _call)
+
+    def test_conflicting_parameter_names_rejected(self):
+        router = self._router()
+        with pytest.raises(ValueError):
+            router.add('PUT', '/v1/portfolio/{user_id}', lambda r: None, _call)
+
+
+class TestLazyHandlers:
+    """Test handler modules are resolved on first use"""
+
+    def test_string_target_resolved_on_access(self):
+        route = Route('GET', '/v1/docs', 'handlers.docs_handler:handle_get_swagger_ui', _call, PUBLIC)
+        assert route._handler is None
+
+        from handlers.docs_handler import handle_get_swagger_ui
+        assert route.handler is handle_get_swagger_ui
+        assert route.module_name == 'handlers.docs_handler'
+
+    def test_all_api_routes_resolve(self):
+        """Every route in the table names an importable handler"""
+        import api
+
+        for route in api.ROUTES:
+            assert callable(route.handler), f"Unresolvable handler for {route}"
+
+
+class TestApiDispatch:
+    """Test api.handler dispatch through the route table"""
+
+    def _event(self, method, path, body=None):
+        return {
+            'httpMethod': method,
+            'path': path,
+            'body': json.dumps(body) if body is not None else None,
+            'headers': {},
+            'requestContext': {'identity': {'sourceIp': '1.2.3.4'}}
+        }
+
+    def test_health_is_public(self):
+        import api
+
+        with patch('api.get_user_from_token') as mock_auth:
+            result = api.handler(self._event('GET', '/v1/health'), None)
+
+        assert result['statusCode'] == 200
+        mock_auth.assert_not_called()
+
+    def test_base_path_is_stripped(self):
+        import api
+
+        result = api.handler(self._event('GET', '/prod/xb667e3fa92f9776468017a9758f31ba4/v1/health'), None)
+        assert result['statusCode'] == 200
+
+    def test_unknown_path_requires_auth_before_404(self):
+        import api
+
+        with patch('api.get_user_from_token', return_value=None):
+            result = api.handler(self._event('GET', '/v1/does-not-exist'), None)
+        assert result['statusCode'] == 401
+
+        with patch('api.get_user_from_token', return_value={'id': 'user-1'}):
+            result = api.handler(self._event('GET', '/v1/does-not-exist'), None)
+        assert result['statusCode'] == 404
+
+    def test_authenticated_route_rejects_anonymous(self):
+        import api
+
+        with patch('api.get_user_from_token', return_value=None):
+            result = api.handler(self._event('GET', '/v1/galleries/gal-1'), None)
+        assert result['statusCode'] == 401
+
+    def test_authenticated_route_passes_params_and_user(self):
+        import api
+
+        user = {'id': 'user-1'}
+        route, _ = api.router.match('GET', '/v1/galleries/gal-1')
+        mock_handler = MagicMock(return_value={'statusCode': 200})
+
+        with patch('api.get_user_from_token', return_value=user), \
+             patch.object(route, '_handler', mock_handler):
+            result = api.handler(self._event('GET', '/v1/galleries/gal-1'), None)
+
+        assert result['statusCode'] == 200
+        mock_handler.assert_called_once_with('gal-1', user)
+
+    def test_optional_auth_route_allows_anonymous(self):
+        import api
+
+        route, _ = api.router.match('POST', '/v1/analytics/track/gallery/gal-1')
+        assert route.access == OPTIONAL_AUTH
+        mock_handler = MagicMock(return_value={'statusCode': 200})
+
+        with patch('api.get_user_from_token', return_value=None), \
+             patch.object(route, '_handler', mock_handler):
+            api.handler(self._event('POST', '/v1/analytics/track/gallery/gal-1', {'metadata': {'a': 1}}), None)
+
+        mock_handler.assert_called_once_with('gal-1', None, {'a': 1})
+
+    def test_rate_limited_route_returns_429(self):
+        import api
+
+        with patch('api.check_rate_limit', return_value=(False, 120)):
+            result = api.handler(self._event('POST', '/v1/auth/login', {'email': 'a@b.com'}), None)
+
+        assert result['statusCode'] == 429
+        assert result['headers']['Retry-After'] == '120'
+
+    def test_gallery_statistics_not_shadowed_by_gallery_route(self):
+        import api
+
+        route, params = api.router.match('GET', '/v1/galleries/gal-1/statistics')
+        assert route.target == 'handlers.gallery_statistics_handler:handle_get_gallery_statistics'
+        assert params == {'gallery_id': 'gal-1'}
+
+    def test_handler_exception_returns_500(self):
+        import api
+
+        route, _ = api.router.match('GET', '/v1/docs')
+        with patch.object(route, '_handler', MagicMock(side_effect=RuntimeError('boom'))):
+            result = api.handler(self._event('GET', '/v1/docs'), None)
+
+        assert result['statusCode'] == 500
+        assert json.loads(result['body'])['path'] == '/v1/docs'
@@ -0,0 +1,195 @@
+"""
+Tests for ranged S3 metadata reads (utils/s3_range_reader.py and
+metadata_extractor.extract_metadata_from_s3)
+"""
+import io
+import struct
+from unittest.mock import patch
+from PIL import Image
+
+from utils.s3_range_reader import S3RangeReader, isobmff_boxes, write_sparse_isobmff
+from utils.metadata_extractor import extract_metadata_from_s3, extract_image_metadata
+
+
+class RangeS3:
+    """S3 stand-in serving one object, honouring Range"""
+
+    def __init__(self, data):
+        self.data = data
+        self.ranges = []
+
+    def get_object(self, Bucket, Key, Range=None):
+        if Range is None:
+            self.ranges.append(None)
+            return {'Body': io.BytesIO(self.data)}
+        start, end = (int(part) for part in Range[len('bytes='):].split('-'))
+        self.ranges.append((start, end))
+        return {'Body': io.BytesIO(self.data[start:end + 1])}
+
+    @property
+    def bytes_served(self):
+        return sum(len(self.data) if r is None else r[1] - r[0] + 1 for r in self.ranges)
+
+
+def _box(box_type, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+
+def _mp4(mdat_size, faststart=False):
+    """ftyp + mdat + moov (or moov first) with a recognisable moov payload"""
+    ftyp = _box(b'ftyp', b'isom\x00\x00\x02\x00isomiso2')
+    moov = _box(b'moov', _box(b'mvhd', b'\x01' * 100))
+    mdat = _box(b'mdat', b'\xaa' * mdat_size)
+    return ftyp + (moov + mdat if faststart else mdat + moov)
+
+
+def _jpeg_with_exif(size=(3000, 2000)):
+    exif = Image.Exif()
+    exif[271] = 'Canon'
+    exif[272] = 'EOS R5'
+    output = io.BytesIO()
+    noise = Image.effect_noise(size, 50).convert('RGB')
+    noise.save(output, format='JPEG', quality=95, exif=exif.tobytes())
+    return output.getvalue()
+
+
+class TestS3RangeReader:
+    """Seekable reads over Range GETs"""
+
+    def test_reads_match_object_and_are_cached(self):
+        data = bytes(range(256)) * 4096  # 1 MB
+        s3 = RangeS3(data)
+        reader = S3RangeReader(s3, 'b', 'k', len(data), block_size=1024)
+
+        assert reader.read(10) == data[:10]
+        reader.seek(500)
+        assert reader.read(100) == data[500:600]
+        assert len(s3.ranges) == 1  # Served from the first block
+
+        reader.seek(-16, io.SEEK_END)
+        assert reader.read() == data[-16:]
+        assert reader.read(10) == b''
+
+    def test_block_size_grows_on_misses(self):
+        data = b'x' * (1024 * 1024)
+        s3 = RangeS3(data)
+        reader = S3RangeReader(s3, 'b', 'k', len(data), block_size=1024)
+
+        for offset in (0, 100000, 300000):
+            reader.read_at(offset, 1)
+
+        assert [end - start + 1 for start, end in s3.ranges] == [1024, 2048, 4096]
+        assert reader.bytes_fetched == 1024 + 2048 + 4096
+
+
+class TestIsobmffBoxes:
+    """Top-level box walk for MP4/MOV"""
+
+    def test_moov_after_mdat(self):
+        data = _mp4(5 * 1024 * 1024)
+        s3 = RangeS3(data)
+        reader = S3RangeReader(s3, 'b', 'k', len(data))
+
+        boxes = isobmff_boxes(reader)
+
+        assert [box[0] for box in boxes] == ['ftyp', 'mdat', 'moov']
+        assert s3.bytes_served < 256 * 1024
+
+    def test_largesize_box(self):
+        ftyp = _box(b'ftyp', b'isom\x00\x00\x02\x00')
+        mdat = struct.pack('>I4sQ', 1, b'mdat', 16 + 1000) + b'\x00' * 1000
+        moov = _box(b'moov', b'\x00' * 20)
+        data = ftyp + mdat + moov
+        reader = S3RangeReader(RangeS3(data), 'b', 'k', len(data))
+
+        boxes = isobmff_boxes(reader)
+
+        assert boxes[1] == ('mdat', len(ftyp), 1016, 16)
+        assert boxes[2][0] == 'moov'
+
+    def test_not_isobmff(self):
+        data = _jpeg_with_exif((100, 100))
+        reader = S3RangeReader(RangeS3(data), 'b', 'k', len(data))
+
+        assert isobmff_boxes(reader) is None
+
+    def test_sparse_copy_has_headers_and_moov_only(self, tmp_path):
+        data = _mp4(2 * 1024 * 1024)
+        reader = S3RangeReader(RangeS3(data), 'b', 'k', len(data))
+
+        path = write_sparse_isobmff(reader, isobmff_boxes(reader), '.mp4')
+        try:
+            with open(path, 'rb') as f:
+                copy = f.read()
+        finally:
+            import os
+            os.remove(path)
+
+        assert len(copy) == len(data)
+        moov_offset = data.index(b'moov') - 4
+        assert copy[moov_offset:] == data[moov_offset:]
+        assert copy[:32] == data[:32]  # ftyp + mdat header
+        assert copy[1000:2000] == b'\x00' * 1000  # mdat payload is a hole
+
+
+class TestExtractMetadataFromS3:
+    """Same metadata as a full download, from a fraction of the bytes"""
+
+    def test_jpeg_exif_from_headers(self):
+        data = _jpeg_with_exif()
+        s3 = RangeS3(data)
+
+        metadata = extract_metadata_from_s3(s3, 'b', 'g/p.jpg', 'p.jpg', len(data))
+
+        full = extract_image_metadata(data, 'p.jpg')
+        for field in ('format', 'dimensions', 'camera', 'file_size', 'size_mb'):
+            assert metadata[field] == full[field]
+        assert metadata['camera']['model'] == 'EOS R5'
+        assert None not in s3.ranges
+        assert s3.bytes_served < len(data) / 4
+
+    def test_mp4_probed_from_sparse_moov(self):
+        data = _mp4(4 * 1024 * 1024)
+        s3 = RangeS3(data)
+        probed = {}
+
+        def fake_probe(path, filename, file_size):
+            with open(path, 'rb') as f:
+                probed['moov'] = b'mvhd' in f.read()
+            return {'type': 'video', 'file_size': file_size, 'duration_seconds': 12.0}
+
+        with patch('utils.video_processor.probe_video_file', side_effect=fake_probe):
+            metadata = extract_metadata_from_s3(s3, 'b', 'g/v.mp4', 'v.mp4', len(data))
+
+        assert metadata == {'type': 'video', 'file_size': len(data), 'duration_seconds': 12.0}
+        assert probed['moov']
+        assert None not in s3.ranges
+        assert s3.bytes_served < 256 * 1024
+
+    def test_other_video_containers_read_in_full(self):
+        s3 = RangeS3(b'\x1a\x45\xdf\xa3' + b'\x00' * 1000)
+
+        with patch('utils.video_processor.extract_video_metadata', return_value={'type': 'video'}) as mock_extract:
+            extract_metadata_from_s3(s3, 'b', 'g/v.mkv', 'v.mkv', len(s3.data))
+
+        assert s3.ranges == [None]
+        mock_extract.assert_called_once_with(s3.data, 'v.mkv')
+
+    def test_unreadable_image_falls_back_to_full_read(self):
+        data = b'not an image' * 100
+        s3 = RangeS3(data)
+
+        metadata = extract_metadata_from_s3(s3, 'b', 'g/p.heic', 'p.heic', len(data))
+
+        assert s3.ranges[-1] is None
+        assert metadata['file_size'] == len(data)
+
+    def test_unreadable_raw_not_downloaded(self):
+        data = b'\x00\x00\x00\x18ftypcrx ' + b'\x00' * 100000
+        s3 = RangeS3(data)
+
+        metadata = extract_metadata_from_s3(s3, 'b', 'g/p.cr3', 'p.cr3', len(data))
+
+        assert None not in s3.ranges
+        assert metadata['file_size'] == len(data)
+        assert not metadata.get('format')
@@ -0,0 +1,221 @@
+"""
+Tests for session/API-key validation caching and signed session tokens in utils/auth.py
+"""
+import time
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from utils import auth
+
+
+def _event(token):
+    return {'headers': {'Cookie': f'galerly_session={token}'}}
+
+
+def _session(user, age=timedelta(0)):
+    created_at = (datetime.now(timezone.utc) - age).replace(tzinfo=None).isoformat() + 'Z'
+    return {'Item': {'token': 'tok', 'user': user, 'created_at': created_at}}
+
+
+@pytest.fixture
+def mock_sessions():
+    with patch('utils.auth.sessions_table') as table:
+        yield table
+
+
+@pytest.fixture
+def signing_key(monkeypatch):
+    monkeypatch.setenv('SESSION_SIGNING_KEY', 'test-signing-key')
+
+
+class TestSessionCache:
+    """Validated sessions are reused across requests in a warm container"""
+
+    def test_second_request_skips_dynamodb(self, mock_sessions, sample_user):
+        mock_sessions.get_item.return_value = _session(sample_user)
+
+        first = auth.get_user_from_token(_event('tok'))
+        second = auth.get_user_from_token(_event('tok'))
+
+        assert first == second == sample_user
+        mock_sessions.get_item.assert_called_once()
+        assert auth.get_session_cache_stats()['hits'] == 1
+
+    def test_get_session_shares_cache(self, mock_sessions, sample_user):
+        mock_sessions.get_item.return_value = _session(sample_user)
+
+        auth.get_user_from_token(_event('tok'))
+        session = auth.get_session('tok')
+
+        assert session == {'user_id': 'user_123', 'email': 'test@example.com'}
+        mock_sessions.get_item.assert_called_once()
+
+    def test_expired_session_deleted(self, mock_sessions, sample_user):
+        mock_sessions.get_item.return_value = _session(sample_user, age=timedelta(days=8))
+
+        assert auth.get_session('tok') is None
+        mock_sessions.delete_item.assert_called_once_with(Key={'token': 'tok'})
+
+    def test_cache_entry_expires_after_ttl(self, mock_sessions, sample_user):
+        mock_sessions.get_item.return_value = _session(sample_user)
+
+        with patch('utils.ttl_cache.time.monotonic', return_value=1000.0):
+            auth.get_session('tok')
+        with patch('utils.ttl_cache.time.monotonic',
+                   return_value=1000.0 + auth.SESSION_CACHE_TTL_SECONDS + 1):
+            auth.get_session('tok')
+
+        assert mock_sessions.get_item.call_count == 2
+
+    def test_invalidate_all_user_sessions_drops_cache(self, mock_sessions, sample_user):
+        from utils import session_security
+        mock_sessions.get_item.return_value = _session(sample_user)
+        auth.get_session('tok')
+
+        with patch('utils.session_security.sessions_table') as security_sessions:
+            security_sessions.scan.return_value = {'Items': [{'token': 'tok', 'user': sample_user}]}
+            session_security.invalidate_all_user_sessions('user_123', 'test@example.com')
+        mock_sessions.get_item.return_value = {}
+
+        assert auth.get_session('tok') is None
+
+
+class TestSignedTokens:
+    """HMAC-signed tokens carry user id and expiry"""
+
+    def test_unsigned_without_key(self, monkeypatch):
+        monkeypatch.delenv('SESSION_SIGNING_KEY', raising=False)
+
+        token = auth.generate_session_token('user_123')
+
+        assert not token.startswith(auth.SIGNED_TOKEN_PREFIX + '.')
+        assert auth.verify_session_token(token) is None
+
+    def test_round_trip(self, signing_key):
+        token = auth.generate_session_token('user_123')
+
+        claims = auth.verify_session_token(token)
+
+        assert claims['user_id'] == 'user_123'
+        assert claims['expires'] > time.time()
+
+    def test_tampered_token_rejected_without_dynamodb(self, signing_key, mock_sessions):
+        token = auth.generate_session_token('user_123')
+        prefix, nonce, user_id, expires, signature = token.split('.')
+        forged = '.'.join([prefix, nonce, auth._b64encode(b'admin_1'), expires, signature])
+
+        assert auth.get_session(forged) is None
+        mock_sessions.get_item.assert_not_called()
+
+    def test_expired_token_rejected_without_dynamodb(self, signing_key, mock_sessions):
+        with patch('utils.auth.time.time', return_value=time.time() - 8 * 24 * 3600):
+            token = auth.generate_session_token('user_123')
+
+        assert auth.get_session(token) is None
+        mock_sessions.get_item.assert_not_called()
+
+    def test_row_for_other_user_rejected(self, signing_key, mock_sessions, sample_user):
+        token = auth.generate_session_token('someone_else')
+        mock_sessions.get_item.return_value = _session(sample_user)
+
+        assert auth.get_session(token) is None
+
+    def test_valid_signed_token_cached(self, signing_key, mock_sessions, sample_user):
+        token = auth.generate_session_token('user_123')
+        mock_sessions.get_item.return_value = _session(sample_user)
+
+        assert auth.get_user_from_token(_event(token)) == sample_user
+        assert auth.get_user_from_token(_event(token)) == sample_user
+        mock_sessions.get_item.assert_called_once()
+
+
+def _api_event(key):
+    return {'headers': {'Authorization': f'Bearer {key}'}}
+
+
+@pytest.fixture
+def api_key_tables():
+    with patch('utils.auth.api_keys_table') as keys, patch('utils.auth.users_table') as users:
+        yield keys, users
+
+
+class TestApiKeyAuth:
+    """Hashed-key lookup with positive/negative caching and a plan gate"""
+
+    def test_hashed_lookup_then_cached(self, api_key_tables, sample_user):
+        keys, users = api_key_tables
+        owner = {**sample_user, 'api_key': 'galerly_live_abc'}
+        keys.get_item.return_value = {'Item': {'key_hash': auth.hash_api_key('galerly_live_abc'),
+                                               'email': owner['email'], 'user_id': owner['id']}}
+        users.get_item.return_value = {'Item': owner}
+
+        with patch('utils.auth._has_api_access', return_value=True):
+            first = auth.get_user_from_api_key(_api_event('galerly_live_abc'))
+            second = auth.get_user_from_api_key(_api_event('galerly_live_abc'))
+
+        assert first == second == owner
+        keys.get_item.assert_called_once_with(Key={'key_hash': auth.hash_api_key('galerly_live_abc')})
+        users.get_item.assert_called_once()
+        users.query.assert_not_called()
+
+    def test_unknown_key_negative_cached(self, api_key_tables):
+        keys, users = api_key_tables
+        keys.get_item.return_value = {}
+        users.query.return_value = {'Items': []}
+
+        assert auth.get_user_from_api_key(_api_event('galerly_live_nope')) is None
+        assert auth.get_user_from_api_key(_api_event('galerly_live_nope')) is None
+
+        keys.get_item.assert_called_once()
+        assert auth.get_api_key_cache_stats()['invalid_hits'] == 1
+
+    def test_legacy_key_found_via_index_and_registered(self, api_key_tables, sample_user):
+        keys, users = api_key_tables
+        owner = {**sample_user, 'api_key': 'galerly_live_old'}
+        keys.get_item.return_value = {}
+        users.query.return_value = {'Items': [owner]}
+
+        with patch('utils.auth._has_api_access', return_value=True):
+            assert auth.get_user_from_api_key(_api_event('galerly_live_old')) == owner
+
+        assert keys.put_item.call_args.kwargs['Item']['key_hash'] == auth.hash_api_key('galerly_live_old')
+
+    def test_rotated_key_row_rejected(self, api_key_tables, sample_user):
+        keys, users = api_key_tables
+        keys.get_item.return_value = {'Item': {'key_hash': 'x', 'email': sample_user['email']}}
+        users.get_item.return_value = {'Item': {**sample_user, 'api_key': 'galerly_live_new'}}
+
+        assert auth.get_user_from_api_key(_api_event('galerly_live_old')) is None
+
+    def test_plan_gate_uses_cached_features(self, api_key_tables, sample_user):
+        from utils.feature_resolver import cache_features, resolve_features
+        keys, users = api_key_tables
+        owner = {**sample_user, 'plan': 'starter', 'api_key': 'galerly_live_abc'}
+        keys.get_item.return_value = {'Item': {'email': owner['email']}}
+        users.get_item.return_value = {'Item': owner}
+        features, plan_name = resolve_features('starter')
+        cache_features(owner['id'], 'starter', 0, features, plan_name)
+
+        with patch('handlers.subscription_handler.get_user_features') as mock_features:
+            assert auth.get_user_from_api_key(_api_event('galerly_live_abc')) is None
+
+        mock_features.assert_not_called()
+
+    def test_rotation_invalidates_old_key(self, api_key_tables, sample_user):
+        from handlers import auth_handler
+        keys, users = api_key_tables
+        owner = {**sample_user, 'plan': 'pro', 'api_key': 'galerly_live_old'}
+        keys.get_item.return_value = {'Item': {'email': owner['email']}}
+        users.get_item.return_value = {'Item': owner}
+        assert auth.get_user_from_api_key(_api_event('galerly_live_old')) == owner
+
+        with patch('handlers.auth_handler.users_table') as handler_users, \
+             patch('utils.plan_enforcement.get_user_features',
+                   return_value=({'api_access': True}, 'pro', 'Pro')):
+            handler_users.update_item.return_value = {'Attributes': {'api_key': 'galerly_live_old'}}
+            result = auth_handler.handle_generate_api_key(sample_user)
+
+        assert result['statusCode'] == 200
+        keys.delete_item.assert_called_once_with(Key={'key_hash': auth.hash_api_key('galerly_live_old')})
+        assert auth.get_api_key_cache_stats()['size'] == 0
@@ -265,22 +265,19 @@ class TestBulkDownloadHandler:
         from handlers.bulk_download_handler import handle_bulk_download_by_token
         from tests.conftest import global_mock_table, global_mock_s3
         
-        # Configure global mocks - handler scans for gallery with token
+        # Configure global mocks - handler resolves token via ShareTokenIndex
         gallery_with_token = {**sample_gallery, 'share_token': 'token123', 'share_enabled': True}
         
-        # Mock scan for gallery token lookup
-        def mock_scan(**kwargs):
-            # Check if looking for gallery token or photographer
-            filter_expr = kwargs.get('FilterExpression', '')
-            if 'share_token' in str(filter_expr):
+        # Mock index queries for gallery token lookup and photographer lookup
+        def mock_query(**kwargs):
+            if kwargs.get('IndexName') == 'ShareTokenIndex':
                 return {'Items': [gallery_with_token]}
-            elif 'user_id' in str(filter_expr) or 'id' in str(filter_expr):
+            elif kwargs.get('IndexName') == 'UserIdIndex':
                 # Photographer lookup
                 return {'Items': [{'id': sample_gallery.get('user_id'), 'account_status': 'active'}]}
             return {'Items': []}
         
-        global_mock_table.scan.side_effect = mock_scan
-        global_mock_table.query.return_value = {'Items': []}
+        global_mock_table.query.side_effect = mock_query
         global_mock_s3.head_object.return_value = {'ContentLength': 1000}
         
         event = {'body': json.dumps({
@@ -118,6 +118,37 @@ class TestCDNUrls:
         
         assert 'gallery-123' in url or 'photo-456' in url or 'large' in url
 
+    def test_rendition_url_per_format(self):
+        """WebP/AVIF variants live next to the JPEG rendition"""
+        from utils.cdn_urls import get_rendition_url
+        
+        assert get_rendition_url('gal/photo.jpg', 'small').endswith('renditions/gal/photo_small.jpg')
+        assert get_rendition_url('gal/photo.jpg', 'small', 'webp').endswith('renditions/gal/photo_small.webp')
+        assert get_rendition_url('gal/photo.jpg', 'small', 'avif').endswith('renditions/gal/photo_small.avif')
+    
+    def test_photo_urls_srcset_variants(self):
+        """srcset per rendered format, most efficient first, widths from dimensions"""
+        from utils.cdn_urls import get_photo_urls
+        
+        urls = get_photo_urls('gal/photo.jpg', formats=['webp', 'avif'], dimensions={'width': 6000, 'height': 4000})
+        
+        assert list(urls['srcset']) == ['avif', 'webp', 'jpeg']
+        assert urls['srcset']['jpeg'].split(', ')[0].endswith('photo_thumbnail.jpg 400w')
+        assert '_large.jpg 4000w' in urls['srcset']['jpeg']
+        assert '_small.webp 800w' in urls['srcset']['webp']
+        assert '_large' not in urls['srcset']['avif']
+        assert urls['thumbnail_url'].endswith('photo_thumbnail.jpg')
+    
+    def test_photo_urls_without_formats_is_jpeg_only(self):
+        """Plans without modern formats only get the JPEG srcset"""
+        from utils.cdn_urls import get_photo_urls
+        
+        urls = get_photo_urls('gal/photo.jpg', dimensions=(300, 200))
+        
+        assert list(urls['srcset']) == ['jpeg']
+        # A 300px original makes every rendition 300px wide - listed once
+        assert urls['srcset']['jpeg'].count('300w') == 1
+
 
 class TestDuplicateDetector:
     """Test duplicate detection utilities"""
@@ -0,0 +1,399 @@
+"""
+Tests for utils/zip_generator.py - streaming gallery ZIPs
+"""
+import hashlib
+import io
+import os
+import threading
+import zipfile
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+from botocore.exceptions import ClientError
+
+from utils import zip_generator
+
+
+class FakeS3:
+    """S3 stand-in with objects, ranged GETs and multipart uploads"""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.exceptions = SimpleNamespace(ClientError=ClientError)
+        self.uploads = {}
+        self.completed = {}
+        self.aborted = []
+        self.part_sizes = []
+        self.heads = []
+        self.gets = []
+        self.copied = 0
+        self.broken_once = set()
+
+    def _etag(self, Key):
+        return '"%s"' % hashlib.md5(self.objects[Key]).hexdigest()
+
+    def _check_match(self, Key, etag):
+        if etag is not None and etag != self._etag(Key):
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'Copy')
+
+    def head_object(self, Bucket, Key):
+        self.heads.append(Key)
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        return {'ContentLength': len(self.objects[Key])}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        self._check_match(Key, IfMatch)
+        self.gets.append(Key)
+        data = self.objects[Key]
+        start, end = 0, len(data)
+        if Range:
+            first, last = Range[len('bytes='):].split('-')
+            start, end = int(first), int(last) + 1 if last else len(data)
+        body = io.BytesIO(data[start:end])
+        if Key in self.broken_once:
+            # Stream breaks half way the first time it is read
+            self.broken_once.discard(Key)
+            half = len(data) // 2
+            body = BrokenBody(data[:half])
+        return {'Body': body}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f'u{len(self.uploads) + len(self.completed) + len(self.aborted) + 1}'
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        self.part_sizes.append(len(Body))
+        return {'ETag': f'etag-{PartNumber}'}
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange,
+                         CopySourceIfMatch=None):
+        self._check_match(CopySource['Key'], CopySourceIfMatch)
+        first, last = CopySourceRange[len('bytes='):].split('-')
+        body = self.objects[CopySource['Key']][int(first):int(last) + 1]
+        self.uploads[UploadId][PartNumber] = body
+        self.copied += len(body)
+        return {'CopyPartResult': {'ETag': f'etag-{PartNumber}'}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        assert numbers == sorted(parts)
+        # S3 rejects parts under the minimum size, except the last one
+        assert all(len(parts[number]) >= zip_generator.ZIP_MIN_PART_SIZE for number in numbers[:-1])
+        self.completed[Key] = self.objects[Key] = b''.join(parts[number] for number in numbers)
+        return {'ETag': self._etag(Key)}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append(UploadId)
+        self.uploads.pop(UploadId, None)
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+
+class BrokenBody:
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, size):
+        chunk = self.stream.read(size)
+        if not chunk:
+            raise IOError('Connection reset')
+        return chunk
+
+
+@pytest.fixture
+def gallery():
+    """Patch S3 and the photos table; returns a function that installs both"""
+    def install(objects, photos):
+        s3 = FakeS3(objects)
+        table = MagicMock()
+        table.query.return_value = {'Items': photos}
+        patches = [patch.object(zip_generator, 's3_client', s3),
+                   patch.object(zip_generator, 'photos_table', table),
+                   patch.object(zip_generator, 'ZIP_PART_SIZE', 64 * 1024),
+                   patch.object(zip_generator, 'ZIP_MIN_PART_SIZE', 20 * 1024),
+                   patch.object(zip_generator, 'ZIP_READ_CHUNK', 16 * 1024)]
+        for p in patches:
+            p.start()
+        installed.extend(patches)
+        return s3, table
+    installed = []
+    with patch('utils.cdn_urls.get_zip_url', return_value='https://cdn/zip'):
+        yield install
+    for p in installed:
+        p.stop()
+
+
+def _photo(photo_id, key, filename, **extra):
+    return {'id': photo_id, 's3_key': key, 'filename': filename, **extra}
+
+
+class TestStreamingZip:
+    """Archive is streamed into a multipart upload"""
+
+    def test_archive_is_byte_identical(self, gallery):
+        objects = {f'g/p{i}.jpg': os.urandom(50_000 + i * 10_000) for i in range(6)}
+        photos = [_photo(f'p{i}', f'g/p{i}.jpg', f'IMG_{i}.jpg') for i in range(6)]
+        s3, _ = gallery(objects, photos)
+
+        result = zip_generator.generate_gallery_zip('g')
+
+        assert result['success'] and result['photo_count'] == 6
+        archive = zipfile.ZipFile(io.BytesIO(s3.completed['g/gallery-all-photos.zip']))
+        assert archive.testzip() is None
+        for i in range(6):
+            info = archive.getinfo(f'IMG_{i}.jpg')
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert archive.read(info) == objects[f'g/p{i}.jpg']
+
+    def test_parts_are_bounded(self, gallery):
+        objects = {f'g/p{i}.raw': os.urandom(200_000) for i in range(5)}
+        photos = [_photo(f'p{i}', f'g/p{i}.raw', f'p{i}.raw') for i in range(5)]
+        s3, _ = gallery(objects, photos)
+
+        zip_generator.generate_gallery_zip('g')
+
+        assert len(s3.part_sizes) > 10
+        assert all(size == 64 * 1024 for size in s3.part_sizes[:-1])
+        assert s3.part_sizes[-1] <= 64 * 1024
+
+    def test_missing_and_duplicate_names(self, gallery):
+        objects = {'g/a.jpg': b'a' * 100, 'g/b.jpg': b'b' * 100, 'g/conv.jpg': b'c' * 100}
+        photos = [
+            _photo('1', 'g/a.jpg', 'same.jpg'),
+            _photo('2', 'g/b.jpg', 'same.jpg'),
+            _photo('3', 'g/missing.jpg', 'gone.jpg'),
+            _photo('4', 'g/conv.jpg', 'photo.jpg', original_s3_key='g/orig.cr3', original_filename='photo.cr3'),
+        ]
+        s3, _ = gallery(objects, photos)
+
+        result = zip_generator.generate_gallery_zip('g')
+
+        archive = zipfile.ZipFile(io.BytesIO(s3.completed['g/gallery-all-photos.zip']))
+        assert archive.namelist() == ['same.jpg', 'same_1.jpg', 'photo.jpg']
+        assert archive.read('photo.jpg') == b'c' * 100
+        assert result['photo_count'] == 3
+
+    def test_broken_stream_resumed(self, gallery):
+        data = os.urandom(100_000)
+        s3, _ = gallery({'g/p.jpg': data}, [_photo('1', 'g/p.jpg', 'p.jpg')])
+        s3.broken_once.add('g/p.jpg')
+
+        zip_generator.generate_gallery_zip('g')
+
+        archive = zipfile.ZipFile(io.BytesIO(s3.completed['g/gallery-all-photos.zip']))
+        assert archive.read('p.jpg') == data
+
+    def test_all_orphaned_aborts_nothing_uploaded(self, gallery):
+        s3, _ = gallery({}, [_photo('1', 'g/x.jpg', 'x.jpg')])
+
+        result = zip_generator.generate_gallery_zip('g')
+
+        assert result['photo_count'] == 0
+        assert s3.completed == {} and s3.uploads == {}
+
+    def test_manifest_matches_archive(self, gallery):
+        objects = {f'g/p{i}.jpg': os.urandom(30_000) for i in range(3)}
+        photos = [_photo(f'p{i}', f'g/p{i}.jpg', 'same.jpg') for i in range(3)]
+        s3, _ = gallery(objects, photos)
+
+        zip_generator.generate_gallery_zip('g')
+
+        manifest = zip_generator.load_zip_manifest('g')
+        archive = zipfile.ZipFile(io.BytesIO(s3.completed['g/gallery-all-photos.zip']))
+        assert [entry['photo_id'] for entry in manifest['entries']] == ['p0', 'p1', 'p2']
+        for entry, info in zip(manifest['entries'], archive.infolist()):
+            assert (entry['filename'], entry['offset'], entry['crc']) == (info.filename, info.header_offset, info.CRC)
+        assert manifest['entries'][-1]['end'] == archive.start_dir
+        assert manifest['zip_etag'] == s3._etag('g/gallery-all-photos.zip')
+
+    def test_all_pages_queried(self, gallery):
+        objects = {'g/a.jpg': b'a', 'g/b.jpg': b'b'}
+        s3, table = gallery(objects, [])
+        table.query.side_effect = [
+            {'Items': [_photo('1', 'g/a.jpg', 'a.jpg')], 'LastEvaluatedKey': {'id': '1'}},
+            {'Items': [_photo('2', 'g/b.jpg', 'b.jpg')]},
+        ]
+
+        result = zip_generator.generate_gallery_zip('g')
+
+        assert result['photo_count'] == 2
+        assert table.query.call_args_list[1].kwargs['ExclusiveStartKey'] == {'id': '1'}
+
+
+class TestResolveSources:
+    """Existence checks run in parallel"""
+
+    def test_heads_overlap(self):
+        barrier = threading.Barrier(4, timeout=5)
+
+        def head_object(Bucket, Key):
+            barrier.wait()
+            return {'ContentLength': 10}
+
+        s3 = MagicMock()
+        s3.head_object.side_effect = head_object
+        photos = [_photo(str(i), f'g/{i}.jpg', f'{i}.jpg') for i in range(4)]
+
+        with patch.object(zip_generator, 's3_client', s3):
+            sources = zip_generator.resolve_sources(photos, workers=4)
+
+        assert [source['key'] for source in sources] == [f'g/{i}.jpg' for i in range(4)]
+
+
+def _zip_entries(s3):
+    archive = zipfile.ZipFile(io.BytesIO(s3.completed['g/gallery-all-photos.zip']))
+    assert archive.testzip() is None
+    return {name: archive.read(name) for name in archive.namelist()}
+
+
+class TestIncrementalZip:
+    """Unchanged entries are copied from the previous ZIP, only the delta is read"""
+
+    def _gallery(self, gallery, count=8, size=30_000):
+        objects = {f'g/p{i}.jpg': os.urandom(size) for i in range(count)}
+        photos = [_photo(f'p{i}', f'g/p{i}.jpg', f'IMG_{i}.jpg') for i in range(count)]
+        s3, table = gallery(objects, photos)
+        zip_generator.generate_gallery_zip('g')
+        s3.gets.clear()
+        s3.heads.clear()
+        return s3, table, objects, photos
+
+    def test_added_photos_only_read(self, gallery):
+        s3, table, objects, photos = self._gallery(gallery)
+        objects['g/new.jpg'] = os.urandom(40_000)
+        photos.append(_photo('new', 'g/new.jpg', 'IMG_0.jpg'))
+
+        result = zip_generator.update_gallery_zip('g')
+
+        assert result['mode'] == 'incremental' and result['photo_count'] == 9
+        assert s3.heads == ['g/new.jpg']
+        assert [key for key in s3.gets if key.startswith('g/p')] == []
+        assert s3.copied > 0
+        entries = _zip_entries(s3)
+        assert entries['IMG_0_1.jpg'] == objects['g/new.jpg']
+        for i in range(8):
+            assert entries[f'IMG_{i}.jpg'] == objects[f'g/p{i}.jpg']
+
+    def test_removed_photos_dropped(self, gallery):
+        s3, table, objects, photos = self._gallery(gallery)
+        del photos[5]
+        del photos[2]
+
+        result = zip_generator.update_gallery_zip('g')
+
+        assert result['mode'] == 'incremental' and result['photo_count'] == 6
+        assert s3.heads == []
+        entries = _zip_entries(s3)
+        assert sorted(entries) == [f'IMG_{i}.jpg' for i in (0, 1, 3, 4, 6, 7)]
+        assert all(entries[f'IMG_{i}.jpg'] == objects[f'g/p{i}.jpg'] for i in (0, 1, 3, 4, 6, 7))
+        # The manifest follows the new layout, so the next update can reuse it
+        photos.append(_photo('p2', 'g/p2.jpg', 'IMG_2.jpg'))
+        assert zip_generator.update_gallery_zip('g')['mode'] == 'incremental'
+        assert _zip_entries(s3)['IMG_2.jpg'] == objects['g/p2.jpg']
+
+    def test_unchanged_gallery_not_rewritten(self, gallery):
+        s3, table, objects, photos = self._gallery(gallery)
+        zip_before = s3.completed['g/gallery-all-photos.zip']
+
+        result = zip_generator.update_gallery_zip('g')
+
+        assert result['mode'] == 'unchanged' and result['photo_count'] == 8
+        assert s3.uploads == {} and s3.completed['g/gallery-all-photos.zip'] is zip_before
+
+    def test_changed_zip_falls_back_to_full(self, gallery):
+        s3, table, objects, photos = self._gallery(gallery)
+        s3.objects['g/gallery-all-photos.zip'] = b'rewritten elsewhere'
+        photos.append(_photo('new', 'g/p0.jpg', 'extra.jpg'))
+
+        result = zip_generator.update_gallery_zip('g')
+
+        assert result['mode'] == 'full' and result['photo_count'] == 9
+        assert s3.aborted
+        assert len(_zip_entries(s3)) == 9
+
+    def test_no_manifest_builds_full(self, gallery):
+        s3, _ = gallery({'g/a.jpg': b'a' * 10}, [_photo('1', 'g/a.jpg', 'a.jpg')])
+
+        result = zip_generator.update_gallery_zip('g')
+
+        assert result['mode'] == 'full' and _zip_entries(s3) == {'a.jpg': b'a' * 10}
+
+    def test_zip_is_current(self):
+        manifest = {'built_at': '2026-01-02T10:00:00.000000Z', 'entries': [{}]}
+
+        assert zip_generator.zip_is_current({'updated_at': '2026-01-02T09:59:59.000000Z'}, manifest)
+        assert not zip_generator.zip_is_current({'updated_at': '2026-01-02T10:00:01.000000Z'}, manifest)
+        assert not zip_generator.zip_is_current({}, None)
+
+
+class TestCopyRange:
+    """Server-side copies respect the minimum part size"""
+
+    def test_small_and_large_ranges(self, gallery):
+        source = os.urandom(200_000)
+        s3, _ = gallery({'src': source}, [])
+
+        writer = zip_generator.S3MultipartWriter('b', 'out', part_size=64 * 1024)
+        writer.write(b'head')
+        writer.copy_range('src', 0, 100_000)      # Top-up read, then a copied part
+        writer.copy_range('src', 100_000, 105_000)  # Too small to copy - buffered
+        writer.copy_range('src', 105_000, 200_000)
+        writer.write(b'tail')
+        writer.close()
+
+        assert s3.completed['out'] == b'head' + source + b'tail'
+        assert writer.position == len(source) + 8
+        assert s3.copied >= 150_000
+
+
+class TestSelectionZip:
+    """Subset ZIPs cached under their photo-id set"""
+
+    def test_digest_ignores_order_and_duplicates(self):
+        assert zip_generator.selection_digest(['b', 'a', 'b']) == zip_generator.selection_digest(['a', 'b'])
+        assert zip_generator.selection_digest(['a']) != zip_generator.selection_digest(['a', 'b'])
+
+    def test_subset_built_once_then_cached(self, gallery):
+        objects = {f'g/p{i}.jpg': os.urandom(20_000) for i in range(5)}
+        photos = [_photo(f'p{i}', f'g/p{i}.jpg', f'IMG_{i}.jpg') for i in range(5)]
+        s3, _ = gallery(objects, photos)
+
+        result = zip_generator.generate_selection_zip('g', ['p3', 'p1', 'deleted'])
+
+        key = zip_generator.selection_zip_key('g', ['p1', 'p3'])
+        assert result['success'] and not result['cached'] and result['s3_key'] == key
+        archive = zipfile.ZipFile(io.BytesIO(s3.completed[key]))
+        assert archive.namelist() == ['IMG_1.jpg', 'IMG_3.jpg']
+        assert archive.read('IMG_3.jpg') == objects['g/p3.jpg']
+
+        s3.gets.clear()
+        again = zip_generator.generate_selection_zip('g', ['p1', 'p3'])
+
+        assert again['cached'] and again['s3_key'] == key
+        assert s3.gets == [] and s3.uploads == {}
+
+    def test_failed_photo_not_cached(self, gallery):
+        objects = {'g/a.jpg': b'a' * 100, 'g/b.jpg': b'b' * 100}
+        s3, _ = gallery(objects, [_photo('a', 'g/a.jpg', 'a.jpg'), _photo('b', 'g/b.jpg', 'b.jpg')])
+        real_get = s3.get_object
+
+        def get_object(Bucket, Key, **kwargs):
+            if Key == 'g/b.jpg':
+                raise IOError('timeout')
+            return real_get(Bucket, Key, **kwargs)
+        s3.get_object = get_object
+
+        result = zip_generator.generate_selection_zip('g', ['a', 'b'])
+
+        assert not result['success']
+        assert zip_generator.selection_zip_key('g', ['a', 'b']) not in s3.objects
@@ -0,0 +1,360 @@
+"""
+Columnar analytics archive
+Raw tracking events older than a few weeks are only read by exports and
+long-range reports, so compact_analytics_archive.py moves them out of
+DynamoDB into Parquet files in S3, one partition per day:
+
+    s3://<photos bucket>/analytics-archive/<archive>/date=YYYY-MM-DD/part-<run>.parquet
+    s3://<photos bucket>/analytics-archive/<archive>/_watermark.json
+
+Archives: 'analytics' (galerly-analytics), 'visitor_tracking' and
+'video_analytics'. Each declares the columns reports filter or aggregate on;
+every other attribute of an item is kept as JSON in the 'extra' column, so
+nothing is lost. Rows are sorted by the archive's owner column, so a filter
+on it (e.g. user_id for a photographer's export) skips whole row groups
+using the Parquet statistics, and only the requested columns are fetched
+(ranged GETs through pyarrow's S3 filesystem).
+
+The watermark is the first day that is not archived. Readers take days
+before it from the archive and the rest from DynamoDB, so events are never
+counted twice while a compaction is running or after one failed half-way.
+
+pyarrow is optional (requirements-archive.txt; a separate layer on the API
+Lambda). The watermark is plain JSON read with boto3, so a reader without
+pyarrow still knows which days are archived: asking for any of them raises
+ArchiveUnavailableError rather than silently returning only DynamoDB's part.
+"""
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from urllib.parse import urlparse
+
+from utils.config import (
+    AWS_ENDPOINT_URL, AWS_REGION, S3_PHOTOS_BUCKET,
+    analytics_table, video_analytics_table, s3_client, LazyTable
+)
+from utils.resource_names import VISITOR_TRACKING_TABLE
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+    ARCHIVE_AVAILABLE = True
+except ImportError:
+    pa = ds = pafs = pq = None
+    ARCHIVE_AVAILABLE = False
+
+ARCHIVE_PREFIX = 'analytics-archive'
+WATERMARK_FILE = '_watermark.json'
+# Rows per Parquet row group: the unit skipped by predicate pushdown
+ROW_GROUP_SIZE = 16384
+# Rows per record batch handed to readers
+READ_BATCH_SIZE = 8192
+EXTRA_COLUMN = 'extra'
+
+# Same table visitor_tracking_handler writes to
+_visitor_tracking_table = LazyTable(
+    os.environ.get('DYNAMODB_TABLE_VISITOR_TRACKING') or VISITOR_TRACKING_TABLE
+)
+
+# Column kinds: 'string', 'float', 'int', 'json' (dict/list stored as a
+# JSON string and decoded again on read)
+ARCHIVES = {
+    'analytics': {
+        'table': lambda: analytics_table,
+        'owner': 'user_id',
+        'columns': [
+            ('id', 'string'), ('user_id', 'string'), ('gallery_id', 'string'),
+            ('photo_id', 'string'), ('event_type', 'string'), ('timestamp', 'string'),
+            ('duration', 'float'), ('metadata', 'json'),
+        ],
+    },
+    'video_analytics': {
+        'table': lambda: video_analytics_table,
+        'owner': 'gallery_id',
+        'columns': [
+            ('id', 'string'), ('gallery_id', 'string'), ('photo_id', 'string'),
+            ('user_id', 'string'), ('session_id', 'string'), ('event_type', 'string'),
+            ('timestamp', 'string'), ('quality', 'string'), ('duration_watched', 'float'),
+            ('total_duration', 'float'), ('completion_rate', 'float'),
+        ],
+    },
+    'visitor_tracking': {
+        'table': lambda: _visitor_tracking_table,
+        'owner': 'session_id',
+        'columns': [
+            ('id', 'string'), ('session_id', 'string'), ('event_type', 'string'),
+            ('timestamp', 'string'), ('page_url', 'string'), ('referrer', 'string'),
+            ('device_type', 'string'), ('browser', 'string'), ('os', 'string'),
+            ('country', 'string'), ('country_code', 'string'), ('city', 'string'),
+            ('event_category', 'string'), ('event_label', 'string'), ('event_value', 'float'),
+            ('duration_seconds', 'float'), ('scroll_depth', 'float'), ('clicks', 'int'),
+            ('total_duration', 'float'),
+        ],
+    },
+}
+
+
+class ArchiveUnavailableError(RuntimeError):
+    """Archived days were requested but pyarrow is not installed"""
+
+
+def _spec(name):
+    if name not in ARCHIVES:
+        raise ValueError(f'Unknown analytics archive: {name}')
+    return ARCHIVES[name]
+
+
+def archive_table(name):
+    """DynamoDB table holding the hot events of an archive"""
+    return _spec(name)['table']()
+
+
+def event_day(timestamp):
+    """YYYY-MM-DD of an ISO timestamp"""
+    return (timestamp or '')[:10]
+
+
+def next_day(day):
+    return (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def previous_day(day):
+    return (datetime.strptime(day, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def _require_pyarrow():
+    if not ARCHIVE_AVAILABLE:
+        raise RuntimeError('pyarrow is required for the analytics archive')
+
+
+def _filesystem():
+    """(pyarrow filesystem, root path) of the archive"""
+    kwargs = {'region': AWS_REGION}
+    if AWS_ENDPOINT_URL:
+        endpoint = urlparse(AWS_ENDPOINT_URL)
+        kwargs['endpoint_override'] = endpoint.netloc or AWS_ENDPOINT_URL
+        kwargs['scheme'] = endpoint.scheme or 'http'
+    return pafs.S3FileSystem(**kwargs), f'{S3_PHOTOS_BUCKET}/{ARCHIVE_PREFIX}'
+
+
+def archive_schema(name):
+    """Arrow schema of an archive's files"""
+    _require_pyarrow()
+    types = {'string': pa.string(), 'json': pa.string(), 'float': pa.float64(), 'int': pa.int64()}
+    fields = [pa.field(column, types[kind]) for column, kind in _spec(name)['columns']]
+    return pa.schema(fields + [pa.field(EXTRA_COLUMN, pa.string())])
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+
+def _column_value(value, kind):
+    """Value converted to a column's kind; raises ValueError if it doesn't fit"""
+    if kind == 'float':
+        return float(value)
+    if kind == 'int':
+        if isinstance(value, bool) or int(value) != value:
+            raise ValueError(f'not an integer: {value!r}')
+        return int(value)
+    if kind == 'json':
+        return json.dumps(value, default=_json_default)
+    if not isinstance(value, str):
+        raise ValueError(f'not a string: {value!r}')
+    return value
+
+
+def to_record(name, item):
+    """
+    Flatten a DynamoDB item into a row of the archive's schema
+    Attributes without a column, or whose value doesn't fit their column's
+    type, are kept in the 'extra' JSON column
+    """
+    record = {}
+    extra = {}
+    for column, kind in _spec(name)['columns']:
+        record[column] = None
+        value = item.get(column)
+        if value is None:
+            continue
+        try:
+            record[column] = _column_value(value, kind)
+        except (TypeError, ValueError):
+            extra[column] = value
+    declared = dict(_spec(name)['columns'])
+    extra.update((key, value) for key, value in item.items() if key not in declared)
+    record[EXTRA_COLUMN] = json.dumps(extra, default=_json_default) if extra else None
+    return record
+
+
+def from_record(name, record):
+    """Inverse of to_record (numbers come back as int/float, not Decimal)"""
+    kinds = dict(_spec(name)['columns'])
+    item = {}
+    for column, value in record.items():
+        if value is None:
+            continue
+        if column == EXTRA_COLUMN:
+            item.update(json.loads(value))
+        elif kinds.get(column) == 'json':
+            item[column] = json.loads(value)
+        else:
+            item[column] = value
+    return item
+
+
+def _partition_dir(root, name, day):
+    return f'{root}/{name}/date={day}'
+
+
+def write_partition(name, day, items, run_id=None):
+    """
+    Write one day's events as a new Parquet file
+
+    Returns:
+        path of the file written
+    """
+    _require_pyarrow()
+    fs, root = _filesystem()
+    owner = _spec(name)['owner']
+    records = sorted((to_record(name, item) for item in items),
+                     key=lambda r: (r.get(owner) or '', r.get('timestamp') or ''))
+    table = pa.Table.from_pylist(records, schema=archive_schema(name))
+
+    path = f"{_partition_dir(root, name, day)}/part-{run_id or uuid.uuid4().hex}.parquet"
+    fs.create_dir(_partition_dir(root, name, day))
+    with fs.open_output_stream(path) as stream:
+        pq.write_table(table, stream, row_group_size=ROW_GROUP_SIZE, compression='zstd')
+    return path
+
+
+def _partition_files(name, start_day, end_day):
+    """Parquet files of the days in [start_day, end_day] (partition pruning)"""
+    fs, root = _filesystem()
+    selector = pafs.FileSelector(f'{root}/{name}', recursive=True, allow_not_found=True)
+    files = []
+    for info in fs.get_file_info(selector):
+        if info.type != pafs.FileType.File or not info.path.endswith('.parquet'):
+            continue
+        partition = info.path.rsplit('/', 2)[-2]
+        if partition.startswith('date=') and start_day <= partition[5:] <= end_day:
+            files.append(info.path)
+    return fs, sorted(files)
+
+
+def _filter_expression(filters):
+    """{column: value or list of values} -> dataset expression"""
+    expression = None
+    for column, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set, frozenset)):
+            term = ds.field(column).isin(list(value))
+        else:
+            term = ds.field(column) == value
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def iter_archive_batches(name, start_day, end_day, columns=None, filters=None):
+    """
+    Stream archived rows of [start_day, end_day] as Arrow record batches
+
+    Args:
+        name: Archive name (see ARCHIVES)
+        start_day, end_day: YYYY-MM-DD, inclusive
+        columns: Columns to read (None: all); others are never fetched
+        filters: {column: value or list of values}; row groups whose
+            statistics exclude the value are skipped
+    """
+    _require_pyarrow()
+    fs, files = _partition_files(name, start_day, end_day)
+    if not files:
+        return
+    dataset = ds.dataset(files, schema=archive_schema(name), format='parquet', filesystem=fs)
+    scanner = dataset.scanner(columns=columns, filter=_filter_expression(filters),
+                              batch_size=READ_BATCH_SIZE)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch
+
+
+def iter_archive_items(name, start_day, end_day, columns=None, filters=None):
+    """Like iter_archive_batches, one dict per event (shaped like the DynamoDB item)"""
+    for batch in iter_archive_batches(name, start_day, end_day, columns, filters):
+        for record in batch.to_pylist():
+            yield from_record(name, record)
+
+
+def read_archive(name, start_day, end_day, columns=None, filters=None):
+    """Archived rows of [start_day, end_day] as one pyarrow Table"""
+    batches = list(iter_archive_batches(name, start_day, end_day, columns, filters))
+    if not batches:
+        schema = archive_schema(name)
+        if columns:
+            schema = pa.schema([schema.field(column) for column in columns])
+        return schema.empty_table()
+    return pa.Table.from_batches(batches)
+
+
+def archived_ids(name, day):
+    """Ids already archived for a day (reads only the id column)"""
+    return set(read_archive(name, day, day, columns=['id']).column('id').to_pylist())
+
+
+def _watermark_key(name):
+    return f'{ARCHIVE_PREFIX}/{name}/{WATERMARK_FILE}'
+
+
+def get_watermark(name):
+    """First day not in the archive (YYYY-MM-DD), or None if nothing is archived"""
+    try:
+        response = s3_client.get_object(Bucket=S3_PHOTOS_BUCKET, Key=_watermark_key(name))
+    except s3_client.exceptions.ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+        return None
+    return json.loads(response['Body'].read()).get('before')
+
+
+def set_watermark(name, day):
+    """Record that every event before day is archived"""
+    body = json.dumps({'before': day, 'updated_at': datetime.now(timezone.utc).isoformat()})
+    s3_client.put_object(Bucket=S3_PHOTOS_BUCKET, Key=_watermark_key(name),
+                         Body=body.encode('utf-8'), ContentType='application/json')
+
+
+def iter_events(name, start_day, end_day, query_hot, columns=None, filters=None):
+    """
+    Events of [start_day, end_day] from the archive and DynamoDB
+
+    Days before the archive's watermark are read from Parquet, later days
+    with query_hot(start_day, end_day), which must yield DynamoDB items of
+    that range. Archived items are decoded back to dicts; numbers are
+    int/float rather than Decimal.
+
+    Raises:
+        ArchiveUnavailableError: the range starts before the watermark and
+            pyarrow is not installed (checked when called, before any read)
+    """
+    watermark = get_watermark(name)
+    if watermark and start_day < watermark and not ARCHIVE_AVAILABLE:
+        raise ArchiveUnavailableError(
+            f'Events before {watermark} are archived and the archive reader (pyarrow) is not installed'
+        )
+    return _iter_events(name, start_day, end_day, watermark, query_hot, columns, filters)
+
+
+def _iter_events(name, start_day, end_day, watermark, query_hot, columns, filters):
+    if watermark and start_day < watermark:
+        yield from iter_archive_items(name, start_day, min(end_day, previous_day(watermark)),
+                                      columns, filters)
+        start_day = watermark
+    if start_day <= end_day:
+        yield from query_hot(start_day, end_day)
@@ -0,0 +1,346 @@
+"""
+Analytics rollups
+Maintains galerly-analytics-rollups: counters written at ingest time so the
+analytics dashboards read a handful of pre-aggregated rows instead of every
+raw event in the date range.
+
+Rows are keyed by gallery_id + rollup_key:
+- day#YYYY-MM-DD             one row per (gallery, day); one counter
+                             attribute per event type (gallery_view: 12, ...)
+- hll#YYYY-MM-DD             one row per (gallery, day) with a HyperLogLog
+                             sketch of the day's visitors (utils/hyperloglog.py)
+- photo#YYYY-MM-DD#photo_id  one row per (gallery, photo, day) with the
+                             photo's counters (photo_view, photo_download, ...)
+
+The date comes first in the sort key, so a date range is a single BETWEEN
+per row type. Counters are updated with ADD, which is atomic and creates
+the row on first use.
+
+Sketches can't be ADDed, so a visitor is merged with a compare-and-set on
+hll_version. Registers only grow, which makes the last sketch this
+container saw a lower bound: a visitor that doesn't raise a register of it
+(every repeat view, and most views once a day is busy) costs no DynamoDB
+call at all. Unique visitors over any range of days, galleries or
+photographers is the count of the merged sketches.
+"""
+import hashlib
+from collections import defaultdict
+from decimal import Decimal
+from boto3.dynamodb.conditions import Key
+from utils.config import analytics_rollups_table
+from utils.hyperloglog import HyperLogLog
+from utils.ttl_cache import TTLCache
+
+DAY_PREFIX = 'day#'
+HLL_PREFIX = 'hll#'
+PHOTO_PREFIX = 'photo#'
+# Event types with a per-photo row (their metadata carries photo_id)
+PHOTO_EVENT_TYPES = ('photo_view', 'photo_download', 'photo_share')
+# Event types whose metadata.ip counts as a visitor
+VISITOR_EVENT_TYPES = ('gallery_view',)
+# Hex digits of sha256(ip) stored per visitor (no raw IPs in rollups)
+VISITOR_ID_LENGTH = 16
+# Attributes of a rollup row that are not counters
+ROW_FIELDS = ('gallery_id', 'rollup_key', 'user_id', 'date', 'photo_id', 'hll', 'hll_version')
+# Compare-and-set attempts when concurrent views race on a day's sketch
+SKETCH_WRITE_ATTEMPTS = 5
+# Last sketch seen per (gallery, day) - today's busy galleries
+SKETCH_CACHE_MAX_SIZE = 1024
+SKETCH_CACHE_TTL_SECONDS = 3600
+
+# (gallery_id, day) -> (hll_version, HyperLogLog)
+_sketch_cache = TTLCache(lambda: SKETCH_CACHE_MAX_SIZE, lambda: SKETCH_CACHE_TTL_SECONDS)
+
+
+def event_day(timestamp):
+    """YYYY-MM-DD of an ISO timestamp"""
+    return timestamp[:10]
+
+
+def day_key(day):
+    return f"{DAY_PREFIX}{day}"
+
+
+def hll_key(day):
+    return f"{HLL_PREFIX}{day}"
+
+
+def photo_key(day, photo_id):
+    return f"{PHOTO_PREFIX}{day}#{photo_id}"
+
+
+def visitor_id(ip):
+    """Stable pseudonymous visitor id for an IP address"""
+    return hashlib.sha256(ip.encode('utf-8')).hexdigest()[:VISITOR_ID_LENGTH]
+
+
+def _event_rows(event):
+    """
+    Rollup rows an event touches, with what it adds to each
+
+    Returns:
+        list of (rollup_key, fields, counters) - fields are SET, counters
+        are ADDed
+    """
+    event_type = event.get('event_type')
+    timestamp = event.get('timestamp') or ''
+    if not event_type or len(timestamp) < 10:
+        return []
+    metadata = event.get('metadata') or {}
+    day = event_day(timestamp)
+    fields = {'user_id': event.get('user_id'), 'date': day}
+    rows = [(day_key(day), fields, {event_type: 1})]
+
+    photo_id = metadata.get('photo_id')
+    if event_type in PHOTO_EVENT_TYPES and photo_id:
+        counters = {event_type: 1}
+        duration = metadata.get('duration')
+        if duration:
+            counters['duration_total'] = Decimal(str(duration))
+            counters['duration_count'] = 1
+        rows.append((photo_key(day, photo_id), {**fields, 'photo_id': photo_id}, counters))
+    return rows
+
+
+def _event_visitor(event):
+    """(day, visitor id) an event counts as a unique visitor for, or None"""
+    ip = (event.get('metadata') or {}).get('ip')
+    timestamp = event.get('timestamp') or ''
+    if event.get('event_type') not in VISITOR_EVENT_TYPES or not ip or len(timestamp) < 10:
+        return None
+    return event_day(timestamp), visitor_id(str(ip))
+
+
+def _update_row(gallery_id, rollup_key, fields, counters):
+    names = {}
+    values = {}
+    sets = []
+    adds = []
+    for i, (name, value) in enumerate(fields.items()):
+        if value is None:
+            continue
+        names[f'#s{i}'] = name
+        values[f':s{i}'] = value
+        sets.append(f'#s{i} = :s{i}')
+    for i, (name, value) in enumerate(counters.items()):
+        names[f'#a{i}'] = name
+        values[f':a{i}'] = value
+        adds.append(f'#a{i} :a{i}')
+
+    expression = f"ADD {', '.join(adds)}"
+    if sets:
+        expression = f"SET {', '.join(sets)} {expression}"
+    analytics_rollups_table.update_item(
+        Key={'gallery_id': gallery_id, 'rollup_key': rollup_key},
+        UpdateExpression=expression,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+
+def _is_condition_failure(error):
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code == 'ConditionalCheckFailedException' or 'ConditionalCheckFailedException' in str(error)
+
+
+def decode_sketch(value):
+    """HyperLogLog from a stored hll attribute (Binary or bytes); None if absent"""
+    if value is None:
+        return None
+    return HyperLogLog.from_bytes(getattr(value, 'value', value))
+
+
+def _read_sketch(gallery_id, day):
+    """(hll_version, sketch) of a gallery-day, read consistently"""
+    response = analytics_rollups_table.get_item(
+        Key={'gallery_id': gallery_id, 'rollup_key': hll_key(day)},
+        ConsistentRead=True,
+        ProjectionExpression='hll, hll_version'
+    )
+    item = response.get('Item') or {}
+    return int(item.get('hll_version', 0)), decode_sketch(item.get('hll')) or HyperLogLog()
+
+
+def _write_sketch(gallery_id, user_id, day, version, sketch):
+    """Store sketch as version + 1 if the row is still at version"""
+    names = {'#hll': 'hll', '#version': 'hll_version', '#date': 'date'}
+    values = {':hll': sketch.to_bytes(), ':next': version + 1, ':date': day}
+    if version:
+        condition = '#version = :version'
+        values[':version'] = version
+    else:
+        condition = 'attribute_not_exists(#version)'
+    sets = '#hll = :hll, #version = :next, #date = :date'
+    if user_id:
+        names['#user'] = 'user_id'
+        values[':user'] = user_id
+        sets += ', #user = :user'
+    analytics_rollups_table.update_item(
+        Key={'gallery_id': gallery_id, 'rollup_key': hll_key(day)},
+        UpdateExpression=f'SET {sets}',
+        ConditionExpression=condition,
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+
+def _record_visitors(gallery_id, user_id, day, visitors):
+    """Merge visitors into the gallery-day sketch"""
+    cache_key = (gallery_id, day)
+    cached = _sketch_cache.get(cache_key)
+    if cached:
+        version, sketch = cached
+        # Registers only grow, so the cached sketch is a lower bound
+        visitors = [v for v in visitors if not sketch.covers(v)]
+        if not visitors:
+            return
+    else:
+        version, sketch = _read_sketch(gallery_id, day)
+
+    for _ in range(SKETCH_WRITE_ATTEMPTS):
+        sketch = sketch.copy()
+        changed = [sketch.add(v) for v in visitors]
+        if not any(changed):
+            _sketch_cache.put(cache_key, (version, sketch))
+            return
+        try:
+            _write_sketch(gallery_id, user_id, day, version, sketch)
+            _sketch_cache.put(cache_key, (version + 1, sketch))
+            return
+        except Exception as e:
+            if not _is_condition_failure(e):
+                raise
+            # Another view won the race; merge into the latest sketch
+            version, sketch = _read_sketch(gallery_id, day)
+    print(f"Visitor sketch for {gallery_id}/{day} still contended after {SKETCH_WRITE_ATTEMPTS} attempts")
+
+
+def _aggregate(events):
+    """
+    Combine what a set of events adds to each rollup row
+
+    Returns:
+        (rows, visitors) - rows is {(gallery_id, rollup_key): (fields, counters)},
+        visitors is {(gallery_id, day): (user_id, [visitor ids])}
+    """
+    rows = {}
+    visitors = {}
+    for event in events:
+        gallery_id = event.get('gallery_id')
+        if not gallery_id:
+            continue
+        for rollup_key, fields, counters in _event_rows(event):
+            row_fields, row_counters = rows.setdefault((gallery_id, rollup_key), ({}, {}))
+            row_fields.update({name: value for name, value in fields.items() if value is not None})
+            for name, value in counters.items():
+                row_counters[name] = row_counters.get(name, 0) + value
+        visitor = _event_visitor(event)
+        if visitor:
+            day, visitor = visitor
+            user_id, day_visitors = visitors.get((gallery_id, day), (None, []))
+            day_visitors.append(visitor)
+            visitors[(gallery_id, day)] = (event.get('user_id') or user_id, day_visitors)
+    return rows, visitors
+
+
+def record_events(events):
+    """
+    Add raw analytics events (as written by analytics_handler.track_event) to
+    their gallery-day rows, visitor sketches and, for photo events, photo-day
+    rows - one update per touched row however many events share it
+    """
+    rows, visitors = _aggregate(events)
+    for (gallery_id, rollup_key), (fields, counters) in rows.items():
+        _update_row(gallery_id, rollup_key, fields, counters)
+    for (gallery_id, day), (user_id, day_visitors) in visitors.items():
+        _record_visitors(gallery_id, user_id, day, day_visitors)
+
+
+def record_event(event):
+    """Add one raw analytics event to its rollups"""
+    record_events([event])
+
+
+def build_rollups(events):
+    """
+    Aggregate raw events into complete rollup rows (used by the backfill)
+
+    Returns:
+        {(gallery_id, rollup_key): row item}
+    """
+    rows, visitors = _aggregate(events)
+    items = {}
+    for (gallery_id, rollup_key), (fields, counters) in rows.items():
+        items[(gallery_id, rollup_key)] = {'gallery_id': gallery_id, 'rollup_key': rollup_key, **fields, **counters}
+    for (gallery_id, day), (user_id, day_visitors) in visitors.items():
+        sketch = HyperLogLog()
+        for visitor in day_visitors:
+            sketch.add(visitor)
+        item = {'gallery_id': gallery_id, 'rollup_key': hll_key(day), 'date': day,
+                'hll': sketch.to_bytes(), 'hll_version': 1}
+        if user_id:
+            item['user_id'] = user_id
+        items[(gallery_id, hll_key(day))] = item
+    return items
+
+
+def _query_range(gallery_id, low, high):
+    query_kwargs = {
+        'KeyConditionExpression': Key('gallery_id').eq(gallery_id) & Key('rollup_key').between(low, high)
+    }
+    items = []
+    while True:
+        response = analytics_rollups_table.query(**query_kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def counters_of(row):
+    """Counter attributes of a rollup row as plain numbers"""
+    return {name: _number(value) for name, value in row.items()
+            if name not in ROW_FIELDS and not isinstance(value, (set, str))}
+
+
+def load_gallery_rollups(gallery_id, start_day, end_day, photos=True):
+    """
+    Rollups of one gallery for the days start_day..end_day (inclusive)
+
+    Args:
+        gallery_id: Gallery ID
+        start_day, end_day: YYYY-MM-DD
+        photos: Also load the per-photo rows
+
+    Returns:
+        {'days': {day: {event_type: count}},
+         'photos': {photo_id: {event_type: count, 'duration_total', 'duration_count'}},
+         'visitors': HyperLogLog of the visitors over the range}
+    """
+    days = {}
+    visitors = HyperLogLog()
+    for row in _query_range(gallery_id, day_key(start_day), day_key(end_day)):
+        days[row.get('date') or row['rollup_key'][len(DAY_PREFIX):]] = counters_of(row)
+    for row in _query_range(gallery_id, hll_key(start_day), hll_key(end_day)):
+        sketch = decode_sketch(row.get('hll'))
+        if sketch:
+            visitors.merge(sketch)
+
+    photo_totals = defaultdict(lambda: defaultdict(int))
+    if photos:
+        # '~' sorts after every photo id character, closing the last day
+        for row in _query_range(gallery_id, photo_key(start_day, ''), photo_key(end_day, '~')):
+            photo_id = row.get('photo_id') or row['rollup_key'].rsplit('#', 1)[-1]
+            for name, value in counters_of(row).items():
+                photo_totals[photo_id][name] += value
+
+    return {
+        'days': days,
+        'photos': {photo_id: dict(counters) for photo_id, counters in photo_totals.items()},
+        'visitors': visitors
+    }
@@ -1,12 +1,45 @@
 """
 Authentication utilities
+
+Session validation runs on every authenticated request, so validated sessions
+are kept in a small per-container cache (SESSION_CACHE_TTL_SECONDS). Deleting
+a session in DynamoDB (logout, invalidate_all_user_sessions) therefore takes
+effect in other warm containers within that window; the container doing the
+delete drops its entry immediately.
+
+When SESSION_SIGNING_KEY is set, new session tokens are HMAC-signed and carry
+the user id and expiry. Forged, tampered or expired tokens are rejected
+without a DynamoDB read; valid ones still need the session row (it is what
+revocation deletes) but only on a cache miss.
 """
+import base64
 import bcrypt
+import hashlib
+import hmac
 import secrets
 import os
+import time
 from datetime import datetime, timedelta, timezone
 from boto3.dynamodb.conditions import Key
-from .config import sessions_table, users_table
+from .config import sessions_table, users_table, api_keys_table
+from .ttl_cache import TTLCache
+
+# Sessions expire 7 days after creation (Swiss law compliance)
+SESSION_LIFETIME = timedelta(days=7)
+
+# Upper bound on how long a revoked session can keep working in another container
+SESSION_CACHE_TTL_SECONDS = 30
+SESSION_CACHE_MAX_SIZE = 4096
+
+SIGNED_TOKEN_PREFIX = 's1'
+
+# API keys: owners are cached briefly (rotation and plan changes reach other
+# containers within the TTL); unknown keys are remembered so guessing
+# doesn't reach DynamoDB
+API_KEY_CACHE_TTL_SECONDS = 60
+API_KEY_CACHE_MAX_SIZE = 2048
+INVALID_API_KEY_CACHE_TTL_SECONDS = 60
+INVALID_API_KEY_CACHE_MAX_SIZE = 4096
 
 def hash_password(password):
     """
@@ -62,31 +95,118 @@ def get_api_key_from_event(event):
     # Also support X-API-Key header
     return headers.get('X-API-Key') or headers.get('x-api-key')
 
+def hash_api_key(api_key):
+    """Lookup hash for an API key (hex SHA-256; keys are high-entropy, no salt needed)"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+# key_hash -> user item for valid keys; key_hash -> True for unknown keys
+_api_key_cache = TTLCache(lambda: API_KEY_CACHE_MAX_SIZE, lambda: API_KEY_CACHE_TTL_SECONDS)
+_invalid_api_key_cache = TTLCache(lambda: INVALID_API_KEY_CACHE_MAX_SIZE, lambda: INVALID_API_KEY_CACHE_TTL_SECONDS)
+_api_key_stats = {'hits': 0, 'misses': 0, 'invalid_hits': 0}
+
+
+def register_api_key(api_key, user, previous_key=None):
+    """
+    Point an API key's hash at its owner (and retire the previous key)
+
+    Args:
+        api_key: New plaintext key
+        user: Owner (needs id and email)
+        previous_key: Key being rotated out, if any
+    """
+    api_keys_table.put_item(Item={
+        'key_hash': hash_api_key(api_key),
+        'user_id': user['id'],
+        'email': user['email'],
+        'created_at': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+    })
+    _invalid_api_key_cache.pop(hash_api_key(api_key))
+    if previous_key:
+        revoke_api_key(previous_key)
+
+
+def revoke_api_key(api_key):
+    """Remove a key's hash row and drop it from this container's cache"""
+    key_hash = hash_api_key(api_key)
+    api_keys_table.delete_item(Key={'key_hash': key_hash})
+    _api_key_cache.pop(key_hash)
+
+
+def _lookup_api_key_owner(api_key, key_hash):
+    """Owner's user item for a key, or None"""
+    row = api_keys_table.get_item(Key={'key_hash': key_hash}).get('Item')
+    if row:
+        user = users_table.get_item(Key={'email': row['email']}).get('Item')
+        # The user row is authoritative: a rotated key must match it
+        if user and user.get('api_key') == api_key:
+            return user
+        return None
+
+    # Keys issued before the hash table existed: find via ApiKeyIndex once,
+    # then record the hash so later lookups take the fast path
+    response = users_table.query(
+        IndexName='ApiKeyIndex',
+        KeyConditionExpression=Key('api_key').eq(api_key)
+    )
+    items = response.get('Items', [])
+    if not items:
+        return None
+    user = items[0]
+    try:
+        register_api_key(api_key, user)
+    except Exception as e:
+        print(f"Error recording API key hash: {str(e)}")
+    return user
+
+
+def _has_api_access(user):
+    """Plan gate for API-key requests, reusing cached feature resolution"""
+    from utils.feature_resolver import get_cached_features
+    plan_id = user.get('plan') or user.get('subscription') or 'free'
+    cached = get_cached_features(user.get('id'), plan_id, int(user.get('features_version', 0)))
+    if cached:
+        features = cached[0]
+    else:
+        from handlers.subscription_handler import get_user_features
+        features, _, _ = get_user_features(user)
+    return bool(features.get('api_access'))
+
+
 def get_user_from_api_key(event):
-    """Authenticate user via API Key"""
+    """
+    Authenticate user via API Key
+
+    Keys resolve through the galerly-api-keys hash table; owners and unknown
+    keys are cached per container (API_KEY_CACHE_TTL_SECONDS and
+    INVALID_API_KEY_CACHE_TTL_SECONDS bound how long a rotated key or a
+    plan downgrade takes to reach other containers).
+    """
     api_key = get_api_key_from_event(event)
     if not api_key:
         return None
         
     try:
-        # Query users table by API key using GSI
-        # Assuming GSI 'ApiKeyIndex' exists on 'api_key' field
-        response = users_table.query(
-            IndexName='ApiKeyIndex',
-            KeyConditionExpression=Key('api_key').eq(api_key)
-        )
-        
-        items = response.get('Items', [])
-        if not items:
+        key_hash = hash_api_key(api_key)
+        if _invalid_api_key_cache.get(key_hash):
+            _api_key_stats['invalid_hits'] += 1
             return None
-            
-        user = items[0]
+
+        user = _api_key_cache.get(key_hash)
+        if user is not None:
+            _api_key_stats['hits'] += 1
+        else:
+            _api_key_stats['misses'] += 1
+            user = _lookup_api_key_owner(api_key, key_hash)
+            if not user:
+                _invalid_api_key_cache.put(key_hash, True)
+                return None
+            _api_key_cache.put(key_hash, user)
         
-        # Enforce Plan Limits: Check if plan still supports API access
-        # Users might downgrade but keep the key - block access if not Ultimate/Pro
-        plan = user.get('plan') or user.get('subscription') or 'free'
-        from handlers.subscription_handler import get_user_features
-        features, _, _ = get_user_features(user)
+        # Enforce Plan Limits: users might downgrade but keep the key -
+        # block access once the plan no longer includes API access
+        if not _has_api_access(user):
+            return None
         
         return user
         
@@ -94,6 +214,162 @@ def get_user_from_api_key(event):
         print(f"Error authenticating with API key: {str(e)}")
     return None
 
+
+def clear_api_key_cache():
+    """Empty the API key caches (tests)"""
+    _api_key_cache.clear()
+    _invalid_api_key_cache.clear()
+    _api_key_stats.update(hits=0, misses=0, invalid_hits=0)
+
+
+def get_api_key_cache_stats():
+    """API key cache counters for this container"""
+    return dict(_api_key_stats, size=len(_api_key_cache), invalid_size=len(_invalid_api_key_cache))
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _signing_key():
+    key = os.environ.get('SESSION_SIGNING_KEY')
+    return key.encode('utf-8') if key else None
+
+
+def _sign(key, payload):
+    return _b64encode(hmac.new(key, payload.encode('utf-8'), hashlib.sha256).digest())
+
+
+def generate_session_token(user_id):
+    """
+    New session token for a login
+
+    Signed (s1.<nonce>.<user_id>.<expires>.<sig>) when SESSION_SIGNING_KEY
+    is configured, otherwise a plain random token.
+    """
+    key = _signing_key()
+    if not key or not user_id:
+        return generate_secure_token(32)
+    expires = int(time.time() + SESSION_LIFETIME.total_seconds())
+    payload = '.'.join([
+        SIGNED_TOKEN_PREFIX,
+        generate_secure_token(24),
+        _b64encode(str(user_id).encode('utf-8')),
+        str(expires)
+    ])
+    return f"{payload}.{_sign(key, payload)}"
+
+
+def verify_session_token(token):
+    """
+    Check a signed session token without touching DynamoDB
+
+    Returns:
+        {'user_id': ..., 'expires': ...} for a valid signed token,
+        False for a signed token that is forged, tampered or expired,
+        None if the token is unsigned (or no key is configured) and
+        has to be looked up
+    """
+    if not token.startswith(SIGNED_TOKEN_PREFIX + '.'):
+        return None
+    key = _signing_key()
+    if not key:
+        return None
+    try:
+        payload, signature = token.rsplit('.', 1)
+        _, _, user_id, expires = payload.split('.')
+        if not hmac.compare_digest(signature, _sign(key, payload)):
+            return False
+        if int(expires) <= time.time():
+            return False
+        return {'user_id': _b64decode(user_id).decode('utf-8'), 'expires': int(expires)}
+    except (ValueError, UnicodeDecodeError):
+        return False
+
+
+def _session_expiry(session):
+    """Unix time at which a session row expires"""
+    created_at = datetime.fromisoformat(session.get('created_at', '2000-01-01').replace('Z', ''))
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return (created_at + SESSION_LIFETIME).timestamp()
+
+
+# token -> (session item, expires at)
+_session_cache = TTLCache(lambda: SESSION_CACHE_MAX_SIZE, lambda: SESSION_CACHE_TTL_SECONDS)
+_session_stats = {'hits': 0, 'misses': 0, 'rejected_signed': 0}
+
+
+def load_session(token):
+    """
+    Validated session row for a token, or None
+
+    Served from the per-container cache when possible; expired sessions are
+    deleted. Used by both get_user_from_token and get_session.
+    """
+    claims = verify_session_token(token)
+    if claims is False:
+        _session_stats['rejected_signed'] += 1
+        return None
+
+    entry = _session_cache.get(token)
+    if entry is not None:
+        session, expires = entry
+        if expires > time.time():
+            _session_stats['hits'] += 1
+            return session
+        _session_cache.pop(token)
+
+    _session_stats['misses'] += 1
+    response = sessions_table.get_item(Key={'token': token})
+    session = response.get('Item')
+    if not session:
+        return None
+
+    expires = _session_expiry(session)
+    if claims:
+        expires = min(expires, claims['expires'])
+        if (session.get('user') or {}).get('id') != claims['user_id']:
+            return None
+
+    if expires <= time.time():
+        sessions_table.delete_item(Key={'token': token})
+        return None
+
+    _session_cache.put(token, (session, expires))
+    return session
+
+
+def forget_session(token):
+    """Drop a token from this container's cache (after deleting the session row)"""
+    if token:
+        _session_cache.pop(token)
+
+
+def forget_user_sessions(user_id=None, email=None):
+    """Drop every cached session of a user in this container; returns the count"""
+    def belongs_to_user(entry):
+        session_user = entry[0].get('user') or {}
+        return (user_id and session_user.get('id') == user_id) or \
+            (email and session_user.get('email') == email)
+    return _session_cache.discard_where(belongs_to_user)
+
+
+def clear_session_cache():
+    """Empty the session cache (tests)"""
+    _session_cache.clear()
+    _session_stats.update(hits=0, misses=0, rejected_signed=0)
+
+
+def get_session_cache_stats():
+    """Session cache counters for this container"""
+    return dict(_session_stats, size=len(_session_cache))
+
+
 def get_user_from_token(event):
     """Extract user from Cookie/Authorization and fetch from DynamoDB"""
     # 1. Try Session Token (Cookie)
@@ -101,19 +377,9 @@ def get_user_from_token(event):
     
     if token:
         try:
-            response = sessions_table.get_item(Key={'token': token})
-            
-            if 'Item' in response:
-                session = response['Item']
-                
-                # Check if session is expired (7 days - Swiss law compliance)
-                created_at = datetime.fromisoformat(session.get('created_at', '2000-01-01').replace('Z', ''))
-                age = datetime.now(timezone.utc) - created_at
-                
-                if age <= timedelta(days=7):
-                    return session.get('user')
-                else:
-                    sessions_table.delete_item(Key={'token': token})
+            session = load_session(token)
+            if session:
+                return session.get('user')
         except Exception as e:
             print(f"Error in auth (session): {str(e)}")
             
@@ -123,19 +389,8 @@ def get_user_from_token(event):
 def get_session(token):
     """Get session from token - for security decorator"""
     try:
-        response = sessions_table.get_item(Key={'token': token})
-        
-        if 'Item' not in response:
-            return None
-        
-        session = response['Item']
-        
-        # Check if session is expired (7 days)
-        created_at = datetime.fromisoformat(session.get('created_at', '2000-01-01').replace('Z', ''))
-        age = datetime.now(timezone.utc) - created_at
-        
-        if age > timedelta(days=7):
-            sessions_table.delete_item(Key={'token': token})
+        session = load_session(token)
+        if not session:
             return None
         
         # Return session data
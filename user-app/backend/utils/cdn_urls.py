@@ -39,6 +39,11 @@ RENDITION_SIZES = {
     'large': (4000, 4000)          # High-res zoom
 }
 
+# Rendition file extension per format; srcset variants are listed in
+# FORMAT_PREFERENCE order so clients can emit <picture> sources as-is
+RENDITION_EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp', 'avif': 'avif'}
+FORMAT_PREFERENCE = ('avif', 'webp', 'jpeg')
+
 def get_zip_url(gallery_id):
     """
     Generate ZIP download URL for bulk downloads
@@ -49,9 +54,21 @@ def get_zip_url(gallery_id):
     Returns:
         URL to gallery ZIP file
     """
-    from utils.config import S3_RENDITIONS_BUCKET
-    
     zip_s3_key = f"{gallery_id}/gallery-all-photos.zip"
+    return get_zip_object_url(zip_s3_key)
+
+def get_zip_object_url(zip_s3_key):
+    """
+    Generate download URL for a ZIP stored in the renditions bucket
+    (gallery ZIPs and selection ZIPs)
+    
+    Args:
+        zip_s3_key: ZIP key in the renditions bucket
+    
+    Returns:
+        URL to the ZIP file
+    """
+    from utils.config import S3_RENDITIONS_BUCKET
     
     if IS_LOCALSTACK_S3 and AWS_ENDPOINT_URL:
         # LocalStack: ZIP files are stored in renditions bucket
@@ -62,13 +79,14 @@ def get_zip_url(gallery_id):
         # Production: CloudFront
         return f"https://{CDN_DOMAIN}/{zip_s3_key}"
 
-def get_rendition_url(s3_key, size_name):
+def get_rendition_url(s3_key, size_name, image_format='jpeg'):
     """
     Generate rendition URL for CloudFront or LocalStack S3
     
     Args:
         s3_key: Original S3 key (gallery_id/photo_id.ext)
         size_name: Rendition size ('thumbnail', 'small', 'medium', 'large')
+        image_format: 'jpeg' (default), 'webp' or 'avif'
     
     Returns:
         URL to pre-generated rendition
@@ -92,8 +110,8 @@ def get_rendition_url(s3_key, size_name):
     photo_id = photo_filename.rsplit('.', 1)[0]  # Remove extension
     
     # Generate rendition key
-    # Format: renditions/gallery_id/photo_id_size.jpg
-    rendition_key = f"renditions/{gallery_id}/{photo_id}_{size_name}.jpg"
+    # Format: renditions/gallery_id/photo_id_size.jpg (.webp/.avif for variants)
+    rendition_key = f"renditions/{gallery_id}/{photo_id}_{size_name}.{RENDITION_EXTENSIONS[image_format]}"
     
     # Generate URL based on environment
     if IS_LOCALSTACK_S3:
@@ -127,23 +145,68 @@ def get_original_url(s3_key):
         # Production: CloudFront URL to photos bucket
         return f"https://{CDN_DOMAIN}/{s3_key}"
 
-def get_photo_urls(s3_key):
+def get_srcset(s3_key, image_format='jpeg', dimensions=None):
+    """
+    srcset attribute value for one rendition format
+    
+    Args:
+        s3_key: S3 key (gallery_id/photo_id.ext)
+        image_format: 'jpeg', 'webp' or 'avif'
+        dimensions: Optional original (width, height) or {'width', 'height'};
+            without it each size is described by its box width
+    
+    Returns:
+        "url 400w, url 800w, ..." (sizes that collapse to the same width are listed once)
+    """
+    from utils.rendition_core import MODERN_FORMATS, fit_within
+    
+    if isinstance(dimensions, dict):
+        dimensions = (dimensions.get('width'), dimensions.get('height'))
+    if not dimensions or not all(dimensions):
+        dimensions = None
+    
+    sizes = RENDITION_SIZES
+    if image_format in MODERN_FORMATS:
+        sizes = {name: box for name, box in RENDITION_SIZES.items() if name in MODERN_FORMATS[image_format]['quality']}
+    
+    candidates = []
+    seen_widths = set()
+    for size_name, box in sizes.items():
+        width = fit_within((int(dimensions[0]), int(dimensions[1])), box)[0] if dimensions else box[0]
+        if width in seen_widths:
+            continue
+        seen_widths.add(width)
+        candidates.append(f"{get_rendition_url(s3_key, size_name, image_format)} {width}w")
+    return ', '.join(candidates)
+
+
+def get_photo_urls(s3_key, formats=None, dimensions=None):
     """
     Generate all URL variants for a photo
     Returns pre-generated rendition URLs for responsive display
     
     Args:
         s3_key: S3 key (gallery_id/photo_id.ext)
+        formats: Modern formats rendered for this photo (['webp', 'avif'],
+            see rendition_core.enabled_formats)
+        dimensions: Optional original (width, height) for exact srcset widths
     
     Returns:
         dict with url (original), thumbnail_url, small_url, medium_url, large_url
+        and srcset ({format: srcset} for jpeg plus each rendered format, most
+        efficient format first)
     """
+    rendered = set(formats or ()) | {'jpeg'}
     return {
         'url': get_original_url(s3_key),           # Original for download
         'thumbnail_url': get_rendition_url(s3_key, 'thumbnail'),  # 400x400
         'small_url': get_rendition_url(s3_key, 'small'),          # 800x600
         'medium_url': get_rendition_url(s3_key, 'medium'),        # 2000x2000
-        'large_url': get_rendition_url(s3_key, 'large')           # 4000x4000
+        'large_url': get_rendition_url(s3_key, 'large'),          # 4000x4000
+        'srcset': {
+            image_format: get_srcset(s3_key, image_format, dimensions)
+            for image_format in FORMAT_PREFERENCE if image_format in rendered
+        }
     }
 
 # Debug logging for local development
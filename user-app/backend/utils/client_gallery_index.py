@@ -0,0 +1,134 @@
+"""
+Client gallery reverse index
+Maintains galerly-client-galleries: one row per (client_email, gallery_id)
+for every gallery shared with a client, so the client dashboard is a single
+query instead of a scan over every gallery in the system.
+
+Rows carry the gallery owner's user_id so the full gallery items can be
+fetched with BatchGetItem on the galleries primary key (utils/request_scope).
+"""
+from datetime import datetime, timezone
+from boto3.dynamodb.conditions import Key
+from utils.config import client_galleries_table, galleries_table
+from utils.request_scope import current_scope
+
+
+def get_gallery_client_emails(gallery):
+    """Normalized set of client emails for a gallery (client_emails + legacy client_email)"""
+    if not gallery:
+        return set()
+    emails = {email.strip().lower() for email in gallery.get('client_emails', []) or [] if email and email.strip()}
+    legacy_email = (gallery.get('client_email') or '').strip().lower()
+    if legacy_email:
+        emails.add(legacy_email)
+    return emails
+
+
+def sync_client_gallery_index(gallery, previous_emails=None):
+    """
+    Bring index rows for a gallery in line with its current client emails
+
+    Args:
+        gallery: Gallery item (needs user_id, id and client_emails)
+        previous_emails: Client emails before the change; rows for emails no
+            longer on the gallery are removed. Pass None for new galleries.
+    """
+    gallery_id = gallery.get('id')
+    user_id = gallery.get('user_id')
+    if not gallery_id or not user_id:
+        return
+
+    current = get_gallery_client_emails(gallery)
+    removed = {email.lower() for email in (previous_emails or [])} - current
+    indexed_at = datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+
+    with client_galleries_table.batch_writer() as batch:
+        for email in current:
+            batch.put_item(Item={
+                'client_email': email,
+                'gallery_id': gallery_id,
+                'user_id': user_id,
+                'gallery_created_at': gallery.get('created_at', indexed_at),
+                'indexed_at': indexed_at
+            })
+        for email in removed:
+            batch.delete_item(Key={'client_email': email, 'gallery_id': gallery_id})
+
+
+def add_gallery_client_email(gallery, email):
+    """
+    Add a client email to a gallery's client_emails and index it
+
+    Args:
+        gallery: Gallery item (needs user_id and id); its client_emails list
+            is updated in place
+        email: Client email to grant access to
+
+    Returns:
+        True if the email was added, False if it was already on the gallery
+    """
+    email = email.strip().lower()
+    previous_emails = get_gallery_client_emails(gallery)
+    if email in previous_emails:
+        return False
+
+    client_emails = list(gallery.get('client_emails') or []) + [email]
+    galleries_table.update_item(
+        Key={'user_id': gallery['user_id'], 'id': gallery['id']},
+        UpdateExpression='SET client_emails = :emails, updated_at = :time',
+        ExpressionAttributeValues={
+            ':emails': client_emails,
+            ':time': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+        }
+    )
+    gallery['client_emails'] = client_emails
+    sync_client_gallery_index(gallery, previous_emails)
+    return True
+
+
+def remove_client_gallery_index(gallery):
+    """Delete all index rows for a gallery (call when the gallery is deleted)"""
+    gallery_id = gallery.get('id')
+    emails = get_gallery_client_emails(gallery)
+    if not gallery_id or not emails:
+        return
+
+    with client_galleries_table.batch_writer() as batch:
+        for email in emails:
+            batch.delete_item(Key={'client_email': email, 'gallery_id': gallery_id})
+
+
+def get_client_gallery_keys(client_email):
+    """
+    Primary keys of all galleries shared with a client
+
+    Returns:
+        list of {'user_id': ..., 'id': ...} dicts
+    """
+    keys = []
+    query_kwargs = {
+        'KeyConditionExpression': Key('client_email').eq(client_email.strip().lower()),
+        'ProjectionExpression': 'gallery_id, user_id'
+    }
+    while True:
+        response = client_galleries_table.query(**query_kwargs)
+        for item in response.get('Items', []):
+            keys.append({'user_id': item['user_id'], 'id': item['gallery_id']})
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return keys
+
+
+def batch_get_galleries(keys):
+    """
+    Fetch gallery items by primary key with BatchGetItem
+
+    Args:
+        keys: list of {'user_id': ..., 'id': ...}
+
+    Returns:
+        list of gallery items (missing galleries are omitted)
+    """
+    galleries = current_scope().batch_get_items(galleries_table, keys)
+    return [gallery for gallery in galleries if gallery]
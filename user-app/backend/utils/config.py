@@ -39,11 +39,14 @@ from utils.resource_names import (
     SUBSCRIPTIONS_TABLE,
     BILLING_TABLE,
     ANALYTICS_TABLE,
+    ANALYTICS_ROLLUPS_TABLE,
     AUDIT_LOG_TABLE,
     RATE_LIMITS_TABLE,
     PLAN_VIOLATIONS_TABLE,
     CLIENT_FAVORITES_TABLE,
     CLIENT_FEEDBACK_TABLE,
+    CLIENT_GALLERIES_TABLE,
+    API_KEYS_TABLE,
     EMAIL_TEMPLATES_TABLE,
     FEATURES_TABLE,
     USER_FEATURES_TABLE,
@@ -55,6 +58,8 @@ from utils.resource_names import (
     BACKGROUND_JOBS_TABLE,
     VISITOR_TRACKING_TABLE,
     VIDEO_ANALYTICS_TABLE,
+    LEADS_TABLE,
+    SALES_TABLE,
     # S3 Buckets
     S3_FRONTEND_BUCKET,
     S3_PHOTOS_BUCKET,
@@ -267,8 +272,11 @@ sessions_table = LazyTable(SESSIONS_TABLE)
 billing_table = LazyTable(BILLING_TABLE)
 subscriptions_table = LazyTable(SUBSCRIPTIONS_TABLE)
 analytics_table = LazyTable(ANALYTICS_TABLE)
+analytics_rollups_table = LazyTable(ANALYTICS_ROLLUPS_TABLE)
 client_favorites_table = LazyTable(CLIENT_FAVORITES_TABLE)
 client_feedback_table = LazyTable(CLIENT_FEEDBACK_TABLE)
+client_galleries_table = LazyTable(CLIENT_GALLERIES_TABLE)
+api_keys_table = LazyTable(API_KEYS_TABLE)
 email_templates_table = LazyTable(EMAIL_TEMPLATES_TABLE)
 features_table = LazyTable(FEATURES_TABLE)
 user_features_table = LazyTable(USER_FEATURES_TABLE)
@@ -280,6 +288,8 @@ seo_settings_table = LazyTable(SEO_SETTINGS_TABLE)
 background_jobs_table = LazyTable(BACKGROUND_JOBS_TABLE)
 visitor_tracking_table = LazyTable(VISITOR_TRACKING_TABLE)
 video_analytics_table = LazyTable(VIDEO_ANALYTICS_TABLE)
+leads_table = LazyTable(LEADS_TABLE)
+sales_table = LazyTable(SALES_TABLE)
 client_feedback_table = LazyTable('DYNAMODB_TABLE_CLIENT_FEEDBACK')
 email_templates_table = LazyTable('DYNAMODB_TABLE_EMAIL_TEMPLATES')
 features_table = LazyTable('DYNAMODB_TABLE_FEATURES')
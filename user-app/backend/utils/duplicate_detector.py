@@ -1,8 +1,48 @@
 """
 Duplicate photo detection utility
 Detects duplicate photos by filename and file size
+
+Pre-upload checks answer from two sparse indexes on the photos table instead
+of listing the gallery:
+- UserFileHashIndex (user_id, file_hash): exact copies, in any of the
+  photographer's galleries
+- GalleryNameSizeIndex (gallery_id, name_size): same normalized filename with
+  a similar size; name_size is "<name>#<zero-padded size>", so the size
+  tolerance is a single BETWEEN on the sort key
+
+Near duplicates (the same frame re-exported at another quality or size) are
+found from the perceptual_hash stored at processing time (a 64-bit dHash, see
+rendition_core.perceptual_hash) with a vectorized Hamming-distance search.
 """
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Key
+from utils.config import photos_table
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Browsers report different sizes for some formats (HEIC), so sizes within
+# 10% of each other count as the same file
+DUPLICATE_SIZE_TOLERANCE = 0.1
+# Digits of the size in name_size (13 digits = up to ~9TB)
+NAME_SIZE_DIGITS = 13
+# Parallel index queries for a batch check
+DUPLICATE_QUERY_WORKERS = 8
+# Hamming distance (of 64 bits) up to which two perceptual hashes are the
+# same picture - re-encodes and resizes stay well under it, different frames
+# of a burst are usually above
+NEAR_DUPLICATE_MAX_DISTANCE = 6
+# Largest distance a search may ask for. Each extra bit adds a band and
+# narrows all of them, so candidate runs grow fast: on 50k uniform hashes
+# the banded search takes ~0.14s at 6, ~0.55s at 8 and ~8s at 15
+# (benchmarks/bench_near_duplicates.py) - 8 keeps it under a second
+NEAR_DUPLICATE_DISTANCE_LIMIT = 8
+# Photo fields loaded for a near-duplicate search
+NEAR_DUPLICATE_FIELDS = ('id', 'gallery_id', 'filename', 'file_size', 'url', 'medium_url',
+                         'thumbnail_url', 'created_at', 'perceptual_hash')
 
 def calculate_file_hash(image_data):
     """
@@ -111,3 +151,285 @@ def check_for_duplicates_in_gallery(image_data, existing_photos, filename_from_c
         'duplicates': duplicates
     }
 
+
+
+def name_size_key(filename, file_size):
+    """GalleryNameSizeIndex sort key, or None when the name or size is missing"""
+    name = normalize_filename(filename)
+    size = int(file_size or 0)
+    if not name or size <= 0:
+        return None
+    return f"{name}#{size:0{NAME_SIZE_DIGITS}d}"
+
+
+def duplicate_index_fields(filename, file_size, file_hash=None):
+    """
+    Attributes that put a photo record in the duplicate indexes
+
+    Only set values are returned - an empty string is not allowed as a
+    secondary index key, and missing attributes keep the indexes sparse.
+    """
+    fields = {}
+    if file_hash:
+        fields['file_hash'] = file_hash
+    key = name_size_key(filename, file_size)
+    if key:
+        fields['name_size'] = key
+    return fields
+
+
+def sizes_match(size_a, size_b):
+    """Same size within DUPLICATE_SIZE_TOLERANCE of the larger one"""
+    size_a, size_b = float(size_a or 0), float(size_b or 0)
+    return abs(size_a - size_b) <= max(size_a, size_b) * DUPLICATE_SIZE_TOLERANCE
+
+
+def _query_all(**query_kwargs):
+    items = []
+    while True:
+        response = photos_table.query(**query_kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _name_size_matches(gallery_id, filename, file_size):
+    """Photos of the gallery with the same normalized name and a size within tolerance"""
+    name = normalize_filename(filename)
+    size = int(file_size or 0)
+    if not name or size <= 0:
+        return []
+    # |p - s| <= 0.1 * max(p, s)  <=>  0.9 * s <= p <= s / 0.9
+    low = int(size * (1 - DUPLICATE_SIZE_TOLERANCE))
+    high = int(size / (1 - DUPLICATE_SIZE_TOLERANCE)) + 1
+    photos = _query_all(
+        IndexName='GalleryNameSizeIndex',
+        KeyConditionExpression=Key('gallery_id').eq(gallery_id) & Key('name_size').between(
+            f"{name}#{low:0{NAME_SIZE_DIGITS}d}", f"{name}#{high:0{NAME_SIZE_DIGITS}d}")
+    )
+    # The range is on the padded string - recheck the exact rule
+    return [photo for photo in photos
+            if photo.get('name_size', '').rsplit('#', 1)[0] == name and sizes_match(photo.get('file_size'), size)]
+
+
+def _hash_matches(user_id, file_hash):
+    """The photographer's photos with this exact content hash (any gallery)"""
+    if not file_hash:
+        return []
+    return _query_all(
+        IndexName='UserFileHashIndex',
+        KeyConditionExpression=Key('user_id').eq(user_id) & Key('file_hash').eq(file_hash)
+    )
+
+
+def _duplicate_entry(photo, match_type):
+    return {
+        'id': photo.get('id'),
+        'gallery_id': photo.get('gallery_id'),
+        'filename': photo.get('filename'),
+        'file_size': photo.get('file_size'),
+        'url': photo.get('url'),
+        'medium_url': photo.get('medium_url'),
+        'thumbnail_url': photo.get('thumbnail_url'),
+        'uploaded_at': photo.get('created_at'),
+        'match_type': match_type
+    }
+
+
+def find_duplicates(user_id, gallery_id, candidates, across_galleries=False):
+    """
+    Duplicate check for a batch of files before upload, from index lookups only
+
+    A candidate matches an existing photo with the same content hash (when
+    the client sent one) or, in the target gallery, the same normalized
+    filename and a similar size. With across_galleries, hash matches in any
+    of the photographer's galleries count too.
+
+    Args:
+        user_id: Photographer ID
+        gallery_id: Target gallery
+        candidates: list of {'filename', 'file_size', 'file_hash' (optional)}
+        across_galleries: Report hash matches from every gallery
+
+    Returns:
+        list (same order as candidates) of {'filename', 'file_size',
+        'has_duplicates', 'duplicate_count', 'duplicates'}
+    """
+    def check(candidate):
+        filename = candidate.get('filename', '')
+        file_size = candidate.get('file_size', 0)
+        duplicates = {}
+        for photo in _hash_matches(user_id, candidate.get('file_hash')):
+            if across_galleries or photo.get('gallery_id') == gallery_id:
+                duplicates[photo.get('id')] = _duplicate_entry(photo, 'exact_file')
+        for photo in _name_size_matches(gallery_id, filename, file_size):
+            duplicates.setdefault(photo.get('id'), _duplicate_entry(photo, 'filename_size_match'))
+        return {
+            'filename': filename,
+            'file_size': file_size,
+            'has_duplicates': bool(duplicates),
+            'duplicate_count': len(duplicates),
+            'duplicates': list(duplicates.values())
+        }
+
+    if not candidates:
+        return []
+    with ThreadPoolExecutor(max_workers=min(DUPLICATE_QUERY_WORKERS, len(candidates))) as pool:
+        return list(pool.map(check, candidates))
+
+
+def hash_array(hex_hashes):
+    """uint64 array of 16-hex-digit perceptual hashes"""
+    return np.array([int(value, 16) for value in hex_hashes], dtype=np.uint64)
+
+
+def _popcount(values):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    # NumPy < 2.0: count the bits of every byte
+    return np.unpackbits(values.view(np.uint8)).reshape(len(values), -1).sum(axis=1)
+
+
+def hamming_distances(hashes, target):
+    """Bit distance from every hash in a uint64 array to one hash"""
+    return _popcount(np.bitwise_xor(hashes, np.uint64(target)))
+
+
+def near_duplicate_pairs(hashes, max_distance=None):
+    """
+    Every pair of hashes within max_distance bits of each other
+
+    Banded search instead of comparing all n^2 pairs: the 64 bits are split
+    into max_distance + 1 bands, and two hashes that differ in at most
+    max_distance bits are identical in at least one band. Only hashes sharing
+    a band value are compared, so the cost follows the number of near matches
+    rather than the square of the collection size.
+
+    Args:
+        hashes: uint64 array (hash_array)
+        max_distance: Largest Hamming distance that counts (default
+            NEAR_DUPLICATE_MAX_DISTANCE, at most NEAR_DUPLICATE_DISTANCE_LIMIT)
+
+    Returns:
+        (first, second, distance) int arrays - first < second, each pair once
+    """
+    if max_distance is None:
+        max_distance = NEAR_DUPLICATE_MAX_DISTANCE
+    if not 0 <= max_distance <= NEAR_DUPLICATE_DISTANCE_LIMIT:
+        raise ValueError(f"max_distance must be between 0 and {NEAR_DUPLICATE_DISTANCE_LIMIT}")
+    count = len(hashes)
+    empty = np.array([], dtype=np.int64)
+    if count < 2:
+        return empty, empty, empty
+
+    bands = max_distance + 1
+    first, second = [], []
+    start = 0
+    for band in range(bands):
+        width = (64 - start) // (bands - band)
+        values = (hashes >> np.uint64(start)) & np.uint64((1 << width) - 1)
+        start += width
+        order = np.argsort(values, kind='stable')
+        ordered = values[order]
+        # Pairs inside runs of equal band values: compare each sorted position
+        # with the one `offset` further on while any run is still that long
+        sorted_hashes = hashes[order]
+        offset = 1
+        while offset < count:
+            same = np.flatnonzero(ordered[:-offset] == ordered[offset:])
+            if not len(same):
+                break
+            # Only real matches are kept, so candidates never pile up
+            close = same[_popcount(sorted_hashes[same] ^ sorted_hashes[same + offset]) <= max_distance]
+            first.append(order[close])
+            second.append(order[close + offset])
+            offset += 1
+
+    if not first:
+        return empty, empty, empty
+    first, second = np.concatenate(first), np.concatenate(second)
+    low, high = np.minimum(first, second), np.maximum(first, second)
+    # A pair matching in several bands is found once per band
+    pairs = np.unique(low.astype(np.int64) * count + high)
+    low, high = pairs // count, pairs % count
+    distances = _popcount(np.bitwise_xor(hashes[low], hashes[high])).astype(np.int64)
+    return low, high, distances
+
+
+def near_duplicate_groups(photos, max_distance=None):
+    """
+    Group photos whose perceptual hashes are within max_distance bits
+
+    Matches are transitive (A~B and B~C put A, B and C in one group).
+    Photos without a perceptual_hash are ignored.
+
+    Returns:
+        list of groups, largest first; each group is a list of
+        _duplicate_entry dicts with 'distance' = bits from the group's first photo
+    """
+    photos = [photo for photo in photos if photo.get('perceptual_hash')]
+    hashes = hash_array(photo['perceptual_hash'] for photo in photos)
+    first, second, _ = near_duplicate_pairs(hashes, max_distance)
+
+    parent = list(range(len(photos)))
+
+    def root(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for a, b in zip(first.tolist(), second.tolist()):
+        parent[root(a)] = root(b)
+
+    members = {}
+    for index in sorted(set(first.tolist()) | set(second.tolist())):
+        members.setdefault(root(index), []).append(index)
+
+    groups = []
+    for indexes in members.values():
+        distances = hamming_distances(hashes[indexes], hashes[indexes[0]]).tolist()
+        groups.append([{**_duplicate_entry(photos[index], 'perceptual'), 'distance': distance}
+                       for index, distance in zip(indexes, distances)])
+    groups.sort(key=len, reverse=True)
+    return groups
+
+
+def _photos_with_hashes(user_id, gallery_id=None):
+    """The fields near-duplicate search needs, for one gallery or all of a photographer's photos"""
+    names = {f'#f{i}': field for i, field in enumerate(NEAR_DUPLICATE_FIELDS)}
+    if gallery_id:
+        condition = Key('gallery_id').eq(gallery_id)
+        index_name = 'GalleryIdIndex'
+    else:
+        condition = Key('user_id').eq(user_id)
+        index_name = 'UserIdIndex'
+    return _query_all(
+        IndexName=index_name,
+        KeyConditionExpression=condition,
+        ProjectionExpression=', '.join(names),
+        ExpressionAttributeNames=names
+    )
+
+
+def find_near_duplicates(user_id, gallery_id=None, max_distance=None):
+    """
+    Groups of visually identical photos in a gallery, or across all of the
+    photographer's galleries when gallery_id is None
+
+    Args:
+        user_id: Photographer ID
+        gallery_id: Gallery to search (None = whole account)
+        max_distance: Hamming distance threshold (see near_duplicate_pairs)
+
+    Returns:
+        {'groups': near_duplicate_groups(...), 'photos_searched': int}
+    """
+    if np is None:
+        raise RuntimeError('numpy is required for near-duplicate search')
+    photos = _photos_with_hashes(user_id, gallery_id)
+    return {
+        'groups': near_duplicate_groups(photos, max_distance),
+        'photos_searched': sum(1 for photo in photos if photo.get('perceptual_hash'))
+    }
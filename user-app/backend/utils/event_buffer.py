@@ -0,0 +1,135 @@
+"""
+Buffered tracking-event writes
+Tracking endpoints (analytics events, photo/video engagement, visitor
+tracking) append their items to an invocation-wide buffer instead of doing a
+put_item each. At the end of the invocation the buffer is flushed with
+batch_writer, which sends BatchWriteItem calls of 25 items and retries
+unprocessed items, so a batch of 100 events is 4 round trips instead of 100.
+
+api.handler opens a buffer per invocation and flushes it in its finally
+block. Code running outside a request (scripts, scheduled jobs, direct
+handler calls in tests) has no buffer and writes through immediately.
+
+Items can name an after-write hook (e.g. analytics rollups); it is called
+once per flush with every item of that table that was written, so it can
+coalesce its own updates.
+"""
+import contextvars
+import threading
+
+# DynamoDB BatchWriteItem limit (batch_writer sends groups of this size)
+BATCH_WRITE_MAX_ITEMS = 25
+# Flush a table early once this many items are pending (bounds memory on
+# very large client batches)
+MAX_PENDING_ITEMS = 500
+
+_current_buffer = contextvars.ContextVar('galerly_event_buffer', default=None)
+
+
+class EventBuffer:
+    """Pending tracking items for one invocation, grouped by table"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'items': 0,         # items buffered
+            'flushed': 0,       # items written
+            'batches': 0,       # BatchWriteItem groups sent (25 items each)
+            'errors': 0
+        }
+
+    def put(self, table, item, after_write=None):
+        """Queue an item; flushes the table early if too many are pending"""
+        group_key = (id(table), after_write)
+        with self._lock:
+            group = self._pending.setdefault(group_key, (table, after_write, []))
+            group[2].append(item)
+            self.stats['items'] += 1
+            full = len(group[2]) >= MAX_PENDING_ITEMS
+        if full:
+            self._flush_group(group_key)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(items) for _, _, items in self._pending.values())
+
+    def flush(self):
+        """Write every pending item; never raises"""
+        with self._lock:
+            group_keys = list(self._pending)
+        for group_key in group_keys:
+            self._flush_group(group_key)
+
+    def _flush_group(self, group_key):
+        with self._lock:
+            group = self._pending.pop(group_key, None)
+        if not group:
+            return
+        table, after_write, items = group
+        try:
+            with table.batch_writer() as batch:
+                for item in items:
+                    batch.put_item(Item=item)
+        except Exception as e:
+            self.stats['errors'] += len(items)
+            print(f"Error flushing {len(items)} tracking events: {str(e)}")
+            return
+        self.stats['flushed'] += len(items)
+        self.stats['batches'] += -(-len(items) // BATCH_WRITE_MAX_ITEMS)
+        _run_after_write(after_write, items)
+
+
+def _run_after_write(after_write, items):
+    """Run a hook for stored items; a failing hook never fails the write"""
+    if not after_write:
+        return
+    try:
+        after_write(items)
+    except Exception as e:
+        print(f"Error in after-write hook for {len(items)} tracking events: {str(e)}")
+
+
+def begin_event_buffer():
+    """Start buffering tracking writes for the current invocation"""
+    buffer = EventBuffer()
+    _current_buffer.set(buffer)
+    return buffer
+
+
+def flush_event_buffer(label=''):
+    """
+    Flush and close the current buffer
+
+    Returns:
+        stats dict or None if no buffer was active
+    """
+    buffer = _current_buffer.get()
+    if buffer is None:
+        return None
+    _current_buffer.set(None)
+    buffer.flush()
+
+    stats = dict(buffer.stats)
+    if stats['items']:
+        print(f"Tracking events{' ' + label if label else ''}: "
+              f"{stats['flushed']} written in {stats['batches']} batch writes"
+              + (f", {stats['errors']} failed" if stats['errors'] else ''))
+    return stats
+
+
+def put_event(table, item, after_write=None):
+    """
+    Write a tracking item: buffered within an invocation, immediately outside one
+
+    Args:
+        table: Table from utils.config (or any boto3 Table)
+        item: Item to put
+        after_write: Optional callable(items) run after the items are stored
+    """
+    buffer = _current_buffer.get()
+    if buffer is not None:
+        buffer.put(table, item, after_write)
+        return
+    table.put_item(Item=item)
+    _run_after_write(after_write, [item])
@@ -0,0 +1,223 @@
+"""
+Precompiled plan feature resolution
+get_user_features (handlers/subscription_handler.py) turns a plan plus any
+admin-granted feature overrides into a flat features dict. The resolution
+rules used to be an if/elif ladder walked on every authenticated request;
+here they are compiled once per container into:
+- a feature_id -> [(group, rank, values)] lookup table
+- per-plan base resolutions built from PLANS
+
+Resolved features are cached per user for FEATURE_CACHE_TTL_SECONDS. An
+entry is only served while the user's plan and overrides version
+(users.features_version, bumped on every override grant/revoke) still match,
+so plan changes and override writes from any container take effect on the
+next request. Writers in this container also drop the entry explicitly.
+"""
+from functools import lru_cache
+from utils.plans_config import PLANS
+from utils.ttl_cache import TTLCache
+
+FEATURE_CACHE_MAX_SIZE = 4096
+FEATURE_CACHE_TTL_SECONDS = 300
+
+# Defaults before any feature_id is applied (storage/galleries come from the plan)
+BASE_FEATURES = {
+    'video_minutes': 0,
+    'video_quality': 'hd',  # hd or 4k
+    'remove_branding': False,
+    'custom_domain': False,
+    'raw_support': False,
+    'analytics_level': 'basic',  # basic, advanced, pro
+    'email_templates': False,
+    'client_favorites': False,
+    'seo_tools': False,
+    'raw_vault': False,
+    'client_invoicing': False,
+    'scheduler': False,
+    'e_signatures': False,
+    'watermarking': False,
+    'edit_requests': False,
+    'api_access': False,
+    'webp_renditions': False,
+    'avif_renditions': False
+}
+
+# Resolution rules: within a group the first matching rule wins, so rules are
+# listed in order of "power" (upgrades override defaults).
+# Each rule is (feature_ids that trigger it, values it sets).
+FEATURE_RULES = {
+    'storage': [
+        (('storage_unlimited',), {'storage_gb': -1}),
+        (('storage_1tb', 'storage_1000gb'), {'storage_gb': 1000}),
+        (('storage_200gb',), {'storage_gb': 200}),
+        (('storage_100gb',), {'storage_gb': 100}),
+        (('storage_50gb',), {'storage_gb': 50}),
+        (('storage_10gb',), {'storage_gb': 10}),
+        (('storage_3gb',), {'storage_gb': 3}),
+        (('storage_1gb',), {'storage_gb': 1}),
+    ],
+    'galleries': [
+        (('unlimited_galleries',), {'galleries_per_month': -1}),
+    ],
+    'video': [
+        (('video_4k_unlimited',), {'video_minutes': -1, 'video_quality': '4k'}),
+        (('video_10hr_4k',), {'video_minutes': 600, 'video_quality': '4k'}),
+        (('video_4hr_4k',), {'video_minutes': 240, 'video_quality': '4k'}),
+        (('video_2hr_4k',), {'video_minutes': 120, 'video_quality': '4k'}),
+        (('video_1hr_hd', 'video_60min_hd'), {'video_minutes': 60, 'video_quality': 'hd'}),
+        (('video_60min_4k',), {'video_minutes': 60, 'video_quality': '4k'}),
+        (('video_30min_4k',), {'video_minutes': 30, 'video_quality': '4k'}),
+        (('video_30min_hd',), {'video_minutes': 30, 'video_quality': 'hd'}),
+        (('video_15min_hd',), {'video_minutes': 15, 'video_quality': 'hd'}),
+        (('video_10min_hd',), {'video_minutes': 10, 'video_quality': 'hd'}),
+        (('video_none',), {'video_minutes': 0, 'video_quality': 'none'}),
+    ],
+    'branding': [
+        (('no_branding', 'white_label'), {'remove_branding': True}),
+        (('branding_on',), {'remove_branding': False}),
+    ],
+    'watermarking': [(('watermarking',), {'watermarking': True})],
+    'custom_domain': [(('custom_domain',), {'custom_domain': True})],
+    'client_invoicing': [(('client_invoicing', 'smart_invoicing'), {'client_invoicing': True})],
+    'scheduler': [(('scheduler',), {'scheduler': True})],
+    'e_signatures': [(('e_signatures',), {'e_signatures': True})],
+    'client_favorites': [(('client_favorites', 'client_proofing'), {'client_favorites': True})],
+    'raw_support': [(('raw_support', 'raw_vault'), {'raw_support': True})],
+    'raw_vault': [(('raw_vault',), {'raw_vault': True})],
+    'email_templates': [(('email_templates',), {'email_templates': True})],
+    'seo_tools': [(('seo_tools',), {'seo_tools': True})],
+    'analytics': [
+        (('analytics_pro', 'visitor_insights'), {'analytics_level': 'pro'}),
+        (('analytics_advanced',), {'analytics_level': 'advanced'}),
+    ],
+    'edit_requests': [(('edit_requests',), {'edit_requests': True})],
+    'api_access': [(('api_access',), {'api_access': True})],
+    'webp_renditions': [(('webp_renditions',), {'webp_renditions': True})],
+    'avif_renditions': [(('avif_renditions',), {'avif_renditions': True})],
+}
+
+
+def _compile_rules(rules):
+    """feature_id -> list of (group, rank, values)"""
+    lookup = {}
+    for group, group_rules in rules.items():
+        for rank, (feature_ids, values) in enumerate(group_rules):
+            for feature_id in feature_ids:
+                lookup.setdefault(feature_id, []).append((group, rank, values))
+    return lookup
+
+
+# Compiled once per container
+_RULE_LOOKUP = _compile_rules(FEATURE_RULES)
+
+
+def _best_rules(feature_ids):
+    """Winning (rank, values) per group for a set of feature ids"""
+    best = {}
+    for feature_id in feature_ids:
+        for group, rank, values in _RULE_LOOKUP.get(feature_id, ()):
+            current = best.get(group)
+            if current is None or rank < current[0]:
+                best[group] = (rank, values)
+    return best
+
+
+@lru_cache(maxsize=None)
+def _plan_base(plan_id):
+    """Plan defaults and winning rules for the plan's own feature_ids"""
+    plan_def = PLANS.get(plan_id, PLANS.get('free'))
+    features = {
+        'storage_gb': plan_def.get('storage_gb', 2),
+        'galleries_per_month': plan_def.get('galleries_per_month', 3),
+        **BASE_FEATURES
+    }
+    return features, _best_rules(plan_def.get('feature_ids', [])), plan_def['name']
+
+
+@lru_cache(maxsize=1024)
+def _resolve(plan_id, override_ids):
+    defaults, plan_rules, _ = _plan_base(plan_id)
+    best = dict(plan_rules)
+    for group, (rank, values) in _best_rules(override_ids).items():
+        current = best.get(group)
+        if current is None or rank < current[0]:
+            best[group] = (rank, values)
+
+    features = dict(defaults)
+    for _, values in best.values():
+        features.update(values)
+    return features
+
+
+def resolve_features(plan_id, override_feature_ids=()):
+    """
+    Resolve a plan plus feature overrides into a features dict
+
+    Args:
+        plan_id: Plan id (unknown plans resolve as free)
+        override_feature_ids: feature_ids granted on top of the plan
+
+    Returns:
+        (features dict, plan name) - the dict is a fresh copy
+    """
+    overrides = frozenset(fid for fid in override_feature_ids if fid)
+    return dict(_resolve(plan_id, overrides)), _plan_base(plan_id)[2]
+
+
+# Per-user cache: user_id -> ((plan_id, features_version), features, plan_name)
+_feature_cache = TTLCache(lambda: FEATURE_CACHE_MAX_SIZE, lambda: FEATURE_CACHE_TTL_SECONDS)
+_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def get_cached_features(user_id, plan_id, features_version):
+    """Cached (features, plan_name) for a user, or None if missing/stale"""
+    entry = _feature_cache.get(user_id)
+    if entry is None or entry[0] != (plan_id, features_version):
+        _cache_stats['misses'] += 1
+        return None
+    _cache_stats['hits'] += 1
+    return dict(entry[1]), entry[2]
+
+
+def cache_features(user_id, plan_id, features_version, features, plan_name):
+    """Remember a user's resolved features for the current plan/overrides version"""
+    _feature_cache.put(user_id, ((plan_id, features_version), dict(features), plan_name))
+
+
+def invalidate_user_features(user_id):
+    """Drop a user's cached features (call after changing their plan or overrides)"""
+    if user_id:
+        _feature_cache.pop(user_id)
+
+
+def bump_features_version(user_email, user_id=None):
+    """
+    Record an overrides change on the user so every container re-resolves
+
+    Args:
+        user_email: users table key
+        user_id: Also drop this container's cached entry
+    """
+    # Imported here: the image-processing Lambda ships this module without utils.config
+    from utils.config import users_table
+    invalidate_user_features(user_id)
+    try:
+        users_table.update_item(
+            Key={'email': user_email},
+            UpdateExpression='ADD features_version :one',
+            ExpressionAttributeValues={':one': 1}
+        )
+    except Exception as e:
+        # Other containers fall back to the cache TTL
+        print(f"Error bumping features_version for {user_email}: {str(e)}")
+
+
+def clear_feature_cache():
+    """Empty the per-user cache (tests, config reloads)"""
+    _feature_cache.clear()
+    _cache_stats.update(hits=0, misses=0)
+
+
+def get_feature_cache_stats():
+    """Cache hit/miss counters for this container"""
+    return dict(_cache_stats, size=len(_feature_cache))
@@ -0,0 +1,158 @@
+"""
+Gallery resolver - gallery_id -> owner lookup for public endpoints
+Public tracking endpoints only know the gallery id, while the galleries table
+is keyed by (user_id, id). Lookups go through the GalleryIdIndex GSI
+(see utils/query_optimization.py) and the stable fields (owner and name) are
+kept in a bounded per-container LRU so repeat hits skip DynamoDB entirely.
+Client share links are resolved the same way through ShareTokenIndex.
+"""
+from boto3.dynamodb.conditions import Key
+from utils.config import galleries_table
+from utils.ttl_cache import TTLCache
+
+# Per-container cache bounds. Ownership never changes, names rarely do,
+# so a few minutes of staleness across containers is acceptable.
+GALLERY_CACHE_MAX_SIZE = 2048
+GALLERY_CACHE_TTL_SECONDS = 300
+
+# Share tokens: valid tokens map to the gallery primary key (the item itself
+# is re-read on every hit so archive/expiry checks stay fresh); unknown
+# tokens are remembered briefly so link-guessing doesn't hit the index.
+SHARE_TOKEN_CACHE_MAX_SIZE = 2048
+SHARE_TOKEN_CACHE_TTL_SECONDS = 300
+INVALID_TOKEN_CACHE_MAX_SIZE = 4096
+INVALID_TOKEN_CACHE_TTL_SECONDS = 60
+
+# Bounds are looked up lazily so tests (and tuning) can patch the constants
+_gallery_cache = TTLCache(lambda: GALLERY_CACHE_MAX_SIZE, lambda: GALLERY_CACHE_TTL_SECONDS)
+_share_token_cache = TTLCache(lambda: SHARE_TOKEN_CACHE_MAX_SIZE, lambda: SHARE_TOKEN_CACHE_TTL_SECONDS)
+_invalid_token_cache = TTLCache(lambda: INVALID_TOKEN_CACHE_MAX_SIZE, lambda: INVALID_TOKEN_CACHE_TTL_SECONDS)
+_cache_stats = {'hits': 0, 'misses': 0, 'token_hits': 0, 'token_misses': 0, 'invalid_token_hits': 0}
+
+
+def resolve_gallery(gallery_id):
+    """
+    Resolve a gallery id to its owner and name
+
+    Args:
+        gallery_id: Gallery ID
+
+    Returns:
+        dict with id, user_id and name, or None if the gallery does not exist.
+        Missing galleries are not cached so a freshly created gallery is
+        visible immediately.
+    """
+    if not gallery_id:
+        return None
+
+    gallery = _gallery_cache.get(gallery_id)
+    if gallery is not None:
+        _cache_stats['hits'] += 1
+        return gallery
+
+    _cache_stats['misses'] += 1
+    response = galleries_table.query(
+        IndexName='GalleryIdIndex',
+        KeyConditionExpression=Key('id').eq(gallery_id),
+        ProjectionExpression='id, user_id, #name',
+        ExpressionAttributeNames={'#name': 'name'},
+        Limit=1
+    )
+    items = response.get('Items', [])
+    if not items:
+        return None
+
+    item = items[0]
+    gallery = {
+        'id': item.get('id', gallery_id),
+        'user_id': item.get('user_id'),
+        'name': item.get('name')
+    }
+    if gallery['user_id']:
+        _gallery_cache.put(gallery_id, gallery)
+    return gallery
+
+
+def get_gallery_owner(gallery_id):
+    """Owner user_id for a gallery, or None if the gallery does not exist"""
+    gallery = resolve_gallery(gallery_id)
+    return gallery.get('user_id') if gallery else None
+
+
+def resolve_share_token(share_token):
+    """
+    Resolve a client share token to its gallery
+
+    Args:
+        share_token: Token from a client share link
+
+    Returns:
+        Full gallery item, or None if no gallery currently has this token.
+        A cached token costs one get_item by primary key; an unknown token
+        costs one ShareTokenIndex query and is then answered from the
+        negative cache for INVALID_TOKEN_CACHE_TTL_SECONDS.
+    """
+    if not share_token:
+        return None
+
+    if _invalid_token_cache.get(share_token) is not None:
+        _cache_stats['invalid_token_hits'] += 1
+        return None
+
+    key = _share_token_cache.get(share_token)
+    if key is not None:
+        _cache_stats['token_hits'] += 1
+        gallery = galleries_table.get_item(Key=key).get('Item')
+        if gallery and gallery.get('share_token') == share_token:
+            return gallery
+        # Token was rotated or gallery deleted since it was cached
+        _share_token_cache.pop(share_token)
+        _invalid_token_cache.put(share_token, True)
+        return None
+
+    _cache_stats['token_misses'] += 1
+    response = galleries_table.query(
+        IndexName='ShareTokenIndex',
+        KeyConditionExpression=Key('share_token').eq(share_token),
+        Limit=1
+    )
+    items = response.get('Items', [])
+    if not items:
+        _invalid_token_cache.put(share_token, True)
+        return None
+
+    gallery = items[0]
+    if gallery.get('user_id') and gallery.get('id'):
+        _share_token_cache.put(share_token, {'user_id': gallery['user_id'], 'id': gallery['id']})
+    return gallery
+
+
+def invalidate_share_token(share_token):
+    """Forget a share token (call when a token is rotated or revoked)"""
+    _share_token_cache.pop(share_token)
+    _invalid_token_cache.pop(share_token)
+
+
+def invalidate_gallery(gallery_id):
+    """Drop a gallery from this container's cache (call on rename/delete)"""
+    _gallery_cache.pop(gallery_id)
+
+
+def clear_gallery_cache():
+    """Empty all resolver caches and reset hit/miss counters"""
+    _gallery_cache.clear()
+    _share_token_cache.clear()
+    _invalid_token_cache.clear()
+    for name in _cache_stats:
+        _cache_stats[name] = 0
+
+
+def get_gallery_cache_stats():
+    """Cache sizes and hit/miss counters for diagnostics"""
+    return {
+        'size': len(_gallery_cache),
+        'max_size': GALLERY_CACHE_MAX_SIZE,
+        'share_tokens': len(_share_token_cache),
+        'invalid_tokens': len(_invalid_token_cache),
+        **_cache_stats
+    }
@@ -0,0 +1,119 @@
+"""
+HyperLogLog cardinality sketch
+Counts distinct values (analytics unique visitors) in a fixed 2**precision
+registers instead of keeping the values themselves. Sketches of the same
+precision merge by taking the per-register maximum, so the distinct count of
+a union (several days, galleries or photographers) is the count of the
+merged sketch - never a re-scan of the raw events.
+
+Accuracy: the relative standard error is 1.04 / sqrt(2**precision). At the
+default precision of 12 (4096 registers) that is ~1.6%: about two thirds of
+estimates are within 1.6% of the true count and nearly all within 5%. Small
+counts (up to 2.5 * registers) use linear counting and are close to exact.
+
+Serialized sketches are the zlib-compressed register bytes, so a day with a
+handful of visitors stores a few dozen bytes and a saturated sketch stays
+under ~3KB.
+"""
+import math
+import zlib
+import hashlib
+
+DEFAULT_PRECISION = 12
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+HASH_BITS = 64
+
+
+def _alpha(registers):
+    """Bias correction constant for the raw estimate"""
+    if registers == 16:
+        return 0.673
+    if registers == 32:
+        return 0.697
+    if registers == 64:
+        return 0.709
+    return 0.7213 / (1 + 1.079 / registers)
+
+
+def standard_error(precision=DEFAULT_PRECISION):
+    """Relative standard error of a sketch's estimate"""
+    return 1.04 / math.sqrt(1 << precision)
+
+
+def _hash64(value):
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch"""
+
+    def __init__(self, precision=DEFAULT_PRECISION, registers=None):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be between {MIN_PRECISION} and {MAX_PRECISION}")
+        self.precision = precision
+        size = 1 << precision
+        if registers is None:
+            self.registers = bytearray(size)
+        elif len(registers) != size:
+            raise ValueError(f"expected {size} registers, got {len(registers)}")
+        else:
+            self.registers = bytearray(registers)
+
+    def position(self, value):
+        """(register index, rank) a value maps to"""
+        hashed = _hash64(value)
+        remaining_bits = HASH_BITS - self.precision
+        index = hashed >> remaining_bits
+        rest = hashed & ((1 << remaining_bits) - 1)
+        # Rank = leading zeros of the remaining bits + 1
+        rank = remaining_bits - rest.bit_length() + 1
+        return index, rank
+
+    def covers(self, value):
+        """True if adding value would not change the sketch"""
+        index, rank = self.position(value)
+        return self.registers[index] >= rank
+
+    def add(self, value):
+        """Add a value; returns True if the sketch changed"""
+        index, rank = self.position(value)
+        if self.registers[index] >= rank:
+            return False
+        self.registers[index] = rank
+        return True
+
+    def merge(self, other):
+        """Union another sketch into this one (in place); returns self"""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of different precision')
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Estimated number of distinct values added"""
+        size = len(self.registers)
+        raw = _alpha(size) * size * size / sum(2.0 ** -r for r in self.registers)
+        if raw <= 2.5 * size:
+            zeros = self.registers.count(0)
+            if zeros:
+                # Linear counting for small cardinalities
+                return int(round(size * math.log(size / zeros)))
+        return int(round(raw))
+
+    def is_empty(self):
+        return not any(self.registers)
+
+    def to_bytes(self):
+        """Serialized form: precision byte + compressed registers"""
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        return cls(precision=data[0], registers=zlib.decompress(data[1:]))
+
+    def copy(self):
+        return HyperLogLog(self.precision, self.registers)
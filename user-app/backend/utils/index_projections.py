@@ -0,0 +1,45 @@
+"""
+Projections of the GSIs that do not project ALL
+setup_dynamodb.py (fresh and local tables) and manage_indexes.py (indexes
+added to existing tables) both read them from here, so an index has the
+same attributes - and the same storage and write cost - however it was
+created. Only import-free constants: the setup scripts load this without
+utils.config.
+"""
+
+# What the duplicate modal shows (utils/duplicate_detector.py)
+_DUPLICATE_ATTRIBUTES = ['filename', 'file_size', 'url', 'medium_url', 'thumbnail_url', 'created_at']
+
+# galerly-photos.UserFileHashIndex - sparse: only photos with a content hash
+PHOTOS_FILE_HASH_PROJECTION = {
+    'ProjectionType': 'INCLUDE',
+    'NonKeyAttributes': _DUPLICATE_ATTRIBUTES + ['gallery_id']
+}
+
+# galerly-photos.GalleryNameSizeIndex
+PHOTOS_NAME_SIZE_PROJECTION = {
+    'ProjectionType': 'INCLUDE',
+    'NonKeyAttributes': list(_DUPLICATE_ATTRIBUTES)
+}
+
+# Analytics exports (handlers/analytics_export_handler.py): only the
+# exported columns
+
+# galerly-galleries.UserCreatedAtIndex
+GALLERIES_EXPORT_PROJECTION = {
+    'ProjectionType': 'INCLUDE',
+    'NonKeyAttributes': ['name', 'client_name', 'client_emails', 'photo_count', 'view_count',
+                         'download_count', 'privacy']
+}
+
+# galerly-photos.UserCreatedAtIndex
+PHOTOS_EXPORT_PROJECTION = {
+    'ProjectionType': 'INCLUDE',
+    'NonKeyAttributes': ['gallery_id', 'filename', 'file_size', 'views', 'download_count', 'favorites_count']
+}
+
+# galerly-analytics.UserTimestampIndex - summary CSV and PDF report
+ANALYTICS_EXPORT_PROJECTION = {
+    'ProjectionType': 'INCLUDE',
+    'NonKeyAttributes': ['event_type', 'metadata']
+}
@@ -19,6 +19,10 @@ except ImportError:
     print(" PIL not available - metadata extraction disabled")
 
 
+# Video containers whose metadata sits in one ISO-BMFF moov box
+ISOBMFF_VIDEO_EXTENSIONS = ('.mp4', '.mov', '.m4v')
+
+
 def is_video_file(filename):
     """Check if file is a video based on extension"""
     video_extensions = ['.mp4', '.mov', '.avi', '.mkv', '.m4v', '.webm', '.mpeg', '.mpg']
@@ -26,10 +30,14 @@ def is_video_file(filename):
     return ext in video_extensions
 
 
-def extract_image_metadata(image_data, filename):
+def extract_image_metadata(image_data, filename, file_size=None):
     """
     Step 7: Extract comprehensive metadata from image or video
     
+    image_data is the file's bytes, or for images a seekable file object
+    (e.g. utils.s3_range_reader.S3RangeReader) that is only read as far as
+    the headers go - pass file_size with it.
+    
     Returns:
         dict: Metadata including:
             - Basic: filename, size, format
@@ -47,10 +55,12 @@ def extract_image_metadata(image_data, filename):
         return extract_video_metadata(image_data, filename)
     
     # Handle image files
+    if file_size is None:
+        file_size = len(image_data)
     metadata = {
         'filename': filename,
-        'file_size': len(image_data),
-        'size_mb': round(len(image_data) / (1024 * 1024), 2),
+        'file_size': file_size,
+        'size_mb': round(file_size / (1024 * 1024), 2),
         'upload_timestamp': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z',
         'format': None,
         'type': 'image',
@@ -68,12 +78,13 @@ def extract_image_metadata(image_data, filename):
     try:
         from io import BytesIO
         try:
-            image = Image.open(BytesIO(image_data))
+            # Image.open only parses headers (JPEG APP segments, TIFF IFDs)
+            image = Image.open(image_data if hasattr(image_data, 'read') else BytesIO(image_data))
         except Exception as e:
             # Try explicit HEIC support if standard open fails
             try:
                 import pillow_heif
-                if pillow_heif.is_supported(image_data):
+                if isinstance(image_data, bytes) and pillow_heif.is_supported(image_data):
                     heif_file = pillow_heif.read_heif(BytesIO(image_data))
                     image = Image.frombytes(
                         heif_file.mode,
@@ -187,6 +198,63 @@ def extract_image_metadata(image_data, filename):
     return metadata
 
 
+def extract_metadata_from_s3(s3_client, bucket, s3_key, filename, file_size):
+    """
+    extract_image_metadata for an uploaded object, using S3 Range GETs
+
+    - Images: PIL reads the headers through an S3RangeReader (JPEG EXIF/ICC
+      segments, TIFF-based RAW IFDs - CR2/NEF/ARW/DNG/...)
+    - MP4/MOV/M4V: the top-level boxes are walked by their headers and only
+      ftyp + moov are fetched into a sparse temp file for ffprobe
+    - Everything else, or when the ranged read finds nothing (HEIC through
+      pillow_heif, other video containers): the whole object is read as before
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket of the upload
+        s3_key: Key of the upload
+        filename: Original filename
+        file_size: Object size (HeadObject ContentLength)
+
+    Returns:
+        dict: Same metadata as extract_image_metadata on the full file
+    """
+    from utils.s3_range_reader import S3RangeReader, isobmff_boxes, write_sparse_isobmff
+    from utils.raw_processor import is_raw_file
+
+    ext = os.path.splitext(filename)[1].lower()
+    reader = None
+    try:
+        reader = S3RangeReader(s3_client, bucket, s3_key, file_size)
+        metadata = None
+        if ext in ISOBMFF_VIDEO_EXTENSIONS:
+            boxes = isobmff_boxes(reader)
+            if boxes:
+                from utils.video_processor import probe_video_file
+                path = write_sparse_isobmff(reader, boxes, ext)
+                try:
+                    metadata = probe_video_file(path, filename, reader.size)
+                finally:
+                    os.remove(path)
+        elif not is_video_file(filename):
+            metadata = extract_image_metadata(reader, filename, file_size=reader.size)
+            # PIL could not read it - pillow_heif needs the whole file. RAWs
+            # PIL cannot open (CR3, RAF, ...) get nothing from a full read either.
+            if not metadata.get('format') and not is_raw_file(filename):
+                metadata = None
+
+        if metadata is not None:
+            print(f"Ranged metadata read for {s3_key}: {reader.bytes_fetched / 1024:.0f} KB "
+                  f"in {reader.requests} requests ({reader.size / (1024 * 1024):.1f} MB object)")
+            return metadata
+    except Exception as e:
+        print(f"Ranged metadata read failed for {s3_key}: {str(e)}")
+
+    # Fall back to downloading the whole object
+    data = s3_client.get_object(Bucket=bucket, Key=s3_key)['Body'].read()
+    return extract_image_metadata(data, filename)
+
+
 def convert_to_degrees(value):
     """
     Convert GPS coordinates to degrees
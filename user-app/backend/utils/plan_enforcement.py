@@ -186,7 +186,9 @@ def get_required_plan_for_feature(feature):
         'custom_domain': 'Plus',
         'watermarking': 'Plus',
         'analytics_advanced': 'Plus',
+        'webp_renditions': 'Plus',
         'raw_support': 'Pro',
+        'avif_renditions': 'Pro',
         'client_invoicing': 'Pro',
         'email_templates': 'Pro',
         'seo_tools': 'Pro',
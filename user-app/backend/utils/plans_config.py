@@ -55,7 +55,7 @@ PLANS = {
         'max_galleries': -1,  # Unlimited
         'galleries_per_month': -1,  # Unlimited
         'storage_gb': 100,
-        'feature_ids': ['storage_100gb', 'video_4hr_4k', 'unlimited_galleries', 'custom_domain', 'no_branding', 'analytics_advanced', 'watermarking', 'client_proofing', 'edit_requests'],
+        'feature_ids': ['storage_100gb', 'video_4hr_4k', 'unlimited_galleries', 'custom_domain', 'no_branding', 'analytics_advanced', 'watermarking', 'client_proofing', 'edit_requests', 'webp_renditions'],
         'features': [
             '100 GB Smart Storage',
             'Unlimited Galleries',
@@ -77,7 +77,7 @@ PLANS = {
         'max_galleries': -1,  # Unlimited
         'galleries_per_month': -1,  # Unlimited
         'storage_gb': 500,
-        'feature_ids': ['storage_500gb', 'video_10hr_4k', 'unlimited_galleries', 'custom_domain', 'no_branding', 'analytics_pro', 'raw_support', 'email_templates', 'smart_invoicing', 'seo_tools', 'client_proofing', 'watermarking', 'lightroom_workflow', 'edit_requests'],
+        'feature_ids': ['storage_500gb', 'video_10hr_4k', 'unlimited_galleries', 'custom_domain', 'no_branding', 'analytics_pro', 'raw_support', 'email_templates', 'smart_invoicing', 'seo_tools', 'client_proofing', 'watermarking', 'lightroom_workflow', 'edit_requests', 'api_access', 'webp_renditions', 'avif_renditions'],
         'features': [
             '500 GB Smart Storage',
             'Unlimited Galleries',
@@ -102,7 +102,7 @@ PLANS = {
         'max_galleries': -1,  # Unlimited
         'galleries_per_month': -1,  # Unlimited
         'storage_gb': 2000,  # 2 TB
-        'feature_ids': ['storage_2tb', 'video_10hr_4k', 'unlimited_galleries', 'custom_domain', 'no_branding', 'analytics_pro', 'raw_support', 'email_templates', 'smart_invoicing', 'scheduler', 'e_signatures', 'seo_tools', 'client_proofing', 'watermarking', 'lightroom_workflow', 'raw_vault', 'edit_requests'],
+        'feature_ids': ['storage_2tb', 'video_10hr_4k', 'unlimited_galleries', 'custom_domain', 'no_branding', 'analytics_pro', 'raw_support', 'email_templates', 'smart_invoicing', 'scheduler', 'e_signatures', 'seo_tools', 'client_proofing', 'watermarking', 'lightroom_workflow', 'raw_vault', 'edit_requests', 'api_access', 'webp_renditions', 'avif_renditions'],
         'features': [
             '2 TB Smart Storage',
             'Unlimited Galleries',
@@ -1,13 +1,31 @@
 """
 Rate Limiting Middleware for Expensive Operations
 Prevents abuse of analytics, uploads, and API endpoints
+
+Limits use a sliding-window counter: each limit key has one small item with a
+request counter per fixed window (c_<window index>). A request is one
+conditional UpdateItem that increments the current window's counter, drops
+the counter from two windows back and returns both live counters; the
+estimate is
+
+    previous_count * (unexpired share of previous window) + current_count
+
+and concurrent requests can't overwrite each other. A caller returning after
+a longer gap leaves older counters behind; they come back in the response
+and a second UpdateItem removes them, so the item never holds more than the
+two live counters for long.
+A per-container pre-filter remembers the last counts and rejections so
+callers that are clearly over their limit are turned away without a
+DynamoDB round trip.
 """
+import math
 import time
 import hashlib
 from functools import wraps
 from utils.response import create_response
 from utils.config import get_dynamodb
 from utils.resource_names import RATE_LIMITS_TABLE
+from utils.ttl_cache import TTLCache
 
 # Initialize rate limit tracking table using naming convention
 dynamodb = get_dynamodb()
@@ -74,6 +92,100 @@ def get_rate_limit_key(limit_type, identifier):
     return f"{limit_type}:{hashed}"
 
 
+# Pre-filter entries outlive the longest configured window
+PREFILTER_MAX_SIZE = 4096
+PREFILTER_TTL_SECONDS = max(config['window_seconds'] for config in RATE_LIMITS.values()) * 2
+
+# key -> {'window': index, 'current': count, 'previous': count, 'blocked_until': ts}
+_prefilter = TTLCache(lambda: PREFILTER_MAX_SIZE, lambda: PREFILTER_TTL_SECONDS)
+
+
+def _window_position(config, now):
+    """(window index, seconds elapsed in that window)"""
+    window = config['window_seconds']
+    return int(now // window), now % window
+
+
+COUNTER_PREFIX = 'c_'
+
+
+def _counter_name(window_index):
+    return f"{COUNTER_PREFIX}{window_index}"
+
+
+def _remove_stale_counters(key, attributes, window_index):
+    """
+    Drop counters older than the previous window (left behind by a gap between requests)
+    Newer windows are kept: a container whose clock runs ahead may already be counting in them.
+    """
+    stale = []
+    for name in attributes:
+        suffix = name[len(COUNTER_PREFIX):] if name.startswith(COUNTER_PREFIX) else ''
+        if suffix.lstrip('-').isdigit() and int(suffix) < window_index - 1:
+            stale.append(name)
+    stale.sort()
+    if not stale:
+        return
+    names = {f'#s{i}': name for i, name in enumerate(stale)}
+    try:
+        rate_limits_table.update_item(
+            Key={'limit_key': key},
+            UpdateExpression='REMOVE ' + ', '.join(names),
+            ExpressionAttributeNames=names
+        )
+    except Exception as e:
+        print(f"Rate limit cleanup error: {str(e)}")
+
+
+def _estimate(config, previous, current, elapsed):
+    """Sliding-window request count"""
+    window = config['window_seconds']
+    return previous * (window - elapsed) / window + current
+
+
+def _seconds_until_allowed(config, previous, current, elapsed):
+    """Seconds until the estimate drops back under the limit"""
+    window = config['window_seconds']
+    limit = config['requests']
+    if current >= limit or previous <= 0:
+        # Only the next window can help
+        return int(math.ceil(window - elapsed))
+    # previous * (window - elapsed - t) / window + current < limit
+    wait = window - elapsed - (limit - current) * window / previous
+    return max(1, int(math.ceil(wait)))
+
+
+def _is_condition_failure(error):
+    code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+    return code == 'ConditionalCheckFailedException' or 'ConditionalCheckFailedException' in str(error)
+
+
+def _prefilter_check(key, config, window_index, elapsed, now):
+    """
+    Reject from local state when the caller is certainly over the limit
+
+    Returns:
+        retry_after seconds if rejected locally, else None
+    """
+    state = _prefilter.get(key)
+    if not state:
+        return None
+    if state['blocked_until'] > now:
+        return int(math.ceil(state['blocked_until'] - now))
+    if state['window'] == window_index:
+        previous, current = state['previous'], state['current']
+    elif state['window'] == window_index - 1:
+        previous, current = state['current'], 0
+    else:
+        return None
+    # Counters only grow within a window, so these are lower bounds
+    if _estimate(config, previous, current, elapsed) + 1 > config['requests']:
+        retry_after = _seconds_until_allowed(config, previous, current + 1, elapsed)
+        state['blocked_until'] = now + retry_after
+        return retry_after
+    return None
+
+
 def check_rate_limit(limit_type, identifier):
     """
     Check if request is within rate limit
@@ -92,46 +204,58 @@ def check_rate_limit(limit_type, identifier):
         
         config = RATE_LIMITS[limit_type]
         key = get_rate_limit_key(limit_type, identifier)
-        current_time = int(time.time())
-        window_start = current_time - config['window_seconds']
+        now = time.time()
+        window_index, elapsed = _window_position(config, now)
+        
+        retry_after = _prefilter_check(key, config, window_index, elapsed, now)
+        if retry_after is not None:
+            return False, retry_after
         
-        # Get or create rate limit record
         try:
-            response = rate_limits_table.get_item(Key={'limit_key': key})
-            
-            if 'Item' in response:
-                item = response['Item']
-                requests = item.get('requests', [])
-                
-                # Filter out requests outside window
-                requests = [r for r in requests if r > window_start]
-                
-                # Check if limit exceeded
-                if len(requests) >= config['requests']:
-                    oldest_request = min(requests)
-                    retry_after = oldest_request + config['window_seconds'] - current_time
-                    return False, max(retry_after, 0)
-                
-                # Add current request
-                requests.append(current_time)
-            else:
-                # First request
-                requests = [current_time]
-            
-            # Update record
-            rate_limits_table.put_item(Item={
-                'limit_key': key,
-                'requests': requests,
-                'updated_at': current_time,
-                'ttl': current_time + config['window_seconds'] + 3600  # Expire 1 hour after window
-            })
-            
-            return True, 0
-            
+            response = rate_limits_table.update_item(
+                Key={'limit_key': key},
+                UpdateExpression='ADD #cur :one SET updated_at = :now, #ttl = :ttl REMOVE #stale',
+                ConditionExpression='attribute_not_exists(#cur) OR #cur < :limit',
+                ExpressionAttributeNames={
+                    '#cur': _counter_name(window_index),
+                    '#stale': _counter_name(window_index - 2),
+                    '#ttl': 'ttl'
+                },
+                ExpressionAttributeValues={
+                    ':one': 1,
+                    ':limit': config['requests'],
+                    ':now': int(now),
+                    # Expire 1 hour after the next window closes
+                    ':ttl': int(now) + 2 * config['window_seconds'] + 3600
+                },
+                ReturnValues='ALL_NEW'
+            )
         except Exception as db_error:
+            if _is_condition_failure(db_error):
+                # Current window alone is full
+                retry_after = int(math.ceil(config['window_seconds'] - elapsed))
+                _prefilter.put(key, {'window': window_index, 'current': config['requests'],
+                                     'previous': 0, 'blocked_until': now + retry_after})
+                return False, retry_after
             print(f"Rate limit DB error: {str(db_error)}")
             # On error, allow request (fail open)
             return True, 0
+        
+        attributes = response.get('Attributes', {})
+        _remove_stale_counters(key, attributes, window_index)
+        current = int(attributes.get(_counter_name(window_index), 1))
+        previous = int(attributes.get(_counter_name(window_index - 1), 0))
+        state = {'window': window_index, 'current': current, 'previous': previous, 'blocked_until': 0}
+        
+        # This request is already counted in `current`
+        if _estimate(config, previous, current, elapsed) > config['requests']:
+            retry_after = _seconds_until_allowed(config, previous, current, elapsed)
+            state['blocked_until'] = now + retry_after
+            _prefilter.put(key, state)
+            return False, retry_after
+        
+        _prefilter.put(key, state)
+        return True, 0
             
     except Exception as e:
         print(f"Rate limit check error: {str(e)}")
@@ -139,6 +263,11 @@ def check_rate_limit(limit_type, identifier):
         return True, 0
 
 
+def clear_rate_limit_prefilter():
+    """Forget local rate limit state (tests)"""
+    _prefilter.clear()
+
+
 def rate_limit(limit_type, identifier_key='user_id'):
     """
     Decorator for rate limiting endpoints
@@ -224,35 +353,28 @@ def get_rate_limit_status(limit_type, identifier):
         
         config = RATE_LIMITS[limit_type]
         key = get_rate_limit_key(limit_type, identifier)
-        current_time = int(time.time())
-        window_start = current_time - config['window_seconds']
+        now = time.time()
+        current_time = int(now)
+        window_index, elapsed = _window_position(config, now)
         
         try:
             response = rate_limits_table.get_item(Key={'limit_key': key})
+            item = response.get('Item', {})
+            current = int(item.get(_counter_name(window_index), 0))
+            previous = int(item.get(_counter_name(window_index - 1), 0))
+            requests_made = int(math.ceil(_estimate(config, previous, current, elapsed)))
             
-            if 'Item' in response:
-                item = response['Item']
-                requests = item.get('requests', [])
-                
-                # Filter out requests outside window
-                requests = [r for r in requests if r > window_start]
-                
-                oldest_request = min(requests) if requests else current_time
-                reset_at = oldest_request + config['window_seconds']
-                
-                return {
-                    'requests_made': len(requests),
-                    'requests_allowed': config['requests'],
-                    'remaining': max(0, config['requests'] - len(requests)),
-                    'reset_at': reset_at
-                }
+            if requests_made >= config['requests']:
+                reset_at = current_time + _seconds_until_allowed(config, previous, current, elapsed)
             else:
-                return {
-                    'requests_made': 0,
-                    'requests_allowed': config['requests'],
-                    'remaining': config['requests'],
-                    'reset_at': current_time + config['window_seconds']
-                }
+                reset_at = current_time + int(math.ceil(config['window_seconds'] - elapsed))
+            
+            return {
+                'requests_made': requests_made,
+                'requests_allowed': config['requests'],
+                'remaining': max(0, config['requests'] - requests_made),
+                'reset_at': reset_at
+            }
                 
         except Exception as db_error:
             print(f"Rate limit status DB error: {str(db_error)}")
@@ -280,6 +402,7 @@ def reset_rate_limit(limit_type, identifier):
     try:
         key = get_rate_limit_key(limit_type, identifier)
         rate_limits_table.delete_item(Key={'limit_key': key})
+        _prefilter.pop(key)
         print(f"Rate limit reset: {limit_type} for {identifier}")
         return True
     except Exception as e:
@@ -1,7 +1,8 @@
 """
 RAW Photo Processing Module
 Handles RAW file formats (CR2, NEF, ARW, DNG, RAF, etc.)
-- Preview/thumbnail generation from RAW
+- Preview/thumbnail generation from RAW (embedded preview, half-size or
+  full demosaic - whichever is cheapest for the size)
 - Metadata extraction (EXIF, camera info)
 - File validation
 - RAW-specific handling for Pro/Ultimate plans
@@ -11,6 +12,8 @@ import os
 from PIL import Image
 from datetime import datetime
 
+from utils.rendition_core import fit_within
+
 try:
     import rawpy
     import numpy as np
@@ -41,6 +44,22 @@ RAW_EXTENSIONS = {
     '.erf': 'Epson RAW'
 }
 
+# Preview boxes (None = full resolution)
+RAW_PREVIEW_SIZES = {
+    'thumbnail': (400, 400),
+    'small': (800, 600),
+    'medium': (2000, 2000),
+    'large': (4000, 4000),
+    'original': None
+}
+
+# Sizes that always get a full demosaic unless the embedded preview covers them
+FULL_DEMOSAIC_SIZES = ('large', 'original')
+
+# Embedded previews whose aspect ratio is further off than this are letterboxed
+# or cropped differently from the RAW and are not used
+ASPECT_TOLERANCE = 0.02
+
 
 def is_raw_file(filename):
     """
@@ -70,10 +89,162 @@ def get_raw_format_name(filename):
     return RAW_EXTENSIONS.get(ext)
 
 
+def choose_raw_tier(size, full_size, embedded_size=None):
+    """
+    Cheapest decode that still covers the requested preview size
+
+    - 'embedded': the camera's embedded JPEG preview, when it is at least as
+      large as the target and has the same aspect ratio (no letterboxing)
+    - 'half': half_size demosaic (2x2 binning, ~1/4 of the work and memory),
+      for the mid sizes when half resolution still covers the target
+    - 'full': full demosaic - only for 'large'/'original' or when nothing
+      smaller covers the target
+
+    Args:
+        size: Preview size name (see RAW_PREVIEW_SIZES)
+        full_size: (width, height) of a full demosaic, orientation applied
+        embedded_size: (width, height) of the embedded preview, orientation
+            applied, or None when there is none
+
+    Returns:
+        str: 'embedded', 'half' or 'full'
+    """
+    box = RAW_PREVIEW_SIZES.get(size, RAW_PREVIEW_SIZES['medium'])
+    if box is None:
+        return 'full'
+    target = fit_within(full_size, box)
+    if embedded_size and _covers(embedded_size, target):
+        return 'embedded'
+    half_size = (full_size[0] // 2, full_size[1] // 2)
+    if size not in FULL_DEMOSAIC_SIZES and _covers(half_size, target):
+        return 'half'
+    return 'full'
+
+
+def _covers(size, target):
+    """size is at least target on both edges, with a matching aspect ratio"""
+    if size[0] < target[0] or size[1] < target[1]:
+        return False
+    return abs(size[0] / size[1] - target[0] / target[1]) <= ASPECT_TOLERANCE * target[0] / target[1]
+
+
+def _transpose_for(orientation):
+    """PIL transpose for a LibRaw flip / EXIF orientation value (None = upright)"""
+    return {
+        3: Image.Transpose.ROTATE_180,
+        5: Image.Transpose.ROTATE_90,   # LibRaw flip: 90 CCW
+        6: Image.Transpose.ROTATE_270,  # 90 CW
+        8: Image.Transpose.ROTATE_90,   # EXIF orientation: 90 CCW
+    }.get(orientation)
+
+
+def _full_output_size(raw):
+    """Size postprocess() returns at full resolution, orientation applied"""
+    width, height = raw.sizes.width, raw.sizes.height
+    if raw.sizes.flip in (5, 6):
+        return height, width
+    return width, height
+
+
+def _embedded_preview(raw):
+    """
+    Open the embedded preview without decoding it
+
+    Returns:
+        (PIL image, transpose or None) or (None, None) when the file has no
+        usable preview
+    """
+    try:
+        thumb = raw.extract_thumb()
+    except Exception as e:
+        print(f"No embedded RAW preview: {str(e)}")
+        return None, None
+
+    if thumb.format == rawpy.ThumbFormat.JPEG:
+        image = Image.open(io.BytesIO(thumb.data))
+        # Most cameras leave the preview unrotated and record the orientation
+        # in the RAW only - fall back to LibRaw's flip in that case
+        orientation = image.getexif().get(0x0112)
+        transpose = _transpose_for(orientation) if orientation not in (None, 1) else _transpose_for(raw.sizes.flip)
+        return image, transpose
+    if thumb.format == rawpy.ThumbFormat.BITMAP:
+        return Image.fromarray(thumb.data), _transpose_for(raw.sizes.flip)
+    return None, None
+
+
+def _oriented_size(size, transpose):
+    if transpose in (Image.Transpose.ROTATE_90, Image.Transpose.ROTATE_270):
+        return size[1], size[0]
+    return size
+
+
+def decode_raw(raw_data, size='large', no_auto_bright=False, tier=None):
+    """
+    Decode a RAW file just far enough for a preview of the given size
+
+    Picks the tier with choose_raw_tier: the embedded JPEG preview (no
+    demosaic at all, drafted down to the target), a half_size demosaic, or a
+    full demosaic.
+
+    Args:
+        raw_data: Bytes of RAW file
+        size: Preview size the result must cover (see RAW_PREVIEW_SIZES)
+        no_auto_bright: Passed to postprocess (keep the photographer's exposure)
+        tier: Force a tier (benchmarks); 'embedded' falls back to 'full' when
+            the file has no preview
+
+    Returns:
+        dict: {
+            'image': PIL image (RGB, upright, at least the target size),
+            'tier': 'embedded' | 'half' | 'full',
+            'full_dimensions': tuple - size of a full demosaic
+        }
+    """
+    with rawpy.imread(io.BytesIO(raw_data)) as raw:
+        full_size = _full_output_size(raw)
+        embedded, transpose = _embedded_preview(raw)
+        embedded_size = _oriented_size(embedded.size, transpose) if embedded else None
+        if tier is None:
+            tier = choose_raw_tier(size, full_size, embedded_size)
+        elif tier == 'embedded' and embedded is None:
+            tier = 'full'
+
+        if tier == 'embedded':
+            box = RAW_PREVIEW_SIZES.get(size, RAW_PREVIEW_SIZES['medium'])
+            if box and embedded.format == 'JPEG':
+                # draft() works in stored (unrotated) coordinates
+                embedded.draft('RGB', _oriented_size(fit_within(full_size, box), transpose))
+            image = embedded.convert('RGB')
+            if transpose is not None:
+                image = image.transpose(transpose)
+        else:
+            rgb_array = raw.postprocess(
+                use_camera_wb=True,           # Use camera white balance
+                half_size=(tier == 'half'),   # 2x2 binning instead of demosaic
+                no_auto_bright=no_auto_bright,
+                output_color=rawpy.ColorSpace.sRGB,
+                output_bps=8                  # 8-bit output
+            )
+            image = Image.fromarray(rgb_array)
+            del rgb_array
+
+    print(f"RAW decode ({tier}): {image.size[0]}x{image.size[1]}")
+
+    return {
+        'image': image,
+        'tier': tier,
+        'full_dimensions': full_size
+    }
+
+
 def generate_raw_preview(raw_data, size='medium', quality=85):
     """
     Generate JPEG preview from RAW file data
     
+    Only decodes as much as the size needs (see decode_raw): small sizes
+    usually come straight from the embedded camera preview, mid sizes from a
+    half_size demosaic, 'large'/'original' from a full demosaic.
+    
     Args:
         raw_data: Bytes of RAW file
         size: Preview size - 'thumbnail' (400px), 'medium' (2000px), 'large' (4000px)
@@ -84,6 +255,7 @@ def generate_raw_preview(raw_data, size='medium', quality=85):
             'success': bool,
             'preview_data': bytes (JPEG),
             'dimensions': tuple (width, height),
+            'tier': str ('embedded', 'half' or 'full'),
             'error': str (if failed)
         }
     """
@@ -96,37 +268,14 @@ def generate_raw_preview(raw_data, size='medium', quality=85):
     try:
         print(f"🔄 Processing RAW file to {size} preview...")
         
-        # Step 1: Open RAW file with rawpy
-        with rawpy.imread(io.BytesIO(raw_data)) as raw:
-            # Step 2: Process RAW to RGB array
-            # postprocess() applies demosaicing, white balance, color correction
-            rgb_array = raw.postprocess(
-                use_camera_wb=True,  # Use camera white balance
-                half_size=False,      # Full resolution for quality
-                no_auto_bright=False, # Allow auto brightness
-                output_color=rawpy.ColorSpace.sRGB,  # sRGB color space
-                output_bps=8          # 8-bit output
-            )
-        
-        # Step 3: Convert to PIL Image
-        image = Image.fromarray(rgb_array)
-        
-        # Step 4: Resize based on requested size
-        size_map = {
-            'thumbnail': (400, 400),
-            'small': (800, 600),
-            'medium': (2000, 2000),
-            'large': (4000, 4000),
-            'original': None  # No resize
-        }
-        
-        target_size = size_map.get(size, (2000, 2000))
-        original_dimensions = image.size
+        decoded = decode_raw(raw_data, size=size)
+        image = decoded['image']
         
+        target_size = RAW_PREVIEW_SIZES.get(size, RAW_PREVIEW_SIZES['medium'])
         if target_size:
             image.thumbnail(target_size, Image.Resampling.LANCZOS)
         
-        # Step 5: Convert to JPEG
+        # Convert to JPEG
         output = io.BytesIO()
         image.save(output, format='JPEG', quality=quality, optimize=True)
         preview_data = output.getvalue()
@@ -137,8 +286,9 @@ def generate_raw_preview(raw_data, size='medium', quality=85):
             'success': True,
             'preview_data': preview_data,
             'dimensions': image.size,
-            'original_dimensions': original_dimensions,
-            'file_size': len(preview_data)
+            'original_dimensions': decoded['full_dimensions'],
+            'file_size': len(preview_data),
+            'tier': decoded['tier']
         }
         
     except Exception as e:
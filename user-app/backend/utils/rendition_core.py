@@ -0,0 +1,508 @@
+"""
+Rendition Core
+One decode/resize/adjust/encode pipeline shared by utils/image_processor
+(API + LocalStack path) and the image-processing Lambda, so both produce the
+same renditions with the same settings.
+
+A rendition plan describes one job: source -> ordered operations -> outputs
+
+    {
+        'source': {'bucket': 'galerly-images', 'key': 'gallery_id/photo_id.jpg'},
+        'operations': [
+            {'op': 'color', 'brightness': 1.1, 'contrast': 1.0, 'saturation': 1.0},
+            {'op': 'logo_watermark', 'bucket': '...', 'key': 'watermarks/logo.png',
+             'position': 'bottom-right', 'opacity': 0.7, 'size_percent': 15},
+            {'op': 'text_watermark', 'text': '(c) Studio', 'position': 'bottom-right', 'opacity': 0.5}
+        ],
+        'outputs': [
+            {'id': 'large', 'name': 'large', 'box': [4000, 4000], 'format': 'JPEG', 'quality': 92,
+             'bucket': '...', 'key': 'renditions/gallery_id/photo_id_large.jpg'},
+            {'id': 'large.webp', 'name': 'large', 'box': [4000, 4000], 'format': 'WEBP', 'quality': 85,
+             'bucket': '...', 'key': 'renditions/gallery_id/photo_id_large.webp'},
+            ...
+        ]
+    }
+
+JPEG outputs are always produced. WebP/AVIF variants (MODERN_FORMATS) are
+added next to them when the plan's formats ask for them; which formats a
+photographer gets is decided by their subscription features (enabled_formats).
+
+Plans are plain data (JSON-serializable). Operations run in order on every
+output after it has been resized, so they touch at most the largest rendition
+rather than the full-resolution original and run on the encode workers.
+
+Only PIL is required here - this module must not import utils.config so it
+can be packaged next to image-processing/lambda_function.py.
+"""
+import io
+import math
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from PIL import Image
+
+# Rendition outputs (shared with utils/cdn_urls.RENDITION_SIZES)
+RENDITION_OUTPUTS = {
+    'thumbnail': {'box': (400, 400), 'quality': 80},      # Grid display
+    'small': {'box': (800, 600), 'quality': 85},          # Preview
+    'medium': {'box': (2000, 2000), 'quality': 90},       # Detail view
+    'large': {'box': (4000, 4000), 'quality': 92}         # High-res zoom
+}
+
+# Encode/upload workers per image (Pillow releases the GIL while resizing
+# and encoding, boto3 clients are thread-safe)
+RENDITION_WORKERS = 4
+
+# Images processed concurrently per multi-record event. Each in-flight image
+# holds at most a draft-reduced decode (~4000px on the long edge, ~50 MB RGB)
+RECORD_WORKERS = 3
+
+# Perceptual hash (dHash) grid: 9x8 grayscale -> 64 bits, computed from the
+# smallest rendition before any watermark/colour operation
+PERCEPTUAL_HASH_SIZE = 8
+
+# Modern-format variants written next to the JPEG renditions (same sizes).
+# Each is enabled per subscription plan by a feature flag (utils/feature_resolver).
+# Qualities are tuned to roughly match the JPEG renditions visually; AVIF skips
+# 'large' because a 4000px AVIF encode costs seconds per photo.
+MODERN_FORMATS = {
+    'webp': {
+        'format': 'WEBP',
+        'feature': 'webp_renditions',
+        'quality': {'thumbnail': 75, 'small': 78, 'medium': 82, 'large': 85}
+    },
+    'avif': {
+        'format': 'AVIF',
+        'feature': 'avif_renditions',
+        'quality': {'thumbnail': 50, 'small': 55, 'medium': 60}
+    }
+}
+
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'AVIF': 'image/avif', 'PNG': 'image/png'}
+FILE_EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'AVIF': 'avif', 'PNG': 'png'}
+
+# Encoder settings per format (WebP method 4 and AVIF speed 6 are the
+# size/encode-time sweet spots, see benchmarks/bench_formats.py)
+ENCODER_OPTIONS = {
+    'JPEG': {'optimize': True, 'progressive': True},
+    'WEBP': {'method': 4},
+    'AVIF': {'speed': 6}
+}
+
+
+def fit_within(source_size, box):
+    """
+    Size of `source_size` scaled to fit in `box`, exactly as Image.thumbnail
+    computes it (so renditions keep the dimensions they always had)
+
+    Returns:
+        (width, height), or source_size if it already fits
+    """
+    width, height = source_size
+    x, y = map(math.floor, box)
+    if x >= width and y >= height:
+        return tuple(source_size)
+
+    def round_aspect(number, key):
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))
+    return x, y
+
+
+def rendition_base_key(s3_key):
+    """renditions/<gallery_id>/<photo_id> for a gallery_id/photo_id.ext key"""
+    parts = s3_key.split('/')
+    if len(parts) != 2:
+        raise ValueError(f"Invalid s3_key format: {s3_key}")
+    gallery_id, photo_filename = parts
+    photo_id = photo_filename.rsplit('.', 1)[0]
+    return f"renditions/{gallery_id}/{photo_id}"
+
+
+@lru_cache(maxsize=None)
+def encoder_available(image_format):
+    """Whether this Pillow build can encode `image_format` (AVIF needs Pillow 11.3+ with libavif)"""
+    from PIL import features
+    return bool(features.check(image_format.lower()))
+
+
+def enabled_formats(features):
+    """
+    Modern formats a photographer's renditions include
+
+    Args:
+        features: Resolved feature flags (get_user_features()[0])
+
+    Returns:
+        list of MODERN_FORMATS names, e.g. ['webp', 'avif']
+    """
+    features = features or {}
+    return [name for name, spec in MODERN_FORMATS.items()
+            if features.get(spec['feature']) and encoder_available(spec['format'])]
+
+
+def build_rendition_plan(s3_key, source_bucket, renditions_bucket, operations=None,
+                         outputs=None, cache_control=None, formats=None):
+    """
+    Build the plan for one uploaded image
+
+    Args:
+        s3_key: Original key (gallery_id/photo_id.ext)
+        source_bucket: Bucket holding the original
+        renditions_bucket: Bucket renditions are written to
+        operations: Ordered operation dicts (see module docstring)
+        outputs: {name: {'box', 'quality'[, 'format']}} - defaults to RENDITION_OUTPUTS
+        cache_control: Optional CacheControl header for every output
+        formats: MODERN_FORMATS names to add next to the JPEGs (see enabled_formats)
+
+    Returns:
+        plan dict
+
+    Raises:
+        ValueError: s3_key is not gallery_id/photo_id.ext
+    """
+    base_key = rendition_base_key(s3_key)
+    plan_outputs = []
+
+    def add_output(output_id, name, box, image_format, quality):
+        output = {
+            'id': output_id,
+            'name': name,
+            'box': list(box),
+            'format': image_format,
+            'quality': quality,
+            'bucket': renditions_bucket,
+            'key': f"{base_key}_{name}.{FILE_EXTENSIONS[image_format]}"
+        }
+        if cache_control:
+            output['cache_control'] = cache_control
+        plan_outputs.append(output)
+
+    for name, spec in (outputs or RENDITION_OUTPUTS).items():
+        add_output(name, name, spec['box'], spec.get('format', 'JPEG'), spec['quality'])
+
+    for variant in formats or ():
+        variant_spec = MODERN_FORMATS[variant]
+        for name, spec in (outputs or RENDITION_OUTPUTS).items():
+            if name in variant_spec['quality']:
+                add_output(f"{name}.{variant}", name, spec['box'], variant_spec['format'],
+                           variant_spec['quality'][name])
+
+    return {
+        'source': {'bucket': source_bucket, 'key': s3_key},
+        'operations': list(operations or []),
+        'outputs': plan_outputs
+    }
+
+
+def plan_output_sizes(plan, source_size):
+    """
+    Target dimensions per output, largest first (variants of one size are adjacent)
+
+    Returns:
+        list of (output, (width, height))
+    """
+    targets = [(output, fit_within(source_size, output['box'])) for output in plan['outputs']]
+    return sorted(targets, key=lambda target: target[1][0] * target[1][1], reverse=True)
+
+
+def load_for_plan(image, plan):
+    """
+    Load an opened image, in JPEG draft mode down to the largest output
+
+    Draft mode lets libjpeg downscale by 1/2, 1/4 or 1/8 during the IDCT while
+    still covering the largest rendition, which skips most of the decode work
+    on 24-45MP files.
+
+    Returns:
+        (image, source_size) - source_size is the full-resolution size
+    """
+    source_size = image.size
+    if image.format == 'JPEG' and plan['outputs']:
+        image.draft(None, plan_output_sizes(plan, source_size)[0][1])
+    image.load()
+    return image, source_size
+
+
+def to_rgb(image):
+    """Flatten RGBA onto white and convert other modes to RGB (L is kept)"""
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        rgba = image.convert('RGBA')
+        rgb_image = Image.new('RGB', rgba.size, (255, 255, 255))
+        rgb_image.paste(rgba, mask=rgba.split()[3])
+        return rgb_image
+    if image.mode not in ('RGB', 'L'):
+        return image.convert('RGB')
+    return image
+
+
+def build_pyramid(image, source_size, plan):
+    """
+    Resize an image into every output size, each derived from the next-larger
+    output instead of from full resolution
+
+    Args:
+        image: Decoded image (may already be draft-reduced)
+        source_size: Full-resolution size the targets are computed from
+        plan: Rendition plan
+
+    Yields:
+        (output, PIL image) largest first
+    """
+    previous = image
+    for output, target in plan_output_sizes(plan, source_size):
+        if previous.size != target:
+            previous = previous.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        yield output, previous
+
+
+def perceptual_hash(image):
+    """
+    64-bit difference hash (dHash) of an image, as 16 hex digits
+
+    Each bit says whether a pixel of the 9x8 grayscale reduction is brighter
+    than its right neighbour, so re-exports of the same frame (other quality,
+    size or format) land within a few bits of each other - compare with the
+    Hamming distance (see utils/duplicate_detector.find_near_duplicates).
+    """
+    width = PERCEPTUAL_HASH_SIZE + 1
+    small = image.convert('L').resize((width, PERCEPTUAL_HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(PERCEPTUAL_HASH_SIZE):
+        for column in range(PERCEPTUAL_HASH_SIZE):
+            left = pixels[row * width + column]
+            value = (value << 1) | (pixels[row * width + column + 1] > left)
+    return f"{value:016x}"
+
+
+# ---------------------------------------------------------------------------
+# Operations
+# ---------------------------------------------------------------------------
+
+def apply_color_adjustments(image, brightness=None, contrast=None, saturation=None):
+    """Brightness / contrast / saturation enhancement factors (1.0 = unchanged)"""
+    from PIL import ImageEnhance
+
+    if brightness is not None:
+        image = ImageEnhance.Brightness(image).enhance(float(brightness))
+    if contrast is not None:
+        image = ImageEnhance.Contrast(image).enhance(float(contrast))
+    if saturation is not None:
+        image = ImageEnhance.Color(image).enhance(float(saturation))
+    return image
+
+
+def _watermark_position(position, image_size, mark_size):
+    """Top-left corner for a watermark, with a 2% margin"""
+    img_width, img_height = image_size
+    mark_width, mark_height = mark_size
+    margin = int(min(img_width, img_height) * 0.02)
+    positions = {
+        'top-left': (margin, margin),
+        'top-right': (img_width - mark_width - margin, margin),
+        'bottom-left': (margin, img_height - mark_height - margin),
+        'bottom-right': (img_width - mark_width - margin, img_height - mark_height - margin),
+        'center': ((img_width - mark_width) // 2, (img_height - mark_height) // 2)
+    }
+    return positions.get(position, positions['bottom-right'])
+
+
+def apply_logo_watermark(image, logo, position='bottom-right', opacity=0.7, size_percent=15):
+    """
+    Paste a logo scaled to `size_percent` of the image width
+
+    Args:
+        image: PIL image
+        logo: PIL image of the logo (any mode)
+        position: top-left, top-right, bottom-left, bottom-right or center
+        opacity: 0.0 to 1.0
+        size_percent: Logo width as a percentage of image width (5-50)
+
+    Returns:
+        New RGB image with the watermark applied
+    """
+    opacity = max(0.0, min(1.0, float(opacity)))
+    size_percent = max(5, min(50, float(size_percent)))
+
+    if logo.mode != 'RGBA':
+        logo = logo.convert('RGBA')
+
+    img_width, img_height = image.size
+    watermark_width = max(1, int(img_width * (size_percent / 100)))
+    watermark_height = max(1, int(watermark_width / (logo.size[0] / logo.size[1])))
+    watermark = logo.resize((watermark_width, watermark_height), Image.Resampling.LANCZOS)
+
+    if opacity < 1.0:
+        alpha = watermark.split()[3].point(lambda p: int(p * opacity))
+        watermark.putalpha(alpha)
+
+    watermarked = image.convert('RGBA')
+    watermarked.paste(watermark, _watermark_position(position, image.size, watermark.size), watermark)
+    return to_rgb(watermarked)
+
+
+def apply_text_watermark(image, text, position='bottom-right', opacity=0.5):
+    """
+    Draw a text watermark sized to 3% of the shorter image edge
+
+    Returns:
+        New RGB image with the watermark applied
+    """
+    from PIL import ImageDraw, ImageFont
+
+    if not text:
+        return image
+    opacity = max(0.0, min(1.0, float(opacity)))
+
+    base = image.convert('RGBA')
+    overlay = Image.new('RGBA', base.size, (255, 255, 255, 0))
+    draw = ImageDraw.Draw(overlay)
+    font = ImageFont.load_default(size=max(12, int(min(base.size) * 0.03)))
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    x, y = _watermark_position(position, base.size, (right - left, bottom - top))
+    draw.text((x - left, y - top), text, font=font, fill=(255, 255, 255, int(255 * opacity)))
+    return to_rgb(Image.alpha_composite(base, overlay))
+
+
+def _prepare_operations(operations, s3_client):
+    """
+    Resolve operation inputs once per plan (logo watermarks are downloaded
+    here, not per output). Operations whose inputs can't be loaded are dropped.
+
+    Returns:
+        list of (callable, kwargs)
+    """
+    prepared = []
+    for operation in operations:
+        kind = operation.get('op')
+        try:
+            if kind == 'color':
+                kwargs = {name: operation[name] for name in ('brightness', 'contrast', 'saturation')
+                          if operation.get(name) is not None}
+                if kwargs:
+                    prepared.append((apply_color_adjustments, kwargs))
+            elif kind == 'logo_watermark':
+                response = s3_client.get_object(Bucket=operation['bucket'], Key=operation['key'])
+                logo = Image.open(io.BytesIO(response['Body'].read()))
+                logo.load()
+                prepared.append((apply_logo_watermark, {
+                    'logo': logo,
+                    'position': operation.get('position', 'bottom-right'),
+                    'opacity': operation.get('opacity', 0.7),
+                    'size_percent': operation.get('size_percent', 15)
+                }))
+            elif kind == 'text_watermark':
+                if operation.get('text'):
+                    prepared.append((apply_text_watermark, {
+                        'text': operation['text'],
+                        'position': operation.get('position', 'bottom-right'),
+                        'opacity': operation.get('opacity', 0.5)
+                    }))
+            else:
+                print(f"⚠️  Unknown rendition operation: {kind}")
+        except Exception as e:
+            print(f"⚠️  Skipping {kind} operation: {str(e)}")
+    return prepared
+
+
+def _run_operations(image, prepared):
+    for func, kwargs in prepared:
+        try:
+            image = func(image, **kwargs)
+        except Exception as e:
+            print(f"⚠️  {func.__name__} failed: {str(e)}")
+    return image
+
+
+# ---------------------------------------------------------------------------
+# Encode + upload
+# ---------------------------------------------------------------------------
+
+def encode_image(image, output):
+    """Encode one output with its format's ENCODER_OPTIONS"""
+    image_format = output.get('format', 'JPEG')
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=output['quality'], **ENCODER_OPTIONS.get(image_format, {}))
+    return buffer.getvalue()
+
+
+def _render_output(image, output, prepared, s3_client, source_key):
+    rendition = _run_operations(image, prepared)
+    body = encode_image(rendition, output)
+    checksum = hashlib.md5(body).hexdigest()
+    put_args = {
+        'Bucket': output['bucket'],
+        'Key': output['key'],
+        'Body': body,
+        'ContentType': CONTENT_TYPES[output.get('format', 'JPEG')],
+        'Metadata': {'original-key': source_key, 'size': output['name'], 'checksum': checksum}
+    }
+    if output.get('cache_control'):
+        put_args['CacheControl'] = output['cache_control']
+    s3_client.put_object(**put_args)
+    return {
+        'key': output['key'],
+        'dimensions': rendition.size,
+        'size': len(body),
+        'checksum': checksum,
+        'format': output.get('format', 'JPEG')
+    }
+
+
+def render_plan(plan, image, source_size, s3_client, workers=RENDITION_WORKERS):
+    """
+    Execute a plan against a decoded image
+
+    Args:
+        plan: Rendition plan (build_rendition_plan)
+        image: Decoded source image (see load_for_plan)
+        source_size: Full-resolution size of the source
+        s3_client: boto3 S3 client used for logo downloads and uploads
+        workers: Encode/upload threads
+
+    Returns:
+        {'outputs': {output id: {'key', 'dimensions', 'size', 'checksum', 'format'}},
+         'source_dimensions': source_size, 'perceptual_hash': str} - outputs in plan order
+    """
+    image = to_rgb(image)
+    prepared = _prepare_operations(plan['operations'], s3_client)
+    source_key = plan['source']['key']
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        smallest = image
+        for output, resized in build_pyramid(image, source_size, plan):
+            futures[output['id']] = pool.submit(_render_output, resized, output, prepared, s3_client, source_key)
+            smallest = resized
+        # Hashed from the un-watermarked thumbnail while the encodes run
+        hash_value = perceptual_hash(smallest)
+        results = {output['id']: futures[output['id']].result() for output in plan['outputs']}
+
+    return {'outputs': results, 'source_dimensions': tuple(source_size), 'perceptual_hash': hash_value}
+
+
+def render_many(jobs, render_one, workers=RECORD_WORKERS):
+    """
+    Run `render_one(job)` for several images concurrently (e.g. the records
+    of one S3 event). A failing job doesn't affect the others.
+
+    Returns:
+        list of (job, result, error) in job order - error is None on success
+    """
+    def run(job):
+        try:
+            return job, render_one(job), None
+        except Exception as e:
+            return job, None, e
+
+    jobs = list(jobs)
+    if len(jobs) <= 1 or workers <= 1:
+        return [run(job) for job in jobs]
+    with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(run, jobs))
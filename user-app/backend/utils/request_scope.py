@@ -0,0 +1,198 @@
+"""
+Request-scoped data access for DynamoDB tables
+Wraps the tables in utils/config.py with a per-request identity map:
+- item reads are memoized for the life of one request, so the same user,
+  gallery or photo is fetched from DynamoDB at most once
+- independent key lookups are coalesced into BatchGetItem calls
+  (up to 100 keys each)
+- every scope counts logical reads vs. actual round trips so the savings
+  can be reported at the end of the request
+
+api.handler opens a scope per invocation. Code running outside a request
+(scripts, background jobs, direct handler calls in tests) gets a throwaway
+scope that still batches but does not memoize.
+"""
+import contextvars
+from utils.config import get_dynamodb, LazyTable
+
+# DynamoDB BatchGetItem limit
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_RETRIES = 5
+
+_current_scope = contextvars.ContextVar('galerly_request_scope', default=None)
+
+# Sentinel for memoized "item does not exist"
+_MISSING = object()
+
+
+def _resolve_table_name(table):
+    """Physical table name for a config table, or None if it can't be batched"""
+    if isinstance(table, LazyTable):
+        return table._table_name
+    name = getattr(table, 'name', None)
+    return name if isinstance(name, str) else None
+
+
+def _key_id(key):
+    return tuple(sorted(key.items()))
+
+
+class RequestScope:
+    """
+    Identity map + BatchGetItem coalescing for one request
+
+    Args:
+        memoize: Keep items (and memo() results) for the life of the scope.
+            Disable for requests that write, where a later read in the same
+            request must see the new value.
+    """
+
+    def __init__(self, memoize=True):
+        self.memoize = memoize
+        self._items = {}
+        self._memo = {}
+        self.stats = {
+            'reads': 0,         # item reads requested by callers
+            'round_trips': 0,   # DynamoDB calls actually made for those reads
+            'memo_hits': 0,
+            'batched_keys': 0
+        }
+
+    def get_item(self, table, key):
+        """Memoized get_item; returns the item dict or None"""
+        return self.batch_get_items(table, [key])[0]
+
+    def batch_get_items(self, table, keys):
+        """
+        Fetch several items from one table
+
+        Args:
+            table: Table from utils.config (or any boto3 Table)
+            keys: list of primary key dicts
+
+        Returns:
+            list of items (None where missing), in the order of keys
+        """
+        table_name = _resolve_table_name(table)
+        cache_ns = table_name or id(table)
+        self.stats['reads'] += len(keys)
+
+        results = {}
+        pending = []
+        for key in keys:
+            key_id = _key_id(key)
+            cached = self._items.get((cache_ns, key_id)) if self.memoize else None
+            if cached is not None:
+                self.stats['memo_hits'] += 1
+                results[key_id] = cached
+            elif key_id not in results:
+                results[key_id] = _MISSING
+                pending.append(key)
+
+        if pending:
+            if len(pending) == 1 or table_name is None:
+                fetched = self._get_one_by_one(table, pending)
+            else:
+                fetched = self._batch_get(table, table_name, pending)
+            for key in pending:
+                key_id = _key_id(key)
+                item = fetched.get(key_id)
+                results[key_id] = item if item is not None else _MISSING
+                if self.memoize:
+                    self._items[(cache_ns, key_id)] = results[key_id]
+
+        return [None if results[_key_id(key)] is _MISSING else results[_key_id(key)] for key in keys]
+
+    def _get_one_by_one(self, table, keys):
+        fetched = {}
+        for key in keys:
+            self.stats['round_trips'] += 1
+            item = table.get_item(Key=key).get('Item')
+            if item:
+                fetched[_key_id(key)] = item
+        return fetched
+
+    def _batch_get(self, table, table_name, keys):
+        fetched = {}
+        key_names = list(keys[0].keys())
+        dynamodb = get_dynamodb()
+
+        for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+            request = {table_name: {'Keys': keys[start:start + BATCH_GET_MAX_KEYS]}}
+            self.stats['batched_keys'] += len(request[table_name]['Keys'])
+            for _ in range(BATCH_GET_MAX_RETRIES):
+                self.stats['round_trips'] += 1
+                response = dynamodb.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(table_name, []):
+                    fetched[_key_id({name: item.get(name) for name in key_names})] = item
+                request = response.get('UnprocessedKeys') or {}
+                if not request:
+                    break
+            if request:
+                # Throttled past the retry budget - finish with single reads
+                fetched.update(self._get_one_by_one(table, request.get(table_name, {}).get('Keys', [])))
+
+        return fetched
+
+    def memo(self, memo_key, loader):
+        """
+        Memoize an arbitrary read (e.g. a query) for the life of the scope
+
+        Args:
+            memo_key: Hashable key identifying the read
+            loader: Zero-argument callable performing the read (counted as
+                one round trip)
+        """
+        self.stats['reads'] += 1
+        if self.memoize and memo_key in self._memo:
+            self.stats['memo_hits'] += 1
+            return self._memo[memo_key]
+        self.stats['round_trips'] += 1
+        value = loader()
+        if self.memoize:
+            self._memo[memo_key] = value
+        return value
+
+    def forget(self, table, key):
+        """Drop a memoized item (call after writing it within the same request)"""
+        table_name = _resolve_table_name(table)
+        self._items.pop((table_name or id(table), _key_id(key)), None)
+
+    @property
+    def round_trips_saved(self):
+        return self.stats['reads'] - self.stats['round_trips']
+
+
+def begin_request_scope(memoize=True):
+    """Start a scope for the current request and make it current"""
+    scope = RequestScope(memoize=memoize)
+    _current_scope.set(scope)
+    return scope
+
+
+def end_request_scope(label=''):
+    """
+    Close the current scope and report its savings
+
+    Returns:
+        stats dict (with round_trips_saved) or None if no scope was active
+    """
+    scope = _current_scope.get()
+    if scope is None:
+        return None
+    _current_scope.set(None)
+
+    stats = dict(scope.stats, round_trips_saved=scope.round_trips_saved)
+    if stats['round_trips_saved'] > 0:
+        print(f"Request data layer{' ' + label if label else ''}: "
+              f"{stats['reads']} item reads in {stats['round_trips']} round trips "
+              f"({stats['round_trips_saved']} saved, {stats['memo_hits']} memo hits)")
+    return stats
+
+
+def current_scope():
+    """Active request scope, or a non-memoizing throwaway scope outside a request"""
+    scope = _current_scope.get()
+    if scope is None:
+        return RequestScope(memoize=False)
+    return scope
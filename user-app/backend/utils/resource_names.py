@@ -47,6 +47,7 @@ SUBSCRIPTIONS_TABLE = get_table_name('subscriptions')
 BILLING_TABLE = get_table_name('billing')
 REFUNDS_TABLE = get_table_name('refunds')
 ANALYTICS_TABLE = get_table_name('analytics')
+ANALYTICS_ROLLUPS_TABLE = get_table_name('analytics-rollups')
 AUDIT_LOG_TABLE = get_table_name('audit-log')
 RATE_LIMITS_TABLE = get_table_name('rate-limits')
 PLAN_VIOLATIONS_TABLE = get_table_name('plan-violations')
@@ -54,6 +55,8 @@ PLAN_VIOLATIONS_TABLE = get_table_name('plan-violations')
 # Additional tables
 CLIENT_FAVORITES_TABLE = get_table_name('client-favorites')
 CLIENT_FEEDBACK_TABLE = get_table_name('client-feedback')
+CLIENT_GALLERIES_TABLE = get_table_name('client-galleries')
+API_KEYS_TABLE = get_table_name('api-keys')
 EMAIL_TEMPLATES_TABLE = get_table_name('email-templates')
 FEATURES_TABLE = get_table_name('features')
 USER_FEATURES_TABLE = get_table_name('user-features')
@@ -0,0 +1,193 @@
+"""
+Compiled route table for the API Lambda
+Routes are matched with a segment trie keyed on method + path template,
+and each handler module is imported the first time its route is hit
+"""
+import importlib
+
+# Route access levels
+PUBLIC = 'public'          # No authentication lookup at all
+OPTIONAL_AUTH = 'optional'  # User resolved from token if present, may be None
+AUTH_REQUIRED = 'required'  # 401 when no valid session
+
+ANY_METHOD = '*'
+
+_handler_cache = {}
+
+
+def load_handler(target):
+    """
+    Resolve 'package.module:function' to the function, importing the module on first use
+    """
+    handler = _handler_cache.get(target)
+    if handler is None:
+        module_name, func_name = target.split(':', 1)
+        module = importlib.import_module(module_name)
+        handler = getattr(module, func_name)
+        _handler_cache[target] = handler
+    return handler
+
+
+class Route:
+    """
+    Single route entry: method + path template -> lazily imported handler
+
+    target is given as 'package.module:function' (imported on first access
+    of Route.handler) or as the handler function itself for routes served
+    by the entry point module.
+    """
+    __slots__ = ('method', 'template', 'target', 'call', 'access', '_handler')
+
+    def __init__(self, method, template, target, call, access=AUTH_REQUIRED):
+        self.method = method
+        self.template = template
+        self.target = target
+        self.call = call
+        self.access = access
+        self._handler = None if isinstance(target, str) else target
+
+    @property
+    def module_name(self):
+        if isinstance(self.target, str):
+            return self.target.split(':', 1)[0]
+        return self.target.__module__
+
+    @property
+    def handler(self):
+        """Resolve (and cache) the handler function, importing its module on first use"""
+        if self._handler is None:
+            self._handler = load_handler(self.target)
+        return self._handler
+
+    def __repr__(self):
+        target = self.target if isinstance(self.target, str) else self.target.__name__
+        return f"Route({self.method} {self.template} -> {target})"
+
+
+class _Node:
+    """Trie node: static children by segment, one parameter child, routes by method"""
+    __slots__ = ('static', 'param', 'param_name', 'routes')
+
+    def __init__(self):
+        self.static = {}
+        self.param = None
+        self.param_name = None
+        self.routes = {}
+
+
+class RequestContext:
+    """Parsed request handed to route call adapters"""
+    __slots__ = ('event', 'path', 'method', 'body', 'raw_body', 'params', 'user')
+
+    def __init__(self, event, path, method, body, raw_body, params, user=None):
+        self.event = event
+        self.path = path
+        self.method = method
+        self.body = body
+        self.raw_body = raw_body
+        self.params = params
+        self.user = user
+
+    @property
+    def query(self):
+        return self.event.get('queryStringParameters') or {}
+
+    @property
+    def headers(self):
+        return self.event.get('headers', {}) or {}
+
+    @property
+    def client_ip(self):
+        return self.event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'unknown')
+
+    def event_with_params(self):
+        """Event with pathParameters set, for handlers that take the raw event"""
+        self.event['pathParameters'] = dict(self.params)
+        return self.event
+
+
+def split_path(path):
+    """Split a request path or template into non-empty segments"""
+    return [segment for segment in path.split('/') if segment]
+
+
+class Router:
+    """
+    Method + path template router
+
+    Templates use {name} for a single path segment, e.g.
+    '/v1/galleries/{gallery_id}/photos'. Static segments always win over
+    parameters at the same depth, so '/v1/portfolio/settings' is never
+    captured by '/v1/portfolio/{photographer_id}'. The method takes part in
+    matching, so a static path without the requested method falls back to a
+    parameter route that has it.
+    """
+
+    def __init__(self, routes=None):
+        self._root = _Node()
+        self.routes = []
+        for route in routes or []:
+            self.add_route(route)
+
+    def add(self, method, template, target, call, access=AUTH_REQUIRED):
+        """Register a route and return it"""
+        route = Route(method, template, target, call, access)
+        self.add_route(route)
+        return route
+
+    def add_route(self, route):
+        node = self._root
+        for segment in split_path(route.template):
+            if segment.startswith('{') and segment.endswith('}'):
+                name = segment[1:-1]
+                if node.param is None:
+                    node.param = _Node()
+                    node.param_name = name
+                elif node.param_name != name:
+                    raise ValueError(
+                        f"Conflicting parameter names '{node.param_name}' and '{name}' in {route.template}"
+                    )
+                node = node.param
+            else:
+                node = node.static.setdefault(segment, _Node())
+
+        if route.method in node.routes:
+            raise ValueError(f"Duplicate route: {route.method} {route.template}")
+        node.routes[route.method] = route
+        self.routes.append(route)
+
+    def match(self, method, path):
+        """
+        Find the route for a request
+
+        Returns:
+            (route, params) or (None, None) when nothing matches
+        """
+        params = {}
+        route = self._match_node(self._root, method, split_path(path), 0, params)
+        if route is None:
+            return None, None
+        return route, params
+
+    def _match_node(self, node, method, segments, index, params):
+        if index == len(segments):
+            return node.routes.get(method) or node.routes.get(ANY_METHOD)
+
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._match_node(child, method, segments, index + 1, params)
+            if found is not None:
+                return found
+
+        if node.param is not None:
+            found = self._match_node(node.param, method, segments, index + 1, params)
+            if found is not None:
+                params[node.param_name] = segment
+                return found
+
+        return None
+
+    def loaded_modules(self):
+        """Handler modules imported so far (for cold-start diagnostics)"""
+        return sorted({route.module_name for route in self.routes if route._handler is not None})
@@ -0,0 +1,163 @@
+"""
+Ranged S3 reads for header-only metadata extraction
+
+Metadata lives at the start of most uploads (JPEG APP segments, TIFF/RAW
+IFDs) or in a single box (the ISO-BMFF `moov` of MP4/MOV), so the confirm
+handlers only fetch those ranges instead of downloading multi-GB videos or
+100MB RAWs into Lambda memory.
+"""
+import io
+import os
+import struct
+import tempfile
+
+# First range request; every miss doubles the next one (up to the max)
+RANGE_INITIAL_BYTES = 64 * 1024
+RANGE_MAX_BYTES = 8 * 1024 * 1024
+
+# Top-level boxes walked looking for moov before giving up
+ISOBMFF_MAX_BOXES = 64
+# Boxes whose payload is never needed for probing
+ISOBMFF_SKIP_PAYLOAD = ('mdat', 'free', 'skip', 'wide')
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Seekable read-only file over an S3 object, fetched with Range GETs on demand
+
+    Fetched ranges are cached, so seeking back into headers (PIL does this a
+    lot for TIFF IFDs) costs nothing. `requests` and `bytes_fetched` tell how
+    much was actually downloaded.
+    """
+
+    def __init__(self, s3_client, bucket, key, size, block_size=RANGE_INITIAL_BYTES):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.size = int(size)
+        self.block_size = block_size
+        self.position = 0
+        self.segments = []  # [(start, bytes)]
+        self.requests = 0
+        self.bytes_fetched = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self.position = offset
+        return self.position
+
+    def _cached(self, start, end):
+        for segment_start, data in self.segments:
+            if segment_start <= start and end <= segment_start + len(data):
+                return data[start - segment_start:end - segment_start]
+        return None
+
+    def _fetch(self, start, end):
+        """Fetch at least [start, end) - grows the block size on every miss"""
+        fetch_end = min(max(end, start + self.block_size), self.size)
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self.key,
+                                             Range=f"bytes={start}-{fetch_end - 1}")
+        data = response['Body'].read()
+        if not isinstance(data, bytes):
+            raise TypeError(f"unexpected range body {type(data).__name__}")
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        self.block_size = min(self.block_size * 2, RANGE_MAX_BYTES)
+        self.segments.append((start, data))
+        return data[:end - start]
+
+    def read_at(self, offset, length):
+        """Bytes [offset, offset + length), clipped to the object size"""
+        end = min(offset + length, self.size)
+        if offset >= end:
+            return b''
+        data = self._cached(offset, end)
+        if data is None:
+            data = self._fetch(offset, end)
+        return data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self.readall()
+        data = self.read_at(self.position, size)
+        self.position += len(data)
+        return data
+
+    def readall(self):
+        # One request for the remainder rather than DEFAULT_BUFFER_SIZE chunks
+        return self.read(max(self.size - self.position, 0))
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def isobmff_boxes(reader):
+    """
+    Walk the top-level boxes of an ISO-BMFF file (MP4/MOV/M4V) by their headers
+
+    Returns:
+        list of (box_type, offset, size, header_size), or None when the data
+        is not ISO-BMFF
+    """
+    boxes = []
+    offset = 0
+    while offset + 8 <= reader.size and len(boxes) < ISOBMFF_MAX_BOXES:
+        header = reader.read_at(offset, 16)
+        size, raw_type = struct.unpack('>I4s', header[:8])
+        header_size = 8
+        if size == 1:
+            if len(header) < 16:
+                return None
+            size = struct.unpack('>Q', header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = reader.size - offset  # Box runs to the end of the file
+        if size < header_size or not all(32 <= c < 127 for c in raw_type):
+            return None
+        boxes.append((raw_type.decode('ascii'), offset, size, header_size))
+        if raw_type == b'moov' and any(box[0] == 'ftyp' for box in boxes):
+            return boxes
+        offset += size
+    return boxes if any(box[0] == 'moov' for box in boxes) else None
+
+
+def write_sparse_isobmff(reader, boxes, suffix):
+    """
+    Temp file of the object's full size holding only what a prober needs
+
+    Every top-level box header is written at its offset, plus the payload of
+    every box except media data, so ffprobe sees the real layout (and file
+    size, for the bit rate) while mdat stays a hole on disk.
+
+    Returns:
+        Path of the temp file (caller removes it)
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        os.ftruncate(fd, reader.size)
+        for box_type, offset, size, header_size in boxes:
+            length = header_size if box_type in ISOBMFF_SKIP_PAYLOAD else size
+            os.pwrite(fd, reader.read_at(offset, length), offset)
+    except Exception:
+        os.close(fd)
+        os.remove(path)
+        raise
+    os.close(fd)
+    return path
@@ -5,7 +5,7 @@ Handles session rotation and security operations
 import secrets
 from datetime import datetime, timezone
 from utils.config import sessions_table, users_table
-from utils.auth import get_token_from_event
+from utils.auth import get_token_from_event, generate_session_token, forget_session, forget_user_sessions
 
 def rotate_session(old_session_token, user):
     """
@@ -15,7 +15,7 @@ def rotate_session(old_session_token, user):
     Returns: (new_token, cookie_value)
     """
     # Generate new session token
-    new_token = secrets.token_urlsafe(32)
+    new_token = generate_session_token(user.get('id'))
     now = datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
     
     # Create new session
@@ -30,6 +30,7 @@ def rotate_session(old_session_token, user):
     # Delete old session
     try:
         sessions_table.delete_item(Key={'token': old_session_token})
+        forget_session(old_session_token)
     except Exception as e:
         print(f"Warning: Failed to delete old session: {str(e)}")
     
@@ -109,6 +110,10 @@ def invalidate_all_user_sessions(user_id, user_email, reason='security'):
         for token in sessions_to_delete:
             sessions_table.delete_item(Key={'token': token})
         
+        # Other warm containers drop their cached copies within
+        # SESSION_CACHE_TTL_SECONDS (utils/auth.py)
+        forget_user_sessions(user_id=user_id, email=user_email)
+        
         print(f"🔒 Invalidated {len(sessions_to_delete)} sessions for user {user_id} (reason: {reason})")
         
         # Log for audit
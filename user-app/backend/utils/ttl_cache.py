@@ -0,0 +1,59 @@
+"""
+Per-container TTL cache
+Bounded LRU used for warm-container caches (gallery/share-token resolution,
+resolved plan features). Entries also expire after a TTL so cross-container
+writes become visible within a bounded window.
+"""
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded LRU with per-entry expiry; max_size/ttl are read at call time"""
+
+    def __init__(self, max_size, ttl):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        max_size = self._max_size()
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            return self._entries.pop(key, None)
+
+    def discard_where(self, predicate):
+        """Drop every entry whose value matches predicate; returns the count"""
+        with self._lock:
+            doomed = [key for key, (_, value) in self._entries.items() if predicate(value)]
+            for key in doomed:
+                del self._entries[key]
+            return len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -36,21 +36,12 @@ def is_video_file(filename):
     return ext in video_extensions
 
 
-def extract_video_metadata(video_data, filename):
-    """
-    Extract comprehensive metadata from video file using ffprobe
-    
-    Args:
-        video_data: Raw video bytes
-        filename: Original filename
-    
-    Returns:
-        dict: Video metadata including duration, dimensions, codec, bitrate
-    """
-    metadata = {
+def _video_metadata_template(filename, file_size):
+    """Video metadata before probing (what is returned if ffprobe fails)"""
+    return {
         'filename': filename,
-        'file_size': len(video_data),
-        'size_mb': round(len(video_data) / (1024 * 1024), 2),
+        'file_size': file_size,
+        'size_mb': round(file_size / (1024 * 1024), 2),
         'upload_timestamp': datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z',
         'format': 'video',
         'type': 'video',
@@ -60,7 +51,19 @@ def extract_video_metadata(video_data, filename):
         'codec': {},
         'bitrate': None
     }
+
+
+def extract_video_metadata(video_data, filename):
+    """
+    Extract comprehensive metadata from video file using ffprobe
+    
+    Args:
+        video_data: Raw video bytes
+        filename: Original filename
     
+    Returns:
+        dict: Video metadata including duration, dimensions, codec, bitrate
+    """
     # Create temporary file for ffprobe analysis
     temp_fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(filename)[1])
     
@@ -69,6 +72,35 @@ def extract_video_metadata(video_data, filename):
         os.write(temp_fd, video_data)
         os.close(temp_fd)
         
+        return probe_video_file(temp_path, filename, len(video_data))
+    except Exception as e:
+        print(f"⚠️ Error extracting video metadata: {str(e)}")
+        return _video_metadata_template(filename, len(video_data))
+    finally:
+        # Clean up temp file
+        try:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        except:
+            pass
+
+
+def probe_video_file(path, filename, file_size):
+    """
+    Run ffprobe on a video already on disk
+    
+    Args:
+        path: Local path (may be a sparse copy holding only the headers,
+            see utils.s3_range_reader.write_sparse_isobmff)
+        filename: Original filename
+        file_size: Size of the original upload in bytes
+    
+    Returns:
+        dict: Video metadata including duration, dimensions, codec, bitrate
+    """
+    metadata = _video_metadata_template(filename, file_size)
+    
+    try:
         # Use ffprobe to extract metadata
         cmd = [
             'ffprobe',
@@ -76,7 +108,7 @@ def extract_video_metadata(video_data, filename):
             '-print_format', 'json',
             '-show_format',
             '-show_streams',
-            temp_path
+            path
         ]
         
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=VIDEO_METADATA_TIMEOUT)
@@ -120,13 +152,6 @@ def extract_video_metadata(video_data, filename):
     except Exception as e:
         print(f"⚠️ Error extracting video metadata: {str(e)}")
         return metadata
-    finally:
-        # Clean up temp file
-        try:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-        except:
-            pass
 
 
 def generate_video_thumbnail(s3_key, video_data=None, bucket=None):
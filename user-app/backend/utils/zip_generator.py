@@ -7,295 +7,787 @@ IMPORTANT: Images are stored in the ZIP file exactly as uploaded by the photogra
 - No format conversion
 - No resizing or processing
 - Byte-for-byte identical to original S3 files
+
+The ZIP is streamed: each original is read from S3 in chunks and the archive
+is written straight into an S3 multipart upload (ZIP64 when needed), so
+memory stays at a few part sizes whatever the gallery size.
+
+A manifest of the entries (photo, byte range, CRC) is saved next to the
+originals. When photos change, update_gallery_zip reuses the unchanged
+entries of the previous ZIP with server-side UploadPartCopy, appends the new
+photos and rewrites the central directory - the cost follows the delta, not
+the gallery size.
+
+Selection ZIPs (client favorites, submitted selections) are stored under a
+content address - the hash of the sorted photo-id set - so asking again for
+the same photos is served straight from the renditions bucket.
 """
-import io
+import hashlib
+import json
+import os
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from boto3.dynamodb.conditions import Key
 from utils.config import s3_client, S3_BUCKET, S3_RENDITIONS_BUCKET, photos_table
 
+# Multipart part size - every part but the last must be at least 5MB, and an
+# upload has at most 10,000 parts (16MB parts -> 160GB archives)
+ZIP_PART_SIZE = int(os.environ.get('ZIP_PART_SIZE_MB', '16')) * 1024 * 1024
+# S3 limits for a part other than the last, and for one UploadPartCopy
+ZIP_MIN_PART_SIZE = 5 * 1024 * 1024
+ZIP_MAX_COPY_PART_SIZE = 5 * 1024 * 1024 * 1024
+# Parts uploading while the next one fills (memory ~ (workers + 1) x part size)
+ZIP_UPLOAD_WORKERS = 2
+# Parallel HeadObject existence checks
+ZIP_HEAD_WORKERS = 16
+# Chunk size for streaming originals out of S3
+ZIP_READ_CHUNK = 1024 * 1024
+# Resumed (ranged) GETs when an original's stream breaks mid-entry
+ZIP_READ_RETRIES = 3
+
+GALLERY_ZIP_NAME = 'gallery-all-photos.zip'
+# Entry manifest, kept in the (private) originals bucket
+GALLERY_ZIP_MANIFEST_NAME = 'gallery-all-photos.manifest.json'
+ZIP_MANIFEST_VERSION = 1
+# Selection ZIPs: {gallery_id}/selections/{sha256 of sorted photo ids}.zip
+SELECTION_ZIP_PREFIX = 'selections'
+
+
+class S3MultipartWriter:
+    """
+    Write-only, unseekable file object backed by an S3 multipart upload
+
+    Bytes are buffered until a part fills, then uploaded in the background
+    (at most `workers` parts in flight). close() completes the upload,
+    abort() discards it.
+    """
+
+    def __init__(self, bucket, key, part_size=None, workers=None, **create_kwargs):
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size or ZIP_PART_SIZE
+        self.workers = workers or ZIP_UPLOAD_WORKERS
+        self.upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key, **create_kwargs)['UploadId']
+        self.buffer = bytearray()
+        self.position = 0
+        self.parts = []
+        self.pending = []
+        self.etag = None
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def write(self, data):
+        self.buffer += data
+        self.position += len(data)
+        while len(self.buffer) >= self.part_size:
+            part = bytes(self.buffer[:self.part_size])
+            del self.buffer[:self.part_size]
+            self._submit(self._upload_part, part)
+        return len(data)
+
+    def copy_range(self, key, start, end, if_match=None):
+        """
+        Append bytes [start, end) of another object in the same bucket
+
+        Large ranges become UploadPartCopy parts (no bytes pass through
+        Lambda). Every part but the last must be at least ZIP_MIN_PART_SIZE,
+        so buffered bytes are topped up with a ranged read first, and a short
+        range is read into the buffer instead of copied.
+        """
+        if self.buffer:
+            top_up = min(end - start, ZIP_MIN_PART_SIZE - len(self.buffer))
+            if top_up > 0:
+                self.write(self._read_range(key, start, start + top_up, if_match))
+                start += top_up
+            if len(self.buffer) >= ZIP_MIN_PART_SIZE:
+                self._submit(self._upload_part, bytes(self.buffer))
+                self.buffer = bytearray()
+
+        remaining = end - start
+        if remaining < ZIP_MIN_PART_SIZE:
+            if remaining > 0:
+                self.write(self._read_range(key, start, end, if_match))
+            return
+
+        # Equal slices, each between the minimum part and the maximum copy size
+        count = -(-remaining // ZIP_MAX_COPY_PART_SIZE)
+        step = -(-remaining // count)
+        for slice_start in range(start, end, step):
+            slice_end = min(slice_start + step, end)
+            self._submit(self._copy_part, key, slice_start, slice_end, if_match)
+            self.position += slice_end - slice_start
+
+    def _read_range(self, key, start, end, if_match):
+        kwargs = {'IfMatch': if_match} if if_match else {}
+        response = s3_client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes={start}-{end - 1}", **kwargs)
+        return response['Body'].read()
+
+    def _submit(self, upload, *args):
+        # Bound memory: wait for the oldest part before queueing another
+        while len(self.pending) >= self.workers:
+            self.parts.append(self.pending.pop(0).result())
+        part_number = len(self.parts) + len(self.pending) + 1
+        self.pending.append(self.pool.submit(upload, part_number, *args))
+
+    def _upload_part(self, part_number, body):
+        response = s3_client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                         PartNumber=part_number, Body=body)
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    def _copy_part(self, part_number, key, start, end, if_match):
+        kwargs = {'CopySourceIfMatch': if_match} if if_match else {}
+        response = s3_client.upload_part_copy(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                              PartNumber=part_number,
+                                              CopySource={'Bucket': self.bucket, 'Key': key},
+                                              CopySourceRange=f"bytes={start}-{end - 1}", **kwargs)
+        return {'PartNumber': part_number, 'ETag': response['CopyPartResult']['ETag']}
+
+    def close(self):
+        """Upload the last part and complete the multipart upload"""
+        if self.buffer or not (self.parts or self.pending):
+            self._submit(self._upload_part, bytes(self.buffer))
+            self.buffer = bytearray()
+        self.parts.extend(future.result() for future in self.pending)
+        self.pending = []
+        self.pool.shutdown()
+        response = s3_client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                                       MultipartUpload={'Parts': self.parts})
+        self.etag = response.get('ETag')
+
+    def abort(self):
+        """Discard the upload (already uploaded parts are deleted by S3)"""
+        self.pool.shutdown(cancel_futures=True)
+        try:
+            s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception as e:
+            print(f" Could not abort multipart upload {self.upload_id}: {str(e)}")
+
+
+def _query_gallery_photos(gallery_id):
+    """All photo records of a gallery (every GalleryIdIndex page)"""
+    photos = []
+    query_kwargs = {
+        'IndexName': 'GalleryIdIndex',
+        'KeyConditionExpression': Key('gallery_id').eq(gallery_id)
+    }
+    while True:
+        response = photos_table.query(**query_kwargs)
+        photos.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return photos
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _head_size(s3_key):
+    """ContentLength of an object, or None when it is missing"""
+    try:
+        return s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)['ContentLength']
+    except s3_client.exceptions.ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            print(f"   Error checking S3 for {s3_key}: {e}")
+        return None
+
+
+def _resolve_source(photo):
+    """
+    Pick the object to put in the ZIP for a photo record
+
+    PRIORITY: the original file if available (HEIC, RAW, etc), otherwise the
+    converted file (JPEG).
+
+    Returns:
+        {'key', 'filename', 'size'} or None when no file exists in S3
+    """
+    photo_id = photo.get('id', '')
+    s3_key = photo.get('s3_key')
+    if not s3_key:
+        print(f"   Skipping photo {photo_id}: no s3_key")
+        return None
+
+    candidates = []
+    if photo.get('original_s3_key'):
+        candidates.append((photo['original_s3_key'], photo.get('original_filename')))
+    candidates.append((s3_key, photo.get('filename')))
+
+    try:
+        for index, (key, filename) in enumerate(candidates):
+            size = _head_size(key)
+            if size is None:
+                if index + 1 < len(candidates):
+                    print(f"   Original file missing, falling back to converted: {s3_key}")
+                continue
+            # Extract filename from S3 key (e.g., "gallery-id/photo-id.png" -> "photo-id.png")
+            return {'key': key, 'filename': filename or key.split('/')[-1], 'size': size}
+    except Exception as e:
+        print(f"   Error validating {photo.get('filename', 'unknown')}: {e}")
+        return None
+
+    print(f"   Skipping orphaned photo: {photo.get('filename', 'unknown')} (ID: {photo_id}) - S3 file missing")
+    return None
+
+
+def resolve_sources(photos, workers=ZIP_HEAD_WORKERS):
+    """_resolve_source for every photo, HeadObject calls in parallel (order kept)"""
+    if not photos:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(photos))) as pool:
+        return list(pool.map(_resolve_source, photos))
+
+
+def _unique_filename(filename, used_filenames, taken=()):
+    """Handle duplicate filenames: photo.jpg, photo_1.jpg, photo_2.jpg, ... (skipping names in taken)"""
+    original_filename = filename
+    while True:
+        filename = original_filename
+        if filename in used_filenames:
+            name_parts = filename.rsplit('.', 1)
+            if len(name_parts) == 2:
+                base_name, ext = name_parts
+                filename = f"{base_name}_{used_filenames[original_filename]}.{ext}"
+            else:
+                filename = f"{filename}_{used_filenames[original_filename]}"
+            used_filenames[original_filename] += 1
+        else:
+            used_filenames[original_filename] = 1
+        if filename not in taken:
+            return filename
+
+
+def _copy_object(s3_key, size, body, entry):
+    """
+    Stream an S3 object body into an open ZIP entry in ZIP_READ_CHUNK pieces
+
+    A broken stream is resumed with a ranged GET from the last byte written
+    (the entry cannot be rewound once bytes are in the archive).
+    """
+    written = 0
+    attempts = 0
+    while True:
+        try:
+            while written < size:
+                chunk = body.read(ZIP_READ_CHUNK)
+                if not chunk:
+                    break
+                entry.write(chunk)
+                written += len(chunk)
+            if written != size:
+                raise IOError(f"{s3_key} ended at {written} of {size} bytes")
+            return
+        except Exception as e:
+            attempts += 1
+            if attempts > ZIP_READ_RETRIES:
+                raise
+            print(f"   Resuming {s3_key} at byte {written}: {str(e)}")
+            body = s3_client.get_object(Bucket=S3_BUCKET, Key=s3_key, Range=f"bytes={written}-")['Body']
+
+
+def _manifest_key(gallery_id):
+    return f"{gallery_id}/{GALLERY_ZIP_MANIFEST_NAME}"
+
+
+def load_zip_manifest(gallery_id):
+    """Entry manifest of the gallery's current ZIP, or None when missing/unreadable"""
+    try:
+        response = s3_client.get_object(Bucket=S3_BUCKET, Key=_manifest_key(gallery_id))
+        manifest = json.loads(response['Body'].read())
+    except Exception:
+        return None
+    if manifest.get('version') != ZIP_MANIFEST_VERSION or not manifest.get('entries'):
+        return None
+    return manifest
+
+
+def _save_manifest(gallery_id, manifest):
+    try:
+        s3_client.put_object(Bucket=S3_BUCKET, Key=_manifest_key(gallery_id),
+                             Body=json.dumps(manifest).encode('utf-8'), ContentType='application/json')
+    except Exception as e:
+        # Next update falls back to a full rebuild
+        print(f" Could not save ZIP manifest: {str(e)}")
+
+
+def zip_is_current(gallery, manifest):
+    """
+    True when the ZIP was built after the last change to the gallery
+
+    Uploads and deletes bump the gallery's updated_at, and built_at is taken
+    before the photos are queried, so a change during a build marks it stale.
+    """
+    return bool(manifest) and manifest.get('built_at', '') >= (gallery.get('updated_at') or '')
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+
+
+def _entry_record(photo_id, source, zinfo, end):
+    """Manifest entry: where a photo sits in the ZIP and what its central directory record needs"""
+    return {
+        'photo_id': photo_id,
+        'key': source['key'],
+        'size': source['size'],
+        'filename': zinfo.filename,
+        'offset': zinfo.header_offset,
+        'end': end,  # Past the data descriptor
+        'crc': zinfo.CRC,
+        'date_time': list(zinfo.date_time),
+        'flag_bits': zinfo.flag_bits,
+        'create_system': zinfo.create_system,
+        'create_version': zinfo.create_version,
+        'extract_version': zinfo.extract_version,
+        'external_attr': zinfo.external_attr,
+    }
+
+
+def _zipinfo_from_record(record):
+    """ZipInfo of a reused entry, for the rewritten central directory"""
+    zinfo = zipfile.ZipInfo(record['filename'], date_time=tuple(record['date_time']))
+    zinfo.compress_type = zipfile.ZIP_STORED
+    zinfo.file_size = zinfo.compress_size = record['size']
+    zinfo.CRC = record['crc']
+    zinfo.header_offset = record['offset']
+    for field in ('flag_bits', 'create_system', 'create_version', 'extract_version', 'external_attr'):
+        setattr(zinfo, field, record[field])
+    return zinfo
+
+
+def _copy_runs(entries):
+    """Group entries into contiguous byte ranges of the old ZIP: [(start, end, entries)]"""
+    runs = []
+    for entry in sorted(entries, key=lambda entry: entry['offset']):
+        if runs and runs[-1][1] == entry['offset']:
+            runs[-1][1] = entry['end']
+            runs[-1][2].append(entry)
+        else:
+            runs.append([entry['offset'], entry['end'], [entry]])
+    return runs
+
+
+def _write_archive(writer, items, kept=(), zip_etag=None):
+    """
+    Write the archive into writer: entries reused from the previous ZIP
+    first (server-side copies of their byte ranges, guarded by its ETag),
+    then the new photos streamed from S3, then the central directory.
+
+    Returns:
+        (manifest entry records, failed photo ids)
+    """
+    records = []
+    failed_photos = []
+
+    # Reused entries keep their bytes - only their offsets change
+    for start, end, run in _copy_runs(kept):
+        shift = writer.position - start
+        writer.copy_range(writer.key, start, end, if_match=zip_etag)
+        records.extend(dict(entry, offset=entry['offset'] + shift, end=entry['end'] + shift) for entry in run)
+
+    # Use ZIP_STORED (no compression) to preserve images exactly as uploaded
+    with zipfile.ZipFile(writer, 'w', zipfile.ZIP_STORED) as zip_file:
+        for record in records:
+            zinfo = _zipinfo_from_record(record)
+            zip_file.filelist.append(zinfo)
+            zip_file.NameToInfo[zinfo.filename] = zinfo
+
+        used_filenames = {}  # Track duplicates
+        taken = {record['filename'] for record in records}
+
+        for idx, (photo, source) in enumerate(items, 1):
+            photo_id = photo.get('id', '')
+            if source['size'] == 0:
+                print(f"   Photo {idx}/{len(items)} ({photo_id}): Empty file, skipping")
+                failed_photos.append(photo_id)
+                continue
+
+            # Open the stream before the entry: a failure here only skips the photo
+            try:
+                body = s3_client.get_object(Bucket=S3_BUCKET, Key=source['key'])['Body']
+            except Exception as photo_error:
+                print(f"  Photo {idx}/{len(items)} ({photo_id}): Error - {str(photo_error)}")
+                failed_photos.append(photo_id)
+                continue
+
+            filename = _unique_filename(source['filename'], used_filenames, taken)
+            taken.add(filename)
+
+            # Sizes are known up front, so zipfile switches the entry
+            # to ZIP64 by itself when it needs it
+            zinfo = zipfile.ZipInfo(filename, date_time=time.localtime(time.time())[:6])
+            zinfo.compress_type = zipfile.ZIP_STORED
+            zinfo.file_size = source['size']
+
+            # Copy original from S3 (no processing/modification)
+            print(f"  📥 Photo {idx}/{len(items)}: Streaming {source['key']}...")
+            with zip_file.open(zinfo, 'w') as entry:
+                _copy_object(source['key'], source['size'], body, entry)
+            records.append(_entry_record(photo_id, source, zinfo, zip_file.start_dir))
+            print(f"  Photo {idx}/{len(items)}: Added {filename} ({source['size']:,} bytes)")
+
+    return records, failed_photos
+
+
+def _stream_zip(zip_s3_key, items, kept=(), zip_etag=None,
+                cache_control='no-cache, no-store, must-revalidate'):  # Don't cache - always get fresh ZIP
+    """
+    Stream a ZIP into the renditions bucket
+
+    Returns:
+        (writer, records, failed photo ids) - the upload is aborted when no
+        entry was written
+    """
+    writer = S3MultipartWriter(S3_RENDITIONS_BUCKET, zip_s3_key,
+                               ContentType='application/zip', CacheControl=cache_control)
+    try:
+        records, failed_photos = _write_archive(writer, items, kept, zip_etag)
+        if not records:
+            writer.abort()
+        else:
+            writer.close()
+    except Exception:
+        # Bytes of a broken entry are already in the archive - drop the upload
+        writer.abort()
+        raise
+    return writer, records, failed_photos
+
+
+def _build(gallery_id, zip_s3_key, items, built_at, kept=(), zip_etag=None):
+    """
+    Write, publish and record a ZIP
+
+    Returns:
+        (records, failed_count, zip_size_mb), or None when nothing was added
+        (the upload is aborted)
+    """
+    writer, records, failed_photos = _stream_zip(zip_s3_key, items, kept, zip_etag)
+
+    if failed_photos:
+        print(f" Failed to add {len(failed_photos)} photos to ZIP (out of {len(items)} new photos)")
+
+    if not records:
+        print("No photos were successfully added to ZIP!")
+        return None
+
+    zip_size_mb = writer.position / (1024 * 1024)
+    print(f"ZIP created: {len(records)} photos, {zip_size_mb:.2f} MB in {len(writer.parts)} parts")
+
+    _save_manifest(gallery_id, {
+        'version': ZIP_MANIFEST_VERSION,
+        'built_at': built_at,
+        'zip_etag': writer.etag,
+        'zip_size': writer.position,
+        'entries': records,
+    })
+    _invalidate_cdn(gallery_id, zip_s3_key)
+    return records, len(failed_photos), zip_size_mb
+
+
+def _invalidate_cdn(gallery_id, zip_s3_key):
+    """Invalidate CloudFront cache for this ZIP file to ensure fresh download"""
+    try:
+        import boto3
+        cloudfront_dist_id = os.environ.get('CLOUDFRONT_DISTRIBUTION_ID')
+        if cloudfront_dist_id:
+            cloudfront_client = boto3.client('cloudfront', region_name=os.environ.get('AWS_REGION'))
+            try:
+                invalidation = cloudfront_client.create_invalidation(
+                    DistributionId=cloudfront_dist_id,
+                    InvalidationBatch={
+                        'Paths': {
+                            'Quantity': 1,
+                            'Items': [f'/{zip_s3_key}']
+                        },
+                        'CallerReference': f'zip-{gallery_id}-{datetime.now(timezone.utc).isoformat()}'
+                    }
+                )
+                invalidation_id = invalidation.get('Invalidation', {}).get('Id', 'N/A')
+                print(f"🔄 CloudFront cache invalidated for ZIP: {invalidation_id}")
+            except Exception as cf_error:
+                print(f" Could not invalidate CloudFront cache: {str(cf_error)}")
+                # Don't fail if cache invalidation fails
+    except Exception as invalidation_error:
+        print(f" Cache invalidation skipped: {str(invalidation_error)}")
+        # Don't fail if cache invalidation fails
+
+
+def _delete_object(zip_s3_key):
+    try:
+        s3_client.delete_object(Bucket=S3_RENDITIONS_BUCKET, Key=zip_s3_key)
+    except Exception as e:
+        print(f" Could not delete {zip_s3_key}: {str(e)}")
+
+
+def _delete_zip(gallery_id):
+    """Remove a stale ZIP from the renditions bucket (where ZIPs are stored) and its manifest"""
+    zip_s3_key = f"{gallery_id}/{GALLERY_ZIP_NAME}"
+    try:
+        s3_client.delete_object(Bucket=S3_RENDITIONS_BUCKET, Key=zip_s3_key)
+        s3_client.delete_object(Bucket=S3_BUCKET, Key=_manifest_key(gallery_id))
+        print(f" Deleted empty zip file: {zip_s3_key}")
+    except:
+        pass
+
+
+def _empty_result(gallery_id):
+    _delete_zip(gallery_id)
+    return {
+        'success': True,
+        's3_key': f"{gallery_id}/{GALLERY_ZIP_NAME}",
+        'zip_url': None,
+        'photo_count': 0
+    }
+
+
+def _result(gallery_id, records, failed_count, zip_size_mb, mode):
+    # Generate URL for the zip (handles both CloudFront and LocalStack)
+    from utils.cdn_urls import get_zip_url
+    zip_s3_key = f"{gallery_id}/{GALLERY_ZIP_NAME}"
+    zip_url = get_zip_url(gallery_id)
+
+    print(f"ZIP uploaded to S3: {zip_s3_key} ({zip_size_mb:.2f} MB)")
+    print(f"ZIP URL: {zip_url}")
+
+    return {
+        'success': True,
+        's3_key': zip_s3_key,
+        'zip_url': zip_url,
+        'photo_count': len(records),  # Return actual count added, not DB count
+        'zip_size_mb': zip_size_mb,
+        'failed_count': failed_count,
+        'mode': mode
+    }
+
 
 def generate_gallery_zip(gallery_id):
     """
     Generate ZIP file containing all photos in a gallery and store it in S3
-    
-    Automatically validates that photos exist in S3 before including them.
-    Skips orphaned records where S3 files are missing.
-    
+
+    Automatically validates that photos exist in S3 before including them
+    (HeadObject checks run in parallel). Skips orphaned records where S3
+    files are missing. Originals are streamed into an S3 multipart upload,
+    never held in memory as a whole.
+
     Args:
         gallery_id: The gallery ID
-        
+
     Returns:
         dict with 'success' (bool), 's3_key' (str), 'zip_url' (str), 'photo_count' (int)
     """
     try:
         print(f"Generating ZIP for gallery {gallery_id}...")
-        
+        zip_s3_key = f"{gallery_id}/{GALLERY_ZIP_NAME}"
+        built_at = _now()
+
         # Get all photos in this gallery
-        photos_response = photos_table.query(
-            IndexName='GalleryIdIndex',
-            KeyConditionExpression=Key('gallery_id').eq(gallery_id)
-        )
-        photos = photos_response.get('Items', [])
-        
+        photos = _query_gallery_photos(gallery_id)
+
         if not photos:
             print(f" No photos found for gallery {gallery_id}")
-            # Still create an empty zip or delete existing zip
-            zip_s3_key = f"{gallery_id}/gallery-all-photos.zip"
-            try:
-                # Delete from renditions bucket (where ZIPs are stored)
-                s3_client.delete_object(Bucket=S3_RENDITIONS_BUCKET, Key=zip_s3_key)
-                print(f" Deleted empty zip file: {zip_s3_key}")
-            except:
-                pass
-            return {
-                'success': True,
-                's3_key': zip_s3_key,
-                'zip_url': None,
-                'photo_count': 0
-            }
-        
+            return _empty_result(gallery_id)
+
         print(f"Found {len(photos)} photo records in DynamoDB")
-        
+
         # Validate photos - check if S3 files actually exist
-        valid_photos = []
-        orphaned_photos = []
-        
-        for photo in photos:
-            photo_id = photo.get('id', '')
-            s3_key = photo.get('s3_key')
-            filename = photo.get('filename', 'unknown')
-            
-            if not s3_key:
-                print(f"   Skipping photo {photo_id}: no s3_key")
-                orphaned_photos.append(photo_id)
-                continue
-            
-            # Check if file exists in S3
-            try:
-                s3_client.head_object(Bucket=S3_BUCKET, Key=s3_key)
-                valid_photos.append(photo)
-            except s3_client.exceptions.ClientError as e:
-                if e.response['Error']['Code'] == '404':
-                    print(f"   Skipping orphaned photo: {filename} (ID: {photo_id}) - S3 file missing")
-                    orphaned_photos.append(photo_id)
-                else:
-                    print(f"   Error checking S3 for {filename}: {e}")
-                    orphaned_photos.append(photo_id)
-            except Exception as e:
-                print(f"   Error validating {filename}: {e}")
-                orphaned_photos.append(photo_id)
-        
-        if orphaned_photos:
-            print(f" Found {len(orphaned_photos)} orphaned photo records (DB exists but S3 file missing)")
-            print(f"Including only {len(valid_photos)} valid photos in ZIP")
+        sources = resolve_sources(photos)
+        valid = [(photo, source) for photo, source in zip(photos, sources) if source]
+        orphaned_count = len(photos) - len(valid)
+
+        if orphaned_count:
+            print(f" Found {orphaned_count} orphaned photo records (DB exists but S3 file missing)")
+            print(f"Including only {len(valid)} valid photos in ZIP")
         else:
-            print(f"All {len(valid_photos)} photos validated successfully")
-        
-        if not valid_photos:
+            print(f"All {len(valid)} photos validated successfully")
+
+        if not valid:
             print(f" No valid photos to include in ZIP (all orphaned)")
-            # Delete the ZIP file since there are no valid photos
-            zip_s3_key = f"{gallery_id}/gallery-all-photos.zip"
-            try:
-                s3_client.delete_object(Bucket=S3_BUCKET, Key=zip_s3_key)
-                print(f" Deleted empty zip file: {zip_s3_key}")
-            except:
-                pass
-            return {
-                'success': True,
-                's3_key': zip_s3_key,
-                'zip_url': None,
-                'photo_count': 0
-            }
-        
-        # Create in-memory ZIP file with only valid photos
-        # Use ZIP_STORED (no compression) to preserve images exactly as uploaded
-        zip_buffer = io.BytesIO()
-        successfully_added = 0
-        failed_photos = []
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_STORED) as zip_file:
-            used_filenames = {}  # Track duplicates
-            
-            for idx, photo in enumerate(valid_photos, 1):
-                try:
-                    # Using boto3.resource API, items are already in Python format
-                    photo_id = photo.get('id', '')
-                    s3_key = photo.get('s3_key')
-                    
-                    # PRIORITY: Use original file if available (HEIC, RAW, etc)
-                    # Otherwise use converted file (JPEG)
-                    original_s3_key = photo.get('original_s3_key')
-                    original_filename = photo.get('original_filename')
-                    
-                    download_s3_key = original_s3_key if original_s3_key else s3_key
-                    download_filename = original_filename if original_filename else photo.get('filename')
-                    
-                    if not download_s3_key:
-                        print(f"   Photo {idx}/{len(valid_photos)} ({photo_id}): No s3_key, skipping")
-                        failed_photos.append(photo_id)
-                        continue
-                    
-                    # Double-check S3 file exists before downloading
-                    try:
-                        s3_client.head_object(Bucket=S3_BUCKET, Key=download_s3_key)
-                    except s3_client.exceptions.ClientError as e:
-                        if e.response['Error']['Code'] == '404':
-                            # Original missing, try converted file
-                            if original_s3_key and s3_key:
-                                print(f"   Original file missing, falling back to converted: {s3_key}")
-                                download_s3_key = s3_key
-                                download_filename = photo.get('filename')
-                                try:
-                                    s3_client.head_object(Bucket=S3_BUCKET, Key=download_s3_key)
-                                except:
-                                    print(f"   Photo {idx}/{len(valid_photos)} ({photo_id}): Both original and converted missing, skipping")
-                                    failed_photos.append(photo_id)
-                                    continue
-                            else:
-                                print(f"   Photo {idx}/{len(valid_photos)} ({photo_id}): S3 file missing, skipping")
-                                failed_photos.append(photo_id)
-                                continue
-                        else:
-                            raise
-                    
-                    # Get filename from database
-                    filename = download_filename
-                    if not filename:
-                        # Extract filename from S3 key (e.g., "gallery-id/photo-id.png" → "photo-id.png")
-                        filename = download_s3_key.split('/')[-1]
-                        print(f"  Photo {idx}/{len(valid_photos)}: No filename in DB for {photo_id}, using S3 key: {filename}")
-                    
-                    # Handle duplicate filenames
-                    original_filename = filename
-                    if filename in used_filenames:
-                        # Extract extension
-                        name_parts = filename.rsplit('.', 1)
-                        if len(name_parts) == 2:
-                            base_name, ext = name_parts
-                            filename = f"{base_name}_{used_filenames[original_filename]}.{ext}"
-                        else:
-                            filename = f"{filename}_{used_filenames[original_filename]}"
-                        used_filenames[original_filename] = used_filenames.get(original_filename, 0) + 1
-                    else:
-                        used_filenames[original_filename] = 1
-                    
-                    # Download original image from S3 (no processing/modification)
-                    # Uses original file (HEIC/RAW) if available, otherwise converted (JPEG)
-                    print(f"  📥 Photo {idx}/{len(valid_photos)}: Downloading {download_s3_key}...")
-                    s3_object = s3_client.get_object(Bucket=S3_BUCKET, Key=download_s3_key)
-                    image_data = s3_object['Body'].read()
-                    
-                    if not image_data or len(image_data) == 0:
-                        print(f"   Photo {idx}/{len(valid_photos)} ({photo_id}): Empty file, skipping")
-                        failed_photos.append(photo_id)
-                        continue
-                    
-                    # Add to ZIP without compression (preserves original exactly)
-                    zip_file.writestr(filename, image_data)
-                    successfully_added += 1
-                    print(f"  Photo {idx}/{len(valid_photos)}: Added {filename} ({len(image_data):,} bytes)")
-                    
-                except Exception as photo_error:
-                    photo_id = photo.get('id', 'unknown')
-                    print(f"  Photo {idx}/{len(valid_photos)} ({photo_id}): Error - {str(photo_error)}")
-                    import traceback
-                    traceback.print_exc()
-                    failed_photos.append(photo_id)
-                    continue
-        
-        if failed_photos:
-            print(f" Failed to add {len(failed_photos)} photos to ZIP (out of {len(valid_photos)} valid photos)")
-        
-        if successfully_added == 0:
-            print(f"No photos were successfully added to ZIP!")
-            # Delete the ZIP file since there are no valid photos
-            zip_s3_key = f"{gallery_id}/gallery-all-photos.zip"
-            try:
-                # Delete from renditions bucket (where ZIPs are stored)
-                s3_client.delete_object(Bucket=S3_RENDITIONS_BUCKET, Key=zip_s3_key)
-                print(f" Deleted empty zip file: {zip_s3_key}")
-            except:
-                pass
+            return _empty_result(gallery_id)
+
+        built = _build(gallery_id, zip_s3_key, valid, built_at)
+        if not built:
+            return _empty_result(gallery_id)
+        return _result(gallery_id, *built, mode='full')
+
+    except Exception as e:
+        print(f"Error generating gallery ZIP: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+
+def _plan_update(photos, manifest):
+    """
+    Split the gallery against the manifest
+
+    Returns:
+        (manifest entries still in the gallery, photos to add)
+    """
+    entries = {entry['photo_id']: entry for entry in manifest['entries']}
+    kept, added = [], []
+    for photo in photos:
+        entry = entries.get(photo.get('id'))
+        # Keys are per photo and originals are never overwritten, so an
+        # entry for the same key still holds the right bytes
+        if entry and entry['key'] in (photo.get('original_s3_key'), photo.get('s3_key')):
+            kept.append(entry)
+        else:
+            added.append(photo)
+    return kept, added
+
+
+def update_gallery_zip(gallery_id, manifest=None):
+    """
+    Bring the gallery ZIP up to date, reusing the unchanged entries
+
+    Entries of photos still in the gallery are copied server-side from the
+    previous ZIP (UploadPartCopy); only new photos are read from S3, and
+    removed photos are simply left out. Falls back to generate_gallery_zip
+    without a manifest, or when the incremental update fails (e.g. the ZIP
+    changed since the manifest was written).
+
+    Args:
+        gallery_id: The gallery ID
+        manifest: Already loaded manifest (optional)
+
+    Returns:
+        Same dict as generate_gallery_zip, plus 'mode' ('full', 'incremental' or 'unchanged')
+    """
+    try:
+        manifest = manifest or load_zip_manifest(gallery_id)
+        if not manifest:
+            return generate_gallery_zip(gallery_id)
+
+        zip_s3_key = f"{gallery_id}/{GALLERY_ZIP_NAME}"
+        built_at = _now()
+        photos = _query_gallery_photos(gallery_id)
+        kept, added = _plan_update(photos, manifest)
+
+        # Only new photos need existence checks
+        sources = resolve_sources(added)
+        new_items = [(photo, source) for photo, source in zip(added, sources) if source]
+        removed_count = len(manifest['entries']) - len(kept)
+
+        if not kept and not new_items:
+            print(" No valid photos to include in ZIP")
+            return _empty_result(gallery_id)
+
+        if not removed_count and not new_items:
+            print(f"ZIP for gallery {gallery_id} is up to date ({len(kept)} photos)")
+            _save_manifest(gallery_id, dict(manifest, built_at=built_at))
+            return _result(gallery_id, kept, 0, manifest.get('zip_size', 0) / (1024 * 1024), mode='unchanged')
+
+        print(f"Updating ZIP for gallery {gallery_id}: {len(kept)} kept, "
+              f"{removed_count} removed, {len(new_items)} added")
+        built = _build(gallery_id, zip_s3_key, new_items, built_at, kept, manifest.get('zip_etag'))
+        if not built:
+            return _empty_result(gallery_id)
+        return _result(gallery_id, *built, mode='incremental')
+
+    except Exception as e:
+        print(f"Incremental ZIP update failed, regenerating: {str(e)}")
+        return generate_gallery_zip(gallery_id)
+
+
+def selection_digest(photo_ids):
+    """Content address of a photo subset: SHA-256 of the sorted, de-duplicated ids"""
+    return hashlib.sha256('\n'.join(sorted(set(photo_ids))).encode('utf-8')).hexdigest()
+
+
+def selection_zip_key(gallery_id, photo_ids):
+    return f"{gallery_id}/{SELECTION_ZIP_PREFIX}/{selection_digest(photo_ids)}.zip"
+
+
+def gallery_photos_subset(gallery_id, photo_ids):
+    """Photo records of the gallery whose id is in photo_ids (gallery order; unknown or deleted ids dropped)"""
+    wanted = set(photo_ids)
+    return [photo for photo in _query_gallery_photos(gallery_id) if photo.get('id') in wanted]
+
+
+def selection_zip_exists(zip_s3_key):
+    """True when the selection ZIP is already in the renditions bucket"""
+    try:
+        s3_client.head_object(Bucket=S3_RENDITIONS_BUCKET, Key=zip_s3_key)
+        return True
+    except Exception:
+        return False
+
+
+def generate_selection_zip(gallery_id, photo_ids):
+    """
+    ZIP of a subset of a gallery's photos (client favorites or a submitted selection)
+
+    The ZIP key is the content address of the photo-id set, so an identical
+    request returns the stored ZIP without reading anything. A photo that
+    fails to stream fails the whole ZIP instead of caching an incomplete one.
+
+    Args:
+        gallery_id: The gallery ID
+        photo_ids: Photo IDs to include (order and duplicates don't matter)
+
+    Returns:
+        dict with 'success' (bool), 's3_key' (str), 'zip_url' (str),
+        'photo_count' (int), 'cached' (bool)
+    """
+    try:
+        from utils.cdn_urls import get_zip_object_url
+        photos = gallery_photos_subset(gallery_id, photo_ids)
+        if not photos:
+            return {'success': False, 'error': 'None of the selected photos are in this gallery'}
+
+        zip_s3_key = selection_zip_key(gallery_id, [photo['id'] for photo in photos])
+        if selection_zip_exists(zip_s3_key):
+            print(f"Selection ZIP cache hit: {zip_s3_key}")
             return {
                 'success': True,
                 's3_key': zip_s3_key,
-                'zip_url': None,
-                'photo_count': 0
+                'zip_url': get_zip_object_url(zip_s3_key),
+                'photo_count': len(photos),
+                'cached': True
             }
-        
-        # Get ZIP data
-        zip_buffer.seek(0)
-        zip_data = zip_buffer.read()
-        zip_size_mb = len(zip_data) / (1024 * 1024)
-        
-        print(f"ZIP created: {successfully_added} photos successfully added, {zip_size_mb:.2f} MB")
-        if failed_photos:
-            print(f" {len(failed_photos)} photos failed to add (orphaned or errors)")
-        
-        # Upload ZIP to S3 renditions bucket (where ZIPs are stored)
-        zip_s3_key = f"{gallery_id}/gallery-all-photos.zip"
-        print(f"📤 Uploading ZIP to S3: {zip_s3_key}...")
-        s3_client.put_object(
-            Bucket=S3_RENDITIONS_BUCKET,
-            Key=zip_s3_key,
-            Body=zip_data,
-            ContentType='application/zip',
-            CacheControl='no-cache, no-store, must-revalidate'  # Don't cache - always get fresh ZIP
-        )
-        
-        # Invalidate CloudFront cache for this ZIP file to ensure fresh download
-        try:
-            import os
-            import boto3
-            cloudfront_dist_id = os.environ.get('CLOUDFRONT_DISTRIBUTION_ID')
-            if cloudfront_dist_id:
-                cloudfront_client = boto3.client('cloudfront', region_name=os.environ.get('AWS_REGION'))
-                try:
-                    invalidation = cloudfront_client.create_invalidation(
-                        DistributionId=cloudfront_dist_id,
-                        InvalidationBatch={
-                            'Paths': {
-                                'Quantity': 1,
-                                'Items': [f'/{zip_s3_key}']
-                            },
-                            'CallerReference': f'zip-{gallery_id}-{datetime.now(timezone.utc).isoformat()}'
-                        }
-                    )
-                    invalidation_id = invalidation.get('Invalidation', {}).get('Id', 'N/A')
-                    print(f"🔄 CloudFront cache invalidated for ZIP: {invalidation_id}")
-                except Exception as cf_error:
-                    print(f" Could not invalidate CloudFront cache: {str(cf_error)}")
-                    # Don't fail if cache invalidation fails
-        except Exception as invalidation_error:
-            print(f" Cache invalidation skipped: {str(invalidation_error)}")
-            # Don't fail if cache invalidation fails
-        
-        # Generate URL for the zip (handles both CloudFront and LocalStack)
-        from utils.cdn_urls import get_zip_url
-        zip_url = get_zip_url(gallery_id)
-        
-        print(f"ZIP uploaded to S3: {zip_s3_key} ({zip_size_mb:.2f} MB)")
-        print(f"ZIP URL: {zip_url}")
-        print(f"ZIP contains {successfully_added} photos (expected {len(valid_photos)} valid photos from DB)")
+
+        print(f"Generating selection ZIP for {len(photos)} photos of gallery {gallery_id}...")
+        sources = resolve_sources(photos)
+        valid = [(photo, source) for photo, source in zip(photos, sources) if source]
+        if not valid:
+            return {'success': False, 'error': 'No selected photo files found'}
+
+        # Same photo ids always give the same bytes - cache it for good
+        writer, records, failed_photos = _stream_zip(zip_s3_key, valid,
+                                                     cache_control='public, max-age=31536000, immutable')
         if failed_photos:
-            print(f" {len(failed_photos)} photos were skipped (missing S3 files or errors)")
-        
+            if records:
+                _delete_object(zip_s3_key)
+            return {'success': False, 'error': f"Failed to add {len(failed_photos)} photos"}
+
+        zip_size_mb = writer.position / (1024 * 1024)
+        print(f"Selection ZIP created: {zip_s3_key} ({len(records)} photos, {zip_size_mb:.2f} MB)")
         return {
             'success': True,
             's3_key': zip_s3_key,
-            'zip_url': zip_url,
-            'photo_count': successfully_added,  # Return actual count added, not DB count
+            'zip_url': get_zip_object_url(zip_s3_key),
+            'photo_count': len(records),
             'zip_size_mb': zip_size_mb,
-            'failed_count': len(failed_photos)
+            'cached': False
         }
-        
+
     except Exception as e:
-        print(f"Error generating gallery ZIP: {str(e)}")
+        print(f"Error generating selection ZIP: {str(e)}")
         import traceback
         traceback.print_exc()
         return {
             'success': False,
             'error': str(e)
         }
-
@@ -21,29 +21,22 @@ export default function AnalyticsExport({ onClose }: AnalyticsExportProps) {
       const startDate = new Date(Date.now() - parseInt(dateRange) * 24 * 60 * 60 * 1000).toISOString();
 
       if (format === 'csv') {
-        // Download CSV directly
+        // The CSV is written to storage; download it from the returned link
         const params = new URLSearchParams({
           type: exportType,
           start_date: startDate,
           end_date: endDate
         });
         
-        const response = await fetch(`/api/v1/analytics/export/csv?${params.toString()}`, {
-          headers: {
-            'Authorization': `Bearer ${localStorage.getItem('token')}`
-          }
-        });
+        const response = await api.get(`/analytics/export/csv?${params.toString()}`);
         
-        if (!response.ok) throw new Error('Export failed');
+        if (!response.success || !response.data.download_url) throw new Error('Export failed');
         
-        const blob = await response.blob();
-        const url = window.URL.createObjectURL(blob);
         const a = document.createElement('a');
-        a.href = url;
-        a.download = `analytics_${exportType}_${startDate.slice(0, 10)}_to_${endDate.slice(0, 10)}.csv`;
+        a.href = response.data.download_url;
+        a.download = response.data.filename;
         document.body.appendChild(a);
         a.click();
-        window.URL.revokeObjectURL(url);
         document.body.removeChild(a);
         
         toast.success('CSV exported successfully');
@@ -159,6 +159,7 @@ export default function GalleryPage() {
   );
 
   const fileInputRef = useRef<HTMLInputElement>(null);
+  const duplicateResultsRef = useRef<Map<File, Photo[]>>(new Map());
   
   // Video playback state
   const videoRef = useRef<HTMLVideoElement>(null);
@@ -521,6 +522,22 @@ export default function GalleryPage() {
     // Initialize accumulation with empty array
     setUploadError(null);
     setCheckingDuplicates(true); // Show checking status
+
+    // One request for the whole selection; files it could not answer are checked one by one
+    duplicateResultsRef.current = new Map();
+    try {
+      const batchRes = await photoService.checkDuplicatesBatch(
+        galleryId,
+        files.map((file) => ({ filename: file.name, file_size: file.size }))
+      );
+      if (batchRes.success && batchRes.data) {
+        batchRes.data.results.forEach((result, index) => {
+          duplicateResultsRef.current.set(files[index], result.has_duplicates ? result.duplicates : []);
+        });
+      }
+    } catch (error) {
+      console.error('Error checking duplicates:', error);
+    }
     processUploadQueue(files, []);
   };
 
@@ -538,13 +555,17 @@ export default function GalleryPage() {
     const remainingQueue = queue.slice(1);
 
     try {
-      // Check for duplicates
-      const checkRes = await photoService.checkDuplicates(galleryId!, currentFile.name, currentFile.size);
+      // Check for duplicates (answered by the batch check when possible)
+      let matches = duplicateResultsRef.current.get(currentFile);
+      if (matches === undefined) {
+        const checkRes = await photoService.checkDuplicates(galleryId!, currentFile.name, currentFile.size);
+        matches = checkRes.success && checkRes.data && checkRes.data.has_duplicates ? checkRes.data.duplicates : [];
+      }
       
-      if (checkRes.success && checkRes.data && checkRes.data.has_duplicates) {
+      if (matches.length > 0) {
         // Show modal
         setDuplicateFile(currentFile);
-        setDuplicateMatches(checkRes.data.duplicates);
+        setDuplicateMatches(matches);
         setDuplicateModalOpen(true);
         setPendingUploadQueue(remainingQueue);
         setAccumulatedFiles(currentBatch); // Save progress
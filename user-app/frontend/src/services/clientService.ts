@@ -125,6 +125,30 @@ export async function bulkDownloadByToken(shareToken: string, photoIds?: string[
   });
 }
 
+// ZIP of the client's favorites (galleryId + clientEmail) or a submitted selection (sessionId).
+// Guests must also pass the gallery's shareToken.
+// 200 returns zip_url; 202 means the ZIP is being built - call again after retry_after seconds.
+export async function selectionDownload(params: {
+  galleryId?: string;
+  clientEmail?: string;
+  sessionId?: string;
+  shareToken?: string;
+}) {
+  return api.post<{
+    zip_url?: string;
+    filename: string;
+    photo_count: number;
+    job_id?: string;
+    status?: string;
+    retry_after?: number;
+  }>('/downloads/selection', {
+    gallery_id: params.galleryId,
+    client_email: params.clientEmail,
+    session_id: params.sessionId,
+    token: params.shareToken,
+  });
+}
+
 // Send selection reminder
 export async function sendSelectionReminder(galleryId: string) {
   return api.post('/notifications/send-selection-reminder', {
@@ -151,5 +175,6 @@ export default {
   getGalleryFeedback,
   bulkDownload,
   bulkDownloadByToken,
+  selectionDownload,
 };
 
@@ -87,6 +87,28 @@ export async function checkDuplicates(galleryId: string, filename: string, fileS
   });
 }
 
+// Check a whole upload batch for duplicates in one request (results in the same order as files)
+export async function checkDuplicatesBatch(galleryId: string, files: { filename: string; file_size: number }[]) {
+  return api.post<{
+    results: { filename: string; file_size: number; has_duplicates: boolean; duplicates: Photo[] }[];
+    duplicate_files: number;
+  }>(`/galleries/${galleryId}/photos/check-duplicates`, { files });
+}
+
+// Groups of visually identical photos (perceptual hash) in a gallery, or across all galleries
+export async function findNearDuplicates(galleryId?: string, maxDistance?: number) {
+  const params = new URLSearchParams();
+  if (galleryId) params.append('gallery_id', galleryId);
+  if (maxDistance !== undefined) params.append('max_distance', String(maxDistance));
+  const query = params.toString();
+  return api.get<{
+    scope: 'gallery' | 'account';
+    groups: (Photo & { gallery_id: string; distance: number })[][];
+    group_count: number;
+    photos_searched: number;
+  }>(`/photos/near-duplicates${query ? `?${query}` : ''}`);
+}
+
 // Update photo metadata
 export async function updatePhoto(photoId: string, data: { filename?: string; status?: string; metadata?: Record<string, any> }) {
   return api.put<Photo>(`/photos/${photoId}`, data);
@@ -222,6 +244,8 @@ export default {
   getUploadUrl,
   confirmUpload,
   checkDuplicates,
+  checkDuplicatesBatch,
+  findNearDuplicates,
   updatePhoto,
   deletePhotos,
   addComment,